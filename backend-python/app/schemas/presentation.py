@@ -22,3 +22,29 @@ class Presentation(BaseModel):
     theme: str
     created_at: str
     download_url: str
+
+class SlideUpdate(BaseModel):
+    title: Optional[str] = None
+    content: Optional[List[str]] = None
+    image_url: Optional[str] = None
+
+class SlideRegenerateRequest(BaseModel):
+    instruction: Optional[str] = None  # 作り直す際の指示（例: 「具体例を増やす」）
+    source_text: Optional[str] = None  # 参考にする元テキストの該当箇所
+
+class BatchPresentationRequest(BaseModel):
+    requests: List[PresentationRequest]
+    concurrency: Optional[int] = None
+
+class BatchArchiveRequest(BaseModel):
+    presentation_ids: List[str]
+
+class JobStatus(BaseModel):
+    id: str
+    status: str  # queued / running / completed / failed
+    stage: str
+    progress: float
+    presentation_id: Optional[str] = None
+    error: Optional[str] = None
+    created_at: str
+    updated_at: str
@@ -0,0 +1,178 @@
+import os
+import math
+import time
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, TypeVar
+
+from app.services.llm_client import OPENAI_MAX_CONCURRENCY
+
+# ロガーの初期化
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# 受付制御の有効/無効（無効の場合は同時実行数・締め切りによる制限を行わない）
+GENERATION_ADMISSION_ENABLED = os.getenv("GENERATION_ADMISSION_ENABLED", "true").lower() in ("1", "true", "yes")
+# 同時に実行する生成の上限（超えた分は待機させる）
+GENERATION_MAX_CONCURRENCY = int(os.getenv("GENERATION_MAX_CONCURRENCY", str(OPENAI_MAX_CONCURRENCY)))
+# 待機中の生成の上限（超えた場合は待ち時間の見積もりによらず拒否する）
+GENERATION_MAX_QUEUED = int(os.getenv("GENERATION_MAX_QUEUED", "256"))
+# クライアントが締め切り（X-Request-Timeoutヘッダー）を指定しない場合の締め切り（秒）
+GENERATION_DEFAULT_DEADLINE_SECONDS = float(os.getenv("GENERATION_DEFAULT_DEADLINE_SECONDS", "120"))
+# 上流APIの応答時間の計測値がない間に使う、生成1件あたりの所要時間の見積もり（秒）
+GENERATION_INITIAL_LATENCY_SECONDS = float(os.getenv("GENERATION_INITIAL_LATENCY_SECONDS", "10"))
+# クライアントの切断を確認する間隔（秒）
+CLIENT_DISCONNECT_POLL_SECONDS = float(os.getenv("CLIENT_DISCONNECT_POLL_SECONDS", "0.5"))
+
+DEADLINE_HEADER = "x-request-timeout"
+
+
+class AdmissionRejected(Exception):
+    """締め切りまでに処理を終えられない見込みのため、生成を受け付けなかった"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class ClientDisconnected(Exception):
+    """処理の完了前にクライアントが切断した"""
+
+
+def parse_deadline(value: Optional[str], default: float = GENERATION_DEFAULT_DEADLINE_SECONDS) -> float:
+    """締め切りのヘッダー（秒数）を解釈する（未指定は既定値、不正な値はValueError）"""
+    if value is None or not value.strip():
+        return default
+    try:
+        deadline = float(value)
+    except ValueError:
+        raise ValueError(f"締め切りの指定が不正です: {value}（秒数を指定してください）")
+    if not math.isfinite(deadline) or deadline <= 0:
+        raise ValueError(f"締め切りの指定が不正です: {value}（正の秒数を指定してください）")
+    return deadline
+
+
+class AdmissionController:
+    """実行中・待機中の生成数と直近の上流APIの応答時間から待ち時間を見積もり、締め切りに間に合わない生成を早期に拒否する"""
+
+    def __init__(
+        self,
+        max_concurrency: int = GENERATION_MAX_CONCURRENCY,
+        max_queued: int = GENERATION_MAX_QUEUED,
+        latency_estimate: Optional[Callable[[], Optional[float]]] = None,
+        initial_latency: float = GENERATION_INITIAL_LATENCY_SECONDS,
+        enabled: bool = GENERATION_ADMISSION_ENABLED,
+    ):
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queued = max_queued
+        self.enabled = enabled
+        self._latency_estimate = latency_estimate
+        self._initial_latency = initial_latency
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.in_flight = 0
+        self.queued = 0
+        self._stats = {"admitted": 0, "rejected": 0, "expired": 0}
+
+    def service_time(self) -> float:
+        """生成1件あたりの所要時間の見積もり（直近の上流APIの応答時間の中央値）"""
+        latency = self._latency_estimate() if self._latency_estimate is not None else None
+        return latency if latency is not None else self._initial_latency
+
+    def estimate_wait(self) -> float:
+        """今受け付けた生成が実行を開始するまでの待ち時間の見積もり（秒）"""
+        ahead = self.queued + self.in_flight - self.max_concurrency + 1
+        if ahead <= 0:
+            return 0.0
+        # 実行中の枠は平均してservice_timeごとにmax_concurrency件ずつ空く
+        return ahead / self.max_concurrency * self.service_time()
+
+    def _reject(self, message: str, retry_after: float, reason: str = "rejected") -> AdmissionRejected:
+        self._stats[reason] += 1
+        logger.warning(f"生成の受付を拒否しました: {message} (実行中={self.in_flight}, 待機中={self.queued})")
+        return AdmissionRejected(message, max(1.0, retry_after))
+
+    @asynccontextmanager
+    async def admit(self, deadline: float) -> AsyncIterator[float]:
+        """締め切り（秒）までに終えられる見込みがあれば枠を確保して処理を実行させる（見込みがなければAdmissionRejected）"""
+        if not self.enabled:
+            yield 0.0
+            return
+
+        wait = self.estimate_wait()
+        service = self.service_time()
+        if wait > 0:
+            if self.queued >= self.max_queued:
+                raise self._reject(f"待機中の生成が上限（{self.max_queued}件）に達しています", wait)
+            if wait + service > deadline:
+                raise self._reject(
+                    f"締め切り（{deadline:.1f}秒）までに完了できない見込みです（待ち時間の見積もり={wait:.1f}秒）", wait
+                )
+
+        start = time.perf_counter()
+        self.queued += 1
+        try:
+            # 枠が空くのを待つのは、残りの時間で生成を終えられる間だけ
+            await asyncio.wait_for(self._semaphore.acquire(), max(0.0, deadline - service) if wait > 0 else None)
+        except asyncio.TimeoutError:
+            raise self._reject(
+                f"締め切り（{deadline:.1f}秒）までに生成を開始できませんでした", self.estimate_wait(), reason="expired"
+            )
+        finally:
+            self.queued -= 1
+
+        self._stats["admitted"] += 1
+        self.in_flight += 1
+        try:
+            yield time.perf_counter() - start
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            "enabled": self.enabled,
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "service_time_seconds": round(self.service_time(), 3),
+            "estimated_wait_seconds": round(self.estimate_wait(), 3),
+        }
+
+
+async def cancel_on_disconnect(
+    awaitable: Awaitable[T],
+    is_disconnected: Callable[[], Awaitable[bool]],
+    poll_interval: float = CLIENT_DISCONNECT_POLL_SECONDS,
+) -> T:
+    """awaitableを実行し、途中でクライアントが切断した場合はキャンセルしてClientDisconnectedを送出する
+
+    処理は呼び出し元のタスクのまま実行し、切断の確認のみを別のタスクで行う。
+    キャンセルは上流APIの呼び出しまで伝わり、結果を読む相手のいない生成を打ち切る。
+    """
+    current = asyncio.current_task()
+    disconnected = False
+
+    async def watch() -> None:
+        nonlocal disconnected
+        try:
+            while not await is_disconnected():
+                await asyncio.sleep(poll_interval)
+        except Exception as e:
+            logger.warning(f"クライアントの切断を確認できないため確認を終了します: {str(e)}")
+            return
+        disconnected = True
+        current.cancel()
+
+    watcher = asyncio.ensure_future(watch())
+    try:
+        return await awaitable
+    except asyncio.CancelledError:
+        if not disconnected:
+            raise
+        current.uncancel()
+        raise ClientDisconnected("クライアントが切断したため処理を中断しました") from None
+    finally:
+        watcher.cancel()
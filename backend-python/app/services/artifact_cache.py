@@ -0,0 +1,258 @@
+import os
+import json
+import hashlib
+import logging
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from app.schemas.presentation import Presentation
+
+# ロガーの初期化
+logger = logging.getLogger(__name__)
+
+# 出力の形式（テンプレートやテーマの適用方法など）を変えた場合に上げる。以前の生成物やETagを無効にする
+RENDER_FORMAT_VERSION = 2
+
+# 他プロセスが同じディレクトリに登録・削除した分を索引へ反映する間隔（秒）
+ARTIFACT_CACHE_RESYNC_SECONDS = float(os.getenv("ARTIFACT_CACHE_RESYNC_SECONDS", "60"))
+
+
+def presentation_content_hash(presentation: Presentation) -> str:
+    """出力に影響する内容（スライドとテーマ）からハッシュ値を計算する"""
+    payload = json.dumps(
+        {
+            "format": RENDER_FORMAT_VERSION,
+            "theme": presentation.theme,
+            "slides": [slide.model_dump() for slide in presentation.slides],
+        },
+        ensure_ascii=False,
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ArtifactCache:
+    """生成済みPPTXファイルのディスクキャッシュ（容量上限付きLRU）
+
+    登録済みファイルのサイズと使用順をメモリ上の索引で管理し、登録のたびにディレクトリを走査しない。
+    最終アクセス時刻はファイルのmtimeにも記録し、起動時と一定間隔の再同期（他プロセスが登録した分の反映）で使う。
+    読み出し中のファイルはpinで保護し、releaseするまで削除しない。
+    """
+
+    def __init__(self, directory: str, max_bytes: int, suffix: str = ".pptx", resync_seconds: float = ARTIFACT_CACHE_RESYNC_SECONDS):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self.resync_seconds = resync_seconds
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+        # キー → ファイルサイズ（最近使用したものほど後ろ）
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._bytes = 0
+        # 読み出し中のキー → 参照数
+        self._pins: Dict[str, int] = {}
+        os.makedirs(self.directory, exist_ok=True)
+        self._resync()
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}{self.suffix}")
+
+    def _resync(self) -> None:
+        """ディスク上のファイルから索引を作り直す（呼び出し側でロックを取る必要はない）"""
+        entries = []
+        for entry in os.scandir(self.directory):
+            if not entry.is_file() or not entry.name.endswith(self.suffix):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, entry.name[:-len(self.suffix)], stat.st_size))
+        with self._lock:
+            self._entries = OrderedDict((key, size) for _, key, size in sorted(entries))
+            self._bytes = sum(self._entries.values())
+            self._next_resync = time.monotonic() + self.resync_seconds
+
+    def _track(self, key: str, size: int) -> None:
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._bytes -= previous
+        self._entries[key] = size
+        self._bytes += size
+
+    def _forget(self, key: str) -> None:
+        size = self._entries.pop(key, None)
+        if size is not None:
+            self._bytes -= size
+
+    def _pin(self, key: str) -> None:
+        self._pins[key] = self._pins.get(key, 0) + 1
+
+    def get(self, key: str, pin: bool = False) -> Optional[str]:
+        """キャッシュ済みファイルのパスを返す（なければNone）
+
+        pin=Trueの場合は返したファイルをreleaseまで削除しない。
+        """
+        path = self.path_for(key)
+        try:
+            # LRU管理のためアクセス時刻を更新（他プロセスに削除されていないかの確認も兼ねる）
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self._forget(key)
+                self._stats["misses"] += 1
+            return None
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            else:
+                # 他プロセスが登録したファイル
+                try:
+                    self._track(key, os.path.getsize(path))
+                except FileNotFoundError:
+                    self._stats["misses"] += 1
+                    return None
+            if pin:
+                self._pin(key)
+            self._stats["hits"] += 1
+        return path
+
+    def release(self, path: str) -> None:
+        """get/putでpinしたファイルの保護を解除する（キャッシュ外のパスは無視する）"""
+        name = os.path.basename(path)
+        if not name.endswith(self.suffix):
+            return
+        key = name[:-len(self.suffix)]
+        if path != self.path_for(key):
+            return
+        with self._lock:
+            count = self._pins.get(key, 0) - 1
+            if count > 0:
+                self._pins[key] = count
+            else:
+                self._pins.pop(key, None)
+
+    def new_temp_path(self) -> str:
+        """レンダリング出力用の一時ファイルパスをキャッシュディレクトリ内に作成する"""
+        fd, path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        os.close(fd)
+        return path
+
+    def put(self, key: str, temp_path: str, collect: bool = True, pin: bool = False) -> str:
+        """一時ファイルをキャッシュに登録し、登録先のパスを返す
+
+        多数のファイルをまとめて登録する場合はcollect=Falseとし、最後にcollect_garbageを呼ぶ。
+        pin=Trueの場合は登録したファイルをreleaseまで削除しない。
+        """
+        path = self.path_for(key)
+        size = os.path.getsize(temp_path)
+        os.replace(temp_path, path)
+        with self._lock:
+            self._track(key, size)
+            if pin:
+                self._pin(key)
+            resync = time.monotonic() >= self._next_resync
+        if collect:
+            if resync:
+                self._resync()
+            self.collect_garbage(keep=key)
+        return path
+
+    def collect_garbage(self, keep: Optional[str] = None) -> int:
+        """容量上限を超えている場合に最終アクセスが古いファイルから削除する（pin中のファイルは残す）"""
+        with self._lock:
+            victims = []
+            remaining = self._bytes
+            for key, size in self._entries.items():
+                if remaining <= self.max_bytes:
+                    break
+                if key == keep or key in self._pins:
+                    continue
+                victims.append(key)
+                remaining -= size
+            for key in victims:
+                self._forget(key)
+            total = self._bytes
+
+        for key in victims:
+            try:
+                os.remove(self.path_for(key))
+            except FileNotFoundError:
+                pass
+
+        if victims:
+            with self._lock:
+                self._stats["evictions"] += len(victims)
+            logger.info(f"PPTXキャッシュのガベージコレクション: 削除={len(victims)}件, 使用量={total}bytes")
+        return len(victims)
+
+    def stats(self) -> Dict[str, int]:
+        return dict(self._stats)
+
+
+class SharedArtifactIndex:
+    """生成済みPPTXをRedisで共有し、別ワーカー・別ノードでの再レンダリングを省く"""
+
+    def __init__(self, url: str, ttl_seconds: float = 86400, max_bytes: int = 20 * 1024 * 1024, key_prefix: str = "apg:"):
+        # redisは任意の依存関係のため、共有を有効にした場合のみ読み込む
+        try:
+            import redis
+        except ImportError:
+            logger.error("redisライブラリがインストールされていません（pip install redis）")
+            raise
+
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.key_prefix = key_prefix
+        self._client = redis.Redis.from_url(url)
+
+    def _key(self, key: str) -> str:
+        return f"{self.key_prefix}artifact:{key}"
+
+    def fetch(self, key: str, cache: ArtifactCache, pin: bool = False) -> Optional[str]:
+        """共有インデックスにあればローカルキャッシュへ取り込み、そのパスを返す（pinはArtifactCache.putと同じ）"""
+        data = self._client.get(self._key(key))
+        if data is None:
+            return None
+        temp_path = cache.new_temp_path()
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        return cache.put(key, temp_path, pin=pin)
+
+    def publish(self, key: str, file_path: str) -> None:
+        """レンダリング結果を共有インデックスに登録する（上限サイズを超えるものは登録しない）"""
+        size = os.path.getsize(file_path)
+        if size > self.max_bytes:
+            logger.info(f"共有インデックスの上限を超えるため登録しません: {size}bytes")
+            return
+        with open(file_path, "rb") as f:
+            ttl = int(self.ttl_seconds) if self.ttl_seconds > 0 else None
+            self._client.set(self._key(key), f.read(), ex=ttl)
+
+
+def create_shared_artifact_index_from_env() -> Optional[SharedArtifactIndex]:
+    """PRESENTATION_STORE=redisの場合のみ共有インデックスを作成する"""
+    if os.getenv("PRESENTATION_STORE", "memory").lower() != "redis":
+        return None
+    return SharedArtifactIndex(
+        os.getenv("REDIS_URL", "redis://localhost:6379/0"),
+        ttl_seconds=float(os.getenv("PRESENTATION_STORE_TTL_SECONDS", "86400")),
+        max_bytes=int(os.getenv("SHARED_ARTIFACT_MAX_BYTES", str(20 * 1024 * 1024))),
+        key_prefix=os.getenv("REDIS_KEY_PREFIX", "apg:"),
+    )
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Matchヘッダーが指定のETagに一致するか判定する"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [value.strip() for value in if_none_match.split(",")]
+    return any(
+        candidate == etag or (candidate.startswith("W/") and candidate[2:] == etag)
+        for candidate in candidates
+    )
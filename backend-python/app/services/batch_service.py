@@ -0,0 +1,89 @@
+import os
+import asyncio
+import logging
+import zipfile
+import tempfile
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from app.schemas.presentation import Presentation, PresentationRequest
+from app.services import presentation_service
+
+# ロガーの初期化
+logger = logging.getLogger(__name__)
+
+# 1リクエストあたりの最大件数と同時生成数
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "500"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "8"))
+
+
+async def generate_presentations_batch(
+    requests: List[PresentationRequest],
+    concurrency: Optional[int] = None,
+) -> AsyncIterator[Dict[str, Any]]:
+    """複数のリクエストを並列に生成し、完了した順に結果（またはエラー）を返す"""
+    limit = max(1, min(concurrency or BATCH_MAX_CONCURRENCY, BATCH_MAX_CONCURRENCY))
+    semaphore = asyncio.Semaphore(limit)
+    logger.info(f"バッチ生成開始: 件数={len(requests)}, 同時実行数={limit}")
+
+    async def run(index: int, request: PresentationRequest) -> Dict[str, Any]:
+        async with semaphore:
+            try:
+                presentation = await presentation_service.generate_presentation_from_text(
+                    request.text, request.options
+                )
+                return {"index": index, "status": "ok", "presentation": presentation.model_dump()}
+            except Exception as e:
+                logger.warning(f"バッチ生成の{index}件目でエラー: {str(e)}")
+                return {"index": index, "status": "error", "detail": str(e)}
+
+    tasks = [asyncio.create_task(run(i, request)) for i, request in enumerate(requests)]
+    succeeded = 0
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            result = await next_done
+            if result["status"] == "ok":
+                succeeded += 1
+            yield result
+    finally:
+        # クライアントが切断した場合などは残りの生成を中止する
+        for task in tasks:
+            task.cancel()
+
+    logger.info(f"バッチ生成完了: 成功={succeeded}, 失敗={len(requests) - succeeded}")
+    yield {"status": "done", "succeeded": succeeded, "failed": len(requests) - succeeded}
+
+
+async def build_presentations_archive(
+    presentations: List[Presentation],
+    concurrency: Optional[int] = None,
+) -> str:
+    """複数のプレゼンテーションをレンダリングし、1つのzipファイルにまとめてパスを返す"""
+    semaphore = asyncio.Semaphore(max(1, concurrency or BATCH_MAX_CONCURRENCY))
+
+    async def render(presentation: Presentation) -> str:
+        async with semaphore:
+            # zipへの書き込みが終わるまでキャッシュから削除されないようpinする
+            return await presentation_service.generate_powerpoint_file(presentation, pin=True)
+
+    results = await asyncio.gather(*[render(presentation) for presentation in presentations], return_exceptions=True)
+    file_paths = [result for result in results if isinstance(result, str)]
+
+    def write_archive() -> str:
+        fd, archive_path = tempfile.mkstemp(dir=presentation_service.TEMP_DIR, prefix="presentations_", suffix=".zip")
+        os.close(fd)
+        # PPTXは圧縮済みのため無圧縮で格納する
+        with zipfile.ZipFile(archive_path, "w", compression=zipfile.ZIP_STORED) as archive:
+            for presentation, file_path in zip(presentations, file_paths):
+                archive.write(file_path, arcname=f"presentation-{presentation.id}.pptx")
+        return archive_path
+
+    try:
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        archive_path = await asyncio.to_thread(write_archive)
+    finally:
+        for file_path in file_paths:
+            presentation_service.artifact_cache.release(file_path)
+    logger.info(f"zipファイル作成完了: {archive_path}, 件数={len(presentations)}")
+    return archive_path
@@ -0,0 +1,260 @@
+import io
+import os
+import re
+import asyncio
+import hashlib
+import logging
+import tempfile
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from app.schemas.presentation import Slide
+from app.services.artifact_cache import ArtifactCache
+from app.services.single_flight import SingleFlight
+
+# ロガーの初期化
+logger = logging.getLogger(__name__)
+
+# 画像の取得元（none / local）。IMAGE_LOCAL_DIRが指定されていれば既定でlocalを使う
+IMAGE_PROVIDER = os.getenv("IMAGE_PROVIDER", "local" if os.getenv("IMAGE_LOCAL_DIR") else "none").lower()
+# localプロバイダーが画像を探すディレクトリ
+IMAGE_LOCAL_DIR = os.getenv("IMAGE_LOCAL_DIR", "")
+# 画像の取得・変換の同時実行数
+IMAGE_MAX_PARALLEL = int(os.getenv("IMAGE_MAX_PARALLEL", "4"))
+# 1枚あたりの取得のタイムアウト（秒）
+IMAGE_FETCH_TIMEOUT_SECONDS = float(os.getenv("IMAGE_FETCH_TIMEOUT_SECONDS", "10"))
+# 変換後の最大サイズ（スライドに貼り付ける解像度）
+IMAGE_MAX_WIDTH = int(os.getenv("IMAGE_MAX_WIDTH", "1280"))
+IMAGE_MAX_HEIGHT = int(os.getenv("IMAGE_MAX_HEIGHT", "720"))
+IMAGE_JPEG_QUALITY = int(os.getenv("IMAGE_JPEG_QUALITY", "80"))
+# 取得元の画像として受け付ける最大サイズ（これを超える画像は使わない）
+IMAGE_MAX_SOURCE_BYTES = int(os.getenv("IMAGE_MAX_SOURCE_BYTES", str(20 * 1024 * 1024)))
+# 1つのプレゼンテーションに埋め込む画像の合計サイズの上限
+IMAGE_MAX_DECK_BYTES = int(os.getenv("IMAGE_MAX_DECK_BYTES", str(20 * 1024 * 1024)))
+# 変換済み画像のディスクキャッシュ
+IMAGE_CACHE_DIR = os.getenv("IMAGE_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "presentation_images")
+IMAGE_CACHE_MAX_BYTES = int(os.getenv("IMAGE_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+# スライドのimage_urlに設定するURLの接頭辞（/api/images/{ハッシュ値}.{拡張子}）
+IMAGE_URL_PREFIX = "/api/images/"
+_IMAGE_NAME_PATTERN = re.compile(r"^([0-9a-f]{64})\.(jpg|png)$")
+_KEYWORD_SPLIT_PATTERN = re.compile(r"[\s_\-.,、・]+")
+_IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".gif", ".bmp", ".webp")
+
+
+class ImageProvider(ABC):
+    """スライド用の画像の取得元"""
+
+    name = "base"
+
+    @abstractmethod
+    async def fetch(self, prompt: str) -> Optional[bytes]:
+        """プロンプトに合う画像のバイト列を返す（見つからなければNone）"""
+
+
+class LocalDirectoryImageProvider(ImageProvider):
+    """ローカルディレクトリの画像からファイル名がプロンプトに最もよく一致するものを選ぶ
+
+    ファイル名を「-」「_」や空白で区切ったキーワードのうち、プロンプトに含まれるものが多い画像を返す。
+    """
+
+    name = "local"
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._index: Optional[List[Tuple[str, List[str]]]] = None
+
+    def _load_index(self) -> List[Tuple[str, List[str]]]:
+        if self._index is None:
+            index = []
+            for name in sorted(os.listdir(self.directory)):
+                stem, ext = os.path.splitext(name)
+                if ext.lower() not in _IMAGE_EXTENSIONS:
+                    continue
+                keywords = [word.casefold() for word in _KEYWORD_SPLIT_PATTERN.split(stem) if word]
+                index.append((os.path.join(self.directory, name), keywords))
+            self._index = index
+        return self._index
+
+    def find(self, prompt: str) -> Optional[str]:
+        """プロンプトに最もよく一致する画像のパスを返す"""
+        prompt = prompt.casefold()
+        best_path, best_score = None, 0
+        for path, keywords in self._load_index():
+            score = sum(len(keyword) for keyword in keywords if keyword in prompt)
+            if score > best_score:
+                best_path, best_score = path, score
+        return best_path
+
+    def _read(self, prompt: str) -> Optional[bytes]:
+        path = self.find(prompt)
+        if path is None:
+            return None
+        with open(path, "rb") as f:
+            return f.read()
+
+    async def fetch(self, prompt: str) -> Optional[bytes]:
+        return await asyncio.to_thread(self._read, prompt)
+
+
+def build_image_prompt(slide: Slide) -> str:
+    """スライドのタイトルと先頭の項目から画像を探すためのプロンプトを作る"""
+    parts = [slide.title] + list(slide.content[:2])
+    return " ".join(" ".join(part.split()) for part in parts if part)
+
+
+def process_image(data: bytes, max_width: int, max_height: int, quality: int) -> Tuple[bytes, str]:
+    """スライドの解像度まで縮小し、再圧縮した画像と拡張子を返す（透過のある画像はPNG、それ以外はJPEG）"""
+    # PillowはPython-pptxの依存関係として導入済み
+    from PIL import Image, ImageOps
+
+    with Image.open(io.BytesIO(data)) as image:
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_width, max_height), Image.LANCZOS)
+        has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+        output = io.BytesIO()
+        if has_alpha:
+            image.save(output, format="PNG", optimize=True)
+            return output.getvalue(), "png"
+        image.convert("RGB").save(output, format="JPEG", quality=quality, optimize=True, progressive=True)
+        return output.getvalue(), "jpg"
+
+
+class ImagePipeline:
+    """スライドごとの画像の取得・変換を並列に行い、変換済みの画像を内容のハッシュ値で保存する
+
+    同じプロンプトは一度だけ取得し（実行中の同一プロンプトは合流）、結果をキャッシュする。
+    """
+
+    def __init__(
+        self,
+        provider: ImageProvider,
+        cache_dir: str = IMAGE_CACHE_DIR,
+        cache_max_bytes: int = IMAGE_CACHE_MAX_BYTES,
+        max_parallel: int = IMAGE_MAX_PARALLEL,
+        max_deck_bytes: int = IMAGE_MAX_DECK_BYTES,
+        timeout_seconds: float = IMAGE_FETCH_TIMEOUT_SECONDS,
+        prompt_index_size: int = 4096,
+    ):
+        self.provider = provider
+        self.max_deck_bytes = max_deck_bytes
+        self.timeout_seconds = timeout_seconds
+        self.cache = ArtifactCache(cache_dir, cache_max_bytes, suffix=".img")
+        self._semaphore = asyncio.Semaphore(max_parallel)
+        self._flights = SingleFlight()
+        # プロンプト → 変換済み画像のファイル名（見つからなかったプロンプトはNone）
+        self._prompt_index: "OrderedDict[str, Optional[str]]" = OrderedDict()
+        self._prompt_index_size = prompt_index_size
+        self._stats = {"fetched": 0, "prompt_hits": 0, "not_found": 0, "errors": 0, "skipped_for_size": 0}
+
+    def _prompt_key(self, prompt: str) -> str:
+        return hashlib.sha256(f"{self.provider.name}:{prompt.casefold()}".encode("utf-8")).hexdigest()
+
+    def path_for_url(self, image_url: Optional[str]) -> Optional[str]:
+        """image_urlに対応する変換済み画像のパスを返す（キャッシュにない場合はNone）"""
+        if not image_url or not image_url.startswith(IMAGE_URL_PREFIX):
+            return None
+        name = image_url[len(IMAGE_URL_PREFIX):]
+        if not _IMAGE_NAME_PATTERN.match(name):
+            return None
+        return self.cache.get(name)
+
+    async def _fetch_and_store(self, prompt: str) -> Optional[str]:
+        async with self._semaphore:
+            try:
+                data = await asyncio.wait_for(self.provider.fetch(prompt), self.timeout_seconds)
+                if data is None:
+                    self._stats["not_found"] += 1
+                    return None
+                if len(data) > IMAGE_MAX_SOURCE_BYTES:
+                    logger.warning(f"画像が大きすぎるため使用しません: {len(data)}bytes")
+                    self._stats["skipped_for_size"] += 1
+                    return None
+                processed, ext = await asyncio.to_thread(
+                    process_image, data, IMAGE_MAX_WIDTH, IMAGE_MAX_HEIGHT, IMAGE_JPEG_QUALITY
+                )
+            except Exception as e:
+                self._stats["errors"] += 1
+                logger.warning(f"画像の取得に失敗しました: {type(e).__name__}: {str(e)}")
+                return None
+
+        # ファイルの書き込みとキャッシュへの登録（容量超過時の削除を含む）はスレッドで行う
+        name = await asyncio.to_thread(self._store, processed, ext)
+        self._stats["fetched"] += 1
+        return name
+
+    def _store(self, processed: bytes, ext: str) -> str:
+        """変換後の内容のハッシュ値をファイル名にして保存する（同じ画像は1つだけ保存する）"""
+        name = f"{hashlib.sha256(processed).hexdigest()}.{ext}"
+        if self.cache.get(name) is None:
+            temp_path = self.cache.new_temp_path()
+            try:
+                with open(temp_path, "wb") as f:
+                    f.write(processed)
+                self.cache.put(name, temp_path)
+            finally:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+        return name
+
+    async def image_url_for(self, prompt: str) -> Optional[str]:
+        """プロンプトに対応する画像のURLを返す（取得できなければNone）"""
+        key = self._prompt_key(prompt)
+        if key in self._prompt_index:
+            name = self._prompt_index[key]
+            self._prompt_index.move_to_end(key)
+            if name is None or self.cache.get(name) is not None:
+                self._stats["prompt_hits"] += 1
+                return f"{IMAGE_URL_PREFIX}{name}" if name else None
+
+        name = await self._flights.do(key, lambda: self._fetch_and_store(prompt))
+        self._prompt_index[key] = name
+        while len(self._prompt_index) > self._prompt_index_size:
+            self._prompt_index.popitem(last=False)
+        return f"{IMAGE_URL_PREFIX}{name}" if name else None
+
+    def schedule(self, slide: Slide) -> Optional["asyncio.Task[Optional[str]]"]:
+        """スライドの画像の取得を開始する（既に画像がある場合はNone）"""
+        if slide.image_url:
+            return None
+        return asyncio.ensure_future(self.image_url_for(build_image_prompt(slide)))
+
+    async def attach(self, slides: List[Slide], tasks: List[Optional["asyncio.Task[Optional[str]]"]]) -> List[Slide]:
+        """取得した画像をスライドに設定する（合計サイズが上限を超える分は設定しない）"""
+        urls = await asyncio.gather(*(task for task in tasks if task is not None))
+        results = iter(urls)
+        total = 0
+        attached: List[Slide] = []
+        for slide, task in zip(slides, tasks):
+            url = next(results) if task is not None else None
+            path = self.path_for_url(url)
+            if path is not None:
+                size = os.path.getsize(path)
+                if total + size > self.max_deck_bytes:
+                    self._stats["skipped_for_size"] += 1
+                    path = None
+                else:
+                    total += size
+            attached.append(slide.model_copy(update={"image_url": url}) if path else slide)
+        return attached
+
+    async def attach_images(self, slides: List[Slide]) -> List[Slide]:
+        """全スライドの画像を並列に取得して設定する"""
+        return await self.attach(slides, [self.schedule(slide) for slide in slides])
+
+    def stats(self) -> Dict[str, int]:
+        return dict(self._stats)
+
+
+def create_image_pipeline_from_env() -> Optional[ImagePipeline]:
+    """環境変数IMAGE_PROVIDERの設定から画像パイプラインを作成する（noneの場合はNone）"""
+    if IMAGE_PROVIDER == "none":
+        return None
+    if IMAGE_PROVIDER == "local":
+        if not IMAGE_LOCAL_DIR or not os.path.isdir(IMAGE_LOCAL_DIR):
+            logger.warning(f"IMAGE_LOCAL_DIRが存在しないため画像の追加を無効にします: {IMAGE_LOCAL_DIR}")
+            return None
+        return ImagePipeline(LocalDirectoryImageProvider(IMAGE_LOCAL_DIR))
+    logger.warning(f"不明なIMAGE_PROVIDER={IMAGE_PROVIDER}のため画像の追加を無効にします")
+    return None
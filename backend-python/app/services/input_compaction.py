@@ -0,0 +1,261 @@
+import os
+import re
+import math
+import logging
+import unicodedata
+from typing import Dict, List, Optional, Set, Tuple
+
+from app.services.tokenizer import count_tokens
+
+# ロガーの初期化
+logger = logging.getLogger(__name__)
+
+# 入力テキストの圧縮を行うかどうか
+INPUT_COMPACTION_ENABLED = os.getenv("INPUT_COMPACTION_ENABLED", "true").lower() in ("1", "true", "yes")
+# スライド1枚あたりの入力トークン予算（0の場合は文の抽出を行わない）
+INPUT_TOKEN_BUDGET_PER_SLIDE = int(os.getenv("INPUT_TOKEN_BUDGET_PER_SLIDE", "0"))
+# スライド数が少ない場合でも確保する入力トークン予算の下限
+INPUT_TOKEN_BUDGET_MIN = int(os.getenv("INPUT_TOKEN_BUDGET_MIN", "1500"))
+# この文字数未満の行は重複していても削除しない（「はい」などの短い行を残すため）
+MIN_DUPLICATE_LINE_CHARS = 3
+# 離れた位置で繰り返される段落は、この文字数以上の場合のみ削除する（引用されたメール本文など）
+MIN_DUPLICATE_PARAGRAPH_CHARS = 40
+# 段落の先頭・末尾にこの回数以上現れる短い行はページのヘッダー・フッターとみなし、2回目以降を削除する
+MIN_RUNNING_HEADER_REPEATS = 3
+
+_ZERO_WIDTH_PATTERN = re.compile("[\u200b\u200c\u200d\u2060\ufeff]")
+_SPACE_RUN_PATTERN = re.compile("[ \t\u00a0\u3000\f\v]+")
+_BLANK_LINES_PATTERN = re.compile(r"\n{3,}")
+# メールの引用記号（"> "の繰り返し）
+_QUOTE_PREFIX_PATTERN = re.compile(r"^(?:>\s*)+")
+_PARAGRAPH_PATTERN = re.compile(r"\n\s*\n")
+# 和文は句点等の直後、欧文はピリオド等の後の空白で文を区切る
+_SENTENCE_BOUNDARY_PATTERN = re.compile(r"(?<=[。．！？])|(?<=[.!?])\s+")
+_TERM_PATTERN = re.compile(r"[a-z0-9]+|[^\sa-z0-9]")
+_HEADING_PATTERN = re.compile(r"^(#{1,6}\s|第[0-9０-９一二三四五六七八九十百]+[章節部]|[■◆●【])")
+
+
+class CompactionResult:
+    """入力圧縮の結果と削減できたトークン数"""
+
+    def __init__(self, text: str, original_tokens: int, compacted_tokens: int, budget: Optional[int] = None):
+        self.text = text
+        self.original_tokens = original_tokens
+        self.compacted_tokens = compacted_tokens
+        self.budget = budget
+
+    @property
+    def saved_tokens(self) -> int:
+        return max(0, self.original_tokens - self.compacted_tokens)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "original_tokens": self.original_tokens,
+            "compacted_tokens": self.compacted_tokens,
+            "saved_tokens": self.saved_tokens,
+        }
+
+
+def normalize_whitespace(text: str) -> str:
+    """改行コード・空白の連続・ゼロ幅文字・引用記号を正規化する（行頭のインデントの深さは保つ）"""
+    text = text.replace("\r\n", "\n").replace("\r", "\n")
+    text = _ZERO_WIDTH_PATTERN.sub("", text)
+    lines = []
+    for line in text.split("\n"):
+        body = line.strip()
+        quote = _QUOTE_PREFIX_PATTERN.match(body)
+        if quote:
+            body, indent = body[quote.end():], ""
+        else:
+            # 箇条書きの階層やコードのブロックを崩さないよう、インデントは幅を保って空白にそろえる
+            leading = line[: len(line) - len(line.lstrip())]
+            indent = " " * len(leading.expandtabs(4)) if body else ""
+        lines.append(indent + _SPACE_RUN_PATTERN.sub(" ", body).strip())
+    return _BLANK_LINES_PATTERN.sub("\n\n", "\n".join(lines)).strip("\n")
+
+
+def _dedup_key(text: str) -> str:
+    return "".join(unicodedata.normalize("NFKC", text).casefold().split())
+
+
+def _boundary_lines(lines: List[str]) -> List[int]:
+    # 段落の先頭と末尾の行（空行を除く）の位置
+    positions = [i for i, line in enumerate(lines) if _dedup_key(line)]
+    return sorted({positions[0], positions[-1]}) if positions else []
+
+
+def _running_headers(paragraphs: List[List[str]]) -> Set[str]:
+    """段落の先頭・末尾で繰り返し現れる短い行（ページのヘッダー・フッター）のキーを返す"""
+    counts: Dict[str, int] = {}
+    for lines in paragraphs:
+        for position in _boundary_lines(lines):
+            key = _dedup_key(lines[position])
+            if MIN_DUPLICATE_LINE_CHARS <= len(key) < MIN_DUPLICATE_PARAGRAPH_CHARS:
+                counts[key] = counts.get(key, 0) + 1
+    return {key for key, count in counts.items() if count >= MIN_RUNNING_HEADER_REPEATS}
+
+
+def deduplicate(text: str) -> str:
+    """繰り返される内容（連続する段落と行、ページのヘッダー・フッター、引用されたメール本文など）を削除する
+
+    段落の先頭・末尾に何度も現れる短い行はヘッダー・フッターとして2回目以降を削除する。
+    それ以外の見出しや定型句など短い行・段落は、文書の別の位置で再び現れても内容の一部として残す。
+    """
+    split_paragraphs = [paragraph.split("\n") for paragraph in _PARAGRAPH_PATTERN.split(text)]
+    running_headers = _running_headers(split_paragraphs)
+    seen_headers: Set[str] = set()
+    seen_paragraphs: Set[str] = set()
+    paragraphs: List[str] = []
+    previous_paragraph = None
+    for paragraph_lines in split_paragraphs:
+        key = _dedup_key("".join(paragraph_lines))
+        if not key or key == previous_paragraph:
+            continue
+        previous_paragraph = key
+        if len(key) >= MIN_DUPLICATE_PARAGRAPH_CHARS:
+            if key in seen_paragraphs:
+                continue
+            seen_paragraphs.add(key)
+
+        boundary = _boundary_lines(paragraph_lines)
+        lines = []
+        previous_line = None
+        for position, line in enumerate(paragraph_lines):
+            line_key = _dedup_key(line)
+            if not line_key:
+                continue
+            if position in boundary and line_key in running_headers:
+                if line_key in seen_headers:
+                    continue
+                seen_headers.add(line_key)
+            # インデントが異なる行は別の階層の内容として扱う
+            indented_key = (len(line) - len(line.lstrip()), line_key)
+            if len(line_key) >= MIN_DUPLICATE_LINE_CHARS and indented_key == previous_line:
+                continue
+            previous_line = indented_key
+            lines.append(line)
+        if lines:
+            paragraphs.append("\n".join(lines))
+    return "\n\n".join(paragraphs)
+
+
+def token_budget_for(slide_count: Optional[int]) -> Optional[int]:
+    """スライド数から入力トークンの予算を求める（無効な場合はNone）"""
+    if INPUT_TOKEN_BUDGET_PER_SLIDE <= 0:
+        return None
+    return max(INPUT_TOKEN_BUDGET_MIN, (slide_count or 10) * INPUT_TOKEN_BUDGET_PER_SLIDE)
+
+
+def _terms(sentence: str) -> Set[Tuple[str, ...]]:
+    # 和文は形態素解析を使わず、隣接する2文字（欧文は2単語）の組を特徴量とする
+    tokens = [token for token in _TERM_PATTERN.findall(sentence.casefold()) if token.isalnum()]
+    if len(tokens) < 2:
+        return {tuple(tokens)} if tokens else set()
+    return set(zip(tokens, tokens[1:]))
+
+
+def _join_sentences(sentences: List[str]) -> str:
+    joined = ""
+    for sentence in sentences:
+        if joined and unicodedata.east_asian_width(joined[-1]) not in ("W", "F"):
+            joined += " "
+        joined += sentence
+    return joined
+
+
+def select_sentences(text: str, budget: int, model: str = "gpt-4") -> str:
+    """文書全体でよく現れる語を含む文を優先し、トークン予算に収まるよう文を抽出する
+
+    見出しは最優先で残し、各段落の先頭文は優先度を上げる。同じ文は1回だけ残し、
+    抽出した文は元の順序で並べ直す。
+    """
+    # (段落番号, 行番号, 文) の一覧を作る
+    units: List[Tuple[int, int, str]] = []
+    for paragraph_index, paragraph in enumerate(_PARAGRAPH_PATTERN.split(text)):
+        for line_index, line in enumerate(paragraph.split("\n")):
+            for sentence in _SENTENCE_BOUNDARY_PATTERN.split(line):
+                if sentence and sentence.strip():
+                    units.append((paragraph_index, line_index, sentence.strip()))
+
+    unit_terms = [_terms(sentence) for _, _, sentence in units]
+    document_frequency: Dict[Tuple[str, ...], int] = {}
+    for terms in unit_terms:
+        for term in terms:
+            document_frequency[term] = document_frequency.get(term, 0) + 1
+
+    scores = []
+    previous_paragraph = -1
+    for index, ((paragraph_index, _, sentence), terms) in enumerate(zip(units, unit_terms)):
+        score = sum(math.log1p(document_frequency[term]) for term in terms) / math.sqrt(len(terms) or 1)
+        if paragraph_index != previous_paragraph:
+            score *= 1.5
+        previous_paragraph = paragraph_index
+        is_heading = bool(_HEADING_PATTERN.match(sentence))
+        scores.append((not is_heading, -score, index))
+
+    ranked = [index for _, _, index in sorted(scores)]
+    selected: List[int] = []
+    seen: Set[str] = set()
+    used = 0
+    for index in ranked:
+        key = _dedup_key(units[index][2])
+        if key in seen:
+            continue
+        # 文をつなぐ改行・空白の分として1トークンを加える
+        tokens = count_tokens(units[index][2], model) + 1
+        if used + tokens > budget:
+            continue
+        selected.append(index)
+        seen.add(key)
+        used += tokens
+
+    # 結合後のトークン数が予算を超える場合は優先度の低い文から外す
+    compacted = _assemble(units, set(selected))
+    while selected and count_tokens(compacted, model) > budget:
+        selected.pop()
+        compacted = _assemble(units, set(selected))
+    return compacted
+
+
+def _assemble(units: List[Tuple[int, int, str]], selected: Set[int]) -> str:
+    # 選ばれた文を元の段落・行の構造に戻して結合する
+    paragraphs: List[str] = []
+    lines: List[str] = []
+    sentences: List[str] = []
+    current: Optional[Tuple[int, int]] = None
+    for index, (paragraph_index, line_index, sentence) in enumerate(units):
+        if index not in selected:
+            continue
+        if current is not None and current != (paragraph_index, line_index):
+            lines.append(_join_sentences(sentences))
+            sentences = []
+            if current[0] != paragraph_index:
+                paragraphs.append("\n".join(lines))
+                lines = []
+        current = (paragraph_index, line_index)
+        sentences.append(sentence)
+    if sentences:
+        lines.append(_join_sentences(sentences))
+    if lines:
+        paragraphs.append("\n".join(lines))
+    return "\n\n".join(paragraphs)
+
+
+def compact_input(text: str, slide_count: Optional[int] = None, model: str = "gpt-4") -> CompactionResult:
+    """LLMに送る前に入力テキストを圧縮する（決定的な処理のみで、同じ入力には同じ結果を返す）"""
+    original_tokens = count_tokens(text, model)
+    if not INPUT_COMPACTION_ENABLED:
+        return CompactionResult(text, original_tokens, original_tokens)
+
+    compacted = deduplicate(normalize_whitespace(text))
+    compacted_tokens = count_tokens(compacted, model)
+
+    budget = token_budget_for(slide_count)
+    if budget is not None and compacted_tokens > budget:
+        compacted = select_sentences(compacted, budget, model)
+        compacted_tokens = count_tokens(compacted, model)
+
+    # 圧縮した結果が空になる入力（記号のみなど）は元のテキストを使う
+    if not compacted:
+        return CompactionResult(text, original_tokens, original_tokens, budget)
+    return CompactionResult(compacted, original_tokens, compacted_tokens, budget)
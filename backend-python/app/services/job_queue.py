@@ -0,0 +1,264 @@
+import os
+import time
+import uuid
+import sqlite3
+import asyncio
+import logging
+import tempfile
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from app.schemas.presentation import JobStatus, PresentationRequest
+from app.services import presentation_service
+
+# ロガーの初期化
+logger = logging.getLogger(__name__)
+
+# バックグラウンドで生成を行うワーカー数
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+# 待機中ジョブ数の上限
+JOB_MAX_QUEUED = int(os.getenv("JOB_MAX_QUEUED", "1000"))
+# 状態を保持するジョブ数の上限（古い完了済みジョブから破棄）
+JOB_RETENTION = int(os.getenv("JOB_RETENTION", "10000"))
+# 共有ストア（PRESENTATION_STORE=redis / sqlite）に保存したジョブの状態を保持する秒数
+JOB_STATUS_TTL_SECONDS = float(os.getenv("JOB_STATUS_TTL_SECONDS", "86400"))
+
+
+class JobQueueFull(Exception):
+    """待機中のジョブ数が上限に達している"""
+
+
+class JobStatusStore(ABC):
+    """ジョブの状態を複数ワーカー間で共有する保存先"""
+
+    @abstractmethod
+    def get(self, job_id: str) -> Optional[JobStatus]:
+        """IDからジョブの状態を取得する（存在しなければNone）"""
+
+    @abstractmethod
+    def put(self, job: JobStatus) -> None:
+        """ジョブの状態を保存する（同じIDは上書き）"""
+
+
+class SQLiteJobStatusStore(JobStatusStore):
+    """同じSQLiteファイルを使うワーカー間でジョブの状態を共有する"""
+
+    # 期限切れの状態の削除は、この件数の保存ごとにまとめて行う
+    PURGE_INTERVAL = 100
+
+    def __init__(self, path: str, ttl_seconds: float = JOB_STATUS_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._puts = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_updated_at ON jobs(updated_at)")
+
+    def get(self, job_id: str) -> Optional[JobStatus]:
+        with self._lock:
+            row = self._conn.execute("SELECT data, updated_at FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None or (self.ttl_seconds > 0 and time.time() - row[1] > self.ttl_seconds):
+            return None
+        return JobStatus.model_validate_json(row[0])
+
+    def put(self, job: JobStatus) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO jobs (id, data, updated_at) VALUES (?, ?, ?)", (job.id, job.model_dump_json(), now)
+            )
+            self._puts += 1
+            if self.ttl_seconds > 0 and self._puts % self.PURGE_INTERVAL == 0:
+                self._conn.execute("DELETE FROM jobs WHERE updated_at < ?", (now - self.ttl_seconds,))
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+class RedisJobStatusStore(JobStatusStore):
+    """Redisに保存し、複数ワーカー・複数ノード間でジョブの状態を共有する"""
+
+    def __init__(self, url: str, key_prefix: str = "apg:", ttl_seconds: float = JOB_STATUS_TTL_SECONDS):
+        # redisは任意の依存関係のため、このストアを使う場合のみ読み込む
+        try:
+            import redis
+        except ImportError:
+            logger.error("redisライブラリがインストールされていません（pip install redis）")
+            raise
+
+        self.key_prefix = key_prefix
+        self.ttl_seconds = ttl_seconds
+        self._client = redis.Redis.from_url(url)
+
+    def _key(self, job_id: str) -> str:
+        return f"{self.key_prefix}job:{job_id}"
+
+    def get(self, job_id: str) -> Optional[JobStatus]:
+        data = self._client.get(self._key(job_id))
+        return JobStatus.model_validate_json(data) if data is not None else None
+
+    def put(self, job: JobStatus) -> None:
+        ttl = int(self.ttl_seconds) if self.ttl_seconds > 0 else None
+        self._client.set(self._key(job.id), job.model_dump_json(), ex=ttl)
+
+
+class JobQueue:
+    """生成リクエストを受け付けてバックグラウンドのワーカーで処理するジョブキュー
+
+    sharedを指定すると状態を共有ストアにも書き込み、ジョブを受け付けたプロセス以外からも参照できるようにする。
+    共有ストアへの書き込みは専用のスレッドで受け付け順に行い、イベントループを止めない。
+    """
+
+    def __init__(
+        self,
+        workers: int = JOB_WORKERS,
+        max_queued: int = JOB_MAX_QUEUED,
+        retention: int = JOB_RETENTION,
+        shared: Optional[JobStatusStore] = None,
+    ):
+        self.workers = workers
+        self.max_queued = max_queued
+        self.retention = retention
+        self.shared = shared
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="job-status") if shared is not None else None
+        self._jobs: "OrderedDict[str, JobStatus]" = OrderedDict()
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def start(self) -> None:
+        """現在のイベントループ上でワーカーを起動する（起動済みなら何もしない）"""
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._tasks:
+            return
+        # ワーカーはイベントループに紐づくため、ループが変わった場合は作り直す
+        self._loop = loop
+        self._queue = asyncio.Queue(maxsize=self.max_queued)
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        logger.info(f"ジョブワーカーを起動しました: ワーカー数={self.workers}")
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._writer is not None:
+            # キャンセルで更新された状態まで共有ストアに書き終えるのを待つ
+            await asyncio.to_thread(self._writer.submit(lambda: None).result)
+
+    def _publish(self, job: JobStatus) -> None:
+        if self._writer is not None:
+            self._writer.submit(self._write_shared, job)
+
+    def _write_shared(self, job: JobStatus) -> None:
+        try:
+            self.shared.put(job)
+        except Exception as e:
+            logger.warning(f"ジョブの状態を共有ストアに保存できませんでした: ID={job.id}, エラー={str(e)}")
+
+    def _update(self, job_id: str, **fields) -> None:
+        job = self._jobs.get(job_id)
+        if job is None:
+            return
+        job = self._jobs[job_id] = job.model_copy(update={**fields, "updated_at": datetime.now().isoformat()})
+        self._publish(job)
+
+    def _trim(self) -> None:
+        # 保持上限を超えた分は、完了済みのジョブから古い順に破棄する
+        excess = len(self._jobs) - self.retention
+        if excess <= 0:
+            return
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.status in ("completed", "failed")][:excess]:
+            del self._jobs[job_id]
+
+    async def submit(self, request: PresentationRequest) -> JobStatus:
+        """ジョブを登録し、初期状態を返す"""
+        self.start()
+        now = datetime.now().isoformat()
+        job = JobStatus(
+            id=str(uuid.uuid4()),
+            status="queued",
+            stage="queued",
+            progress=0.0,
+            created_at=now,
+            updated_at=now,
+        )
+        try:
+            self._queue.put_nowait((job.id, request))
+        except asyncio.QueueFull:
+            raise JobQueueFull(f"待機中のジョブが上限({self.max_queued})に達しています")
+        self._jobs[job.id] = job
+        self._publish(job)
+        self._trim()
+        logger.info(f"ジョブを登録しました: ID={job.id}, 待機数={self._queue.qsize()}")
+        return job
+
+    def get(self, job_id: str) -> Optional[JobStatus]:
+        """ジョブの状態を返す（他のワーカーが受け付けたジョブは共有ストアから取得する。同期的な呼び出しのためスレッドから呼ぶ）"""
+        job = self._jobs.get(job_id)
+        if job is None and self.shared is not None:
+            job = self.shared.get(job_id)
+        return job
+
+    async def _worker(self, index: int) -> None:
+        while True:
+            job_id, request = await self._queue.get()
+            try:
+                await self._run(job_id, request)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job_id: str, request: PresentationRequest) -> None:
+        self._update(job_id, status="running", stage="started", progress=0.05)
+
+        def on_progress(stage: str, progress: float) -> None:
+            self._update(job_id, stage=stage, progress=progress)
+
+        try:
+            presentation = await presentation_service.generate_presentation_from_text(
+                request.text, request.options, on_progress=on_progress
+            )
+        except asyncio.CancelledError:
+            self._update(job_id, status="failed", stage="cancelled", error="ジョブがキャンセルされました")
+            raise
+        except Exception as e:
+            logger.error(f"ジョブの実行に失敗しました: ID={job_id}, エラー={str(e)}")
+            self._update(job_id, status="failed", stage="failed", error=str(e))
+            return
+
+        self._update(job_id, status="completed", stage="completed", progress=1.0, presentation_id=presentation.id)
+        logger.info(f"ジョブ完了: ID={job_id}, プレゼンテーションID={presentation.id}")
+
+    def stats(self) -> Dict[str, int]:
+        """このプロセスが受け付けたジョブの状態ごとの件数"""
+        counts: Dict[str, int] = {"queued": 0, "running": 0, "completed": 0, "failed": 0}
+        for job in self._jobs.values():
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return counts
+
+
+def create_job_status_store_from_env() -> Optional[JobStatusStore]:
+    """プレゼンテーションの保存先（PRESENTATION_STORE）と同じ共有ストアにジョブの状態を保存する（memoryの場合はNone）"""
+    backend = os.getenv("PRESENTATION_STORE", "memory").lower()
+    if backend == "redis":
+        return RedisJobStatusStore(
+            os.getenv("REDIS_URL", "redis://localhost:6379/0"), key_prefix=os.getenv("REDIS_KEY_PREFIX", "apg:")
+        )
+    if backend == "sqlite":
+        path = os.getenv("PRESENTATION_STORE_SQLITE_PATH") or os.path.join(
+            tempfile.gettempdir(), "presentations.sqlite3"
+        )
+        return SQLiteJobStatusStore(path)
+    return None
+
+
+def create_job_queue_from_env() -> JobQueue:
+    """環境変数の設定からジョブキューを作成する"""
+    return JobQueue(JOB_WORKERS, JOB_MAX_QUEUED, JOB_RETENTION, shared=create_job_status_store_from_env())
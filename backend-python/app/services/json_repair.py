@@ -0,0 +1,331 @@
+import re
+import json
+import logging
+from dataclasses import dataclass, field
+from typing import Any, List, Optional, Tuple
+
+from pydantic import ValidationError
+
+from app.schemas.presentation import Slide
+
+# ロガーの初期化
+logger = logging.getLogger(__name__)
+
+_CODE_FENCE = re.compile(r"```[A-Za-z]*[ \t]*\n?(.*?)(?:```|$)", re.S)
+_NUMBER = re.compile(r"-?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?")
+_WORD = re.compile(r"[A-Za-z_$][\w$]*")
+_LITERALS = {"true": "true", "false": "false", "null": "null", "True": "true", "False": "false", "None": "null"}
+# 箇条書きの記号（文字列で返された本文を行ごとに分割する際に取り除く）
+_BULLET = re.compile(r"^\s*(?:[-*•・●◦▪]|\d+[.)．])\s*")
+_CLOSERS = {"{": "}", "[": "]"}
+_STRING_ESCAPES = {"\n": "\\n", "\r": "\\r", "\t": "\\t"}
+
+
+class OutlineParseError(ValueError):
+    """修復してもJSONとして解釈できない"""
+
+
+@dataclass
+class RepairResult:
+    """修復済みの値と、行った修復の種類"""
+
+    value: Any
+    repairs: List[str] = field(default_factory=list)
+    # 出力が途中で途切れていた（閉じていない括弧を補った）かどうか
+    truncated: bool = False
+    # 途切れた時点で開いていた括弧の深さ
+    open_depth: int = 0
+
+
+@dataclass
+class OutlineParseResult:
+    """LLMの出力から取り出したスライドと、修復の内容"""
+
+    slides: List[Slide]
+    repairs: List[str] = field(default_factory=list)
+    truncated: bool = False
+    # 必須項目がない・途中で途切れたなどの理由で除いたスライド数
+    dropped: int = 0
+
+    @property
+    def status(self) -> str:
+        """ok（そのまま解釈できた）/ repaired（修復した）/ truncated（末尾が欠けている）"""
+        if self.truncated:
+            return "truncated"
+        return "repaired" if self.repairs else "ok"
+
+
+def _unwrap(text: str, repairs: List[str]) -> str:
+    """コードブロックや前置きの文章を取り除き、JSONの開始位置からの文字列を返す"""
+    fenced = _CODE_FENCE.search(text)
+    if fenced:
+        text = fenced.group(1)
+        repairs.append("code_fence")
+    starts = [index for index in (text.find("{"), text.find("[")) if index >= 0]
+    if not starts:
+        raise OutlineParseError("JSONの開始位置が見つかりません")
+    start = min(starts)
+    if text[:start].strip():
+        repairs.append("leading_text")
+    return text[start:]
+
+
+def _scan(text: str, repairs: List[str]) -> Tuple[str, bool, int]:
+    """1文字ずつ読み進めながら、よくある崩れ（末尾のカンマ、単引用符、途切れなど）を直したJSONを組み立てる"""
+    out: List[str] = []
+    stack: List[str] = []
+    # 直前に出力した要素の種類（value / key / , / : / { / [）
+    prev = ""
+    i = 0
+    length = len(text)
+
+    def note(repair: str) -> None:
+        if repair not in repairs:
+            repairs.append(repair)
+
+    def drop_trailing_comma() -> None:
+        while out and out[-1].isspace():
+            out.pop()
+        if out and out[-1] == ",":
+            out.pop()
+            note("trailing_comma")
+
+    def begin_value() -> None:
+        # 値が続けて並んでいる場合はカンマを補う
+        if prev in ("value", "key") and stack:
+            out.append(",")
+            note("missing_comma")
+
+    while i < length:
+        char = text[i]
+        if char.isspace():
+            out.append(char)
+            i += 1
+        elif char in "\"'":
+            begin_value()
+            quote = char
+            if quote == "'":
+                note("single_quote")
+            is_key = bool(stack) and stack[-1] == "{" and prev in ("{", ",", "value", "key")
+            chars = ['"']
+            i += 1
+            closed = False
+            while i < length:
+                char = text[i]
+                if char == "\\" and i + 1 < length:
+                    escaped = text[i + 1]
+                    # 単引用符の文字列内の\'はJSONでは不要なエスケープ
+                    chars.append("'" if escaped == "'" else "\\" + escaped)
+                    i += 2
+                    continue
+                if char == quote:
+                    closed = True
+                    i += 1
+                    break
+                if char == '"':
+                    chars.append('\\"')
+                elif char in _STRING_ESCAPES:
+                    chars.append(_STRING_ESCAPES[char])
+                    note("control_character")
+                else:
+                    chars.append(char)
+                i += 1
+            if not closed and chars[-1].endswith("\\") and not chars[-1].endswith("\\\\"):
+                chars.pop()
+            chars.append('"')
+            out.append("".join(chars))
+            prev = "key" if is_key else "value"
+            if not closed:
+                break
+        elif char in "{[":
+            begin_value()
+            stack.append(char)
+            out.append(char)
+            prev = char
+            i += 1
+        elif char in "}]":
+            i += 1
+            if char not in (_CLOSERS[opener] for opener in stack):
+                note("unmatched_bracket")
+                continue
+            drop_trailing_comma()
+            if prev == ":":
+                out.append("null")
+            # 閉じ忘れた内側の括弧を補いながら対応する括弧まで閉じる
+            while _CLOSERS[stack[-1]] != char:
+                out.append(_CLOSERS[stack.pop()])
+                note("unmatched_bracket")
+            out.append(char)
+            stack.pop()
+            prev = "value"
+            if not stack:
+                if text[i:].strip():
+                    note("trailing_text")
+                break
+        elif char == ",":
+            if prev in (",", "{", "["):
+                note("extra_comma")
+            else:
+                drop_trailing_comma()
+                out.append(",")
+                prev = ","
+            i += 1
+        elif char == ":":
+            out.append(":")
+            prev = ":"
+            i += 1
+        else:
+            number = _NUMBER.match(text, i)
+            word = _WORD.match(text, i)
+            if number and number.end() > i:
+                begin_value()
+                out.append(number.group())
+                prev = "value"
+                i = number.end()
+            elif word:
+                begin_value()
+                token = word.group()
+                if stack and stack[-1] == "{" and prev in ("{", ","):
+                    # 引用符のないキー
+                    out.append(json.dumps(token))
+                    prev = "key"
+                    note("unquoted_key")
+                else:
+                    out.append(_LITERALS.get(token, json.dumps(token)))
+                    if token not in ("true", "false", "null"):
+                        note("literal")
+                    prev = "value"
+                i = word.end()
+            else:
+                # JSONとして意味のない文字は読み飛ばす
+                note("stray_character")
+                i += 1
+
+    open_depth = len(stack)
+    if stack:
+        note("truncated")
+        drop_trailing_comma()
+        if prev == "key":
+            out.append(":null")
+        elif prev == ":":
+            out.append("null")
+        while stack:
+            out.append(_CLOSERS[stack.pop()])
+    return "".join(out), open_depth > 0, open_depth
+
+
+def repair_json(text: str) -> RepairResult:
+    """JSONとして解釈し、失敗した場合はよくある崩れを修復してから解釈する（修復できなければOutlineParseError）"""
+    try:
+        return RepairResult(json.loads(text))
+    except (TypeError, ValueError):
+        pass
+
+    repairs: List[str] = []
+    repaired, truncated, open_depth = _scan(_unwrap(text or "", repairs), repairs)
+    try:
+        value = json.loads(repaired)
+    except ValueError as e:
+        raise OutlineParseError(f"JSONを修復できませんでした: {str(e)}") from e
+    return RepairResult(value, repairs, truncated, open_depth)
+
+
+def _content_items(content: Any, repairs: List[str]) -> Optional[List[str]]:
+    if content is None:
+        repairs.append("missing_content")
+        return []
+    if isinstance(content, str):
+        repairs.append("content_string")
+        lines = (_BULLET.sub("", line).strip() for line in content.splitlines())
+        return [line for line in lines if line]
+    if isinstance(content, list):
+        items = []
+        for item in content:
+            if isinstance(item, str):
+                items.append(item)
+            elif isinstance(item, dict) and isinstance(item.get("text"), str):
+                items.append(item["text"])
+                repairs.append("content_item")
+            elif item is not None:
+                items.append(json.dumps(item, ensure_ascii=False) if isinstance(item, (dict, list)) else str(item))
+                repairs.append("content_item")
+        return items
+    return None
+
+
+def coerce_slide(data: Any, repairs: Optional[List[str]] = None) -> Optional[Slide]:
+    """スライドのデータをSlideに変換する（本文が文字列なら行ごとのリストにし、変換できなければNone）"""
+    repairs = repairs if repairs is not None else []
+    if not isinstance(data, dict):
+        return None
+    title = data.get("title")
+    if title is None:
+        return None
+    content = _content_items(data.get("content"), repairs)
+    if content is None:
+        return None
+    if not isinstance(title, str):
+        title = str(title)
+        repairs.append("title_type")
+    image_url = data.get("image_url")
+    try:
+        return Slide(title=title, content=content, image_url=image_url if isinstance(image_url, str) else None)
+    except ValidationError:
+        return None
+
+
+def _slide_list(value: Any) -> Tuple[List[Any], int]:
+    """解釈した値からスライドの一覧と、その一覧の括弧の深さを取り出す"""
+    if isinstance(value, list):
+        return value, 1
+    if isinstance(value, dict):
+        if isinstance(value.get("slides"), list):
+            return value["slides"], 2
+        if "title" in value:
+            return [value], 0
+        # {"presentation": {"slides": [...]}} のように一段深い場合
+        for nested in value.values():
+            if isinstance(nested, dict) and isinstance(nested.get("slides"), list):
+                return nested["slides"], 3
+        for nested in value.values():
+            if isinstance(nested, list) and nested and all(isinstance(item, dict) for item in nested):
+                return nested, 2
+    return [], 0
+
+
+def parse_outline(text: str) -> OutlineParseResult:
+    """LLMが返したアウトラインを寛容に解釈してスライドの一覧にする（修復できなければOutlineParseError）"""
+    result = repair_json(text)
+    repairs = list(result.repairs)
+    items, depth = _slide_list(result.value)
+    if not items and not isinstance(result.value, (dict, list)):
+        raise OutlineParseError("スライドの一覧が見つかりません")
+
+    # スライドの一覧の内側で途切れた場合のみ続きがあるとみなす
+    # （外側の閉じ括弧だけが欠けている場合はスライドが揃っているため、修復のみとする）
+    truncated = result.truncated and result.open_depth >= depth
+    if result.truncated and not truncated:
+        repairs = ["unclosed_bracket" if repair == "truncated" else repair for repair in repairs]
+
+    # 途切れた時点で書きかけだったスライドは内容が欠けているため使わない
+    dropped = 0
+    if truncated and result.open_depth > depth and items:
+        items = items[:-1]
+        dropped += 1
+
+    slides = []
+    for i, item in enumerate(items):
+        slide = coerce_slide(item, repairs)
+        if slide is None:
+            logger.warning(f"スライド{i}のデータを変換できないためスキップします")
+            dropped += 1
+            continue
+        slides.append(slide)
+    if dropped and not truncated:
+        repairs.append("dropped_slide")
+    return OutlineParseResult(slides, list(dict.fromkeys(repairs)), truncated, dropped)
+
+
+def outline_json(slides: List[Slide]) -> str:
+    """スライドの一覧を、キャッシュに保存する正規化済みのアウトライン(JSON文字列)にする"""
+    return json.dumps({"slides": [slide.model_dump() for slide in slides]}, ensure_ascii=False)
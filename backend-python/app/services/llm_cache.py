@@ -0,0 +1,269 @@
+import os
+import re
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import tempfile
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+# ロガーの初期化
+logger = logging.getLogger(__name__)
+
+
+def normalize_text(text: str) -> str:
+    """キャッシュキー用にテキストを正規化する（Unicode正規化・空白の畳み込み）"""
+    text = unicodedata.normalize("NFC", text)
+    lines = [re.sub(r"[ \t　]+", " ", line).strip() for line in text.splitlines()]
+    # 連続する空行は1行にまとめる
+    text = "\n".join(lines)
+    text = re.sub(r"\n{3,}", "\n\n", text)
+    return text.strip()
+
+
+def make_cache_key(
+    text: str,
+    theme: Optional[str],
+    slide_count: Optional[int],
+    model: str,
+    system_prompt: str,
+) -> str:
+    """生成結果を一意に決める要素からコンテンツアドレス型のキーを作成する"""
+    payload = json.dumps(
+        {
+            "text": normalize_text(text),
+            "theme": theme,
+            "slide_count": slide_count,
+            "model": model,
+            "system_prompt": system_prompt,
+        },
+        ensure_ascii=False,
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """LLMレスポンスのキャッシュ（メモリ内LRU + 任意のディスク層）
+
+    ディスク層は容量上限付きのLRUで、ファイルの一覧と合計サイズを起動時に一度読み込んでメモリ内で管理する。
+    イベントループからはaget/asetを使い、ディスクの読み書きはスレッドで行う。
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 256,
+        ttl_seconds: float = 3600,
+        disk_dir: Optional[str] = None,
+        disk_max_bytes: int = 256 * 1024 * 1024,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        # ディスク層のキーとファイルサイズ（最終アクセスが古い順）
+        self._disk_entries: "OrderedDict[str, int]" = OrderedDict()
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "disk_evictions": 0,
+        }
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            self._load_disk_index()
+            logger.info(f"LLMキャッシュのディスク層: {self.disk_dir} ({len(self._disk_entries)}件, {self._disk_bytes}bytes)")
+
+    def _is_expired(self, created_at: float) -> bool:
+        return self.ttl_seconds > 0 and time.time() - created_at > self.ttl_seconds
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.json")
+
+    def _load_disk_index(self) -> None:
+        entries = []
+        for entry in os.scandir(self.disk_dir):
+            if not entry.is_file() or not entry.name.endswith(".json"):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, entry.name[: -len(".json")], stat.st_size))
+        for _, key, size in sorted(entries):
+            self._disk_entries[key] = size
+            self._disk_bytes += size
+        for key in self._evict_disk():
+            self._remove_disk_file(key)
+
+    def _forget_disk(self, key: str) -> None:
+        size = self._disk_entries.pop(key, None)
+        if size is not None:
+            self._disk_bytes -= size
+
+    def _evict_disk(self) -> List[str]:
+        """容量上限を超えた分をディスク層の索引から外し、削除するキーを返す（ロックを取得した状態で呼ぶ）"""
+        evicted = []
+        while len(self._disk_entries) > 1 and self._disk_bytes > self.disk_max_bytes:
+            key, size = self._disk_entries.popitem(last=False)
+            self._disk_bytes -= size
+            evicted.append(key)
+        self._stats["disk_evictions"] += len(evicted)
+        return evicted
+
+    def _remove_disk_file(self, key: str) -> None:
+        try:
+            os.remove(self._disk_path(key))
+        except OSError:
+            pass
+
+    def _store_memory(self, key: str, created_at: float, value: str) -> None:
+        self._entries[key] = (created_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def _read_disk(self, key: str) -> Optional[Tuple[float, str]]:
+        path = self._disk_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                record = json.load(f)
+        except FileNotFoundError:
+            with self._lock:
+                self._forget_disk(key)
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"LLMキャッシュのディスク読み込みに失敗しました: {str(e)}")
+            return None
+
+        created_at = record.get("created_at", 0)
+        if self._is_expired(created_at):
+            with self._lock:
+                self._stats["expirations"] += 1
+                self._forget_disk(key)
+            self._remove_disk_file(key)
+            return None
+        try:
+            # 再起動後もLRUの順序を保てるようアクセス時刻を更新
+            os.utime(path)
+        except OSError:
+            pass
+        return created_at, record.get("value")
+
+    def _write_disk(self, key: str, created_at: float, value: str) -> None:
+        # 書き込み途中のファイルを読まないように一時ファイル経由で置き換える
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.disk_dir, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"created_at": created_at, "value": value}, f, ensure_ascii=False)
+                size = f.tell()
+            os.replace(tmp_path, self._disk_path(key))
+        except OSError as e:
+            logger.warning(f"LLMキャッシュのディスク書き込みに失敗しました: {str(e)}")
+            return
+
+        with self._lock:
+            self._forget_disk(key)
+            self._disk_entries[key] = size
+            self._disk_bytes += size
+            evicted = self._evict_disk()
+        for evicted_key in evicted:
+            self._remove_disk_file(evicted_key)
+
+    def _get_memory(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                if not self.disk_dir:
+                    self._stats["misses"] += 1
+                return None
+            created_at, value = entry
+            if not self._is_expired(created_at):
+                self._entries.move_to_end(key)
+                self._stats["memory_hits"] += 1
+                return value
+            del self._entries[key]
+            self._stats["expirations"] += 1
+            if not self.disk_dir:
+                self._stats["misses"] += 1
+            return None
+
+    def _get_disk(self, key: str) -> Optional[str]:
+        record = self._read_disk(key)
+        with self._lock:
+            if record is None:
+                self._stats["misses"] += 1
+                return None
+            created_at, value = record
+            self._store_memory(key, created_at, value)
+            if key in self._disk_entries:
+                self._disk_entries.move_to_end(key)
+            self._stats["disk_hits"] += 1
+            return value
+
+    def get(self, key: str) -> Optional[str]:
+        """キャッシュからレスポンスを取得する（存在しなければNone）"""
+        value = self._get_memory(key)
+        if value is None and self.disk_dir:
+            value = self._get_disk(key)
+        return value
+
+    async def aget(self, key: str) -> Optional[str]:
+        """getと同じ（ディスク層の読み込みはイベントループを止めないようスレッドで行う）"""
+        value = self._get_memory(key)
+        if value is None and self.disk_dir:
+            value = await asyncio.to_thread(self._get_disk, key)
+        return value
+
+    def set(self, key: str, value: str) -> None:
+        """レスポンスをキャッシュに保存する"""
+        created_at = time.time()
+        with self._lock:
+            self._store_memory(key, created_at, value)
+        if self.disk_dir:
+            self._write_disk(key, created_at, value)
+
+    async def aset(self, key: str, value: str) -> None:
+        """setと同じ（ディスク層への書き込みはイベントループを止めないようスレッドで行う）"""
+        created_at = time.time()
+        with self._lock:
+            self._store_memory(key, created_at, value)
+        if self.disk_dir:
+            await asyncio.to_thread(self._write_disk, key, created_at, value)
+
+    def clear(self) -> None:
+        """メモリ内のエントリと統計情報を破棄する（ディスク層は残す）"""
+        with self._lock:
+            self._entries.clear()
+            for name in self._stats:
+                self._stats[name] = 0
+
+    def stats(self) -> Dict[str, int]:
+        """ヒット/ミスなどの統計情報を取得する"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["hits"] = stats["memory_hits"] + stats["disk_hits"]
+            stats["size"] = len(self._entries)
+            stats["disk_size"] = len(self._disk_entries)
+            stats["disk_bytes"] = self._disk_bytes
+            return stats
+
+
+def create_llm_cache_from_env() -> LLMResponseCache:
+    """環境変数の設定からLLMレスポンスキャッシュを作成する"""
+    return LLMResponseCache(
+        max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", "256")),
+        ttl_seconds=float(os.getenv("LLM_CACHE_TTL_SECONDS", "86400")),
+        disk_dir=os.getenv("LLM_CACHE_DIR") or None,
+        disk_max_bytes=int(os.getenv("LLM_CACHE_DISK_MAX_BYTES", str(256 * 1024 * 1024))),
+    )
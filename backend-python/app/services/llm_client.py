@@ -0,0 +1,120 @@
+import os
+import time
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING, AsyncIterator, Dict, Optional
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+# ロガーの初期化
+logger = logging.getLogger(__name__)
+
+# 接続プール・タイムアウトの設定
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+OPENAI_TIMEOUT_SECONDS = float(os.getenv("OPENAI_TIMEOUT_SECONDS", "120"))
+OPENAI_CONNECT_TIMEOUT_SECONDS = float(os.getenv("OPENAI_CONNECT_TIMEOUT_SECONDS", "10"))
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "100"))
+OPENAI_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS", "20"))
+OPENAI_KEEPALIVE_EXPIRY_SECONDS = float(os.getenv("OPENAI_KEEPALIVE_EXPIRY_SECONDS", "60"))
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "16"))
+# SDK内部の再試行回数（再試行はresilience.ResilientCallerで予算付きで行うため既定では無効）
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "0"))
+
+
+def create_async_client(
+    api_key: Optional[str],
+    base_url: Optional[str] = None,
+) -> Optional["AsyncOpenAI"]:
+    """接続プールを共有する非同期OpenAIクライアントを作成する（APIキー未設定ならNone）"""
+    if not api_key:
+        return None
+
+    # openaiの読み込みには時間がかかるため、起動時ではなくクライアント作成時に読み込む
+    try:
+        import httpx
+        from openai import AsyncOpenAI
+    except ImportError:
+        logger.error("OpenAIライブラリがインストールされていません")
+        raise
+
+    http_client = httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=OPENAI_MAX_CONNECTIONS,
+            max_keepalive_connections=OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=OPENAI_KEEPALIVE_EXPIRY_SECONDS,
+        ),
+        timeout=httpx.Timeout(OPENAI_TIMEOUT_SECONDS, connect=OPENAI_CONNECT_TIMEOUT_SECONDS),
+    )
+    return AsyncOpenAI(
+        api_key=api_key,
+        base_url=base_url or OPENAI_BASE_URL,
+        http_client=http_client,
+        max_retries=OPENAI_MAX_RETRIES,
+    )
+
+
+class UpstreamLimiter:
+    """上流APIへの同時呼び出し数をセマフォで制限し、待ち時間を計測する"""
+
+    def __init__(self, max_concurrency: int = OPENAI_MAX_CONCURRENCY):
+        self.max_concurrency = max_concurrency
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.in_flight = 0
+        self.waiting = 0
+        self.acquired = 0
+        self.queue_wait_seconds_total = 0.0
+        self.queue_wait_seconds_max = 0.0
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[float]:
+        """枠が空くまで待機し、待機秒数を渡して処理を実行させる"""
+        start = time.perf_counter()
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+
+        wait_seconds = time.perf_counter() - start
+        self.acquired += 1
+        self.queue_wait_seconds_total += wait_seconds
+        self.queue_wait_seconds_max = max(self.queue_wait_seconds_max, wait_seconds)
+        if wait_seconds > 1.0:
+            logger.info(f"上流API呼び出しの待ち時間: {wait_seconds:.2f}s (実行中={self.in_flight})")
+
+        self.in_flight += 1
+        try:
+            yield wait_seconds
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    @asynccontextmanager
+    async def try_acquire(self) -> AsyncIterator[bool]:
+        """枠が空いていれば待たずに確保してTrueを、空いていない（または待機中の呼び出しがある）場合はFalseを渡す"""
+        if self._semaphore.locked() or self.waiting:
+            yield False
+            return
+        await self._semaphore.acquire()
+        self.in_flight += 1
+        try:
+            yield True
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    def stats(self) -> Dict[str, float]:
+        """同時実行数とキュー待ち時間の統計を取得する"""
+        return {
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "acquired": self.acquired,
+            "queue_wait_seconds_total": self.queue_wait_seconds_total,
+            "queue_wait_seconds_max": self.queue_wait_seconds_max,
+            "queue_wait_seconds_avg": (
+                self.queue_wait_seconds_total / self.acquired if self.acquired else 0.0
+            ),
+        }
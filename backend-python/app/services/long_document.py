@@ -0,0 +1,214 @@
+import os
+import re
+import json
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List
+
+from app.schemas.presentation import PresentationOptions
+from app.services.tokenizer import count_tokens
+from app.services.json_repair import repair_json
+
+# ロガーの初期化
+logger = logging.getLogger(__name__)
+
+# この値を超えるトークン数の入力を長文として分割処理する
+LONG_DOCUMENT_THRESHOLD_TOKENS = int(os.getenv("LONG_DOCUMENT_THRESHOLD_TOKENS", "6000"))
+# 1チャンクあたりのトークン数の上限
+LONG_DOCUMENT_CHUNK_TOKENS = int(os.getenv("LONG_DOCUMENT_CHUNK_TOKENS", "3000"))
+# チャンクごとのアウトライン生成の同時実行数
+LONG_DOCUMENT_MAX_PARALLEL = int(os.getenv("LONG_DOCUMENT_MAX_PARALLEL", "4"))
+
+# (システムプロンプト, ユーザー入力) を受け取りモデルの出力を返す関数
+CompletionFunc = Callable[[str, str], Awaitable[str]]
+
+_HEADING_PATTERN = re.compile(
+    r"^(#{1,6}\s+\S|第[0-9０-９一二三四五六七八九十百]+[章節部]|[0-9０-９]+(\.[0-9０-９]+)*[.．)）]\s*\S|[■◆●【])"
+)
+_SENTENCE_PATTERN = re.compile(r"[^。．！？!?\n]+[。．！？!?]?\s*")
+
+
+def is_long_document(text: str, model: str = "gpt-4") -> bool:
+    """分割処理が必要な長さの入力かどうかを判定する"""
+    return count_tokens(text, model) > LONG_DOCUMENT_THRESHOLD_TOKENS
+
+
+def split_into_sections(text: str) -> List[str]:
+    """見出しまたは空行を境界としてテキストを段落・セクションに分割する"""
+    blocks: List[str] = []
+    current: List[str] = []
+    for line in text.splitlines():
+        stripped = line.strip()
+        if not stripped or _HEADING_PATTERN.match(stripped):
+            if current:
+                blocks.append("\n".join(current).strip())
+                current = []
+            if not stripped:
+                continue
+        current.append(line)
+    if current:
+        blocks.append("\n".join(current).strip())
+    return [block for block in blocks if block]
+
+
+def _split_oversized(block: str, max_tokens: int, model: str) -> List[str]:
+    # 上限を超える段落は文の境界で分割し、それでも長い文は文字数で切る
+    pieces: List[str] = []
+    current = ""
+    for sentence in _SENTENCE_PATTERN.findall(block) or [block]:
+        while count_tokens(sentence, model) > max_tokens:
+            cut = max(1, len(sentence) * max_tokens // count_tokens(sentence, model))
+            pieces.append(sentence[:cut])
+            sentence = sentence[cut:]
+        if current and count_tokens(current + sentence, model) > max_tokens:
+            pieces.append(current)
+            current = ""
+        current += sentence
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def chunk_text(text: str, max_tokens: int = LONG_DOCUMENT_CHUNK_TOKENS, model: str = "gpt-4") -> List[str]:
+    """セクション境界を保ちながら、各チャンクがmax_tokens以下になるようにまとめる"""
+    chunks: List[str] = []
+    current: List[str] = []
+    current_tokens = 0
+    for block in split_into_sections(text):
+        block_tokens = count_tokens(block, model)
+        if block_tokens > max_tokens:
+            parts = _split_oversized(block, max_tokens, model)
+        else:
+            parts = [block]
+        for part in parts:
+            part_tokens = count_tokens(part, model)
+            is_heading = bool(_HEADING_PATTERN.match(part))
+            # 見出しから始まるブロックは、現在のチャンクが半分以上埋まっていれば新しいチャンクにする
+            if current and (
+                current_tokens + part_tokens > max_tokens
+                or (is_heading and current_tokens > max_tokens // 2)
+            ):
+                chunks.append("\n\n".join(current))
+                current = []
+                current_tokens = 0
+            current.append(part)
+            current_tokens += part_tokens
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+
+def _build_map_prompt(options: PresentationOptions, index: int, total: int, slide_count: int) -> str:
+    return f"""あなたはプレゼンテーションのスペシャリストです。
+入力は長い文書を分割した一部（{index + 1}/{total}）です。
+この部分の要点を約{slide_count}枚のスライド案にまとめてください。テーマ: {options.theme}
+各スライドにはタイトルとコンテンツのリストを含めてください。
+結果はJSON形式で返してください。次の形式に従ってください:
+{{
+  "slides": [
+    {{
+      "title": "スライドタイトル",
+      "content": ["コンテンツ項目1", "コンテンツ項目2"]
+    }}
+  ]
+}}
+"""
+
+
+def _build_reduce_prompt(system_prompt: str, slide_count: int) -> str:
+    return system_prompt + f"""
+入力は長い文書の各部分から作成したスライド案（JSON）です。
+重複する内容を統合し、文書全体の流れが分かるように約{slide_count}枚のスライドに再構成してください。
+"""
+
+
+def _parse_slides(content: str) -> List[Dict[str, Any]]:
+    try:
+        slides = repair_json(content).value.get("slides", [])
+    except (ValueError, AttributeError) as e:
+        logger.warning(f"部分アウトラインのJSONパースに失敗しました: {str(e)}")
+        return []
+    return [slide for slide in slides if isinstance(slide, dict)]
+
+
+def _fit_payload(slides: List[Dict[str, Any]], model: str) -> str:
+    """統合の入力がチャンクの上限に収まるよう、各スライドの内容を後ろから削り、それでも長ければスライドを間引く"""
+    items = max((len(slide["content"]) for slide in slides if isinstance(slide.get("content"), list)), default=0)
+    while True:
+        trimmed = [
+            {**slide, "content": slide["content"][:items]} if isinstance(slide.get("content"), list) else slide
+            for slide in slides
+        ]
+        payload = json.dumps({"slides": trimmed}, ensure_ascii=False)
+        if count_tokens(payload, model) <= LONG_DOCUMENT_CHUNK_TOKENS or items == 0:
+            break
+        items -= 1
+    # 文書全体の流れを残すため、末尾ではなく1枚おきに間引く
+    while count_tokens(payload, model) > LONG_DOCUMENT_CHUNK_TOKENS and len(trimmed) > 1:
+        trimmed = trimmed[::2]
+        payload = json.dumps({"slides": trimmed}, ensure_ascii=False)
+    return payload
+
+
+async def _reduce(
+    slides: List[Dict[str, Any]],
+    slide_count: int,
+    system_prompt: str,
+    complete: CompletionFunc,
+    model: str,
+) -> List[Dict[str, Any]]:
+    prompt = _build_reduce_prompt(system_prompt, slide_count)
+    payload = json.dumps({"slides": slides}, ensure_ascii=False)
+    if count_tokens(payload, model) <= LONG_DOCUMENT_CHUNK_TOKENS or len(slides) <= 1:
+        return _parse_slides(await complete(prompt, payload))
+    if len(slides) <= 2 * slide_count:
+        # 統合済みの2つの結果を合わせても上限を超える場合は、これ以上分割しても枚数が減らないため
+        # 内容を削った入力で最後の統合を行う
+        return _parse_slides(await complete(prompt, _fit_payload(slides, model)))
+
+    # 部分アウトラインの合計もコンテキストに収まらない場合は段階的に統合する
+    half = len(slides) // 2
+    left, right = await asyncio.gather(
+        _reduce(slides[:half], slide_count, system_prompt, complete, model),
+        _reduce(slides[half:], slide_count, system_prompt, complete, model),
+    )
+    merged = left + right
+    if len(merged) >= len(slides):
+        # モデルが枚数を減らさなかった場合も、同じ統合を繰り返さず最後の統合を行う
+        return _parse_slides(await complete(prompt, _fit_payload(merged, model)))
+    return await _reduce(merged, slide_count, system_prompt, complete, model)
+
+
+async def generate_outline_map_reduce(
+    text: str,
+    options: PresentationOptions,
+    system_prompt: str,
+    complete: CompletionFunc,
+    model: str = "gpt-4",
+) -> str:
+    """長文をチャンクごとに並列でアウトライン化し、指定枚数に統合したJSON文字列を返す"""
+    chunks = chunk_text(text, LONG_DOCUMENT_CHUNK_TOKENS, model)
+    slide_count = options.slide_count or 10
+    per_chunk = max(1, -(-slide_count // len(chunks)))
+    logger.info(f"長文モード: チャンク数={len(chunks)}, チャンクあたりのスライド数={per_chunk}")
+
+    semaphore = asyncio.Semaphore(LONG_DOCUMENT_MAX_PARALLEL)
+
+    async def outline_chunk(index: int, chunk: str) -> List[Dict[str, Any]]:
+        async with semaphore:
+            content = await complete(_build_map_prompt(options, index, len(chunks), per_chunk), chunk)
+        return _parse_slides(content)
+
+    # map: 各チャンクを並列にアウトライン化
+    partial_outlines = await asyncio.gather(*[outline_chunk(i, chunk) for i, chunk in enumerate(chunks)])
+    partial_slides = [slide for outline in partial_outlines for slide in outline]
+    if not partial_slides:
+        raise ValueError("長文の部分アウトラインを生成できませんでした")
+
+    # reduce: 1チャンクのみで枚数も収まっていれば統合呼び出しを省略
+    if len(chunks) == 1 and len(partial_slides) <= slide_count:
+        merged = partial_slides
+    else:
+        merged = await _reduce(partial_slides, slide_count, system_prompt, complete, model)
+    logger.info(f"長文モード完了: 部分スライド数={len(partial_slides)}, 統合後={len(merged)}")
+    return json.dumps({"slides": merged}, ensure_ascii=False)
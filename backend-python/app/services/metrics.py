@@ -0,0 +1,221 @@
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+# 処理段階ごとのレイテンシ用バケット（秒）
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """単調増加するカウンター"""
+
+    type_name = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        return self._values.get(key, 0)
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Histogram:
+    """累積バケット形式のヒストグラム"""
+
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # ラベル値ごとに [各バケットの件数..., 合計値, 件数]
+        self._values: Dict[LabelValues, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            data = self._values.get(key)
+            if data is None:
+                data = [0] * (len(self.buckets) + 2)
+                self._values[key] = data
+            if index < len(self.buckets):
+                data[index] += 1
+            data[-2] += value
+            data[-1] += 1
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        """with文の処理時間を記録する"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels: str) -> int:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        data = self._values.get(key)
+        return int(data[-1]) if data else 0
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            items = [(key, list(data)) for key, data in self._values.items()]
+        for key, data in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, data):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, key, 'le="+Inf"')
+            yield f"{self.name}_bucket{labels} {int(data[-1])}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(data[-2])}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, key)} {int(data[-1])}"
+
+
+class CallbackMetric:
+    """出力時に関数を呼び出して値を取得するメトリクス（キャッシュの統計情報など）"""
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        func: Callable[[], Union[float, Dict[LabelValues, float]]],
+        labelnames: Sequence[str] = (),
+        type_name: str = "gauge",
+    ):
+        self.name = name
+        self.help_text = help_text
+        self.func = func
+        self.labelnames = tuple(labelnames)
+        self.type_name = type_name
+
+    def samples(self) -> Iterator[str]:
+        value = self.func()
+        if isinstance(value, dict):
+            for key, item in value.items():
+                yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(item)}"
+        else:
+            yield f"{self.name} {_format_value(value)}"
+
+
+class MetricsRegistry:
+    """メトリクスを登録し、Prometheusのテキスト形式で出力する"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Union[Counter, Histogram, CallbackMetric]] = {}
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help_text, labelnames))
+
+    def histogram(self, name: str, help_text: str, labelnames: Sequence[str] = (), buckets: Optional[Sequence[float]] = None) -> Histogram:
+        return self.register(Histogram(name, help_text, labelnames, buckets or DEFAULT_BUCKETS))
+
+    def callback(self, name: str, help_text: str, func, labelnames: Sequence[str] = (), type_name: str = "gauge") -> CallbackMetric:
+        return self.register(CallbackMetric(name, help_text, func, labelnames, type_name))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+# アプリケーション全体で共有するレジストリ
+REGISTRY = MetricsRegistry()
+
+STAGE_LATENCY = REGISTRY.histogram(
+    "presentation_stage_duration_seconds",
+    "処理段階ごとの所要時間",
+    ["stage"],
+)
+HTTP_LATENCY = REGISTRY.histogram(
+    "http_request_duration_seconds",
+    "HTTPリクエストの処理時間",
+    ["method", "route", "status"],
+)
+LLM_TOKENS = REGISTRY.counter(
+    "llm_tokens_total",
+    "OpenAI APIで使用したトークン数",
+    ["type"],
+)
+ERRORS = REGISTRY.counter(
+    "presentation_errors_total",
+    "処理段階ごとのエラー数",
+    ["stage"],
+)
+INPUT_COMPACTION_TOKENS = REGISTRY.counter(
+    "input_compaction_tokens_total",
+    "入力圧縮前後のトークン数と削減できたトークン数",
+    ["type"],
+)
+SLIDE_RENDER_EVENTS = REGISTRY.counter(
+    "pptx_slide_render_total",
+    "スライド単位のキャッシュで再レンダリング/再利用したスライド数",
+    ["result"],
+)
+RENDER_ENGINE_EVENTS = REGISTRY.counter(
+    "pptx_render_engine_total",
+    "ダウンロード時に使用したレンダリングエンジンごとの件数",
+    ["engine"],
+)
+OUTLINE_PARSE_EVENTS = REGISTRY.counter(
+    "llm_outline_parse_total",
+    "LLMが返したアウトラインの解釈結果ごとの件数（ok/repaired/continued/partial/failed）",
+    ["result"],
+)
+OUTLINE_REPAIRS = REGISTRY.counter(
+    "llm_outline_repairs_total",
+    "アウトラインの解釈時に行った修復の種類ごとの件数",
+    ["repair"],
+)
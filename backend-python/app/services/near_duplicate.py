@@ -0,0 +1,365 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import difflib
+import logging
+import threading
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+
+from app.services.llm_cache import normalize_text
+
+# ロガーの初期化
+logger = logging.getLogger(__name__)
+
+# 過去の入力と似ている場合にアウトラインを再利用する（既定では無効）
+NEAR_DUPLICATE_ENABLED = os.getenv("NEAR_DUPLICATE_ENABLED", "false").lower() == "true"
+# 再利用するJaccard類似度（MinHashによる推定値）の下限
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("NEAR_DUPLICATE_THRESHOLD", "0.9"))
+# アウトラインに反映できない変更（行の追加・削除など）を許容する件数（超える場合は再利用せずに生成する）
+NEAR_DUPLICATE_MAX_UNPATCHED = int(os.getenv("NEAR_DUPLICATE_MAX_UNPATCHED", "0"))
+# 保持する入力の件数・容量の上限
+NEAR_DUPLICATE_MAX_ENTRIES = int(os.getenv("NEAR_DUPLICATE_MAX_ENTRIES", "2000"))
+NEAR_DUPLICATE_MAX_BYTES = int(os.getenv("NEAR_DUPLICATE_MAX_BYTES", str(64 * 1024 * 1024)))
+# 永続化先のSQLiteファイル（未指定はメモリ内のみ）
+NEAR_DUPLICATE_INDEX_PATH = os.getenv("NEAR_DUPLICATE_INDEX_PATH", "")
+# 判定結果の履歴として保持する件数
+NEAR_DUPLICATE_REPORT_SIZE = int(os.getenv("NEAR_DUPLICATE_REPORT_SIZE", "200"))
+
+# 文字n-gram（日本語は単語に区切らずに扱えるよう文字単位にする）
+SHINGLE_SIZE = 5
+# MinHashの署名長と、LSHのバンド数（1バンドあたり4値。類似度0.5前後から候補になる）
+NUM_HASHES = 128
+NUM_BANDS = 32
+_ROWS_PER_BAND = NUM_HASHES // NUM_BANDS
+_MAX_HASH = (1 << 64) - 1
+# パッチを当てる際の置換前の文字列の最小長（短すぎると無関係な箇所まで置き換えてしまう）
+PATCH_MIN_CHARS = 6
+
+
+def shingle_hashes(text: str) -> Set[int]:
+    """正規化したテキストの文字n-gramを64bitのハッシュ値の集合にする"""
+    text = normalize_text(text).casefold()
+    if len(text) <= SHINGLE_SIZE:
+        grams = {text}
+    else:
+        grams = {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+    return {int.from_bytes(hashlib.blake2b(gram.encode("utf-8"), digest_size=8).digest(), "big") for gram in grams}
+
+
+def minhash_signature(hashes: Set[int], num_hashes: int = NUM_HASHES) -> Tuple[int, ...]:
+    """One Permutation Hashingで署名を作る（ハッシュ値1つにつき1回の計算で済む）
+
+    ハッシュ値をnum_hashes個のビンに振り分けて各ビンの最小値を取り、空のビンは右隣の値で埋める。
+    """
+    bins = [_MAX_HASH] * num_hashes
+    for value in hashes:
+        index = value % num_hashes
+        rank = value // num_hashes
+        if rank < bins[index]:
+            bins[index] = rank
+    filled = [i for i, value in enumerate(bins) if value != _MAX_HASH]
+    if not filled or len(filled) == num_hashes:
+        return tuple(bins)
+    signature = list(bins)
+    for i in range(num_hashes):
+        if bins[i] != _MAX_HASH:
+            continue
+        # 右方向で最初に値のあるビンを、距離に応じたオフセットを加えて借りる
+        for distance in range(1, num_hashes):
+            value = bins[(i + distance) % num_hashes]
+            if value != _MAX_HASH:
+                signature[i] = value + distance * (_MAX_HASH // num_hashes + 1)
+                break
+    return tuple(signature)
+
+
+def estimate_similarity(a: Tuple[int, ...], b: Tuple[int, ...]) -> float:
+    """署名の一致率からJaccard類似度を推定する"""
+    return sum(1 for x, y in zip(a, b) if x == y) / len(a)
+
+
+def _band_keys(scope: str, signature: Tuple[int, ...]) -> List[Tuple[str, int, Tuple[int, ...]]]:
+    return [
+        (scope, band, signature[band * _ROWS_PER_BAND:(band + 1) * _ROWS_PER_BAND])
+        for band in range(NUM_BANDS)
+    ]
+
+
+def _is_word_char(ch: str) -> bool:
+    return ch.isascii() and ch.isalnum()
+
+
+def _expand_change(old: str, new: str, i1: int, i2: int, j1: int, j2: int) -> Tuple[str, str]:
+    """変更箇所を前後の共通部分に広げ、置換前の文字列を特定できる長さにする（半角英数字の単語の途中では区切らない）"""
+    while True:
+        first = old[i1] if i1 < i2 else (new[j1] if j1 < j2 else "")
+        last = old[i2 - 1] if i1 < i2 else (new[j2 - 1] if j1 < j2 else "")
+        split_left = i1 > 0 and _is_word_char(old[i1 - 1]) and _is_word_char(first)
+        split_right = i2 < len(old) and _is_word_char(old[i2]) and _is_word_char(last)
+        short = i2 - i1 < PATCH_MIN_CHARS
+        extended = False
+        if (short or split_left) and i1 > 0 and j1 > 0:
+            i1, j1 = i1 - 1, j1 - 1
+            extended = True
+        if (short or split_right) and i2 < len(old) and j2 < len(new):
+            i2, j2 = i2 + 1, j2 + 1
+            extended = True
+        if not extended:
+            return old[i1:i2], new[j1:j2]
+
+
+def diff_replacements(old_text: str, new_text: str) -> Tuple[List[Tuple[str, str]], int]:
+    """入力の差分から(置換前, 置換後)の組を求める（行の追加・削除など置換で表せない変更の数も返す）"""
+    old_lines = normalize_text(old_text).splitlines()
+    new_lines = normalize_text(new_text).splitlines()
+    replacements: List[Tuple[str, str]] = []
+    unpatchable = 0
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False).get_opcodes():
+        if tag == "equal":
+            continue
+        if tag != "replace" or i2 - i1 != j2 - j1:
+            unpatchable += max(i2 - i1, j2 - j1)
+            continue
+        for old_line, new_line in zip(old_lines[i1:i2], new_lines[j1:j2]):
+            matcher = difflib.SequenceMatcher(None, old_line, new_line, autojunk=False)
+            for op, a1, a2, b1, b2 in matcher.get_opcodes():
+                if op != "equal":
+                    replacements.append(_expand_change(old_line, new_line, a1, a2, b1, b2))
+    # 重なる変更は1つにまとめられないため、置換前の文字列が重複するものは最初の1つだけ使う
+    unique: Dict[str, str] = {}
+    for old, new in replacements:
+        if old and old != new:
+            unique.setdefault(old, new)
+    return list(unique.items()), unpatchable
+
+
+def patch_outline(outline: str, old_text: str, new_text: str) -> Tuple[str, int, int]:
+    """保存済みのアウトライン中の文字列に入力の差分を当てる（適用数と、行の追加・削除など置換で表せない変更数も返す）"""
+    replacements, unpatched = diff_replacements(old_text, new_text)
+    if not replacements:
+        return outline, 0, unpatched
+    data = json.loads(outline)
+    applied = 0
+
+    def patch(value: Any) -> Any:
+        nonlocal applied
+        if isinstance(value, str):
+            for old, new in replacements:
+                if old in value:
+                    value = value.replace(old, new)
+                    applied += 1
+            return value
+        if isinstance(value, list):
+            return [patch(item) for item in value]
+        if isinstance(value, dict):
+            return {key: patch(item) for key, item in value.items()}
+        return value
+
+    # アウトラインに現れない箇所の変更（モデルが言い換えた・使わなかった語など）は出力に影響しないため数えない
+    return json.dumps(patch(data), ensure_ascii=False), applied, unpatched
+
+
+class _Entry:
+    __slots__ = ("key", "scope", "signature", "text", "outline", "created_at", "size")
+
+    def __init__(self, key: str, scope: str, signature: Tuple[int, ...], text: str, outline: str, created_at: float):
+        self.key = key
+        self.scope = scope
+        self.signature = signature
+        self.text = text
+        self.outline = outline
+        self.created_at = created_at
+        self.size = len(text.encode("utf-8")) + len(outline.encode("utf-8")) + NUM_HASHES * 8
+
+
+class NearDuplicateMatch:
+    """類似する過去の入力から得たアウトライン"""
+
+    def __init__(self, outline: str, similarity: float, decision: str, patches_applied: int, changes_unpatched: int):
+        self.outline = outline
+        self.similarity = similarity
+        self.decision = decision
+        self.patches_applied = patches_applied
+        self.changes_unpatched = changes_unpatched
+
+
+class NearDuplicateIndex:
+    """過去の入力のMinHash署名をLSHで索引し、類似する入力のアウトラインを再利用する
+
+    scopeにはテーマ・スライド数・モデルなど出力に影響する設定を渡し、同じscope内でのみ照合する。
+    件数・容量の上限を超えると古いものから削除し、pathを指定するとSQLiteに永続化する。
+    """
+
+    def __init__(
+        self,
+        threshold: float = NEAR_DUPLICATE_THRESHOLD,
+        max_unpatched: int = NEAR_DUPLICATE_MAX_UNPATCHED,
+        max_entries: int = NEAR_DUPLICATE_MAX_ENTRIES,
+        max_bytes: int = NEAR_DUPLICATE_MAX_BYTES,
+        path: Optional[str] = None,
+        report_size: int = NEAR_DUPLICATE_REPORT_SIZE,
+    ):
+        self.threshold = threshold
+        self.max_unpatched = max_unpatched
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._bands: Dict[Tuple[str, int, Tuple[int, ...]], Set[str]] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._decisions: Deque[Dict[str, Any]] = deque(maxlen=report_size)
+        self._stats = {"exact": 0, "reused": 0, "patched": 0, "miss": 0, "added": 0, "evictions": 0}
+        self._conn: Optional[sqlite3.Connection] = None
+        if path:
+            self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS near_duplicates ("
+                "key TEXT PRIMARY KEY, scope TEXT NOT NULL, signature TEXT NOT NULL, "
+                "text TEXT NOT NULL, outline TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._load()
+            logger.info(f"類似入力インデックス: {path} ({len(self._entries)}件)")
+
+    def _load(self) -> None:
+        rows = self._conn.execute(
+            "SELECT key, scope, signature, text, outline, created_at FROM near_duplicates ORDER BY created_at ASC"
+        ).fetchall()
+        for key, scope, signature, text, outline, created_at in rows:
+            self._insert(_Entry(key, scope, tuple(json.loads(signature)), text, outline, created_at))
+        self._evict()
+
+    def _insert(self, entry: _Entry) -> None:
+        if entry.key in self._entries:
+            self._remove(entry.key)
+        self._entries[entry.key] = entry
+        self._bytes += entry.size
+        for band_key in _band_keys(entry.scope, entry.signature):
+            self._bands.setdefault(band_key, set()).add(entry.key)
+
+    def _remove(self, key: str) -> _Entry:
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+        for band_key in _band_keys(entry.scope, entry.signature):
+            members = self._bands.get(band_key)
+            if members is not None:
+                members.discard(key)
+                if not members:
+                    del self._bands[band_key]
+        return entry
+
+    def _evict(self) -> None:
+        evicted = []
+        while len(self._entries) > 1 and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            evicted.append(self._remove(next(iter(self._entries))).key)
+            self._stats["evictions"] += 1
+        if evicted and self._conn is not None:
+            self._conn.executemany("DELETE FROM near_duplicates WHERE key = ?", [(key,) for key in evicted])
+
+    @staticmethod
+    def _key(scope: str, text: str) -> str:
+        return hashlib.sha256(f"{scope}\n{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+    def _record(self, decision: str, similarity: Optional[float], candidates: int, matched: Optional[str] = None, **extra: int) -> None:
+        self._stats[decision] += 1
+        self._decisions.append({
+            "at": datetime.now().isoformat(timespec="seconds"),
+            "decision": decision,
+            "similarity": round(similarity, 3) if similarity is not None else None,
+            "threshold": self.threshold,
+            "candidates": candidates,
+            "matched": matched[:12] if matched else None,
+            **extra,
+        })
+
+    def lookup(self, text: str, scope: str) -> Optional[NearDuplicateMatch]:
+        """類似度がしきい値以上の過去の入力があれば、差分を当てたアウトラインを返す"""
+        signature = minhash_signature(shingle_hashes(text))
+        with self._lock:
+            exact = self._entries.get(self._key(scope, text))
+            if exact is not None:
+                self._entries.move_to_end(exact.key)
+                self._record("exact", 1.0, 1, exact.key)
+                return NearDuplicateMatch(exact.outline, 1.0, "exact", 0, 0)
+
+            candidates: Set[str] = set()
+            for band_key in _band_keys(scope, signature):
+                candidates.update(self._bands.get(band_key, ()))
+            best: Optional[_Entry] = None
+            best_similarity: Optional[float] = None
+            for key in candidates:
+                entry = self._entries[key]
+                similarity = estimate_similarity(signature, entry.signature)
+                if best_similarity is None or similarity > best_similarity:
+                    best, best_similarity = entry, similarity
+
+            if best is None or best_similarity < self.threshold:
+                self._record("miss", best_similarity, len(candidates), best.key if best else None)
+                return None
+            self._entries.move_to_end(best.key)
+            stored_text, stored_outline = best.text, best.outline
+
+        # 差分の計算とパッチはロックの外で行う
+        try:
+            outline, applied, unpatched = patch_outline(stored_outline, stored_text, text)
+        except (ValueError, TypeError) as e:
+            logger.warning(f"保存済みアウトラインへのパッチに失敗しました: {str(e)}")
+            with self._lock:
+                self._record("miss", best_similarity, len(candidates), best.key)
+            return None
+        if unpatched > self.max_unpatched:
+            # 反映できない変更を含むアウトラインを返すと入力の内容が失われるため、生成し直す
+            with self._lock:
+                self._record("miss", best_similarity, len(candidates), best.key, changes_unpatched=unpatched)
+            logger.info(f"類似する入力がありますが、アウトラインに反映できない変更が{unpatched}件あるため再利用しません")
+            return None
+        decision = "patched" if applied else "reused"
+        with self._lock:
+            self._record(decision, best_similarity, len(candidates), best.key, patches_applied=applied, changes_unpatched=unpatched)
+        logger.info(
+            f"類似する入力のアウトラインを再利用します: 類似度={best_similarity:.3f}, "
+            f"パッチ={applied}件, 適用できない変更={unpatched}件"
+        )
+        return NearDuplicateMatch(outline, best_similarity, decision, applied, unpatched)
+
+    def add(self, text: str, scope: str, outline: str) -> None:
+        """入力と生成したアウトラインを登録する"""
+        entry = _Entry(
+            self._key(scope, text), scope, minhash_signature(shingle_hashes(text)),
+            normalize_text(text), outline, time.time(),
+        )
+        with self._lock:
+            self._insert(entry)
+            self._stats["added"] += 1
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO near_duplicates (key, scope, signature, text, outline, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (entry.key, scope, json.dumps(entry.signature), entry.text, outline, entry.created_at),
+                )
+            self._evict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, int]:
+        return {**self._stats, "size": len(self._entries), "bytes": self._bytes}
+
+    def report(self) -> Dict[str, Any]:
+        """直近の判定結果（類似度・判定・パッチ数）と統計"""
+        with self._lock:
+            return {"threshold": self.threshold, "stats": self.stats(), "decisions": list(self._decisions)}
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+
+
+def create_near_duplicate_index_from_env() -> Optional[NearDuplicateIndex]:
+    """環境変数の設定から類似入力インデックスを作成する（無効の場合はNone）"""
+    if not NEAR_DUPLICATE_ENABLED:
+        return None
+    return NearDuplicateIndex(path=NEAR_DUPLICATE_INDEX_PATH or None)
@@ -0,0 +1,425 @@
+import os
+import re
+import json
+import time
+import shutil
+import hashlib
+import asyncio
+import logging
+import zipfile
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.schemas.presentation import Presentation, Slide
+from app.services.artifact_cache import ArtifactCache, RENDER_FORMAT_VERSION
+from app.services.theme_templates import new_themed_pptx, warm_theme_prototypes
+
+# ロガーの初期化
+logger = logging.getLogger(__name__)
+
+# ワーカープロセス数（0の場合はプロセスプールを使わずスレッドで実行）
+PPTX_RENDER_WORKERS = int(os.getenv("PPTX_RENDER_WORKERS", str(min(4, os.cpu_count() or 1))))
+# 実行中＋待機中のレンダリング数の上限（超えた場合は受け付けない）
+PPTX_RENDER_MAX_PENDING = int(os.getenv("PPTX_RENDER_MAX_PENDING", str(max(1, PPTX_RENDER_WORKERS) * 4)))
+# ワーカープロセスの起動方式（スレッドを持つ親プロセスからでも安全なspawnを既定とする）
+PPTX_RENDER_START_METHOD = os.getenv("PPTX_RENDER_START_METHOD", "spawn")
+# スライド単位のキャッシュを使うかどうか（1枚だけ編集した場合は変更されたスライドのみレンダリングする）
+PPTX_SLIDE_CACHE_ENABLED = os.getenv("PPTX_SLIDE_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+# スライド単位のキャッシュの容量上限（スライドのXMLと土台のファイルそれぞれ）
+PPTX_SLIDE_CACHE_MAX_BYTES = int(os.getenv("PPTX_SLIDE_CACHE_MAX_BYTES", str(128 * 1024 * 1024)))
+
+_SLIDE_PART_PATTERN = re.compile(r"^ppt/slides/slide(\d+)\.xml$")
+
+
+class RenderPoolSaturated(Exception):
+    """レンダリングの待ち行列が上限に達している"""
+
+
+class RenderPoolUnavailable(Exception):
+    """ワーカープロセスが異常終了し、プールを作り直しても回復しなかった"""
+
+
+def _new_pptx(path: Optional[str] = None):
+    # python-pptxの読み込みは重いため、レンダリング時（またはワーカーの起動時）に読み込む
+    from pptx import Presentation as PPTXPresentation
+
+    return PPTXPresentation(path)
+
+
+def _add_picture(slide, content_shape, image_path: str) -> None:
+    """本文の右側に画像を縦横比を保って配置し、本文の幅を狭める"""
+    from PIL import Image
+
+    with Image.open(image_path) as image:
+        image_width, image_height = image.size
+
+    left, top, width, height = content_shape.left, content_shape.top, content_shape.width, content_shape.height
+    text_width = int(width * 0.55)
+    content_shape.left, content_shape.top, content_shape.width, content_shape.height = left, top, text_width, height
+
+    # 残りの領域に収まる大きさに縮小する
+    area_left = left + text_width + int(width * 0.03)
+    area_width = left + width - area_left
+    scale = min(area_width / image_width, height / image_height)
+    picture_width, picture_height = int(image_width * scale), int(image_height * scale)
+    slide.shapes.add_picture(
+        image_path,
+        area_left + (area_width - picture_width) // 2,
+        top + (height - picture_height) // 2,
+        width=picture_width,
+        height=picture_height,
+    )
+
+
+def _add_slide(pptx, slide_data: Slide, is_title: bool, image_path: Optional[str] = None) -> None:
+    """スライドを1枚追加する（タイトルスライドは表紙レイアウト、それ以外はタイトルと内容のレイアウト）"""
+    logger.debug(f"スライド作成中: タイトル={slide_data.title}")
+
+    # スライドの追加
+    try:
+        # 最初のスライドはタイトルスライド、それ以外は通常のスライド
+        if is_title:
+            slide_layout = pptx.slide_layouts[0]  # タイトルスライド
+        else:
+            slide_layout = pptx.slide_layouts[1]  # タイトルと内容のレイアウト
+
+        slide = pptx.slides.add_slide(slide_layout)
+
+        # タイトルの設定
+        title_shape = slide.shapes.title
+        if title_shape:
+            title_shape.text = slide_data.title
+
+        # コンテンツの設定（最初のスライド以外）
+        if not is_title:
+            try:
+                content_shape = slide.placeholders[1]  # コンテンツのプレースホルダー
+                text_frame = content_shape.text_frame
+
+                # 各コンテンツ項目を一行ずつ追加
+                for j, content_item in enumerate(slide_data.content):
+                    if j == 0:
+                        p = text_frame.paragraphs[0]
+                    else:
+                        p = text_frame.add_paragraph()
+                    p.text = content_item
+                    p.level = 0  # 箇条書きレベル
+
+                if image_path:
+                    _add_picture(slide, content_shape, image_path)
+            except Exception as content_error:
+                logger.error(f"コンテンツ設定エラー: {str(content_error)}")
+        # 最初のスライドのサブタイトル設定
+        elif len(slide_data.content) > 0:
+            try:
+                # サブタイトル用のプレースホルダーを探す
+                for shape in slide.placeholders:
+                    if shape.placeholder_format.type == 2:  # サブタイトルのプレースホルダータイプ
+                        shape.text = "\n".join(slide_data.content[:2])
+                        break
+            except Exception as subtitle_error:
+                logger.error(f"サブタイトル設定エラー: {str(subtitle_error)}")
+    except Exception as e:
+        logger.error(f"スライドの生成中にエラーが発生: {str(e)}")
+        # このスライドはスキップして続行
+
+
+def slide_cache_key(theme: str, slide_data: Slide, is_title: bool) -> str:
+    """スライド1枚分の出力を識別するキー（テーマ・レイアウト・内容が同じなら同じXMLになる）"""
+    payload = json.dumps(
+        {"theme": theme, "title_layout": is_title, "slide": slide_data.model_dump()},
+        ensure_ascii=False,
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _skeleton_key(presentation: Presentation) -> str:
+    # スライドのXMLを差し替える土台は、テーマとスライド枚数が同じなら共通に使える
+    payload = f"{RENDER_FORMAT_VERSION}:{presentation.theme}:{len(presentation.slides)}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _slide_index(filename: str) -> Optional[int]:
+    match = _SLIDE_PART_PATTERN.match(filename)
+    return int(match.group(1)) - 1 if match else None
+
+
+def _store_bytes(cache: ArtifactCache, key: str, data: bytes) -> None:
+    temp_path = cache.new_temp_path()
+    with open(temp_path, "wb") as f:
+        f.write(data)
+    cache.put(key, temp_path, collect=False)
+
+
+def _render_full(
+    presentation: Presentation,
+    file_path: str,
+    image_paths: Optional[Dict[str, str]] = None,
+) -> Tuple[Any, Dict[str, float]]:
+    start = time.perf_counter()
+
+    # テーマの配色・フォントを適用済みの原型を複製してPowerPointファイルを作成
+    pptx = new_themed_pptx(presentation.theme)
+
+    # 各スライドの生成
+    image_paths = image_paths or {}
+    for i, slide_data in enumerate(presentation.slides):
+        _add_slide(pptx, slide_data, is_title=(i == 0), image_path=image_paths.get(slide_data.image_url or ""))
+
+    built = time.perf_counter()
+    logger.debug(f"PowerPointファイルを保存: {file_path}")
+    pptx.save(file_path)
+    return pptx, {"render_build": built - start, "render_save": time.perf_counter() - built}
+
+
+def _render_with_slide_cache(presentation: Presentation, file_path: str, slide_cache_dir: str) -> Dict[str, float]:
+    # スライド単位のXMLと、それを差し込む土台のファイルをディスクにキャッシュする
+    slide_cache = ArtifactCache(os.path.join(slide_cache_dir, "slides"), PPTX_SLIDE_CACHE_MAX_BYTES, suffix=".xml")
+    skeleton_cache = ArtifactCache(os.path.join(slide_cache_dir, "skeletons"), PPTX_SLIDE_CACHE_MAX_BYTES, suffix=".pptx")
+    keys = [
+        slide_cache_key(presentation.theme, slide_data, is_title=(i == 0))
+        for i, slide_data in enumerate(presentation.slides)
+    ]
+    skeleton_key = _skeleton_key(presentation)
+    skeleton_path = skeleton_cache.get(skeleton_key)
+
+    if skeleton_path is None:
+        # 土台がない場合は全体をレンダリングし、その結果から各スライドと土台を登録する
+        pptx, timings = _render_full(presentation, file_path)
+        if len(pptx.slides) != len(keys):
+            # 生成できなかったスライドがある場合は対応関係が崩れるため登録しない
+            return timings
+        start = time.perf_counter()
+        # 保存時にpython-pptxがスライドのパーツ名を表示順に振り直すため、i番目はslide{i+1}.xmlになる
+        for key, slide in zip(keys, pptx.slides):
+            if not os.path.exists(slide_cache.path_for(key)):
+                _store_bytes(slide_cache, key, slide.part.blob)
+        temp_path = skeleton_cache.new_temp_path()
+        shutil.copyfile(file_path, temp_path)
+        skeleton_cache.put(skeleton_key, temp_path)
+        slide_cache.collect_garbage()
+        timings["render_slide_cache"] = time.perf_counter() - start
+        timings["slides_rendered"] = len(keys)
+        timings["slides_reused"] = 0
+        return timings
+
+    start = time.perf_counter()
+    slide_xmls: List[Optional[bytes]] = []
+    missing: List[int] = []
+    for i, key in enumerate(keys):
+        cached_path = slide_cache.get(key)
+        data = None
+        if cached_path is not None:
+            try:
+                with open(cached_path, "rb") as f:
+                    data = f.read()
+            except FileNotFoundError:
+                pass
+        if data is None:
+            missing.append(i)
+        slide_xmls.append(data)
+
+    # 変更されたスライドだけを小さなプレゼンテーションとしてレンダリングする
+    if missing:
+        pptx = new_themed_pptx(presentation.theme)
+        for i in missing:
+            _add_slide(pptx, presentation.slides[i], is_title=(i == 0))
+        if len(pptx.slides) != len(missing):
+            _, timings = _render_full(presentation, file_path)
+            return timings
+        for i, slide in zip(missing, pptx.slides):
+            slide_xmls[i] = slide.part.blob
+            _store_bytes(slide_cache, keys[i], slide_xmls[i])
+    built = time.perf_counter()
+
+    # 土台のファイルをコピーしながら、スライドのXMLだけを差し替える
+    with zipfile.ZipFile(skeleton_path) as source, zipfile.ZipFile(file_path, "w", zipfile.ZIP_DEFLATED) as target:
+        for info in source.infolist():
+            index = _slide_index(info.filename)
+            target.writestr(info, slide_xmls[index] if index is not None else source.read(info))
+    if missing:
+        slide_cache.collect_garbage()
+
+    return {
+        "render_build": built - start,
+        "render_assemble": time.perf_counter() - built,
+        "slides_rendered": len(missing),
+        "slides_reused": len(keys) - len(missing),
+    }
+
+
+def render_pptx_file(
+    presentation: Presentation,
+    file_path: str,
+    slide_cache_dir: Optional[str] = None,
+    image_paths: Optional[Dict[str, str]] = None,
+) -> Dict[str, float]:
+    """プレゼンテーションをPowerPointファイルとして指定パスに書き出し、段階ごとの所要時間を返す（ワーカープロセスで実行される）
+
+    slide_cache_dirを指定した場合はスライド単位でキャッシュし、変更されたスライドのみレンダリングする。
+    image_pathsはスライドのimage_urlから埋め込む画像ファイルのパスへの対応表。
+    """
+    # 画像を含むスライドは画像パーツへの参照を持つため、スライド単位のキャッシュを使わない
+    if slide_cache_dir and presentation.slides and not image_paths:
+        return _render_with_slide_cache(presentation, file_path, slide_cache_dir)
+    _, timings = _render_full(presentation, file_path, image_paths)
+    return timings
+
+
+def render_error_pptx_file(message: str, file_path: str) -> None:
+    """エラー内容を記載したデモ用の簡易ファイルを作成する"""
+    pptx = _new_pptx()
+    slide = pptx.slides.add_slide(pptx.slide_layouts[0])
+    title_shape = slide.shapes.title
+    if title_shape:
+        title_shape.text = "デモプレゼンテーション"
+
+    # サブタイトル
+    for shape in slide.placeholders:
+        if shape.placeholder_format.type == 2:  # サブタイトル
+            shape.text = "エラーが発生したため、デモファイルを生成しました"
+            break
+
+    # エラースライド
+    slide = pptx.slides.add_slide(pptx.slide_layouts[1])
+    title_shape = slide.shapes.title
+    if title_shape:
+        title_shape.text = "エラー情報"
+
+    content_shape = slide.placeholders[1]
+    text_frame = content_shape.text_frame
+    p = text_frame.paragraphs[0]
+    p.text = f"エラーが発生しました: {message}"
+
+    pptx.save(file_path)
+
+
+def _warm_worker() -> None:
+    # ワーカー起動時にpython-pptxを読み込み、全テーマの原型を作成しておく
+    warm_theme_prototypes()
+
+
+def _noop() -> None:
+    return None
+
+
+class RenderPool:
+    """PPTXレンダリングをプロセスプールで実行し、混雑時は受付を拒否する"""
+
+    def __init__(
+        self,
+        workers: int = PPTX_RENDER_WORKERS,
+        max_pending: int = PPTX_RENDER_MAX_PENDING,
+        start_method: str = PPTX_RENDER_START_METHOD,
+        slide_cache_dir: Optional[str] = None,
+    ):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.start_method = start_method
+        self.slide_cache_dir = slide_cache_dir
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._stats = {"completed": 0, "rejected": 0, "restarts": 0}
+
+    def start(self) -> None:
+        """ワーカープロセスを起動して事前に温めておく"""
+        with self._lock:
+            self._start()
+
+    def _start(self) -> None:
+        if self.workers <= 0 or self._executor is not None:
+            return
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context(self.start_method),
+            initializer=_warm_worker,
+        )
+        # ProcessPoolExecutorは必要になるまでプロセスを起動しないため、ワーカー数分の空タスクを投入する
+        for _ in range(self.workers):
+            self._executor.submit(_noop)
+        logger.info(f"PPTXレンダリングプールを起動しました: ワーカー数={self.workers}")
+
+    def _restart(self, broken: ProcessPoolExecutor) -> None:
+        """異常終了したプールを作り直す（同時に失敗した他のレンダリングが作り直した後であれば何もしない）"""
+        with self._lock:
+            if self._executor is not broken:
+                return
+            self._stats["restarts"] += 1
+            logger.warning("PPTXレンダリングのワーカープロセスが異常終了したため、プールを作り直します")
+            broken.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            self._start()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True, cancel_futures=True)
+                self._executor = None
+
+    async def render(
+        self,
+        presentation: Presentation,
+        file_path: str,
+        image_paths: Optional[Dict[str, str]] = None,
+    ) -> Dict[str, float]:
+        """プレゼンテーションをワーカーでレンダリングし、完了まで待機して所要時間の内訳を返す"""
+        if self._pending >= self.max_pending:
+            self._stats["rejected"] += 1
+            raise RenderPoolSaturated(f"レンダリングの待ち行列が上限({self.max_pending})に達しています")
+
+        self._pending += 1
+        try:
+            if self.workers <= 0:
+                timings = await asyncio.to_thread(
+                    render_pptx_file, presentation, file_path, self.slide_cache_dir, image_paths
+                )
+            else:
+                timings = await self._render_in_process(presentation, file_path, image_paths)
+            self._stats["completed"] += 1
+            return timings
+        finally:
+            self._pending -= 1
+
+    async def _render_in_process(
+        self,
+        presentation: Presentation,
+        file_path: str,
+        image_paths: Optional[Dict[str, str]],
+    ) -> Dict[str, float]:
+        loop = asyncio.get_running_loop()
+        # ワーカーの異常終了（メモリ不足による強制終了など）後は、作り直すまで全てのレンダリングが失敗するため
+        # プールを作り直して1回だけ再試行する
+        for _ in range(2):
+            self.start()
+            executor = self._executor
+            try:
+                return await loop.run_in_executor(
+                    executor, render_pptx_file, presentation, file_path, self.slide_cache_dir, image_paths
+                )
+            except BrokenProcessPool as e:
+                self._restart(executor)
+                error = e
+        raise RenderPoolUnavailable(f"PPTXレンダリングのワーカープロセスが異常終了しました: {str(error)}") from error
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "workers": self.workers,
+            "pending": self._pending,
+            "max_pending": self.max_pending,
+            **self._stats,
+        }
+
+
+def create_render_pool_from_env(slide_cache_dir: Optional[str] = None) -> RenderPool:
+    """環境変数の設定からレンダリングプールを作成する（スライド単位のキャッシュが無効ならslide_cache_dirは使わない）"""
+    return RenderPool(
+        PPTX_RENDER_WORKERS,
+        PPTX_RENDER_MAX_PENDING,
+        PPTX_RENDER_START_METHOD,
+        slide_cache_dir if PPTX_SLIDE_CACHE_ENABLED else None,
+    )
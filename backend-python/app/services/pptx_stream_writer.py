@@ -0,0 +1,253 @@
+import io
+import os
+import re
+import logging
+import threading
+import zipfile
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Tuple
+from xml.sax.saxutils import escape
+
+from app.schemas.presentation import Presentation, Slide
+from app.services.pptx_renderer import _add_slide
+from app.services.theme_templates import new_themed_pptx
+from app.services.themes import resolve_theme
+
+# ロガーの初期化
+logger = logging.getLogger(__name__)
+
+# 既定のレンダリングエンジン（auto: スライド数が多い場合のみストリーミング、stream: 常にストリーミング、pptx: python-pptx）
+PPTX_RENDER_ENGINE = os.getenv("PPTX_RENDER_ENGINE", "auto")
+# autoの場合にストリーミングで出力するスライド数の下限
+PPTX_STREAM_MIN_SLIDES = int(os.getenv("PPTX_STREAM_MIN_SLIDES", "200"))
+# レスポンスに書き出すチャンクの大きさ（バイト）
+PPTX_STREAM_CHUNK_BYTES = int(os.getenv("PPTX_STREAM_CHUNK_BYTES", str(64 * 1024)))
+
+RENDER_ENGINES = ("auto", "stream", "pptx")
+
+# テンプレート作成時にスライドへ書き込む目印（生成されたXMLのこの位置に内容を差し込む）
+_TITLE_MARKER = "__APG_TITLE__"
+_BODY_MARKER = "__APG_BODY__"
+# python-pptxと同じく、タブと改行以外の制御文字は_xHHHH_の形式で表記する
+_CONTROL_CHARS = re.compile(r"([\x00-\x08\x0B-\x1F])")
+_LINE_BREAK = re.compile("\n|\v")
+# 出力を再現可能にするため、zipの各エントリの日時は固定する
+_ZIP_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
+_SLIDE_RELATIONSHIP = re.compile(r'<Relationship Id="rId\d+" Type="[^"]+/slide" Target="slides/slide\d+\.xml"/>')
+_SLIDE_OVERRIDE = re.compile(r'<Override PartName="/ppt/slides/slide\d+\.xml" ContentType="([^"]+)"/>')
+_FIRST_SLIDE_ID = re.compile(r'<p:sldId id="256" r:id="rId(\d+)"/>')
+
+_templates: Dict[str, "StreamTemplate"] = {}
+_lock = threading.Lock()
+
+
+def choose_render_engine(requested: Optional[str], slide_count: int, has_images: bool = False) -> str:
+    """リクエストの指定（未指定なら既定値）とスライド数から、使うエンジン（streamまたはpptx）を決める"""
+    engine = (requested or PPTX_RENDER_ENGINE).lower()
+    if engine not in RENDER_ENGINES:
+        raise ValueError(f"不明なレンダリングエンジンです: {engine}（{', '.join(RENDER_ENGINES)}のいずれかを指定してください）")
+    # 画像の埋め込みはpython-pptxのみが対応している
+    if has_images:
+        return "pptx"
+    if engine == "auto":
+        return "stream" if slide_count >= PPTX_STREAM_MIN_SLIDES else "pptx"
+    return engine
+
+
+def _run_xml(text: str) -> str:
+    """段落内のテキストを、改行を<a:br/>で区切った<a:r>の並びにする（python-pptxのappend_textと同じ出力）"""
+    parts = []
+    for i, segment in enumerate(_LINE_BREAK.split(text)):
+        if i > 0:
+            parts.append("<a:br/>")
+        if segment:
+            segment = _CONTROL_CHARS.sub(lambda match: "_x%04X_" % ord(match.group(1)), segment)
+            parts.append(f"<a:r><a:t>{escape(segment)}</a:t></a:r>")
+    return "".join(parts)
+
+
+def _paragraph_xml(text: str, properties: str = "") -> str:
+    runs = _run_xml(text)
+    body = properties + runs
+    return f"<a:p>{body}</a:p>" if body else "<a:p/>"
+
+
+def _split_once(xml: str, marker: str) -> Tuple[str, str]:
+    head, found, tail = xml.partition(marker)
+    if not found:
+        raise ValueError(f"テンプレートに差し込み位置が見つかりません: {marker}")
+    return head, tail
+
+
+@dataclass
+class StreamTemplate:
+    """スライド数に依存しないパーツと、スライドのXMLを組み立てるための断片"""
+
+    static_parts: List[Tuple[str, bytes]]
+    content_types: Tuple[str, str]
+    slide_content_type: str
+    presentation_xml: Tuple[str, str]
+    presentation_rels: Tuple[str, str]
+    first_slide_rid: int
+    title_slide: Tuple[str, str]
+    content_slide: Tuple[str, str, str]
+    title_slide_rels: bytes
+    content_slide_rels: bytes
+
+    def slide_xml(self, slide: Slide, is_title: bool) -> bytes:
+        """スライド1枚分のXML（python-pptxエンジンの_add_slideと同じ内容）"""
+        title = "".join(_paragraph_xml(line) for line in slide.title.split("\n"))
+        if is_title:
+            head, tail = self.title_slide
+            xml = head + title + tail
+        else:
+            head, middle, tail = self.content_slide
+            body = "".join(_paragraph_xml(item, "<a:pPr/>") for item in slide.content) or "<a:p/>"
+            xml = head + title + middle + body + tail
+        return xml.encode("utf-8", "replace")
+
+
+def build_stream_template(theme: str) -> StreamTemplate:
+    """テーマ適用済みの原型に目印入りのスライドを追加して保存し、差し込み用の断片に分解する"""
+    pptx = new_themed_pptx(theme)
+    _add_slide(pptx, Slide(title=_TITLE_MARKER, content=[]), is_title=True)
+    _add_slide(pptx, Slide(title=_TITLE_MARKER, content=[_BODY_MARKER]), is_title=False)
+    buffer = io.BytesIO()
+    pptx.save(buffer)
+    with zipfile.ZipFile(buffer) as archive:
+        parts = {info.filename: archive.read(info) for info in archive.infolist()}
+
+    title_paragraph = f"<a:p><a:r><a:t>{_TITLE_MARKER}</a:t></a:r></a:p>"
+    body_paragraph = f"<a:p><a:pPr/><a:r><a:t>{_BODY_MARKER}</a:t></a:r></a:p>"
+    title_slide = _split_once(parts.pop("ppt/slides/slide1.xml").decode("utf-8"), title_paragraph)
+    content_head, content_rest = _split_once(parts.pop("ppt/slides/slide2.xml").decode("utf-8"), title_paragraph)
+    content_middle, content_tail = _split_once(content_rest, body_paragraph)
+
+    presentation_xml = parts.pop("ppt/presentation.xml").decode("utf-8")
+    first_slide = _FIRST_SLIDE_ID.search(presentation_xml)
+    if first_slide is None:
+        raise ValueError("テンプレートにスライドの一覧が見つかりません")
+    presentation_head, _ = _split_once(presentation_xml, "<p:sldIdLst>")
+    _, presentation_tail = _split_once(presentation_xml, "</p:sldIdLst>")
+
+    rels_xml = _SLIDE_RELATIONSHIP.sub("", parts.pop("ppt/_rels/presentation.xml.rels").decode("utf-8"))
+    content_types_xml = parts.pop("[Content_Types].xml").decode("utf-8")
+    slide_content_type = _SLIDE_OVERRIDE.search(content_types_xml).group(1)
+    content_types_xml = _SLIDE_OVERRIDE.sub("", content_types_xml)
+
+    return StreamTemplate(
+        static_parts=[
+            (name, data) for name, data in parts.items()
+            if not name.startswith("ppt/slides/")
+        ],
+        content_types=_split_once(content_types_xml, "</Types>"),
+        slide_content_type=slide_content_type,
+        presentation_xml=(presentation_head + "<p:sldIdLst>", "</p:sldIdLst>" + presentation_tail),
+        presentation_rels=_split_once(rels_xml, "</Relationships>"),
+        first_slide_rid=int(first_slide.group(1)),
+        title_slide=title_slide,
+        content_slide=(content_head, content_middle, content_tail),
+        title_slide_rels=parts["ppt/slides/_rels/slide1.xml.rels"],
+        content_slide_rels=parts["ppt/slides/_rels/slide2.xml.rels"],
+    )
+
+
+def get_stream_template(theme: str) -> StreamTemplate:
+    """テーマごとのテンプレートを返す（初回のみ作成し、以降はプロセス内で再利用する）"""
+    theme = resolve_theme(theme)
+    template = _templates.get(theme)
+    if template is None:
+        with _lock:
+            template = _templates.get(theme)
+            if template is None:
+                template = _templates[theme] = build_stream_template(theme)
+    return template
+
+
+class _ChunkSink:
+    """zipfileの書き込み先（シークできないストリームとして扱われ、書き込まれた分を順に取り出せる）"""
+
+    def __init__(self):
+        self._buffer = bytearray()
+
+    def write(self, data: bytes) -> int:
+        self._buffer.extend(data)
+        return len(data)
+
+    def flush(self) -> None:
+        return None
+
+    def drain(self, min_bytes: int = 0) -> Iterator[bytes]:
+        if self._buffer and len(self._buffer) >= min_bytes:
+            chunk = bytes(self._buffer)
+            self._buffer.clear()
+            yield chunk
+
+
+def _zip_info(name: str) -> zipfile.ZipInfo:
+    info = zipfile.ZipInfo(name, date_time=_ZIP_DATE_TIME)
+    info.compress_type = zipfile.ZIP_DEFLATED
+    return info
+
+
+def iter_pptx_stream(presentation: Presentation, chunk_size: int = PPTX_STREAM_CHUNK_BYTES) -> Iterator[bytes]:
+    """プレゼンテーションのPPTXをzipのパーツ単位で組み立て、chunk_sizeごとのバイト列として順に返す
+
+    python-pptxのオブジェクトを構築せず、スライドのXMLを1枚ずつ書き出すため、
+    スライド数によらずメモリ使用量はほぼ一定で、最初のチャンクはすぐに返る。
+    """
+    template = get_stream_template(presentation.theme)
+    slide_count = len(presentation.slides)
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, "w", zipfile.ZIP_DEFLATED) as archive:
+        # スライドの一覧を含むパーツは、1枚ずつ追記しながら書き出す
+        with archive.open(_zip_info("[Content_Types].xml"), "w") as part:
+            part.write(template.content_types[0].encode("utf-8"))
+            for i in range(slide_count):
+                part.write(
+                    f'<Override PartName="/ppt/slides/slide{i + 1}.xml" '
+                    f'ContentType="{template.slide_content_type}"/>'.encode("utf-8")
+                )
+            part.write(b"</Types>" + template.content_types[1].encode("utf-8"))
+        # 応答をすぐに開始できるよう、最初のパーツは大きさによらず送り出す
+        yield from sink.drain()
+
+        for name, data in template.static_parts:
+            archive.writestr(_zip_info(name), data)
+            yield from sink.drain(chunk_size)
+
+        with archive.open(_zip_info("ppt/presentation.xml"), "w") as part:
+            part.write(template.presentation_xml[0].encode("utf-8"))
+            for i in range(slide_count):
+                part.write(f'<p:sldId id="{256 + i}" r:id="rId{template.first_slide_rid + i}"/>'.encode("utf-8"))
+            part.write(template.presentation_xml[1].encode("utf-8"))
+
+        with archive.open(_zip_info("ppt/_rels/presentation.xml.rels"), "w") as part:
+            part.write(template.presentation_rels[0].encode("utf-8"))
+            for i in range(slide_count):
+                part.write(
+                    f'<Relationship Id="rId{template.first_slide_rid + i}" '
+                    "Type=\"http://schemas.openxmlformats.org/officeDocument/2006/relationships/slide\" "
+                    f'Target="slides/slide{i + 1}.xml"/>'.encode("utf-8")
+                )
+            part.write(b"</Relationships>" + template.presentation_rels[1].encode("utf-8"))
+        yield from sink.drain(chunk_size)
+
+        for i, slide in enumerate(presentation.slides):
+            is_title = i == 0
+            archive.writestr(_zip_info(f"ppt/slides/slide{i + 1}.xml"), template.slide_xml(slide, is_title))
+            archive.writestr(
+                _zip_info(f"ppt/slides/_rels/slide{i + 1}.xml.rels"),
+                template.title_slide_rels if is_title else template.content_slide_rels,
+            )
+            yield from sink.drain(chunk_size)
+    # 中央ディレクトリを含む残りを書き出す
+    yield from sink.drain()
+
+
+def write_pptx_stream(presentation: Presentation, file_path: str) -> None:
+    """iter_pptx_streamの出力をファイルに書き出す"""
+    with open(file_path, "wb") as f:
+        for chunk in iter_pptx_stream(presentation):
+            f.write(chunk)
@@ -1,72 +1,217 @@
 import os
 import json
 import uuid
+import hashlib
 import logging
 import traceback
 import asyncio
+import time
+import threading
 from datetime import datetime
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, AsyncIterator, Iterator, Tuple, Callable
 import tempfile
 
 # ロガーの初期化
 logger = logging.getLogger(__name__)
 
-# OpenAIのインポート
-try:
-    from openai import OpenAI
-    logger.info(f"OpenAI library imported successfully")
-except ImportError:
-    logger.error("OpenAIライブラリがインストールされていません")
-    raise
-except Exception as e:
-    logger.error(f"OpenAIライブラリのインポート中にエラーが発生しました: {str(e)}")
-    raise
-
-from pptx import Presentation as PPTXPresentation
-from pptx.util import Inches, Pt
-
-from app.schemas.presentation import Presentation, Slide, PresentationOptions
+from app.schemas.presentation import Presentation, Slide, PresentationOptions, SlideUpdate
+from app.services.llm_cache import create_llm_cache_from_env, make_cache_key
+from app.services.slide_stream_parser import SlideStreamParser
+from app.services.json_repair import OutlineParseError, coerce_slide, outline_json, parse_outline, repair_json
+from app.services.llm_client import create_async_client, UpstreamLimiter, OPENAI_MAX_CONCURRENCY
+from app.services.resilience import ResilientCaller, CircuitOpenError
+from app.services.admission import AdmissionController
+from app.services.near_duplicate import create_near_duplicate_index_from_env
+from app.services.long_document import is_long_document, generate_outline_map_reduce
+from app.services.tokenizer import count_tokens
+from app.services.artifact_cache import ArtifactCache, presentation_content_hash, create_shared_artifact_index_from_env
+from app.services.pptx_renderer import RenderPoolSaturated, RenderPoolUnavailable, create_render_pool_from_env, render_error_pptx_file
+from app.services.themes import get_theme_settings
+from app.services.theme_templates import warm_theme_prototypes
+from app.services.pptx_stream_writer import choose_render_engine, iter_pptx_stream
+from app.services.presentation_store import create_presentation_store_from_env
+from app.services.single_flight import SingleFlight
+from app.services.input_compaction import compact_input
+from app.services.image_service import IMAGE_URL_PREFIX, create_image_pipeline_from_env
+from app.services.preview_renderer import PreviewRenderer, PREVIEW_RESPONSE_CACHE_MAX_ENTRIES
+from app.services.response_cache import BodyCache, CachedBody, serialize_json
+from app.services.metrics import (
+    REGISTRY, STAGE_LATENCY, LLM_TOKENS, ERRORS, INPUT_COMPACTION_TOKENS, SLIDE_RENDER_EVENTS, RENDER_ENGINE_EVENTS,
+    OUTLINE_PARSE_EVENTS, OUTLINE_REPAIRS,
+)
 
 # OpenAIクライアントの初期化
 api_key = os.getenv("OPENAI_API_KEY")
 if not api_key:
     logger.error("OpenAI API Keyが設定されていません。環境変数OPENAI_API_KEYを設定してください。")
-    # デバッグ用にすべての環境変数をログに出力（本番環境では削除すること）
-    logger.debug(f"利用可能な環境変数: {list(os.environ.keys())}")
 
-# OpenAIクライアントのインスタンス作成
-try:
-    client = OpenAI(api_key=api_key) if api_key else None
-    logger.info(f"OpenAI client initialized: {'設定済み' if client else '未設定'}")
-except Exception as e:
-    logger.error(f"OpenAIクライアント初期化エラー: {str(e)}")
-    client = None
+# OpenAIクライアント（接続プールを全リクエストで共有）。起動を速くするため初回利用時または起動後のウォームアップで作成する
+client = None
+_client_initialized = False
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """OpenAIクライアントを返す（未作成なら作成する。APIキー未設定や作成に失敗した場合はNone）"""
+    global client, _client_initialized
+    if client is None and not _client_initialized:
+        # ウォームアップのスレッドと最初のリクエストが同時に作成しないようにする
+        with _client_lock:
+            if client is None and not _client_initialized:
+                try:
+                    client = create_async_client(api_key)
+                    logger.info(f"OpenAI client initialized: {'設定済み' if client else '未設定'}")
+                except Exception as e:
+                    logger.error(f"OpenAIクライアント初期化エラー: {str(e)}")
+                    client = None
+                _client_initialized = True
+    return client
+
+# 使用するモデル
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4")
+
+# 上流APIへの同時呼び出し数の上限
+upstream_limiter = UpstreamLimiter(OPENAI_MAX_CONCURRENCY)
+
+# LLMレスポンスのキャッシュ（同一テキスト・同一オプションの再生成を省略する）
+llm_cache = create_llm_cache_from_env()
+
+# 上流API呼び出しのタイムアウト・再試行・ヘッジ・サーキットブレーカー
+upstream_resilience = ResilientCaller()
+
+# 過去の入力と似ている（軽微な修正のみの）入力はアウトラインを再利用する（NEAR_DUPLICATE_ENABLED=true時のみ）
+near_duplicate_index = create_near_duplicate_index_from_env()
+
+# 生成の受付制御（実行中・待機中の生成数と直近の上流APIの応答時間から待ち時間を見積もり、締め切りに間に合わない生成は拒否する）
+generation_admission = AdmissionController(latency_estimate=lambda: upstream_resilience.latencies.percentile(50))
+
+# 同一テキスト・同一オプションで同時に実行中の生成を1回の上流呼び出しにまとめる
+upstream_flights = SingleFlight()
 
 # 一時ファイル保存用のディレクトリ
 TEMP_DIR = tempfile.gettempdir()
 logger.info(f"一時ファイル保存ディレクトリ: {TEMP_DIR}")
 
-# メモリ内キャッシュ
-# 実際のアプリケーションではデータベース等の永続化層を使用する
-presentations_cache: Dict[str, Presentation] = {}
+# 生成済みPPTXファイルのキャッシュ（容量上限を超えると古いものから削除）
+PPTX_CACHE_DIR = os.getenv("PPTX_CACHE_DIR") or os.path.join(TEMP_DIR, "presentation_artifacts")
+PPTX_CACHE_MAX_BYTES = int(os.getenv("PPTX_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+artifact_cache = ArtifactCache(PPTX_CACHE_DIR, PPTX_CACHE_MAX_BYTES)
+# 複数ワーカー・複数ノード間で生成済みファイルを共有するインデックス（Redis利用時のみ）
+shared_artifact_index = create_shared_artifact_index_from_env()
 
+# PPTXレンダリング用のプロセスプール（初回利用時または起動時に開始）
+# スライド単位のレンダリング結果は生成済みPPTXのキャッシュと同じディスクに置く
+render_pool = create_render_pool_from_env(slide_cache_dir=os.path.join(PPTX_CACHE_DIR, "slide_cache"))
 
-async def generate_presentation_from_text(
-    text: str, 
-    options: Optional[PresentationOptions] = None
-) -> Presentation:
-    """テキストからプレゼンテーションを生成する"""
-    if options is None:
-        options = PresentationOptions()
-    
-    logger.info(f"プレゼンテーション生成開始: テーマ={options.theme}, スライド数={options.slide_count}")
-    logger.debug(f"入力テキスト(先頭100文字): {text[:100]}...")
-    
-    try:
-        # GPT-4を使用してテキストからスライド構造を生成
-        logger.info("OpenAI APIリクエスト送信中...")
-        
-        system_prompt = f"""あなたはプレゼンテーションのスペシャリストです。テキストから高品質なプレゼンテーションを作成します。
+# スライドに埋め込む画像の取得・変換（IMAGE_PROVIDER=noneの場合はNone）
+image_pipeline = create_image_pipeline_from_env()
+
+# ブラウザ表示用のプレビュー（スライドごとのSVGと、組み立て済みの応答本文をそれぞれ内容のハッシュ値でキャッシュ）
+preview_renderer = PreviewRenderer()
+preview_cache = BodyCache(PREVIEW_RESPONSE_CACHE_MAX_ENTRIES)
+
+# 詳細取得API（フロントエンドが繰り返し取得する）のシリアライズ済み応答本文（プレゼンテーションIDごとに最新の版を保持）
+PRESENTATION_JSON_CACHE_MAX_ENTRIES = int(os.getenv("PRESENTATION_JSON_CACHE_MAX_ENTRIES", "1024"))
+presentation_json_cache = BodyCache(PRESENTATION_JSON_CACHE_MAX_ENTRIES)
+
+# 生成済みプレゼンテーションの保存先（PRESENTATION_STOREでメモリ内/SQLiteを切り替え）
+presentation_store = create_presentation_store_from_env()
+
+# キャッシュ・同時実行数の統計をメトリクスとして公開（出力時に現在の値を参照する）
+REGISTRY.callback(
+    "llm_cache_events_total", "LLMレスポンスキャッシュのヒット/ミス数",
+    lambda: {(name,): llm_cache.stats()[name] for name in ("memory_hits", "disk_hits", "misses", "evictions")},
+    ["result"], type_name="counter",
+)
+REGISTRY.callback(
+    "near_duplicate_decisions_total", "類似入力インデックスの判定結果（exact/reused/patched/miss）の件数",
+    lambda: {
+        (name,): near_duplicate_index.stats()[name] for name in ("exact", "reused", "patched", "miss")
+    } if near_duplicate_index else {},
+    ["decision"], type_name="counter",
+)
+REGISTRY.callback(
+    "image_pipeline_events_total", "画像の取得・キャッシュの件数",
+    lambda: {(name,): value for name, value in image_pipeline.stats().items()} if image_pipeline else {},
+    ["result"], type_name="counter",
+)
+REGISTRY.callback(
+    "preview_cache_events_total", "プレビューのスライド単位キャッシュのヒット/ミス数",
+    lambda: {(name,): preview_renderer.stats()[name] for name in ("hits", "misses", "evictions")},
+    ["result"], type_name="counter",
+)
+REGISTRY.callback(
+    "presentation_json_cache_events_total", "詳細取得APIの応答本文キャッシュのヒット/ミス数",
+    lambda: {(name,): presentation_json_cache.stats()[name] for name in ("hits", "misses", "evictions")},
+    ["result"], type_name="counter",
+)
+REGISTRY.callback(
+    "pptx_cache_events_total", "生成済みPPTXキャッシュのヒット/ミス数",
+    lambda: {(name,): value for name, value in artifact_cache.stats().items()},
+    ["result"], type_name="counter",
+)
+REGISTRY.callback(
+    "llm_upstream_in_flight", "実行中の上流API呼び出し数", lambda: upstream_limiter.in_flight,
+)
+REGISTRY.callback(
+    "llm_upstream_waiting", "同時実行数の上限で待機中の上流API呼び出し数", lambda: upstream_limiter.waiting,
+)
+REGISTRY.callback(
+    "llm_upstream_queue_wait_seconds_total", "上流API呼び出しの待機時間の合計",
+    lambda: upstream_limiter.queue_wait_seconds_total, type_name="counter",
+)
+REGISTRY.callback(
+    "llm_resilience_events_total", "上流API呼び出しの再試行・タイムアウト・ヘッジ等の回数",
+    lambda: {
+        (name,): upstream_resilience.stats()[name]
+        for name in ("calls", "retries", "timeouts", "hedges", "hedge_wins", "failures")
+    },
+    ["event"], type_name="counter",
+)
+REGISTRY.callback(
+    "llm_circuit_open", "サーキットブレーカーの状態（0=閉、0.5=半開、1=開）",
+    lambda: {"closed": 0, "half_open": 0.5, "open": 1}[upstream_resilience.breaker.state],
+)
+REGISTRY.callback(
+    "llm_single_flight_coalesced_total", "実行中の同一リクエストに合流した回数",
+    lambda: upstream_flights.coalesced, type_name="counter",
+)
+REGISTRY.callback(
+    "pptx_render_pending", "実行中・待機中のレンダリング数", lambda: render_pool.stats()["pending"],
+)
+REGISTRY.callback(
+    "generation_in_flight", "受付制御で実行中の生成数", lambda: generation_admission.in_flight,
+)
+REGISTRY.callback(
+    "generation_queued", "受付制御で実行の開始を待っている生成数", lambda: generation_admission.queued,
+)
+REGISTRY.callback(
+    "generation_estimated_wait_seconds", "新たに受け付けた生成が実行を開始するまでの待ち時間の見積もり",
+    lambda: generation_admission.estimate_wait(),
+)
+REGISTRY.callback(
+    "generation_admission_total", "受付制御の結果ごとの件数（admitted/rejected/expired）",
+    lambda: {(name,): generation_admission.stats()[name] for name in ("admitted", "rejected", "expired")},
+    ["result"], type_name="counter",
+)
+
+
+def outline_recovery_ratio() -> float:
+    """崩れていたアウトラインのうち、全体を再生成せずに全スライドを復元できた割合（崩れた出力がなければ1）"""
+    recovered = sum(OUTLINE_PARSE_EVENTS.value(result=result) for result in ("repaired", "continued"))
+    lost = sum(OUTLINE_PARSE_EVENTS.value(result=result) for result in ("partial", "failed"))
+    total = recovered + lost
+    return recovered / total if total else 1.0
+
+
+REGISTRY.callback(
+    "llm_outline_recovery_ratio", "崩れていたアウトラインを修復または続きの生成で復元できた割合", outline_recovery_ratio,
+)
+
+
+def build_system_prompt(options: PresentationOptions) -> str:
+    """生成オプションからシステムプロンプトを組み立てる"""
+    return f"""あなたはプレゼンテーションのスペシャリストです。テキストから高品質なプレゼンテーションを作成します。
 以下のテーマでスライドを作成してください: {options.theme}
 スライド数の目安は約{options.slide_count}枚です。
 各スライドにはタイトルとコンテンツのリストを含めてください。
@@ -80,238 +225,712 @@ async def generate_presentation_from_text(
   ]
 }}
 """
-        logger.debug(f"System prompt: {system_prompt}")
-        
-        # OpenAI APIの呼び出し
+
+
+def build_messages(system_prompt: str, text: str) -> List[Dict[str, str]]:
+    """Chat Completions APIに渡すメッセージを組み立てる"""
+    return [
+        {
+            "role": "system",
+            "content": system_prompt
+        },
+        {
+            "role": "user",
+            "content": text
+        }
+    ]
+
+
+def slide_from_data(index: int, slide_data: Dict[str, Any]) -> Optional[Slide]:
+    """LLMが返したスライドデータをSlideオブジェクトに変換する（本文が文字列なら行ごとのリストにする。不正なデータはNone）"""
+    slide = coerce_slide(slide_data)
+    if slide is None:
+        logger.warning(f"スライド{index}のデータを変換できないためスキップします")
+    return slide
+
+
+async def save_new_presentation(slides: List[Slide], options: PresentationOptions) -> Presentation:
+    """新しいIDでプレゼンテーションを作成し、キャッシュに保存する"""
+    presentation_id = str(uuid.uuid4())
+    presentation = Presentation(
+        id=presentation_id,
+        slides=slides,
+        theme=options.theme,
+        created_at=datetime.now().isoformat(),
+        download_url=f"/api/presentations/{presentation_id}/download"
+    )
+
+    # ストアに保存
+    with STAGE_LATENCY.time(stage="store_put"):
+        await presentation_store.aput(presentation)
+    logger.info(f"プレゼンテーション生成完了: ID={presentation_id}, スライド数={len(slides)}")
+    return presentation
+
+
+async def compact_request_text(text: str, options: PresentationOptions) -> str:
+    """重複行・余分な空白を除いた入力テキストを返し、削減できたトークン数を記録する"""
+    with STAGE_LATENCY.time(stage="input_compaction"):
+        result = await asyncio.to_thread(compact_input, text, options.slide_count, OPENAI_MODEL)
+    INPUT_COMPACTION_TOKENS.inc(result.original_tokens, type="original")
+    INPUT_COMPACTION_TOKENS.inc(result.compacted_tokens, type="compacted")
+    INPUT_COMPACTION_TOKENS.inc(result.saved_tokens, type="saved")
+    logger.info(
+        f"入力テキストを圧縮しました: {result.original_tokens} -> {result.compacted_tokens}トークン "
+        f"(削減={result.saved_tokens})"
+    )
+    return result.text
+
+
+async def request_completion(system_prompt: str, user_content: str) -> str:
+    """Chat Completions APIを呼び出し、JSON形式の応答本文を返す"""
+    logger.info("OpenAI APIリクエスト送信中...")
+
+    # OpenAI APIの呼び出し
+    try:
+        openai_client = get_client()
+        if not openai_client:
+            raise ValueError("OpenAI クライアントが初期化されていません")
+
+        async with upstream_limiter.acquire():
+            with STAGE_LATENCY.time(stage="llm_request"):
+                # 試行ごとのタイムアウト・再試行・ヘッジはupstream_resilienceで行う
+                # ヘッジは上流の同時呼び出し数の上限を超えないよう、枠が空いている場合のみ送る
+                response = await upstream_resilience.call(
+                    lambda: openai_client.chat.completions.create(
+                        model=OPENAI_MODEL,
+                        messages=build_messages(system_prompt, user_content),
+                        response_format={"type": "json_object"}  # JSON形式を強制
+                    ),
+                    hedge_slot=upstream_limiter.try_acquire,
+                )
+        logger.info("OpenAI APIからレスポンスを受信しました")
+        logger.debug(f"Response: {response}")
+        if response.usage:
+            LLM_TOKENS.inc(response.usage.prompt_tokens, type="prompt")
+            LLM_TOKENS.inc(response.usage.completion_tokens, type="completion")
+    except CircuitOpenError:
+        # 呼び出し元で503として扱えるよう、そのまま送出する
+        ERRORS.inc(stage="llm_circuit_open")
+        raise
+    except Exception as e:
+        ERRORS.inc(stage="llm_request")
+        logger.error(f"OpenAI API呼び出しエラー: {str(e)}")
+        raise ValueError(f"OpenAI APIの呼び出しに失敗しました: {str(e)}")
+
+    # APIレスポンスからスライドデータを取得
+    response_content = response.choices[0].message.content
+    if not response_content:
+        logger.error("OpenAI APIから空のレスポンスを受信")
+        raise ValueError("レスポンスの生成に失敗しました")
+    return response_content
+
+
+def near_duplicate_scope(options: PresentationOptions, system_prompt: str) -> str:
+    """類似入力を照合する範囲（テキスト以外で出力に影響するテーマ・スライド数・モデル・プロンプト）"""
+    return make_cache_key("", options.theme, options.slide_count, OPENAI_MODEL, system_prompt)
+
+
+async def find_near_duplicate_outline(text: str, options: PresentationOptions, system_prompt: str) -> Optional[str]:
+    """過去の類似する入力のアウトライン（差分を当てたもの）を返す（見つからなければNone）"""
+    if near_duplicate_index is None:
+        return None
+    with STAGE_LATENCY.time(stage="near_duplicate"):
+        match = await asyncio.to_thread(
+            near_duplicate_index.lookup, text, near_duplicate_scope(options, system_prompt)
+        )
+    return match.outline if match is not None else None
+
+
+async def remember_outline(text: str, options: PresentationOptions, system_prompt: str, outline: str) -> None:
+    """生成したアウトラインを類似入力インデックスに登録する"""
+    if near_duplicate_index is None:
+        return
+    await asyncio.to_thread(
+        near_duplicate_index.add, text, near_duplicate_scope(options, system_prompt), outline
+    )
+
+
+def near_duplicate_report() -> Dict[str, Any]:
+    """類似入力インデックスの直近の判定結果"""
+    if near_duplicate_index is None:
+        return {"enabled": False}
+    return {"enabled": True, **near_duplicate_index.report()}
+
+
+async def generate_outline(text: str, options: PresentationOptions, system_prompt: str) -> str:
+    """入力の長さに応じて1回の呼び出しまたは分割統合でスライド構造(JSON文字列)を生成する"""
+    if is_long_document(text, OPENAI_MODEL):
+        # 長文はチャンクごとに並列でアウトライン化してから統合する
+        return await generate_outline_map_reduce(
+            text, options, system_prompt, request_completion, OPENAI_MODEL
+        )
+    # GPT-4を使用してテキストからスライド構造を生成
+    return await request_completion(system_prompt, text)
+
+
+OUTLINE_CONTINUATION_PROMPT = """
+前回の出力は途中で途切れました。作成済みのスライドの続きとして、{start}枚目以降の残り約{remaining}枚のスライドだけを作成してください。
+作成済みのスライドと内容が重複しないようにし、同じJSON形式（"slides"の一覧）で返してください。
+"""
+
+
+def build_continuation_input(text: str, slides: List[Slide]) -> str:
+    """続きの生成に渡す入力（元のテキストと、作成済みのスライドのタイトルのみ）を組み立てる"""
+    outline = "\n".join(f"{i + 1}. {slide.title}" for i, slide in enumerate(slides))
+    return f"{text}\n\n作成済みのスライド:\n{outline}"
+
+
+async def continue_truncated_outline(
+    text: str, options: PresentationOptions, system_prompt: str, slides: List[Slide]
+) -> List[Slide]:
+    """途中で途切れたアウトラインの残りのスライドだけを生成する（全体の再生成より出力が短く済む）"""
+    remaining = max(1, options.slide_count - len(slides))
+    prompt = system_prompt + OUTLINE_CONTINUATION_PROMPT.format(start=len(slides) + 1, remaining=remaining)
+    with STAGE_LATENCY.time(stage="llm_continuation"):
+        content = await request_completion(prompt, build_continuation_input(text, slides))
+    return parse_outline(content).slides
+
+
+async def parse_generated_outline(
+    content: str, text: str, options: PresentationOptions, system_prompt: str
+) -> Tuple[List[Slide], Optional[str]]:
+    """LLMの出力を寛容に解釈してスライドの一覧にする
+
+    崩れたJSONは修復し、末尾が途切れている場合のみ残りのスライドを追加で生成する。
+    戻り値の2つ目はキャッシュに保存するアウトライン（一部のスライドが欠けたままの場合はNone）。
+    """
+    try:
+        with STAGE_LATENCY.time(stage="json_parse"):
+            outline = parse_outline(content)
+    except OutlineParseError as e:
+        OUTLINE_PARSE_EVENTS.inc(result="failed")
+        ERRORS.inc(stage="json_parse")
+        logger.error(f"JSONパースエラー: {str(e)}")
+        logger.debug(f"パースできなかったJSON: {content}")
+        raise ValueError(f"JSONのパースに失敗しました: {str(e)}")
+
+    for repair in outline.repairs:
+        OUTLINE_REPAIRS.inc(repair=repair)
+    if outline.repairs:
+        logger.info(f"LLMの出力を修復しました: {', '.join(outline.repairs)}")
+    if not outline.truncated:
+        OUTLINE_PARSE_EVENTS.inc(result=outline.status)
+        return outline.slides, content if outline.status == "ok" else outline_json(outline.slides)
+
+    slides = outline.slides
+    tail: List[Slide] = []
+    # 長文の分割統合は入力が大きく続きの生成も高くつくため、取り出せたスライドのみを使う
+    if not is_long_document(text, OPENAI_MODEL):
+        logger.warning(f"LLMの出力が途中で途切れています。{len(slides) + 1}枚目以降の続きを生成します")
         try:
-            if not client:
-                raise ValueError("OpenAI クライアントが初期化されていません")
-            
-            # 非同期コンテキストでの同期API呼び出し
-            response = await asyncio.to_thread(
-                client.chat.completions.create,
-                model="gpt-4",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": system_prompt
-                    },
-                    {
-                        "role": "user",
-                        "content": text
-                    }
-                ],
-                response_format={"type": "json_object"}  # JSON形式を強制
-            )
-            logger.info("OpenAI APIからレスポンスを受信しました")
-            logger.debug(f"Response: {response}")
+            tail = await continue_truncated_outline(text, options, system_prompt, slides)
+        except CircuitOpenError:
+            raise
         except Exception as e:
-            logger.error(f"OpenAI API呼び出しエラー: {str(e)}")
-            raise ValueError(f"OpenAI APIの呼び出しに失敗しました: {str(e)}")
+            logger.warning(f"続きの生成に失敗しました: {str(e)}")
+    if tail:
+        OUTLINE_PARSE_EVENTS.inc(result="continued")
+        slides = slides + tail
+        return slides, outline_json(slides)
+    if slides:
+        OUTLINE_PARSE_EVENTS.inc(result="partial")
+        logger.warning(f"途切れる前のスライドのみを使用します: スライド数={len(slides)}")
+        return slides, None
+    OUTLINE_PARSE_EVENTS.inc(result="failed")
+    ERRORS.inc(stage="json_parse")
+    raise ValueError("JSONのパースに失敗しました: 出力が途中で途切れておりスライドを復元できません")
+
+
+async def generate_presentation_from_text(
+    text: str, 
+    options: Optional[PresentationOptions] = None,
+    on_progress: Optional[Callable[[str, float], None]] = None
+) -> Presentation:
+    """テキストからプレゼンテーションを生成する（on_progressには処理段階と進捗率が通知される）"""
+    if options is None:
+        options = PresentationOptions()
+
+    def report(stage: str, progress: float) -> None:
+        if on_progress is not None:
+            on_progress(stage, progress)
+    
+    logger.info(f"プレゼンテーション生成開始: テーマ={options.theme}, スライド数={options.slide_count}")
+    logger.debug(f"入力テキスト(先頭100文字): {text[:100]}...")
+    
+    try:
+        system_prompt = build_system_prompt(options)
+        logger.debug(f"System prompt: {system_prompt}")
 
-        # APIレスポンスからスライドデータを取得
-        response_content = response.choices[0].message.content
-        if not response_content:
-            logger.error("OpenAI APIから空のレスポンスを受信")
-            raise ValueError("レスポンスの生成に失敗しました")
+        # キャッシュキーも圧縮後のテキストから計算し、空白の違いだけの入力を同一視する
+        text = await compact_request_text(text, options)
+
+        # 同一入力のレスポンスがキャッシュにあればAPI呼び出しを省略
+        cache_key = make_cache_key(text, options.theme, options.slide_count, OPENAI_MODEL, system_prompt)
+        response_content = await llm_cache.aget(cache_key)
+        cache_hit = response_content is not None
+
+        if cache_hit:
+            logger.info(f"LLMレスポンスキャッシュにヒットしました: key={cache_key[:12]}")
+        else:
+            # 軽微な修正のみの入力は過去のアウトラインに差分を当てて再利用する
+            response_content = await find_near_duplicate_outline(text, options, system_prompt)
+        if response_content is None:
+            report("llm", 0.1)
+            # 同時に届いた同一リクエストとは上流呼び出しを共有する
+            response_content = await upstream_flights.do(
+                cache_key, lambda: generate_outline(text, options, system_prompt)
+            )
 
         logger.debug(f"OpenAI APIレスポンス: {response_content[:300]}...")
 
-        # JSONパース
-        try:
-            parsed_response = json.loads(response_content)
-            slides_data = parsed_response.get("slides", [])
-            logger.info(f"パース成功: スライド数={len(slides_data)}")
-        except json.JSONDecodeError as e:
-            logger.error(f"JSONパースエラー: {str(e)}")
-            logger.debug(f"パースできなかったJSON: {response_content}")
-            raise ValueError(f"JSONのパースに失敗しました: {str(e)}")
-        
-        # Slideオブジェクトに変換
-        slides = []
-        for i, slide_data in enumerate(slides_data):
-            try:
-                slide = Slide(
-                    title=slide_data["title"],
-                    content=slide_data["content"],
-                    image_url=slide_data.get("image_url")
-                )
-                slides.append(slide)
-            except KeyError as e:
-                logger.warning(f"スライド{i}のデータに必須キーがありません: {str(e)}")
-                # エラーをスキップして続行
-                continue
-
-        # 画像生成と追加（実装予定）
-        if options.include_images and api_key:
-            logger.info("画像生成機能は現在実装中...")
-            # TODO: DALL-Eや他の画像生成APIの実装
-
-        # プレゼンテーションデータの作成
-        presentation_id = str(uuid.uuid4())
-        presentation = Presentation(
-            id=presentation_id,
-            slides=slides,
-            theme=options.theme,
-            created_at=datetime.now().isoformat(),
-            download_url=f"/api/presentations/{presentation_id}/download"
-        )
+        report("parsing", 0.8)
+
+        # JSONパース（崩れた出力は修復し、途切れた出力は続きのみを生成する）
+        slides, outline = await parse_generated_outline(response_content, text, options, system_prompt)
+        logger.info(f"パース成功: スライド数={len(slides)}")
+
+        # 画像はパース直後に取得を始め、レスポンスのキャッシュへの保存と並行して進める（スライドごとに並列）
+        image_tasks = None
+        if options.include_images and image_pipeline is not None:
+            report("images", 0.85)
+            image_tasks = [image_pipeline.schedule(slide) for slide in slides]
 
-        # キャッシュに保存
-        presentations_cache[presentation_id] = presentation
-        logger.info(f"プレゼンテーション生成完了: ID={presentation_id}, スライド数={len(slides)}")
+        # 全スライドを解釈できたレスポンスのみキャッシュする（修復した場合は正規化したアウトライン）
+        if not cache_hit and outline is not None:
+            await llm_cache.aset(cache_key, outline)
+            await remember_outline(text, options, system_prompt, outline)
+
+        if image_tasks is not None:
+            with STAGE_LATENCY.time(stage="images"):
+                slides = await image_pipeline.attach(slides, image_tasks)
+
+        report("saving", 0.9)
+        presentation = await save_new_presentation(slides, options)
 
         return presentation
 
+    except CircuitOpenError:
+        raise
     except Exception as e:
+        ERRORS.inc(stage="generate")
         logger.error(f"プレゼンテーション生成エラー: {str(e)}")
         logger.debug(f"詳細なエラー: {traceback.format_exc()}")
         raise ValueError(f"プレゼンテーションの生成中にエラーが発生しました: {str(e)}")
 
 
+async def stream_presentation_from_text(
+    text: str,
+    options: Optional[PresentationOptions] = None
+) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """テキストからプレゼンテーションを生成し、スライドが完成するたびに (イベント名, データ) を返す
+
+    スライドごとに "slide" イベントを返し、最後に保存済みプレゼンテーションを
+    "presentation" イベントとして返す。
+    """
+    if options is None:
+        options = PresentationOptions()
+
+    logger.info(f"ストリーミング生成開始: テーマ={options.theme}, スライド数={options.slide_count}")
+
+    system_prompt = build_system_prompt(options)
+    text = await compact_request_text(text, options)
+    cache_key = make_cache_key(text, options.theme, options.slide_count, OPENAI_MODEL, system_prompt)
+    cached_content = await llm_cache.aget(cache_key)
+    slides: List[Slide] = []
+    # 画像はスライドが届いた時点で取得を始め、残りのスライドの生成と並行して進める
+    image_tasks: List[Optional[asyncio.Task]] = []
+    pipeline = image_pipeline if options.include_images else None
+
+    def add_slide(slide: Slide) -> Dict[str, Any]:
+        slides.append(slide)
+        if pipeline is not None:
+            image_tasks.append(pipeline.schedule(slide))
+        return {"index": len(slides) - 1, "slide": slide.model_dump()}
+
+    if cached_content is None:
+        cached_content = await find_near_duplicate_outline(text, options, system_prompt)
+        if cached_content is not None:
+            await llm_cache.aset(cache_key, cached_content)
+            await remember_outline(text, options, system_prompt, cached_content)
+
+    if cached_content is None and is_long_document(text, OPENAI_MODEL):
+        # 長文は分割統合の結果がそろってからまとめて送信する
+        cached_content = await upstream_flights.do(
+            cache_key, lambda: generate_outline(text, options, system_prompt)
+        )
+        await llm_cache.aset(cache_key, cached_content)
+        await remember_outline(text, options, system_prompt, cached_content)
+
+    if cached_content is not None:
+        logger.info(f"LLMレスポンスキャッシュ・類似入力・長文モードのいずれかの結果を送信します: key={cache_key[:12]}")
+        for slide in parse_outline(cached_content).slides:
+            yield "slide", add_slide(slide)
+    else:
+        openai_client = get_client()
+        if not openai_client:
+            raise ValueError("OpenAI クライアントが初期化されていません")
+
+        logger.info("OpenAI APIストリーミングリクエスト送信中...")
+        parser = SlideStreamParser()
+        chunks: List[str] = []
+        async with upstream_limiter.acquire():
+            # ストリームの開始までを再試行の対象とする（受信済みの出力があるため途中からは再試行しない）
+            stream = await upstream_resilience.call(lambda: openai_client.chat.completions.create(
+                model=OPENAI_MODEL,
+                messages=build_messages(system_prompt, text),
+                response_format={"type": "json_object"},
+                stream=True
+            ), hedge=False)
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if not delta:
+                    continue
+                chunks.append(delta)
+                for slide_data in parser.feed(delta):
+                    slide = slide_from_data(len(slides), slide_data)
+                    if slide is None:
+                        continue
+                    yield "slide", add_slide(slide)
+
+        response_content = "".join(chunks)
+        logger.info(f"OpenAI APIストリーミング完了: スライド数={len(slides)}")
+        try:
+            recovered, outline = await parse_generated_outline(response_content, text, options, system_prompt)
+        except ValueError as e:
+            logger.warning(f"ストリーム全体のJSONパースに失敗したためキャッシュしません: {str(e)}")
+        else:
+            # 逐次パーサーで取り出したスライドを全体のパース結果と内容で対応付け、
+            # 取り出せなかったスライド（修復や続きの生成で得たもの）のみを追加で送る
+            streamed = list(slides)
+            order: List[int] = []
+            cursor = 0
+            for slide in recovered:
+                match = next((i for i in range(cursor, len(streamed)) if streamed[i] == slide), None)
+                if match is None:
+                    yield "slide", add_slide(slide)
+                    order.append(len(slides) - 1)
+                else:
+                    order.append(match)
+                    cursor = match + 1
+            # 保存するスライドの順序は全体のパース結果（キャッシュするアウトライン）に合わせる
+            order += [i for i in range(len(streamed)) if i not in order]
+            slides[:] = [slides[i] for i in order]
+            if pipeline is not None:
+                image_tasks[:] = [image_tasks[i] for i in order]
+            if outline is not None:
+                await llm_cache.aset(cache_key, outline)
+                await remember_outline(text, options, system_prompt, outline)
+
+    if pipeline is not None:
+        with STAGE_LATENCY.time(stage="images"):
+            slides = await pipeline.attach(slides, image_tasks)
+
+    presentation = await save_new_presentation(slides, options)
+    yield "presentation", presentation.model_dump()
+
+
+def _warm_up_sync() -> None:
+    # 重い依存関係の読み込みとクライアントの作成を済ませておく
+    get_client()
+    count_tokens("warm up", OPENAI_MODEL)
+    if render_pool.workers <= 0:
+        # スレッドでレンダリングする構成ではこのプロセスでpython-pptxとテーマの原型を使う
+        warm_theme_prototypes()
+
+
+async def warm_up() -> None:
+    """起動後にバックグラウンドで初回リクエストの準備を行う（起動やヘルスチェックは待たせない）"""
+    start = time.perf_counter()
+    try:
+        await asyncio.to_thread(_warm_up_sync)
+        logger.info(f"ウォームアップ完了: {time.perf_counter() - start:.2f}s")
+    except Exception as e:
+        logger.warning(f"ウォームアップに失敗しました: {str(e)}")
+
+
 def get_presentation_by_id(presentation_id: str) -> Optional[Presentation]:
-    """プレゼンテーションIDからプレゼンテーションデータを取得する"""
-    presentation = presentations_cache.get(presentation_id)
+    """プレゼンテーションIDからプレゼンテーションデータを取得する（存在しなければNone）"""
+    with STAGE_LATENCY.time(stage="store_get"):
+        presentation = presentation_store.get(presentation_id)
     if presentation:
-        logger.info(f"キャッシュからプレゼンテーションを取得: ID={presentation_id}")
+        logger.info(f"ストアからプレゼンテーションを取得: ID={presentation_id}")
     else:
         logger.warning(f"プレゼンテーションが見つかりません: ID={presentation_id}")
-        
-        # デモ用にダミーデータを返す（本番ではこの処理を削除）
-        if presentation_id:
-            dummy_presentation = Presentation(
-                id=presentation_id,
-                slides=[
-                    Slide(
-                        title="デモプレゼンテーション",
-                        content=["このプレゼンテーションはデモデータです", "実際のデータはキャッシュに保存されていませんでした"]
-                    ),
-                    Slide(
-                        title="テスト用スライド",
-                        content=["テスト用の内容項目1", "テスト用の内容項目2", "テスト用の内容項目3"]
-                    ),
-                    Slide(
-                        title="まとめ",
-                        content=["実運用時にはデータベースに保存することをお勧めします", "セッションデータの永続化を検討してください"]
-                    )
-                ],
-                theme="modern",
-                created_at=datetime.now().isoformat(),
-                download_url=f"/api/presentations/{presentation_id}/download"
-            )
-            # ダミーデータをキャッシュに保存
-            presentations_cache[presentation_id] = dummy_presentation
-            logger.info(f"デモ用のダミーデータを生成しました: ID={presentation_id}")
-            return dummy_presentation
-    
     return presentation
 
 
-async def generate_powerpoint_file(presentation: Presentation) -> str:
-    """プレゼンテーションをPowerPointファイルとして生成する"""
+async def fetch_presentation_by_id(presentation_id: str) -> Optional[Presentation]:
+    """イベントループから呼ぶget_presentation_by_id（共有ストアへの問い合わせはスレッドで行う）"""
+    with STAGE_LATENCY.time(stage="store_get"):
+        presentation = await presentation_store.aget(presentation_id)
+    if presentation is None:
+        logger.warning(f"プレゼンテーションが見つかりません: ID={presentation_id}")
+    return presentation
+
+
+def replace_slide(presentation: Presentation, index: int, slide: Slide) -> Presentation:
+    """指定位置のスライドを差し替えたプレゼンテーションを保存する（範囲外のindexはIndexError）"""
+    if not 0 <= index < len(presentation.slides):
+        raise IndexError(f"スライド番号が範囲外です: {index}")
+    slides = list(presentation.slides)
+    slides[index] = slide
+    # ストアが保持しているオブジェクトは書き換えず、新しいオブジェクトとして保存する
+    updated = presentation.model_copy(update={"slides": slides})
+    with STAGE_LATENCY.time(stage="store_put"):
+        presentation_store.put(updated)
+    logger.info(f"スライドを更新しました: ID={presentation.id}, index={index}")
+    return updated
+
+
+def update_slide(presentation_id: str, index: int, update: SlideUpdate) -> Optional[Presentation]:
+    """スライド1枚の内容を部分的に更新する（プレゼンテーションが存在しなければNone）"""
+    presentation = get_presentation_by_id(presentation_id)
+    if presentation is None:
+        return None
+    if not 0 <= index < len(presentation.slides):
+        raise IndexError(f"スライド番号が範囲外です: {index}")
+    # 指定された項目のみ更新する（タイトルと内容はnullで消せない）
+    changes = {
+        key: value for key, value in update.model_dump(exclude_unset=True).items()
+        if value is not None or key == "image_url"
+    }
+    slide = presentation.slides[index].model_copy(update=changes)
+    return replace_slide(presentation, index, slide)
+
+
+SLIDE_REGENERATION_PROMPT = """あなたはプレゼンテーションのスペシャリストです。既存のプレゼンテーションのうち、指定された1枚のスライドだけを作り直します。
+前後のスライドと内容が重複しないようにし、全体の構成の中での役割に合った内容にしてください。
+結果はJSON形式で返してください。次の形式に従ってください:
+{
+  "title": "スライドタイトル",
+  "content": ["コンテンツ項目1", "コンテンツ項目2"]
+}
+"""
+
+
+def build_slide_regeneration_input(
+    presentation: Presentation,
+    index: int,
+    instruction: Optional[str] = None,
+    source_text: Optional[str] = None,
+) -> str:
+    """スライドの再生成に必要な文脈（全体の構成・前後のスライド・対象スライド）だけを組み立てる"""
+    outline = "\n".join(f"{i + 1}. {slide.title}" for i, slide in enumerate(presentation.slides))
+    parts = [
+        f"テーマ: {presentation.theme}",
+        f"全体の構成:\n{outline}",
+    ]
+    if index > 0:
+        previous = presentation.slides[index - 1]
+        parts.append(f"前のスライド:\n{json.dumps(previous.model_dump(), ensure_ascii=False)}")
+    if index + 1 < len(presentation.slides):
+        following = presentation.slides[index + 1]
+        parts.append(f"次のスライド:\n{json.dumps(following.model_dump(), ensure_ascii=False)}")
+    current = presentation.slides[index]
+    parts.append(f"作り直すスライド（{index + 1}枚目）:\n{json.dumps(current.model_dump(), ensure_ascii=False)}")
+    if instruction:
+        parts.append(f"指示: {instruction}")
+    if source_text:
+        parts.append(f"参考テキスト:\n{source_text}")
+    return "\n\n".join(parts)
+
+
+async def regenerate_slide(
+    presentation_id: str,
+    index: int,
+    instruction: Optional[str] = None,
+    source_text: Optional[str] = None,
+) -> Optional[Presentation]:
+    """スライド1枚だけをLLMで作り直す（プレゼンテーションが存在しなければNone）"""
+    presentation = await fetch_presentation_by_id(presentation_id)
+    if presentation is None:
+        return None
+    if not 0 <= index < len(presentation.slides):
+        raise IndexError(f"スライド番号が範囲外です: {index}")
+
+    if source_text:
+        source_text = await compact_request_text(source_text, PresentationOptions(slide_count=1))
+    user_content = build_slide_regeneration_input(presentation, index, instruction, source_text)
+    response_content = await request_completion(SLIDE_REGENERATION_PROMPT, user_content)
+
+    try:
+        with STAGE_LATENCY.time(stage="json_parse"):
+            slide_data = repair_json(response_content).value
+    except OutlineParseError as e:
+        ERRORS.inc(stage="json_parse")
+        logger.error(f"JSONパースエラー: {str(e)}")
+        raise ValueError(f"JSONのパースに失敗しました: {str(e)}")
+
+    # モデルが一覧形式で返した場合は先頭のスライドを使う
+    if isinstance(slide_data, dict) and isinstance(slide_data.get("slides"), list) and slide_data["slides"]:
+        slide_data = slide_data["slides"][0]
+    slide = slide_from_data(index, slide_data) if isinstance(slide_data, dict) else None
+    if slide is None:
+        raise ValueError("スライドの再生成に失敗しました")
+    if image_pipeline is not None:
+        slide = (await image_pipeline.attach_images([slide]))[0]
+    return await asyncio.to_thread(replace_slide, presentation, index, slide)
+
+
+def admit_generation(deadline: float):
+    """締め切り（秒）までに生成を終えられる見込みがあれば実行枠を確保する（async withで使う。見込みがなければAdmissionRejected）"""
+    return generation_admission.admit(deadline)
+
+
+def check_upstream_available() -> None:
+    """サーキットブレーカーが開いている場合にCircuitOpenErrorを送出する"""
+    upstream_resilience.breaker.check_available()
+
+
+def upstream_health() -> Dict[str, Any]:
+    """ヘルスチェック用の上流API呼び出しの状態"""
+    stats = upstream_resilience.stats()
+    return {
+        "circuit_state": stats["circuit_state"],
+        "retry_after_seconds": round(upstream_resilience.breaker.retry_after(), 1),
+        "retry_budget": stats["retry_budget"],
+        "hedge_delay_seconds": stats["hedge_delay_seconds"],
+    }
+
+
+def get_image_path(name: str) -> Optional[str]:
+    """/api/images/{name}で配信する変換済み画像のパスを返す（存在しなければNone）"""
+    if image_pipeline is None:
+        return None
+    return image_pipeline.path_for_url(f"{IMAGE_URL_PREFIX}{name}")
+
+
+def resolve_image_paths(presentation: Presentation) -> Dict[str, str]:
+    """スライドのimage_urlから埋め込む画像ファイルのパスを求める（キャッシュにない画像は含めない）"""
+    if image_pipeline is None:
+        return {}
+    paths = {}
+    for slide in presentation.slides:
+        path = image_pipeline.path_for_url(slide.image_url)
+        if path is not None:
+            paths[slide.image_url] = path
+        elif slide.image_url:
+            logger.warning(f"画像が見つからないため埋め込みません: {slide.image_url}")
+    return paths
+
+
+def presentation_json_body(presentation_id: str) -> Optional[CachedBody]:
+    """詳細取得APIの応答本文を返す（存在しなければNone。ストアの版が同じであればシリアライズ済みの本文と圧縮結果を再利用する）"""
+    cached = presentation_json_cache.get(presentation_id)
+    if cached is not None:
+        # 版だけを確認し、変わっていなければ本文の読み込み・検証・シリアライズを省略する
+        with STAGE_LATENCY.time(stage="store_get"):
+            version = presentation_store.version(presentation_id)
+        if version is None:
+            return None
+        if cached.source == version:
+            return cached
+
+    with STAGE_LATENCY.time(stage="store_get"):
+        entry = presentation_store.get_versioned(presentation_id)
+    if entry is None:
+        logger.warning(f"プレゼンテーションが見つかりません: ID={presentation_id}")
+        return None
+    presentation, version = entry
+
+    with STAGE_LATENCY.time(stage="serialize"):
+        body = serialize_json(presentation.model_dump())
+    etag = f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+    if cached is not None and cached.etag == etag:
+        # 保存し直しただけで内容が同じ場合は圧縮結果を引き継ぐ
+        cached.source = version
+        return cached
+    return presentation_json_cache.set(presentation_id, CachedBody(body, etag, "application/json", source=version))
+
+
+def render_presentation_preview(presentation: Presentation, slide_index: Optional[int] = None) -> CachedBody:
+    """プレゼンテーション（またはslide_indexのスライド）のプレビューのHTMLを返す（範囲外のindexはIndexError）"""
+    if slide_index is not None and not 0 <= slide_index < len(presentation.slides):
+        raise IndexError(f"スライド番号が範囲外です: {slide_index}")
+    content_hash = presentation_content_hash(presentation)
+    key = content_hash if slide_index is None else f"{content_hash}:{slide_index}"
+    cached = preview_cache.get(key)
+    if cached is not None:
+        return cached
+
+    # python-pptxを使わず、テーマの配色・フォントを反映したSVGを組み立てる
+    with STAGE_LATENCY.time(stage="preview"):
+        html = preview_renderer.render(presentation, slide_index)
+    etag = f'"preview-{content_hash}"' if slide_index is None else f'"preview-{content_hash}-{slide_index}"'
+    return preview_cache.set(key, CachedBody(html.encode("utf-8"), etag, "text/html; charset=utf-8"))
+
+
+def _discard_temp_file(path: str) -> None:
+    """レンダリング用の一時ファイルが残っていれば削除する"""
+    if os.path.exists(path):
+        os.remove(path)
+
+
+async def generate_powerpoint_file(presentation: Presentation, pin: bool = False) -> str:
+    """プレゼンテーションをPowerPointファイルとして生成する（内容が同じなら生成済みファイルを再利用）
+
+    pin=Trueの場合は読み出し中にキャッシュから削除されないよう保護するため、使い終わったらartifact_cache.releaseを呼ぶ。
+    """
     logger.info(f"PowerPointファイル生成開始: ID={presentation.id}, スライド数={len(presentation.slides)}")
-    
+
     try:
-        # PowerPointファイルを作成
-        pptx = PPTXPresentation()
-        
-        # テーマに基づいた設定
-        theme_settings = get_theme_settings(presentation.theme)
-        logger.debug(f"テーマ設定: {theme_settings}")
-        
-        # 各スライドの生成
-        for i, slide_data in enumerate(presentation.slides):
-            logger.debug(f"スライド{i+1}作成中: タイトル={slide_data.title}")
-            
-            # スライドの追加
-            try:
-                # 最初のスライドはタイトルスライド、それ以外は通常のスライド
-                if i == 0:
-                    slide_layout = pptx.slide_layouts[0]  # タイトルスライド
-                else:
-                    slide_layout = pptx.slide_layouts[1]  # タイトルと内容のレイアウト
-                
-                slide = pptx.slides.add_slide(slide_layout)
-                
-                # タイトルの設定
-                title_shape = slide.shapes.title
-                if title_shape:
-                    title_shape.text = slide_data.title
-                
-                # コンテンツの設定（最初のスライド以外）
-                if i > 0:
-                    try:
-                        content_shape = slide.placeholders[1]  # コンテンツのプレースホルダー
-                        text_frame = content_shape.text_frame
-                        
-                        # 各コンテンツ項目を一行ずつ追加
-                        for j, content_item in enumerate(slide_data.content):
-                            if j == 0:
-                                p = text_frame.paragraphs[0]
-                            else:
-                                p = text_frame.add_paragraph()
-                            p.text = content_item
-                            p.level = 0  # 箇条書きレベル
-                    except Exception as content_error:
-                        logger.error(f"コンテンツ設定エラー: {str(content_error)}")
-                # 最初のスライドのサブタイトル設定
-                elif i == 0 and len(slide_data.content) > 0:
-                    try:
-                        # サブタイトル用のプレースホルダーを探す
-                        for shape in slide.placeholders:
-                            if shape.placeholder_format.type == 2:  # サブタイトルのプレースホルダータイプ
-                                shape.text = "\n".join(slide_data.content[:2])
-                                break
-                    except Exception as subtitle_error:
-                        logger.error(f"サブタイトル設定エラー: {str(subtitle_error)}")
-            except Exception as e:
-                logger.error(f"スライド{i+1}の生成中にエラーが発生: {str(e)}")
-                # このスライドはスキップして続行
-        
-        # 一時ファイルに保存
-        file_name = f"presentation_{presentation.id}.pptx"
-        file_path = os.path.join(TEMP_DIR, file_name)
-        logger.debug(f"PowerPointファイルを保存: {file_path}")
-        pptx.save(file_path)
-        
+        content_hash = presentation_content_hash(presentation)
+        cached_path = artifact_cache.get(content_hash, pin=pin)
+        if cached_path:
+            logger.info(f"生成済みのPowerPointファイルを再利用: {cached_path}")
+            return cached_path
+
+        # 他のワーカーで生成済みであれば共有インデックスから取得
+        if shared_artifact_index is not None:
+            shared_path = await asyncio.to_thread(shared_artifact_index.fetch, content_hash, artifact_cache, pin)
+            if shared_path:
+                logger.info(f"共有インデックスからPowerPointファイルを取得: {shared_path}")
+                return shared_path
+
+        temp_path = await asyncio.to_thread(artifact_cache.new_temp_path)
+        try:
+            # python-pptxの処理はイベントループを止めないようプロセスプールで実行
+            with STAGE_LATENCY.time(stage="render"):
+                timings = await render_pool.render(presentation, temp_path, resolve_image_paths(presentation))
+            # スライド単位のキャッシュで再利用・再レンダリングしたスライド数
+            for result in ("rendered", "reused"):
+                SLIDE_RENDER_EVENTS.inc(timings.pop(f"slides_{result}", 0), result=result)
+            # ワーカー内での構築とファイル保存の内訳
+            for stage, seconds in timings.items():
+                STAGE_LATENCY.observe(seconds, stage=stage)
+            # 共有インデックスへの登録中に削除されないよう、呼び出し元の指定に関わらずpinして登録する
+            file_path = await asyncio.to_thread(artifact_cache.put, content_hash, temp_path, pin=True)
+        finally:
+            await asyncio.to_thread(_discard_temp_file, temp_path)
+
+        try:
+            if shared_artifact_index is not None:
+                await asyncio.to_thread(shared_artifact_index.publish, content_hash, file_path)
+        except BaseException:
+            artifact_cache.release(file_path)
+            raise
+        if not pin:
+            artifact_cache.release(file_path)
+
         logger.info(f"PowerPointファイル生成完了: {file_path}")
         return file_path
-    
+
+    except (RenderPoolSaturated, RenderPoolUnavailable):
+        # 混雑時・ワーカーの異常時はデモファイルを返さず呼び出し元に再試行を促す
+        raise
     except Exception as e:
+        ERRORS.inc(stage="render")
         logger.error(f"PowerPointファイル生成エラー: {str(e)}")
         logger.debug(f"詳細なエラー: {traceback.format_exc()}")
         
         # エラー時にはデモファイルを返す
         try:
-            # デモ用の簡易ファイルを作成
-            pptx = PPTXPresentation()
-            slide = pptx.slides.add_slide(pptx.slide_layouts[0])
-            title_shape = slide.shapes.title
-            if title_shape:
-                title_shape.text = "デモプレゼンテーション"
-            
-            # サブタイトル
-            for shape in slide.placeholders:
-                if shape.placeholder_format.type == 2:  # サブタイトル
-                    shape.text = "エラーが発生したため、デモファイルを生成しました"
-                    break
-            
-            # エラースライド
-            slide = pptx.slides.add_slide(pptx.slide_layouts[1])
-            title_shape = slide.shapes.title
-            if title_shape:
-                title_shape.text = "エラー情報"
-            
-            content_shape = slide.placeholders[1]
-            text_frame = content_shape.text_frame
-            p = text_frame.paragraphs[0]
-            p.text = f"エラーが発生しました: {str(e)}"
-            
-            # 一時ファイルに保存
             file_name = f"demo_presentation_{presentation.id}.pptx"
             file_path = os.path.join(TEMP_DIR, file_name)
-            pptx.save(file_path)
-            
+            await asyncio.to_thread(render_error_pptx_file, str(e), file_path)
+
             logger.info(f"デモファイル生成完了: {file_path}")
             return file_path
         except Exception as demo_error:
@@ -319,38 +938,37 @@ async def generate_powerpoint_file(presentation: Presentation) -> str:
             raise ValueError(f"PowerPointファイルの生成中にエラーが発生し、デモファイルの作成にも失敗しました: {str(e)}")
 
 
-def get_theme_settings(theme: str) -> Dict[str, Any]:
-    """テーマに基づいた設定を取得する"""
-    themes = {
-        "modern": {
-            "primary_color": "0EA5E9",
-            "secondary_color": "7DD3FC",
-            "text_color": "374151",
-            "title_font": "Arial",
-            "content_font": "Arial",
-        },
-        "business": {
-            "primary_color": "1E40AF",
-            "secondary_color": "3B82F6",
-            "text_color": "1F2937",
-            "title_font": "Calibri",
-            "content_font": "Calibri",
-        },
-        "creative": {
-            "primary_color": "8B5CF6",
-            "secondary_color": "C4B5FD",
-            "text_color": "4B5563",
-            "title_font": "Segoe UI",
-            "content_font": "Segoe UI",
-        },
-        "minimal": {
-            "primary_color": "64748B",
-            "secondary_color": "94A3B8",
-            "text_color": "334155",
-            "title_font": "Helvetica",
-            "content_font": "Helvetica",
-        },
-    }
-    
-    logger.debug(f"テーマ {theme} の設定を取得")
-    return themes.get(theme, themes["modern"])
+def choose_download_engine(presentation: Presentation, requested: Optional[str] = None) -> str:
+    """ダウンロードに使うレンダリングエンジン（streamまたはpptx）を決める（不明な指定はValueError）"""
+    has_images = any(slide.image_url for slide in presentation.slides) and bool(resolve_image_paths(presentation))
+    engine = choose_render_engine(requested, len(presentation.slides), has_images)
+    RENDER_ENGINE_EVENTS.inc(engine=engine)
+    return engine
+
+
+def stream_artifact_key(presentation: Presentation) -> str:
+    """ストリーミングで生成したファイルの生成物キャッシュのキー（python-pptxの出力とは別に保持する）"""
+    return f"{presentation_content_hash(presentation)}-stream"
+
+
+def stream_powerpoint_file(presentation: Presentation) -> Iterator[bytes]:
+    """PPTXを組み立てながら順に返し、最後まで書き出せた場合は生成物キャッシュにも保存する"""
+    logger.info(f"PowerPointファイルのストリーミング開始: ID={presentation.id}, スライド数={len(presentation.slides)}")
+    start = time.perf_counter()
+    temp_path = artifact_cache.new_temp_path()
+    try:
+        with open(temp_path, "wb") as f:
+            for chunk in iter_pptx_stream(presentation):
+                f.write(chunk)
+                yield chunk
+        artifact_cache.put(stream_artifact_key(presentation), temp_path)
+        STAGE_LATENCY.observe(time.perf_counter() - start, stage="render_stream")
+    except Exception as e:
+        # ヘッダーの送信後のためエラー応答は返せない（クライアントには途中で切断されたファイルが届く）
+        ERRORS.inc(stage="render_stream")
+        logger.error(f"PowerPointファイルのストリーミング中にエラーが発生: {str(e)}", exc_info=True)
+        raise
+    finally:
+        # 途中で切断された場合も一時ファイルを残さない
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
@@ -0,0 +1,405 @@
+import os
+import time
+import uuid
+import asyncio
+import sqlite3
+import logging
+import tempfile
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from app.schemas.presentation import Presentation
+
+# ロガーの初期化
+logger = logging.getLogger(__name__)
+
+
+class PresentationStore(ABC):
+    """生成済みプレゼンテーションの保存先"""
+
+    @abstractmethod
+    def get(self, presentation_id: str) -> Optional[Presentation]:
+        """IDからプレゼンテーションを取得する（存在しなければNone）"""
+
+    @abstractmethod
+    def get_versioned(self, presentation_id: str) -> Optional[Tuple[Presentation, str]]:
+        """プレゼンテーションとその版を取得する（存在しなければNone）"""
+
+    @abstractmethod
+    def version(self, presentation_id: str) -> Optional[str]:
+        """保存のたびに変わる版を返す（存在しなければNone）
+
+        本文を読み込まずに確認できるため、シリアライズ済みの応答を再利用できるかの判定に使う。
+        """
+
+    @abstractmethod
+    def put(self, presentation: Presentation) -> None:
+        """プレゼンテーションを保存する（同じIDは上書き）"""
+
+    @abstractmethod
+    def delete(self, presentation_id: str) -> None:
+        """プレゼンテーションを削除する"""
+
+    @abstractmethod
+    def __len__(self) -> int:
+        ...
+
+    async def aget(self, presentation_id: str) -> Optional[Presentation]:
+        """イベントループから呼ぶ取得（I/Oを伴うストアはスレッドで行う）"""
+        return self.get(presentation_id)
+
+    async def aput(self, presentation: Presentation) -> None:
+        """イベントループから呼ぶ保存（I/Oを伴うストアはスレッドで行う）"""
+        self.put(presentation)
+
+    def __contains__(self, presentation_id: str) -> bool:
+        return self.get(presentation_id) is not None
+
+    def stats(self) -> Dict[str, int]:
+        return {"size": len(self)}
+
+
+class InMemoryPresentationStore(PresentationStore):
+    """件数・メモリ使用量・有効期限で上限を設けたメモリ内LRUストア"""
+
+    def __init__(self, max_entries: int = 1000, max_bytes: int = 256 * 1024 * 1024, ttl_seconds: float = 86400):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, int, Presentation, str]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._evictions = 0
+
+    def _remove(self, presentation_id: str) -> None:
+        _, size, _, _ = self._entries.pop(presentation_id)
+        self._bytes -= size
+
+    def get_versioned(self, presentation_id: str) -> Optional[Tuple[Presentation, str]]:
+        with self._lock:
+            entry = self._entries.get(presentation_id)
+            if entry is None:
+                return None
+            expires_at, _, presentation, version = entry
+            if self.ttl_seconds > 0 and time.time() > expires_at:
+                self._remove(presentation_id)
+                return None
+            self._entries.move_to_end(presentation_id)
+            return presentation, version
+
+    def get(self, presentation_id: str) -> Optional[Presentation]:
+        entry = self.get_versioned(presentation_id)
+        return entry[0] if entry else None
+
+    def version(self, presentation_id: str) -> Optional[str]:
+        entry = self.get_versioned(presentation_id)
+        return entry[1] if entry else None
+
+    def put(self, presentation: Presentation, version: Optional[str] = None) -> None:
+        """プレゼンテーションを保存する（versionを省略した場合は新しい版を割り当てる）"""
+        # シリアライズ後のサイズをメモリ使用量の目安として記録する
+        size = len(presentation.model_dump_json())
+        with self._lock:
+            if presentation.id in self._entries:
+                self._remove(presentation.id)
+            self._entries[presentation.id] = (time.time() + self.ttl_seconds, size, presentation, version or uuid.uuid4().hex)
+            self._bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                oldest_id = next(iter(self._entries))
+                if oldest_id == presentation.id:
+                    break
+                self._remove(oldest_id)
+                self._evictions += 1
+
+    def delete(self, presentation_id: str) -> None:
+        with self._lock:
+            if presentation_id in self._entries:
+                self._remove(presentation_id)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, int]:
+        return {"size": len(self._entries), "bytes": self._bytes, "evictions": self._evictions}
+
+
+class SQLitePresentationStore(PresentationStore):
+    """SQLiteに保存し、再起動後も参照できるストア
+
+    件数は起動時に一度数えてメモリ内で増減させ、保存のたびに全件を数えない。
+    最終アクセス日時の更新は、前回の更新からtouch_interval秒以上経った参照時のみ行う。
+    """
+
+    def __init__(self, path: str, ttl_seconds: float = 86400, max_entries: int = 100000, touch_interval: float = 60):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.touch_interval = touch_interval
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS presentations ("
+            "id TEXT PRIMARY KEY, data TEXT NOT NULL, expires_at REAL NOT NULL, accessed_at REAL NOT NULL, "
+            "version TEXT NOT NULL DEFAULT '')"
+        )
+        # 版の列がない以前のデータベースには列を追加する（既存の行は空文字列を版とする）
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(presentations)")}
+        if "version" not in columns:
+            self._conn.execute("ALTER TABLE presentations ADD COLUMN version TEXT NOT NULL DEFAULT ''")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_presentations_accessed_at ON presentations(accessed_at)")
+        self._count = self._conn.execute("SELECT COUNT(*) FROM presentations").fetchone()[0]
+        logger.info(f"SQLiteプレゼンテーションストア: {path}")
+
+    def _select(self, presentation_id: str, column: str) -> Optional[Tuple[str, str]]:
+        """有効期限と最終アクセス日時を処理したうえで、指定の列と版を返す"""
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {column}, version, expires_at, accessed_at FROM presentations WHERE id = ?", (presentation_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, version, expires_at, accessed_at = row
+            now = time.time()
+            if self.ttl_seconds > 0 and now > expires_at:
+                self._count -= self._conn.execute("DELETE FROM presentations WHERE id = ?", (presentation_id,)).rowcount
+                return None
+            if now - accessed_at >= self.touch_interval:
+                self._conn.execute("UPDATE presentations SET accessed_at = ? WHERE id = ?", (now, presentation_id))
+        return value, version
+
+    def get_versioned(self, presentation_id: str) -> Optional[Tuple[Presentation, str]]:
+        row = self._select(presentation_id, "data")
+        if row is None:
+            return None
+        data, version = row
+        return Presentation.model_validate_json(data), version
+
+    def get(self, presentation_id: str) -> Optional[Presentation]:
+        entry = self.get_versioned(presentation_id)
+        return entry[0] if entry else None
+
+    def version(self, presentation_id: str) -> Optional[str]:
+        # 本文の列は読み込まない
+        row = self._select(presentation_id, "1")
+        return row[1] if row else None
+
+    def put(self, presentation: Presentation) -> None:
+        now = time.time()
+        with self._lock:
+            exists = self._conn.execute("SELECT 1 FROM presentations WHERE id = ?", (presentation.id,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO presentations (id, data, expires_at, accessed_at, version) VALUES (?, ?, ?, ?, ?)",
+                (presentation.id, presentation.model_dump_json(), now + self.ttl_seconds, now, uuid.uuid4().hex),
+            )
+            if exists is None:
+                self._count += 1
+            if self._count > self.max_entries:
+                # 最終アクセスが古いものから削除
+                self._count -= self._conn.execute(
+                    "DELETE FROM presentations WHERE id IN "
+                    "(SELECT id FROM presentations ORDER BY accessed_at ASC LIMIT ?)",
+                    (self._count - self.max_entries,),
+                ).rowcount
+
+    async def aget(self, presentation_id: str) -> Optional[Presentation]:
+        return await asyncio.to_thread(self.get, presentation_id)
+
+    async def aput(self, presentation: Presentation) -> None:
+        await asyncio.to_thread(self.put, presentation)
+
+    def delete(self, presentation_id: str) -> None:
+        with self._lock:
+            self._count -= self._conn.execute("DELETE FROM presentations WHERE id = ?", (presentation_id,)).rowcount
+
+    def __len__(self) -> int:
+        return self._count
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+class RedisPresentationStore(PresentationStore):
+    """Redisに保存し、複数ワーカー・複数ノードから同じプレゼンテーションを参照できるストア
+
+    頻繁に参照されるプレゼンテーションはプロセス内の短命なキャッシュから返し、
+    ネットワークへの問い合わせを減らす。更新・削除はPub/Subで他のプロセスに通知し、
+    それぞれのキャッシュから取り除かせる。
+    """
+
+    def __init__(
+        self,
+        url: str,
+        ttl_seconds: float = 86400,
+        key_prefix: str = "apg:",
+        local_cache: Optional[InMemoryPresentationStore] = None,
+    ):
+        # redisは任意の依存関係のため、このストアを使う場合のみ読み込む
+        try:
+            import redis
+        except ImportError:
+            logger.error("redisライブラリがインストールされていません（pip install redis）")
+            raise
+
+        self.ttl_seconds = ttl_seconds
+        self.key_prefix = key_prefix
+        self.local_cache = local_cache
+        self._client = redis.Redis.from_url(url)
+        self._stats = {"local_hits": 0, "remote_hits": 0, "misses": 0, "invalidations": 0}
+        # 自プロセスが送った無効化の通知を区別するための識別子
+        self._origin = uuid.uuid4().hex
+        self._invalidation_thread = None
+        if local_cache is not None:
+            pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(**{self._channel: self._on_invalidate})
+            self._invalidation_thread = pubsub.run_in_thread(
+                sleep_time=1.0, daemon=True, exception_handler=self._on_subscribe_error
+            )
+        logger.info(f"Redisプレゼンテーションストア: {url}")
+
+    @property
+    def _channel(self) -> str:
+        return f"{self.key_prefix}presentation-invalidate"
+
+    def _key(self, presentation_id: str) -> str:
+        return f"{self.key_prefix}presentation:{presentation_id}"
+
+    def _version_key(self, presentation_id: str) -> str:
+        return f"{self.key_prefix}presentation-version:{presentation_id}"
+
+    def _on_invalidate(self, message) -> None:
+        origin, _, presentation_id = message["data"].decode("utf-8").partition(":")
+        if origin != self._origin:
+            self.local_cache.delete(presentation_id)
+            self._stats["invalidations"] += 1
+
+    def _on_subscribe_error(self, error: Exception, pubsub, thread) -> None:
+        # 接続が切れている間の通知は届かないため、キャッシュを捨ててRedisから読み直させる
+        logger.warning(f"プレゼンテーションの無効化通知を受信できませんでした: {str(error)}")
+        self.local_cache.clear()
+        time.sleep(1.0)
+
+    def _invalidate_others(self, presentation_id: str) -> None:
+        if self.local_cache is not None:
+            self._client.publish(self._channel, f"{self._origin}:{presentation_id}")
+
+    def _local_get(self, presentation_id: str) -> Optional[Tuple[Presentation, str]]:
+        if self.local_cache is None:
+            return None
+        entry = self.local_cache.get_versioned(presentation_id)
+        if entry is not None:
+            self._stats["local_hits"] += 1
+        return entry
+
+    def _remote_get(self, presentation_id: str) -> Optional[Tuple[Presentation, str]]:
+        data, version = self._client.mget([self._key(presentation_id), self._version_key(presentation_id)])
+        if data is None:
+            self._stats["misses"] += 1
+            return None
+
+        self._stats["remote_hits"] += 1
+        presentation = Presentation.model_validate_json(data)
+        # 版のキーがない以前のデータは空文字列を版とする
+        version = version.decode("utf-8") if version is not None else ""
+        if self.local_cache is not None:
+            self.local_cache.put(presentation, version)
+        return presentation, version
+
+    def get_versioned(self, presentation_id: str) -> Optional[Tuple[Presentation, str]]:
+        return self._local_get(presentation_id) or self._remote_get(presentation_id)
+
+    def get(self, presentation_id: str) -> Optional[Presentation]:
+        entry = self.get_versioned(presentation_id)
+        return entry[0] if entry else None
+
+    def version(self, presentation_id: str) -> Optional[str]:
+        if self.local_cache is not None:
+            version = self.local_cache.version(presentation_id)
+            if version is not None:
+                return version
+        version, exists = self._client.pipeline().get(self._version_key(presentation_id)).exists(self._key(presentation_id)).execute()
+        if not exists:
+            return None
+        return version.decode("utf-8") if version is not None else ""
+
+    async def aget(self, presentation_id: str) -> Optional[Presentation]:
+        # ローカルキャッシュに当たった場合はスレッドに渡さずに返す
+        entry = self._local_get(presentation_id) or await asyncio.to_thread(self._remote_get, presentation_id)
+        return entry[0] if entry else None
+
+    def put(self, presentation: Presentation) -> None:
+        ttl = int(self.ttl_seconds) if self.ttl_seconds > 0 else None
+        version = uuid.uuid4().hex
+        pipeline = self._client.pipeline()
+        pipeline.set(self._key(presentation.id), presentation.model_dump_json(), ex=ttl)
+        pipeline.set(self._version_key(presentation.id), version, ex=ttl)
+        pipeline.execute()
+        if self.local_cache is not None:
+            self.local_cache.put(presentation, version)
+        self._invalidate_others(presentation.id)
+
+    async def aput(self, presentation: Presentation) -> None:
+        await asyncio.to_thread(self.put, presentation)
+
+    def delete(self, presentation_id: str) -> None:
+        self._client.delete(self._key(presentation_id), self._version_key(presentation_id))
+        if self.local_cache is not None:
+            self.local_cache.delete(presentation_id)
+        self._invalidate_others(presentation_id)
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self._client.scan_iter(match=self._key("*"), count=1000))
+
+    def stats(self) -> Dict[str, int]:
+        return dict(self._stats)
+
+    def close(self) -> None:
+        if self._invalidation_thread is not None:
+            self._invalidation_thread.stop()
+            self._invalidation_thread.join(timeout=5)
+        self._client.close()
+
+
+def create_presentation_store_from_env() -> PresentationStore:
+    """環境変数PRESENTATION_STOREの設定（memory / sqlite / redis）からストアを作成する"""
+    backend = os.getenv("PRESENTATION_STORE", "memory").lower()
+    ttl_seconds = float(os.getenv("PRESENTATION_STORE_TTL_SECONDS", "86400"))
+    max_entries = int(os.getenv("PRESENTATION_STORE_MAX_ENTRIES", "1000"))
+
+    if backend == "sqlite":
+        path = os.getenv("PRESENTATION_STORE_SQLITE_PATH") or os.path.join(
+            tempfile.gettempdir(), "presentations.sqlite3"
+        )
+        return SQLitePresentationStore(
+            path,
+            ttl_seconds=ttl_seconds,
+            max_entries=max_entries,
+            touch_interval=float(os.getenv("PRESENTATION_STORE_SQLITE_TOUCH_SECONDS", "60")),
+        )
+    if backend == "redis":
+        # 他ワーカーでの更新はPub/Subで通知されるが、通知を取りこぼした場合に備えて有効期限は短くする
+        local_cache = InMemoryPresentationStore(
+            max_entries=int(os.getenv("PRESENTATION_STORE_LOCAL_CACHE_MAX_ENTRIES", "256")),
+            ttl_seconds=float(os.getenv("PRESENTATION_STORE_LOCAL_CACHE_TTL_SECONDS", "5")),
+        )
+        return RedisPresentationStore(
+            os.getenv("REDIS_URL", "redis://localhost:6379/0"),
+            ttl_seconds=ttl_seconds,
+            key_prefix=os.getenv("REDIS_KEY_PREFIX", "apg:"),
+            local_cache=local_cache,
+        )
+    if backend != "memory":
+        logger.warning(f"不明なPRESENTATION_STORE={backend}のためメモリ内ストアを使用します")
+
+    return InMemoryPresentationStore(
+        max_entries=max_entries,
+        max_bytes=int(os.getenv("PRESENTATION_STORE_MAX_BYTES", str(256 * 1024 * 1024))),
+        ttl_seconds=ttl_seconds,
+    )
@@ -0,0 +1,209 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+import unicodedata
+from collections import OrderedDict
+from html import escape
+from typing import Dict, List, Optional
+
+from app.schemas.presentation import Presentation, Slide
+from app.services.themes import get_theme_settings
+
+# ロガーの初期化
+logger = logging.getLogger(__name__)
+
+# スライド1枚分のプレビュー（SVG）を保持する件数の上限
+PREVIEW_CACHE_MAX_ENTRIES = int(os.getenv("PREVIEW_CACHE_MAX_ENTRIES", "4096"))
+# 組み立て済みのプレビュー（プレゼンテーション単位の応答本文）を保持する件数の上限
+PREVIEW_RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("PREVIEW_RESPONSE_CACHE_MAX_ENTRIES", "256"))
+
+# python-pptxの既定のスライドサイズ（10in x 7.5in）を96dpiで表した座標系
+SLIDE_WIDTH = 960
+SLIDE_HEIGHT = 720
+_MARGIN = 48
+_TITLE_FONT_SIZE = 40
+_SUBTITLE_FONT_SIZE = 26
+_CONTENT_FONT_SIZE = 24
+_LINE_HEIGHT = 1.3
+# 画像がある場合の本文の幅の割合（PPTXの配置と合わせる）
+_TEXT_WIDTH_RATIO = 0.55
+
+
+def _char_width(ch: str) -> float:
+    # 全角文字は1em、それ以外は0.55emとして幅を概算する
+    return 1.0 if unicodedata.east_asian_width(ch) in ("W", "F") else 0.55
+
+
+def wrap_text(text: str, max_width: float, font_size: int) -> List[str]:
+    """文字幅の概算から、指定の幅に収まるように行を折り返す"""
+    max_em = max_width / font_size
+    lines: List[str] = []
+    current, width = "", 0.0
+    for ch in " ".join(text.split()):
+        ch_width = _char_width(ch)
+        if current and width + ch_width > max_em:
+            # 半角の単語の途中で折り返さないよう、直前の空白まで戻す
+            cut = current.rfind(" ")
+            if ch != " " and cut > 0 and not current.endswith(" "):
+                lines.append(current[:cut])
+                current = current[cut + 1:]
+                width = sum(_char_width(c) for c in current)
+            else:
+                lines.append(current.rstrip())
+                current, width = "", 0.0
+                if ch == " ":
+                    continue
+        current += ch
+        width += ch_width
+    if current.strip():
+        lines.append(current.rstrip())
+    return lines or [""]
+
+
+def _text_lines(lines: List[str], x: float, y: float, font_size: int, **attrs: str) -> str:
+    """複数行のテキストをtext要素とtspan要素で表す"""
+    attributes = "".join(f' {name.replace("_", "-")}="{value}"' for name, value in attrs.items())
+    spans = "".join(
+        f'<tspan x="{x:g}" dy="{0 if i == 0 else font_size * _LINE_HEIGHT:g}">{escape(line)}</tspan>'
+        for i, line in enumerate(lines)
+    )
+    return f'<text x="{x:g}" y="{y:g}" font-size="{font_size}"{attributes}>{spans}</text>'
+
+
+def _title_slide_svg(slide: Slide, theme_settings: Dict[str, str]) -> List[str]:
+    width = SLIDE_WIDTH - _MARGIN * 4
+    title_lines = wrap_text(slide.title, width, _TITLE_FONT_SIZE)
+    subtitle_lines = [line for item in slide.content[:2] for line in wrap_text(item, width, _SUBTITLE_FONT_SIZE)]
+    title_y = SLIDE_HEIGHT * 0.42 - (len(title_lines) - 1) * _TITLE_FONT_SIZE * _LINE_HEIGHT / 2
+    parts = [
+        f'<rect x="0" y="{SLIDE_HEIGHT - 24}" width="{SLIDE_WIDTH}" height="24" fill="#{theme_settings["primary_color"]}"/>',
+        _text_lines(
+            title_lines, SLIDE_WIDTH / 2, title_y, _TITLE_FONT_SIZE,
+            text_anchor="middle", font_weight="bold", fill=f'#{theme_settings["primary_color"]}',
+            font_family=escape(theme_settings["title_font"]),
+        ),
+    ]
+    if subtitle_lines:
+        parts.append(_text_lines(
+            subtitle_lines, SLIDE_WIDTH / 2, SLIDE_HEIGHT * 0.62, _SUBTITLE_FONT_SIZE,
+            text_anchor="middle", fill=f'#{theme_settings["text_color"]}',
+            font_family=escape(theme_settings["content_font"]),
+        ))
+    return parts
+
+
+def _content_slide_svg(slide: Slide, theme_settings: Dict[str, str]) -> List[str]:
+    content_width = SLIDE_WIDTH - _MARGIN * 2
+    text_width = content_width * _TEXT_WIDTH_RATIO if slide.image_url else content_width
+    title_lines = wrap_text(slide.title, content_width, _TITLE_FONT_SIZE)[:2]
+    parts = [
+        f'<rect x="0" y="0" width="{SLIDE_WIDTH}" height="12" fill="#{theme_settings["primary_color"]}"/>',
+        _text_lines(
+            title_lines, _MARGIN, _MARGIN + _TITLE_FONT_SIZE, _TITLE_FONT_SIZE,
+            font_weight="bold", fill=f'#{theme_settings["primary_color"]}',
+            font_family=escape(theme_settings["title_font"]),
+        ),
+    ]
+    content_top = _MARGIN + _TITLE_FONT_SIZE * _LINE_HEIGHT * len(title_lines) + 32
+    parts.append(
+        f'<line x1="{_MARGIN}" y1="{content_top - 16:g}" x2="{SLIDE_WIDTH - _MARGIN}" y2="{content_top - 16:g}" '
+        f'stroke="#{theme_settings["secondary_color"]}" stroke-width="2"/>'
+    )
+
+    # 箇条書き（本文の領域からはみ出す行は省略する）
+    y = content_top + _CONTENT_FONT_SIZE
+    bullet_indent = _CONTENT_FONT_SIZE
+    for item in slide.content:
+        lines = wrap_text(item, text_width - bullet_indent, _CONTENT_FONT_SIZE)
+        if y + (len(lines) - 1) * _CONTENT_FONT_SIZE * _LINE_HEIGHT > SLIDE_HEIGHT - _MARGIN:
+            break
+        parts.append(
+            f'<circle cx="{_MARGIN + 6}" cy="{y - _CONTENT_FONT_SIZE * 0.35:g}" r="5" '
+            f'fill="#{theme_settings["secondary_color"]}"/>'
+        )
+        parts.append(_text_lines(
+            lines, _MARGIN + bullet_indent, y, _CONTENT_FONT_SIZE,
+            fill=f'#{theme_settings["text_color"]}', font_family=escape(theme_settings["content_font"]),
+        ))
+        y += (len(lines) * _LINE_HEIGHT + 0.4) * _CONTENT_FONT_SIZE
+
+    if slide.image_url:
+        image_left = _MARGIN + text_width + content_width * 0.03
+        parts.append(
+            f'<image href="{escape(slide.image_url)}" x="{image_left:g}" y="{content_top:g}" '
+            f'width="{SLIDE_WIDTH - _MARGIN - image_left:g}" height="{SLIDE_HEIGHT - _MARGIN - content_top:g}" '
+            f'preserveAspectRatio="xMidYMid meet"/>'
+        )
+    return parts
+
+
+def preview_cache_key(theme: str, slide: Slide, is_title: bool) -> str:
+    """スライド1枚分のプレビューを識別するキー（テーマ・レイアウト・内容が同じなら同じ出力になる）"""
+    payload = json.dumps(
+        {"theme": theme, "title_layout": is_title, "slide": slide.model_dump()},
+        ensure_ascii=False,
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def render_slide_svg(slide: Slide, is_title: bool, theme: str) -> str:
+    """スライド1枚をテーマの配色・フォントでSVGに変換する"""
+    theme_settings = get_theme_settings(theme)
+    parts = _title_slide_svg(slide, theme_settings) if is_title else _content_slide_svg(slide, theme_settings)
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {SLIDE_WIDTH} {SLIDE_HEIGHT}" role="img" '
+        f'aria-label="{escape(slide.title)}">'
+        f'<rect width="{SLIDE_WIDTH}" height="{SLIDE_HEIGHT}" fill="#FFFFFF"/>'
+        f'{"".join(parts)}</svg>'
+    )
+
+
+class PreviewRenderer:
+    """スライドごとのSVGを内容のハッシュ値でキャッシュしながらプレビューのHTMLを組み立てる"""
+
+    def __init__(self, max_entries: int = PREVIEW_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._svgs: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def slide_svg(self, slide: Slide, is_title: bool, theme: str) -> str:
+        """スライド1枚分のSVGを返す（内容が同じならキャッシュを使う）"""
+        key = preview_cache_key(theme, slide, is_title)
+        with self._lock:
+            cached = self._svgs.get(key)
+            if cached is not None:
+                self._svgs.move_to_end(key)
+                self._stats["hits"] += 1
+                return cached
+            self._stats["misses"] += 1
+
+        svg = render_slide_svg(slide, is_title, theme)
+        with self._lock:
+            self._svgs[key] = svg
+            while len(self._svgs) > self.max_entries:
+                self._svgs.popitem(last=False)
+                self._stats["evictions"] += 1
+        return svg
+
+    def fragment(self, slide: Slide, index: int, theme: str) -> str:
+        """スライド1枚分のHTML断片を返す"""
+        return f'<section class="slide" data-index="{index}">{self.slide_svg(slide, index == 0, theme)}</section>'
+
+    def render(self, presentation: Presentation, slide_index: Optional[int] = None) -> str:
+        """プレゼンテーション全体（またはslide_indexのスライドのみ）のプレビューを返す"""
+        if slide_index is not None:
+            return self.fragment(presentation.slides[slide_index], slide_index, presentation.theme)
+        fragments = "".join(
+            self.fragment(slide, i, presentation.theme) for i, slide in enumerate(presentation.slides)
+        )
+        return (
+            f'<div class="presentation-preview" data-theme="{escape(presentation.theme)}" '
+            f'data-slide-count="{len(presentation.slides)}">{fragments}</div>'
+        )
+
+    def stats(self) -> Dict[str, int]:
+        return {**self._stats, "size": len(self._svgs)}
@@ -0,0 +1,289 @@
+import os
+import sys
+import hmac
+import time
+import uuid
+import asyncio
+import random
+import logging
+import threading
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Mapping, Optional, Tuple
+
+# ロガーの初期化
+logger = logging.getLogger(__name__)
+
+# 管理用API・ヘッダーによるプロファイリングの指定に必要なトークン（未設定の場合は無効）
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+# ヘッダーの指定がなくてもプロファイルを取るリクエストの割合（0で無効）
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+# スタックを記録する間隔（ミリ秒）
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+# 保持するプロファイル数の上限（古いものから破棄）
+PROFILE_MAX_PROFILES = int(os.getenv("PROFILE_MAX_PROFILES", "20"))
+# 1つのプロファイルに記録するサンプル数の上限
+PROFILE_MAX_SAMPLES = int(os.getenv("PROFILE_MAX_SAMPLES", "20000"))
+
+PROFILE_HEADER = "x-profile"
+ADMIN_TOKEN_HEADER = "x-admin-token"
+PROFILE_FORMATS = ("speedscope", "collapsed")
+
+# 関数の識別子（名前・ファイル・行番号）
+FrameKey = Tuple[str, str, int]
+
+
+def _code_key(code) -> FrameKey:
+    return (getattr(code, "co_qualname", code.co_name), code.co_filename, code.co_firstlineno)
+
+
+def _awaitable_frame(awaitable) -> Tuple[Any, Any]:
+    """待機中のコルーチン・ジェネレーターのフレームと、その先で待っているオブジェクトを返す"""
+    if isinstance(awaitable, asyncio.Task):
+        awaitable = awaitable.get_coro()
+    frame = getattr(awaitable, "cr_frame", None) or getattr(awaitable, "gi_frame", None)
+    awaiting = getattr(awaitable, "cr_await", None) or getattr(awaitable, "gi_yieldfrom", None)
+    return frame, awaiting
+
+
+@dataclass
+class Profile:
+    """1リクエスト分のサンプリング結果"""
+
+    id: str
+    name: str
+    path: str
+    started_at: str
+    interval: float
+    frames: List[FrameKey] = field(default_factory=list)
+    # 外側から内側の順に並べたフレーム番号の列と、そのスタックに費やした時間（秒）
+    samples: List[Tuple[int, ...]] = field(default_factory=list)
+    weights: List[float] = field(default_factory=list)
+    duration_seconds: float = 0.0
+    truncated: bool = False
+    error: Optional[str] = None
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "name": self.name,
+            "path": self.path,
+            "started_at": self.started_at,
+            "duration_seconds": round(self.duration_seconds, 6),
+            "samples": len(self.samples),
+            "truncated": self.truncated,
+            "error": self.error,
+        }
+
+    def to_speedscope(self) -> Dict[str, Any]:
+        """speedscope（https://www.speedscope.app）で読み込める形式"""
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": f"{self.name} {self.path} ({self.started_at})",
+            "exporter": "auto-presentation-generator",
+            "activeProfileIndex": 0,
+            "shared": {"frames": [{"name": name, "file": file, "line": line} for name, file, line in self.frames]},
+            "profiles": [{
+                "type": "sampled",
+                "name": self.name,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": round(self.duration_seconds, 6),
+                "samples": [list(stack) for stack in self.samples],
+                "weights": [round(weight, 6) for weight in self.weights],
+            }],
+        }
+
+    def to_collapsed(self) -> str:
+        """flamegraph.pl等で使う折りたたみ形式（1行に「外側;…;内側 ミリ秒」）"""
+        totals: Dict[Tuple[int, ...], float] = {}
+        for stack, weight in zip(self.samples, self.weights):
+            totals[stack] = totals.get(stack, 0.0) + weight
+        lines = []
+        for stack, total in totals.items():
+            names = ";".join(
+                f"{name} ({os.path.basename(file)}:{line})" if file else name
+                for name, file, line in (self.frames[i] for i in stack)
+            )
+            lines.append(f"{names} {max(1, round(total * 1000))}")
+        return "\n".join(lines) + "\n"
+
+
+class ProfileSession:
+    """プロファイリング中のリクエスト（withの範囲で、呼び出し元の処理のスタックを別スレッドから定期的に記録する）"""
+
+    def __init__(self, profiler: "RequestProfiler", name: str, path: str):
+        self.profiler = profiler
+        self.profile = Profile(
+            id=uuid.uuid4().hex[:16],
+            name=name,
+            path=path,
+            started_at=datetime.now().isoformat(),
+            interval=profiler.interval,
+        )
+        self._frame_index: Dict[FrameKey, int] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._anchor = None
+        self._task: Optional[asyncio.Task] = None
+        self._thread_id = 0
+
+    @property
+    def id(self) -> str:
+        return self.profile.id
+
+    def __enter__(self) -> "ProfileSession":
+        # withを書いた関数のフレームを起点とし、そこから内側の呼び出しのみを記録する
+        self._anchor = sys._getframe(1)
+        self._thread_id = threading.get_ident()
+        try:
+            self._task = asyncio.current_task()
+        except RuntimeError:
+            self._task = None
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name=f"profiler-{self.id}", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.profile.duration_seconds = time.perf_counter() - self._started
+        if exc is not None:
+            self.profile.error = f"{exc_type.__name__}: {exc}"
+        self._anchor = None
+        self._task = None
+        self.profiler._store(self.profile)
+
+    def _index(self, key: FrameKey) -> int:
+        index = self._frame_index.get(key)
+        if index is None:
+            index = self._frame_index[key] = len(self.profile.frames)
+            self.profile.frames.append(key)
+        return index
+
+    def _running_stack(self) -> Optional[List[FrameKey]]:
+        """起点の処理が実行中であれば、スレッドのスタックのうち起点より内側を返す"""
+        frame = sys._current_frames().get(self._thread_id)
+        stack = []
+        while frame is not None:
+            if frame is self._anchor:
+                stack.append(_code_key(frame.f_code))
+                return stack[::-1]
+            stack.append(_code_key(frame.f_code))
+            frame = frame.f_back
+        return None
+
+    def _awaiting_stack(self) -> List[FrameKey]:
+        """起点の処理が待機中であれば、待機しているコルーチンの連なりをたどって返す"""
+        stack: List[FrameKey] = []
+        awaitable = self._task.get_coro() if self._task is not None else None
+        found = False
+        while awaitable is not None:
+            frame, awaiting = _awaitable_frame(awaitable)
+            if frame is None:
+                # Futureの完了（上流APIの応答や、スレッド・プロセスでの処理）を待っている
+                if found:
+                    stack.append(("[await]", "", 0))
+                break
+            found = found or frame is self._anchor
+            if found:
+                stack.append(_code_key(frame.f_code))
+            awaitable = awaiting
+        return stack
+
+    def _sample(self) -> Optional[Tuple[int, ...]]:
+        stack = self._running_stack()
+        if stack is None:
+            stack = self._awaiting_stack()
+        if not stack:
+            return None
+        return tuple(self._index(key) for key in stack)
+
+    def _run(self) -> None:
+        last = time.perf_counter()
+        while not self._stop.wait(self.profiler.interval):
+            now = time.perf_counter()
+            sample = self._sample()
+            if sample is not None:
+                self.profile.samples.append(sample)
+                self.profile.weights.append(now - last)
+            last = now
+            if len(self.profile.samples) >= self.profiler.max_samples:
+                self.profile.truncated = True
+                break
+
+
+class RequestProfiler:
+    """指定されたリクエストのみをサンプリングプロファイラーで計測し、直近の結果を保持する
+
+    対象外のリクエストではヘッダーと乱数の確認のみを行い、スレッドの起動やスタックの記録は行わない。
+    """
+
+    def __init__(
+        self,
+        admin_token: str = ADMIN_TOKEN,
+        sample_rate: float = PROFILE_SAMPLE_RATE,
+        interval_ms: float = PROFILE_INTERVAL_MS,
+        max_profiles: int = PROFILE_MAX_PROFILES,
+        max_samples: int = PROFILE_MAX_SAMPLES,
+    ):
+        self.admin_token = admin_token
+        self.sample_rate = sample_rate
+        self.interval = interval_ms / 1000
+        self.max_samples = max_samples
+        self._profiles: Deque[Profile] = deque(maxlen=max_profiles)
+        self._lock = threading.Lock()
+        self.profiled = 0
+
+    def is_admin(self, headers: Mapping[str, str]) -> bool:
+        """管理用トークンが設定されており、ヘッダーの値と一致するかどうか"""
+        token = headers.get(ADMIN_TOKEN_HEADER)
+        return bool(self.admin_token) and token is not None and hmac.compare_digest(token, self.admin_token)
+
+    def should_profile(self, headers: Mapping[str, str]) -> bool:
+        """X-Profileヘッダー（管理用トークンが必要）またはサンプリング率でプロファイルを取るか決める"""
+        if headers.get(PROFILE_HEADER) and self.is_admin(headers):
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def profile(self, name: str, path: str = "") -> ProfileSession:
+        """with文で使うと、その範囲の処理をプロファイリングする"""
+        return ProfileSession(self, name, path)
+
+    def _store(self, profile: Profile) -> None:
+        with self._lock:
+            self._profiles.append(profile)
+            self.profiled += 1
+        logger.info(
+            f"プロファイルを記録しました: id={profile.id} {profile.name} {profile.path} "
+            f"所要時間={profile.duration_seconds:.3f}s サンプル数={len(profile.samples)}"
+        )
+
+    def profiles(self) -> List[Dict[str, Any]]:
+        """保持しているプロファイルの概要（新しい順）"""
+        with self._lock:
+            profiles = list(self._profiles)
+        return [profile.summary() for profile in reversed(profiles)]
+
+    def get(self, profile_id: str) -> Optional[Profile]:
+        with self._lock:
+            return next((profile for profile in self._profiles if profile.id == profile_id), None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            retained = len(self._profiles)
+        return {
+            "enabled": bool(self.admin_token) or self.sample_rate > 0,
+            "sample_rate": self.sample_rate,
+            "interval_ms": self.interval * 1000,
+            "profiled": self.profiled,
+            "retained": retained,
+            "max_profiles": self._profiles.maxlen,
+        }
+
+
+def create_request_profiler_from_env() -> RequestProfiler:
+    """環境変数の設定からプロファイラーを作成する"""
+    return RequestProfiler(ADMIN_TOKEN, PROFILE_SAMPLE_RATE, PROFILE_INTERVAL_MS, PROFILE_MAX_PROFILES, PROFILE_MAX_SAMPLES)
@@ -0,0 +1,336 @@
+import os
+import time
+import random
+import asyncio
+import logging
+from collections import deque
+from contextlib import nullcontext
+from typing import Any, AsyncContextManager, Awaitable, Callable, Deque, Dict, Optional, TypeVar
+
+# ロガーの初期化
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# 1回の試行のタイムアウト（秒）
+LLM_ATTEMPT_TIMEOUT_SECONDS = float(os.getenv("LLM_ATTEMPT_TIMEOUT_SECONDS", "90"))
+# 最初の呼び出しを含めた最大試行回数
+LLM_MAX_ATTEMPTS = int(os.getenv("LLM_MAX_ATTEMPTS", "3"))
+# 再試行までの待ち時間（指数バックオフ。実際の待ち時間は0〜この値の一様乱数）
+LLM_BACKOFF_BASE_SECONDS = float(os.getenv("LLM_BACKOFF_BASE_SECONDS", "0.5"))
+LLM_BACKOFF_MAX_SECONDS = float(os.getenv("LLM_BACKOFF_MAX_SECONDS", "8"))
+# 再試行・ヘッジの予算（通常の呼び出しに対する割合と、呼び出しがなくても使える最低回数）
+LLM_RETRY_BUDGET_RATIO = float(os.getenv("LLM_RETRY_BUDGET_RATIO", "0.2"))
+LLM_RETRY_BUDGET_MIN = float(os.getenv("LLM_RETRY_BUDGET_MIN", "10"))
+# ヘッジリクエスト（応答が遅い場合に同じリクエストをもう1つ送り、先に返った方を使う）
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "false").lower() == "true"
+# ヘッジを送るまでの待ち時間は直近の応答時間のこのパーセンタイル（下限あり）
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+LLM_HEDGE_MIN_DELAY_SECONDS = float(os.getenv("LLM_HEDGE_MIN_DELAY_SECONDS", "1"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+# サーキットブレーカー（連続失敗回数が閾値に達したら一定時間、呼び出さずに失敗させる）
+LLM_CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("LLM_CIRCUIT_FAILURE_THRESHOLD", "5"))
+LLM_CIRCUIT_RESET_SECONDS = float(os.getenv("LLM_CIRCUIT_RESET_SECONDS", "30"))
+
+# 再試行で成功しうるHTTPステータス（これに加えて5xxも再試行する）
+_RETRYABLE_STATUS_CODES = {408, 409, 429}
+_RETRYABLE_ERROR_NAMES = {"APIConnectionError", "APITimeoutError", "ConnectError", "ReadTimeout", "RemoteProtocolError"}
+
+
+class CircuitOpenError(Exception):
+    """サーキットブレーカーが開いているため上流APIを呼び出さずに失敗した"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"上流APIが一時的に利用できません（{retry_after:.0f}秒後に再試行してください）")
+        self.retry_after = retry_after
+
+
+def is_retryable(error: BaseException) -> bool:
+    """タイムアウト・接続エラー・429・5xxのように、再試行で成功しうるエラーかどうか"""
+    if isinstance(error, asyncio.TimeoutError):
+        return True
+    status_code = getattr(error, "status_code", None)
+    if isinstance(status_code, int):
+        return status_code in _RETRYABLE_STATUS_CODES or status_code >= 500
+    return type(error).__name__ in _RETRYABLE_ERROR_NAMES
+
+
+def backoff_delay(attempt: int, base: float = LLM_BACKOFF_BASE_SECONDS, cap: float = LLM_BACKOFF_MAX_SECONDS) -> float:
+    """attempt回目（0始まり）の失敗後の待ち時間（指数バックオフにフルジッターを加える）"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class RetryBudget:
+    """再試行・ヘッジの回数を通常の呼び出し数の一定割合に抑える
+
+    呼び出しごとにratio分の残高が増え（上限はminimum）、再試行・ヘッジのたびに1減る。
+    上流の障害時に再試行で負荷を何倍にも増やさないための上限。
+    """
+
+    def __init__(self, ratio: float = LLM_RETRY_BUDGET_RATIO, minimum: float = LLM_RETRY_BUDGET_MIN):
+        self.ratio = ratio
+        self.minimum = minimum
+        self.balance = minimum
+        self.exhausted = 0
+
+    def deposit(self) -> None:
+        self.balance = min(self.minimum, self.balance + self.ratio)
+
+    def withdraw(self) -> bool:
+        """予算が残っていれば1回分を使う（残っていなければFalse）"""
+        if self.balance < 1:
+            self.exhausted += 1
+            return False
+        self.balance -= 1
+        return True
+
+
+class CircuitBreaker:
+    """連続失敗で開き、一定時間後に1件だけ試行（半開）して成功すれば閉じるサーキットブレーカー"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        failure_threshold: int = LLM_CIRCUIT_FAILURE_THRESHOLD,
+        reset_seconds: float = LLM_CIRCUIT_RESET_SECONDS,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._clock = clock
+        self._state = self.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self.opened_total = 0
+        self.rejected_total = 0
+
+    @property
+    def state(self) -> str:
+        if self._state == self.OPEN and self._clock() - self._opened_at >= self.reset_seconds:
+            return self.HALF_OPEN
+        return self._state
+
+    def retry_after(self) -> float:
+        """ブレーカーが閉じる（試行を受け付ける）までの秒数の目安"""
+        if self._state != self.OPEN:
+            return 0.0
+        return max(0.0, self.reset_seconds - (self._clock() - self._opened_at))
+
+    def before_call(self) -> None:
+        """呼び出してよいか判定する（開いている場合はCircuitOpenError）"""
+        state = self.state
+        if state == self.CLOSED:
+            return
+        if state == self.HALF_OPEN and not self._probe_in_flight:
+            # 半開状態では1件だけ試行させ、結果で閉じるか開き直すかを決める
+            self._state = self.HALF_OPEN
+            self._probe_in_flight = True
+            return
+        self.rejected_total += 1
+        raise CircuitOpenError(self.retry_after() or 1.0)
+
+    def check_available(self) -> None:
+        """開いている場合にCircuitOpenErrorを送出する（半開状態の試行枠は消費しない）"""
+        if self.state == self.OPEN:
+            raise CircuitOpenError(self.retry_after())
+
+    def record_success(self) -> None:
+        if self._state != self.CLOSED:
+            logger.info("上流APIの呼び出しが回復したためサーキットブレーカーを閉じます")
+        self._state = self.CLOSED
+        self._consecutive_failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        self._consecutive_failures += 1
+        if self._state == self.HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+            if self._state != self.OPEN:
+                self.opened_total += 1
+                logger.warning(
+                    f"上流APIの呼び出しが{self._consecutive_failures}回連続で失敗したため"
+                    f"サーキットブレーカーを{self.reset_seconds:.0f}秒間開きます"
+                )
+            self._state = self.OPEN
+            self._opened_at = self._clock()
+            self._probe_in_flight = False
+
+    def release_probe(self) -> None:
+        """半開状態の試行が成否を判定できずに終わった場合（キャンセル等）に次の試行を許可する"""
+        self._probe_in_flight = False
+
+
+class LatencyTracker:
+    """直近の成功した呼び出しの所要時間を保持し、パーセンタイルを求める"""
+
+    def __init__(self, size: int = 200):
+        self._samples: Deque[float] = deque(maxlen=size)
+
+    def observe(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, percent: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, max(0, int(round(percent / 100 * len(ordered))) - 1))
+        return ordered[index]
+
+
+class ResilientCaller:
+    """上流APIの呼び出しに試行ごとのタイムアウト・再試行・ヘッジ・サーキットブレーカーを適用する"""
+
+    def __init__(
+        self,
+        attempt_timeout: float = LLM_ATTEMPT_TIMEOUT_SECONDS,
+        max_attempts: int = LLM_MAX_ATTEMPTS,
+        budget: Optional[RetryBudget] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        hedge_enabled: bool = LLM_HEDGE_ENABLED,
+        hedge_percentile: float = LLM_HEDGE_PERCENTILE,
+        hedge_min_delay: float = LLM_HEDGE_MIN_DELAY_SECONDS,
+        hedge_min_samples: int = LLM_HEDGE_MIN_SAMPLES,
+        backoff: Callable[[int], float] = backoff_delay,
+    ):
+        self.attempt_timeout = attempt_timeout
+        self.max_attempts = max(1, max_attempts)
+        self.budget = budget or RetryBudget()
+        self.breaker = breaker or CircuitBreaker()
+        self.hedge_enabled = hedge_enabled
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_min_samples = hedge_min_samples
+        self.latencies = LatencyTracker()
+        self._backoff = backoff
+        self._stats = {
+            "calls": 0, "retries": 0, "timeouts": 0, "hedges": 0, "hedge_wins": 0, "hedges_skipped": 0, "failures": 0,
+        }
+
+    def hedge_delay(self) -> Optional[float]:
+        """ヘッジを送るまでの待ち時間（無効、または計測数が足りない場合はNone）"""
+        if not self.hedge_enabled or len(self.latencies) < self.hedge_min_samples:
+            return None
+        return max(self.hedge_min_delay, self.latencies.percentile(self.hedge_percentile) or 0.0)
+
+    async def _attempt(self, factory: Callable[[], Awaitable[T]]) -> T:
+        start = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(factory(), self.attempt_timeout)
+        except asyncio.TimeoutError:
+            self._stats["timeouts"] += 1
+            raise
+        self.latencies.observe(time.perf_counter() - start)
+        return result
+
+    async def _hedged_attempt(
+        self,
+        factory: Callable[[], Awaitable[T]],
+        delay: float,
+        hedge_slot: Optional[Callable[[], AsyncContextManager[bool]]] = None,
+    ) -> T:
+        """delay秒以内に応答がなければ同じ呼び出しをもう1つ送り、先に成功した方を返す"""
+        primary = asyncio.ensure_future(self._attempt(factory))
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done:
+            return await primary
+
+        # ヘッジも上流への同時呼び出し数に数えるため、枠が空いていない場合は送らない
+        async with hedge_slot() if hedge_slot is not None else nullcontext(True) as acquired:
+            if acquired and self.budget.withdraw():
+                return await self._race(primary, factory)
+        if not acquired:
+            self._stats["hedges_skipped"] += 1
+        return await primary
+
+    async def _race(self, primary: "asyncio.Future[T]", factory: Callable[[], Awaitable[T]]) -> T:
+        """ヘッジを送り、primaryとヘッジのうち先に成功した方を返す"""
+        self._stats["hedges"] += 1
+        hedge = asyncio.ensure_future(self._attempt(factory))
+        pending = {primary, hedge}
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self._stats["hedge_wins"] += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def call(
+        self,
+        factory: Callable[[], Awaitable[T]],
+        hedge: bool = True,
+        hedge_slot: Optional[Callable[[], AsyncContextManager[bool]]] = None,
+    ) -> T:
+        """factoryが返す呼び出しを実行する（ストリーミング等、重複して送れない呼び出しはhedge=False）
+
+        hedge_slotには、ヘッジを送る間の同時実行枠を待たずに確保するコンテキストマネージャー
+        （確保できたかどうかを渡す）を指定する。
+        """
+        self.breaker.before_call()
+        self.budget.deposit()
+        self._stats["calls"] += 1
+        attempt = 0
+        try:
+            while True:
+                try:
+                    delay = self.hedge_delay() if hedge else None
+                    if delay is None:
+                        result = await self._attempt(factory)
+                    else:
+                        result = await self._hedged_attempt(factory, delay, hedge_slot)
+                except Exception as e:
+                    if not is_retryable(e):
+                        # リクエスト内容に起因するエラー（400等）は上流が応答しているため障害として数えない
+                        self.breaker.record_success()
+                        raise
+                    self.breaker.record_failure()
+                    attempt += 1
+                    if attempt >= self.max_attempts or self.breaker.state == CircuitBreaker.OPEN:
+                        raise
+                    if not self.budget.withdraw():
+                        logger.warning("再試行の予算を使い切ったため再試行しません")
+                        raise
+                    wait_seconds = self._backoff(attempt - 1)
+                    self._stats["retries"] += 1
+                    logger.warning(
+                        f"上流APIの呼び出しに失敗したため{wait_seconds:.2f}秒後に再試行します"
+                        f"（{attempt}/{self.max_attempts - 1}回目）: {type(e).__name__}: {str(e)}"
+                    )
+                    await asyncio.sleep(wait_seconds)
+                    # 待機中にブレーカーが開いた場合は再試行せずに失敗させる
+                    self.breaker.before_call()
+                    continue
+                self.breaker.record_success()
+                return result
+        except asyncio.CancelledError:
+            # 呼び出し元の切断等で中断された場合は成否を判定しない
+            self.breaker.release_probe()
+            raise
+        except Exception:
+            self._stats["failures"] += 1
+            raise
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            "circuit_state": self.breaker.state,
+            "circuit_opened": self.breaker.opened_total,
+            "circuit_rejected": self.breaker.rejected_total,
+            "retry_budget": round(self.budget.balance, 2),
+            "retry_budget_exhausted": self.budget.exhausted,
+            "hedge_delay_seconds": self.hedge_delay(),
+        }
+
@@ -0,0 +1,148 @@
+import gzip
+import json
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+# この大きさ未満の本文は圧縮しても効果が小さいため圧縮しない
+COMPRESSION_MIN_BYTES = 512
+# 動的に圧縮する際のbrotliの圧縮レベル（0〜11。高いほど小さいがCPUを使う）
+BROTLI_QUALITY = 5
+
+
+@lru_cache(maxsize=None)
+def _optional_module(name: str):
+    # orjson・brotliは任意の依存関係（未インストール時は標準ライブラリで代替する）。初回利用時に読み込む
+    try:
+        return __import__(name)
+    except ImportError:
+        return None
+
+
+def supported_encodings() -> Sequence[str]:
+    """応答の圧縮で対応する符号化方式（優先度の高い順）"""
+    return ("br", "gzip") if _optional_module("brotli") is not None else ("gzip",)
+
+
+def serialize_json(data: Any) -> bytes:
+    """JSONをUTF-8のバイト列にシリアライズする（orjsonがあれば使う）"""
+    orjson = _optional_module("orjson")
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def choose_encoding(accept_encoding: Optional[str], supported: Optional[Sequence[str]] = None) -> str:
+    """Accept-Encodingヘッダーから使用する符号化方式を選ぶ（該当なしは"identity"）"""
+    if not accept_encoding:
+        return "identity"
+    supported = list(supported if supported is not None else supported_encodings())
+    weights: Dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        weights[name.strip().lower()] = quality
+    candidates = [
+        encoding for encoding in supported
+        if weights.get(encoding, weights.get("*", 0.0)) > 0
+    ]
+    if not candidates:
+        return "identity"
+    # q値が同じ場合はsupportedの並び順（サーバー側の優先度）で選ぶ
+    return max(candidates, key=lambda encoding: (weights.get(encoding, weights.get("*", 0.0)), -supported.index(encoding)))
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "gzip":
+        # mtimeを固定し、同じ内容からは同じバイト列を生成する
+        return gzip.compress(body, compresslevel=6, mtime=0)
+    if encoding == "br" and _optional_module("brotli") is not None:
+        return _optional_module("brotli").compress(body, quality=BROTLI_QUALITY)
+    raise ValueError(f"未対応の符号化方式です: {encoding}")
+
+
+class CachedBody:
+    """シリアライズ済みの応答本文と、符号化方式ごとの圧縮結果（必要になった時点で作成）
+
+    sourceには本文の元になったデータの版を保持し、同じ版であれば再シリアライズを省略できるようにする。
+    """
+
+    def __init__(self, body: bytes, etag: str, media_type: str, source: Any = None):
+        self.etag = etag
+        self.media_type = media_type
+        self.source = source
+        self._variants: Dict[str, bytes] = {"identity": body}
+
+    @property
+    def body(self) -> bytes:
+        return self._variants["identity"]
+
+    def encoded(self, encoding: str) -> bytes:
+        """指定の符号化方式の本文を返す（小さい本文は圧縮せずそのまま返す）"""
+        if encoding == "identity" or len(self.body) < COMPRESSION_MIN_BYTES:
+            return self.body
+        variant = self._variants.get(encoding)
+        if variant is None:
+            variant = compress(self.body, encoding)
+            self._variants[encoding] = variant
+        return variant
+
+    def content_encoding(self, encoding: str) -> Optional[str]:
+        """Content-Encodingヘッダーの値（圧縮しない場合はNone）"""
+        if encoding == "identity" or len(self.body) < COMPRESSION_MIN_BYTES:
+            return None
+        return encoding
+
+    @property
+    def size(self) -> int:
+        return sum(len(variant) for variant in self._variants.values())
+
+
+class BodyCache:
+    """キーごとにシリアライズ済みの応答本文を保持する件数・容量上限付きのLRUキャッシュ"""
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        # 圧縮結果は後から追加されるため、容量は登録時点のサイズで管理する
+        self._entries: "OrderedDict[str, Tuple[int, CachedBody]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, key: str) -> Optional[CachedBody]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return entry[1]
+
+    def set(self, key: str, entry: CachedBody) -> CachedBody:
+        size = entry.size
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[0]
+            self._entries[key] = (size, entry)
+            self._bytes += size
+            while len(self._entries) > 1 and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                _, (evicted_size, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self._stats["evictions"] += 1
+            return entry
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, int]:
+        return {**self._stats, "size": len(self._entries), "bytes": self._bytes}
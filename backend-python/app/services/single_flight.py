@@ -0,0 +1,49 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+# ロガーの初期化
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """同じキーで同時に実行中の処理を1つにまとめ、結果を全ての呼び出し元で共有する
+
+    待機している呼び出し元が全てキャンセルされた場合のみ、実行中の処理もキャンセルする。
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, Tuple[asyncio.Task, Dict[str, int]]] = {}
+        self.executed = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        entry = self._calls.get(key)
+        if entry is None:
+            task = asyncio.ensure_future(func())
+            entry = (task, {"waiters": 0})
+            self._calls[key] = entry
+            task.add_done_callback(lambda _: self._forget(key, task))
+            self.executed += 1
+        else:
+            self.coalesced += 1
+            logger.info(f"実行中の同一リクエストに合流します: key={key[:12]}")
+
+        task, counter = entry
+        counter["waiters"] += 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if not task.done() and counter["waiters"] == 1:
+                task.cancel()
+            raise
+        finally:
+            counter["waiters"] -= 1
+
+    def _forget(self, key: str, task: asyncio.Task) -> None:
+        entry = self._calls.get(key)
+        if entry is not None and entry[0] is task:
+            del self._calls[key]
+
+    def __len__(self) -> int:
+        return len(self._calls)
@@ -0,0 +1,120 @@
+import json
+import logging
+from typing import Any, Dict, List, Optional
+
+# ロガーの初期化
+logger = logging.getLogger(__name__)
+
+
+class SlideStreamParser:
+    """{"slides": [...]} 形式のJSONを逐次パースし、閉じたスライドオブジェクトから順に返す
+
+    LLMのストリーミング出力を断片ごとに feed() へ渡すと、
+    slides配列の要素オブジェクトが閉じた時点でdictとして取り出せる。
+    """
+
+    def __init__(self, array_key: str = "slides"):
+        self.array_key = array_key
+        self._text = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start: Optional[int] = None
+        self._last_key: Optional[str] = None
+        # トップレベルオブジェクトで次に来る文字列がキーか（値の文字列をキーと誤認しないため）
+        self._expect_key = False
+        self._array_depth: Optional[int] = None
+        self._array_closed = False
+        self._object_start: Optional[int] = None
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """断片を追加し、新たに完成したスライドオブジェクトのリストを返す"""
+        self._text += chunk
+        text = self._text
+        completed: List[Dict[str, Any]] = []
+
+        for i in range(self._pos, len(text)):
+            ch = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    # トップレベルオブジェクト直下のキーを保持（値の文字列は無視する）
+                    if self._depth == 1 and self._expect_key:
+                        self._last_key = text[self._string_start:i + 1]
+                    self._string_start = None
+            elif ch == '"':
+                self._in_string = True
+                self._string_start = i
+            elif ch in ":," and self._depth == 1:
+                self._expect_key = ch == ","
+            elif ch in "{[":
+                self._depth += 1
+                if ch == "{" and self._depth == 1:
+                    self._expect_key = True
+                if (
+                    ch == "["
+                    and self._array_depth is None
+                    and self._depth == 2
+                    and self._is_array_key(self._last_key)
+                ):
+                    self._array_depth = self._depth
+                elif (
+                    ch == "{"
+                    and self._array_depth is not None
+                    and not self._array_closed
+                    and self._depth == self._array_depth + 1
+                ):
+                    self._object_start = i
+            elif ch in "}]":
+                if (
+                    ch == "}"
+                    and self._object_start is not None
+                    and self._depth == self._array_depth + 1
+                ):
+                    item = self._decode(text[self._object_start:i + 1])
+                    if item is not None:
+                        completed.append(item)
+                    self._object_start = None
+                elif ch == "]" and self._array_depth is not None and self._depth == self._array_depth:
+                    self._array_closed = True
+                self._depth -= 1
+
+        self._pos = len(text)
+        self._compact()
+        return completed
+
+    def _is_array_key(self, raw_key: Optional[str]) -> bool:
+        if raw_key is None:
+            return False
+        try:
+            return json.loads(raw_key) == self.array_key
+        except ValueError:
+            return False
+
+    def _decode(self, raw: str) -> Optional[Dict[str, Any]]:
+        try:
+            item = json.loads(raw)
+        except ValueError as e:
+            logger.warning(f"ストリーム中のスライドJSONをパースできませんでした: {str(e)}")
+            return None
+        return item if isinstance(item, dict) else None
+
+    def _compact(self) -> None:
+        # 処理済みで今後参照しない部分のバッファを破棄してメモリを一定に保つ
+        keep_from = self._pos
+        for start in (self._object_start, self._string_start):
+            if start is not None:
+                keep_from = min(keep_from, start)
+        if keep_from == 0:
+            return
+        self._text = self._text[keep_from:]
+        self._pos -= keep_from
+        if self._object_start is not None:
+            self._object_start -= keep_from
+        if self._string_start is not None:
+            self._string_start -= keep_from
@@ -0,0 +1,167 @@
+import copy
+import logging
+import threading
+from typing import Any, Dict, Iterable, Optional
+
+from app.services.themes import THEMES, get_theme_settings, resolve_theme
+
+# ロガーの初期化
+logger = logging.getLogger(__name__)
+
+_A = "http://schemas.openxmlformats.org/drawingml/2006/main"
+_P = "http://schemas.openxmlformats.org/presentationml/2006/main"
+_NS = {"a": _A, "p": _P}
+
+# 装飾の帯の高さ（スライドの高さに対する比率、プレビューのSVGと揃える）
+CONTENT_BAR_RATIO = 12 / 720
+TITLE_BAR_RATIO = 24 / 720
+
+# 箇条書き記号の指定より後ろに置く必要がある要素（a:buClrはこれらより前に挿入する）
+_AFTER_BULLET_COLOR = (
+    "buSzTx", "buSzPct", "buSzPts", "buFontTx", "buFont", "buNone",
+    "buAutoNum", "buChar", "buBlip", "tabLst", "defRPr", "extLst",
+)
+
+# python-pptxがXMLの部分木を包んでキャッシュする属性。deepcopyでは部分木が元の木から切り離されて
+# 複製されるため、複製後に取り除いて複製先のXMLから作り直させる（残すとスライドの追加が反映されない）
+_SUBTREE_VIEW_CACHES = ("slides", "slide_masters", "slide_master", "slide_layout")
+
+_prototypes: Dict[str, Any] = {}
+_lock = threading.Lock()
+
+
+def _tag(prefix: str, name: str) -> str:
+    return f"{{{_NS[prefix]}}}{name}"
+
+
+def _scheme_fill(parent, color: str) -> None:
+    """要素の塗りつぶしをテーマの色（schemeClr）に置き換える"""
+    from lxml import etree
+
+    for old in parent.findall("a:solidFill", _NS):
+        parent.remove(old)
+    fill = etree.Element(_tag("a", "solidFill"))
+    etree.SubElement(fill, _tag("a", "schemeClr"), val=color)
+    parent.insert(0, fill)
+
+
+def _apply_color_and_font_scheme(pptx, theme: str, settings: Dict[str, Any]) -> None:
+    """テーマパーツの配色とフォントをテーマの設定で書き換える"""
+    from lxml import etree
+    from pptx.opc.constants import RELATIONSHIP_TYPE as RT
+
+    theme_part = pptx.slide_master.part.part_related_by(RT.THEME)
+    root = etree.fromstring(theme_part.blob)
+    root.set("name", theme)
+
+    scheme = root.find("a:themeElements/a:clrScheme", _NS)
+    scheme.set("name", theme)
+    for slot, color in (
+        ("dk1", settings["text_color"]),
+        ("dk2", settings["text_color"]),
+        ("accent1", settings["primary_color"]),
+        ("accent2", settings["secondary_color"]),
+    ):
+        element = scheme.find(f"a:{slot}", _NS)
+        element.clear()
+        etree.SubElement(element, _tag("a", "srgbClr"), val=color)
+
+    fonts = root.find("a:themeElements/a:fontScheme", _NS)
+    fonts.set("name", theme)
+    fonts.find("a:majorFont/a:latin", _NS).set("typeface", settings["title_font"])
+    fonts.find("a:minorFont/a:latin", _NS).set("typeface", settings["content_font"])
+
+    # 汎用パーツのため、書き換えたXMLをそのままパーツの内容として保持させる
+    theme_part._blob = etree.tostring(root, xml_declaration=True, encoding="UTF-8", standalone=True)
+
+
+def _apply_text_styles(master) -> None:
+    """マスターの文字スタイルを設定する（タイトルは主色、箇条書き記号は副色）"""
+    from lxml import etree
+
+    styles = master._element.find("p:txStyles", _NS)
+    title = styles.find("p:titleStyle/a:lvl1pPr/a:defRPr", _NS)
+    _scheme_fill(title, "accent1")
+
+    for level in styles.find("p:bodyStyle", _NS):
+        if not level.tag.endswith("pPr"):
+            continue
+        for old in level.findall("a:buClr", _NS):
+            level.remove(old)
+        bullet_color = etree.Element(_tag("a", "buClr"))
+        etree.SubElement(bullet_color, _tag("a", "schemeClr"), val="accent2")
+        anchor = next((child for child in level if etree.QName(child).localname in _AFTER_BULLET_COLOR), None)
+        if anchor is not None:
+            anchor.addprevious(bullet_color)
+        else:
+            level.append(bullet_color)
+
+
+def _add_bar(tree, top: int, width: int, height: int) -> None:
+    """主色の帯を図形の最背面（プレースホルダーより後ろ）に追加する"""
+    from pptx.oxml import parse_xml
+
+    shape_id = max(int(value) for value in tree.xpath("//p:cNvPr/@id")) + 1
+    bar = parse_xml(
+        f'<p:sp xmlns:p="{_P}" xmlns:a="{_A}">'
+        f'<p:nvSpPr><p:cNvPr id="{shape_id}" name="Accent Bar"/><p:cNvSpPr/><p:nvPr userDrawn="1"/></p:nvSpPr>'
+        f'<p:spPr><a:xfrm><a:off x="0" y="{top}"/><a:ext cx="{width}" cy="{height}"/></a:xfrm>'
+        '<a:prstGeom prst="rect"><a:avLst/></a:prstGeom>'
+        '<a:solidFill><a:schemeClr val="accent1"/></a:solidFill><a:ln><a:noFill/></a:ln></p:spPr>'
+        "</p:sp>"
+    )
+    tree.find("p:grpSpPr", _NS).addnext(bar)
+
+
+def _add_accent_bars(pptx) -> None:
+    """通常のスライドは上端、表紙は下端に主色の帯を配置する（プレビューのSVGと同じ配置）"""
+    width, height = pptx.slide_width, pptx.slide_height
+    _add_bar(pptx.slide_master._element.cSld.spTree, 0, width, int(height * CONTENT_BAR_RATIO))
+
+    # 表紙のレイアウトにはマスターの帯を表示せず、下端に独自の帯を置く
+    title_layout = pptx.slide_layouts[0]
+    title_layout._element.set("showMasterSp", "0")
+    bar_height = int(height * TITLE_BAR_RATIO)
+    _add_bar(title_layout._element.cSld.spTree, height - bar_height, width, bar_height)
+
+
+def build_theme_template(theme: str):
+    """既定のテンプレートにテーマの配色・フォント・装飾を適用したプレゼンテーションを作成する"""
+    # python-pptxの読み込みは重いため、テンプレートの作成時に読み込む
+    from pptx import Presentation as PPTXPresentation
+
+    theme = resolve_theme(theme)
+    settings = get_theme_settings(theme)
+    pptx = PPTXPresentation()
+    _apply_color_and_font_scheme(pptx, theme, settings)
+    _apply_text_styles(pptx.slide_master)
+    _add_accent_bars(pptx)
+    return pptx
+
+
+def _prototype(theme: str):
+    theme = resolve_theme(theme)
+    prototype = _prototypes.get(theme)
+    if prototype is None:
+        with _lock:
+            prototype = _prototypes.get(theme)
+            if prototype is None:
+                prototype = _prototypes[theme] = build_theme_template(theme)
+    return prototype
+
+
+def new_themed_pptx(theme: str):
+    """テーマ適用済みの原型を複製して、新しいプレゼンテーションを返す（原型は変更しない）"""
+    # 既定テンプレートの再解析とテーマの再適用を避け、解析済みのオブジェクトを複製する
+    pptx = copy.deepcopy(_prototype(theme))
+    for obj in (pptx, *pptx.part.package.iter_parts()):
+        for name in _SUBTREE_VIEW_CACHES:
+            obj.__dict__.pop(name, None)
+    return pptx
+
+
+def warm_theme_prototypes(themes: Optional[Iterable[str]] = None) -> None:
+    """全テーマの原型を事前に作成しておく（ワーカーの起動時などに呼ぶ）"""
+    for theme in themes or THEMES:
+        _prototype(theme)
+    logger.debug(f"テーマの原型を作成しました: {sorted(_prototypes)}")
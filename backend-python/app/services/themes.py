@@ -0,0 +1,51 @@
+import logging
+from typing import Any, Dict
+
+# ロガーの初期化
+logger = logging.getLogger(__name__)
+
+
+# 未知のテーマが指定された場合に使うテーマ
+DEFAULT_THEME = "modern"
+
+THEMES: Dict[str, Dict[str, Any]] = {
+    "modern": {
+        "primary_color": "0EA5E9",
+        "secondary_color": "7DD3FC",
+        "text_color": "374151",
+        "title_font": "Arial",
+        "content_font": "Arial",
+    },
+    "business": {
+        "primary_color": "1E40AF",
+        "secondary_color": "3B82F6",
+        "text_color": "1F2937",
+        "title_font": "Calibri",
+        "content_font": "Calibri",
+    },
+    "creative": {
+        "primary_color": "8B5CF6",
+        "secondary_color": "C4B5FD",
+        "text_color": "4B5563",
+        "title_font": "Segoe UI",
+        "content_font": "Segoe UI",
+    },
+    "minimal": {
+        "primary_color": "64748B",
+        "secondary_color": "94A3B8",
+        "text_color": "334155",
+        "title_font": "Helvetica",
+        "content_font": "Helvetica",
+    },
+}
+
+
+def resolve_theme(theme: str) -> str:
+    """テーマ名を正規化する（未知のテーマは既定のテーマとして扱う）"""
+    return theme if theme in THEMES else DEFAULT_THEME
+
+
+def get_theme_settings(theme: str) -> Dict[str, Any]:
+    """テーマに基づいた設定を取得する"""
+    logger.debug(f"テーマ {theme} の設定を取得")
+    return THEMES[resolve_theme(theme)]
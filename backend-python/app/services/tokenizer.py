@@ -0,0 +1,44 @@
+import logging
+import unicodedata
+from functools import lru_cache
+
+# ロガーの初期化
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=8)
+def _get_encoding(model: str):
+    # tiktokenは任意の依存関係（未インストール時は文字種ベースの概算を使う）。初回利用時に読み込む
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        # エンコーディングファイルを取得できない環境では概算にフォールバック
+        logger.warning(f"tiktokenのエンコーディングを取得できません: {str(e)}")
+        return None
+
+
+def _is_wide(ch: str) -> bool:
+    return unicodedata.east_asian_width(ch) in ("W", "F")
+
+
+def estimate_tokens(text: str) -> int:
+    """tiktokenなしでトークン数を概算する（全角文字は1文字≒1トークン、その他は4文字≒1トークン）"""
+    wide = sum(1 for ch in text if _is_wide(ch))
+    narrow = len(text) - wide
+    return wide + (narrow + 3) // 4
+
+
+def count_tokens(text: str, model: str = "gpt-4") -> int:
+    """テキストのトークン数を数える"""
+    if not text:
+        return 0
+    encoding = _get_encoding(model)
+    if encoding is None:
+        return estimate_tokens(text)
+    return len(encoding.encode(text, disallowed_special=()))
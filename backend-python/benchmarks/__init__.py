@@ -0,0 +1 @@
+# ベンチマークスクリプトをパッケージとして実行するための空の__init__.pyファイル
@@ -0,0 +1,163 @@
+"""PPTXレンダリングのマイクロベンチマーク
+
+generate_powerpoint_fileをスライド数10/100/1000で計測する。
+毎回内容を変えて生成物キャッシュに当たらない状態（cold）と、
+同じ内容を再度要求した場合（cached）の両方を記録する。
+--enginesにstreamを含めると、ストリーミングエンジン（iter_pptx_stream）の
+全体の所要時間、最初のチャンクまでの時間、確保したメモリのピークも記録する。
+
+使い方（backend-pythonディレクトリで実行）:
+    python -m benchmarks.bench_render --slides 10,100,1000 --repeat 3 --output render.json
+    python -m benchmarks.bench_render --slides 500,2000 --engines pptx,stream --output render.json
+"""
+import os
+import sys
+import time
+import uuid
+import asyncio
+import argparse
+import tempfile
+import tracemalloc
+from typing import Any, Dict, List, Optional
+
+from benchmarks.common import build_report, percentile, read_rss_bytes, write_report
+
+
+def build_presentation(slide_count: int, items_per_slide: int):
+    from app.schemas.presentation import Presentation, Slide
+
+    marker = uuid.uuid4().hex[:8]
+    presentation_id = str(uuid.uuid4())
+    return Presentation(
+        id=presentation_id,
+        theme="modern",
+        created_at=time.strftime("%Y-%m-%dT%H:%M:%S"),
+        download_url=f"/api/presentations/{presentation_id}/download",
+        slides=[
+            Slide(
+                title=f"スライド{i + 1} {marker}",
+                content=[f"項目{i + 1}-{j + 1}：レンダリング計測用のテキストです" for j in range(items_per_slide)],
+            )
+            for i in range(slide_count)
+        ],
+    )
+
+
+def measure_stream(slide_count: int, args: argparse.Namespace) -> Dict[str, Any]:
+    from app.services.pptx_stream_writer import get_stream_template, iter_pptx_stream
+
+    # テンプレートの作成（テーマごとに初回のみ）は計測に含めない
+    get_stream_template("modern")
+    totals: List[float] = []
+    first_chunks: List[float] = []
+    peak = 0
+    size = 0
+    for _ in range(args.repeat):
+        presentation = build_presentation(slide_count, args.items_per_slide)
+        tracemalloc.start()
+        start = time.perf_counter()
+        size = 0
+        for chunk in iter_pptx_stream(presentation):
+            if size == 0:
+                first_chunks.append(time.perf_counter() - start)
+            size += len(chunk)
+        totals.append(time.perf_counter() - start)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+
+    result = {
+        "benchmark": "iter_pptx_stream",
+        "slides": slide_count,
+        "repeat": args.repeat,
+        "cold_p50_ms": round(percentile(totals, 0.5) * 1000, 3),
+        "cold_ms_per_slide": round(percentile(totals, 0.5) * 1000 / slide_count, 3),
+        "first_chunk_p50_ms": round(percentile(first_chunks, 0.5) * 1000, 3),
+        "peak_alloc_bytes": peak,
+        "file_bytes": size,
+    }
+    print(
+        f"slides={slide_count:<5} stream={result['cold_p50_ms']}ms first_chunk={result['first_chunk_p50_ms']}ms "
+        f"peak_alloc={peak}bytes size={size}bytes",
+        file=sys.stderr,
+    )
+    return result
+
+
+async def run_benchmark(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    from app.services import presentation_service
+
+    engines = args.engines.split(",")
+    render_pool = presentation_service.render_pool
+    render_pool.start()
+    results = []
+    try:
+        for slide_count in (int(value) for value in args.slides.split(",")):
+            if "stream" in engines:
+                results.append(measure_stream(slide_count, args))
+            if "pptx" not in engines:
+                continue
+            cold: List[float] = []
+            cached: List[float] = []
+            size = 0
+            for _ in range(args.repeat):
+                presentation = build_presentation(slide_count, args.items_per_slide)
+                start = time.perf_counter()
+                path = await presentation_service.generate_powerpoint_file(presentation)
+                cold.append(time.perf_counter() - start)
+                size = os.path.getsize(path)
+
+                start = time.perf_counter()
+                await presentation_service.generate_powerpoint_file(presentation)
+                cached.append(time.perf_counter() - start)
+
+            result = {
+                "benchmark": "generate_powerpoint_file",
+                "slides": slide_count,
+                "repeat": args.repeat,
+                "cold_p50_ms": round(percentile(cold, 0.5) * 1000, 3),
+                "cold_max_ms": round(max(cold) * 1000, 3),
+                "cold_ms_per_slide": round(percentile(cold, 0.5) * 1000 / slide_count, 3),
+                "cached_p50_ms": round(percentile(cached, 0.5) * 1000, 3),
+                "file_bytes": size,
+                "rss_bytes": read_rss_bytes(),
+            }
+            results.append(result)
+            print(
+                f"slides={slide_count:<5} cold={result['cold_p50_ms']}ms "
+                f"({result['cold_ms_per_slide']}ms/slide) cached={result['cached_p50_ms']}ms "
+                f"size={size}bytes",
+                file=sys.stderr,
+            )
+    finally:
+        render_pool.shutdown()
+    return results
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="PPTXレンダリングのマイクロベンチマーク")
+    parser.add_argument("--slides", default="10,100,1000", help="スライド数（カンマ区切り）")
+    parser.add_argument("--items-per-slide", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--render-workers", default="", help="PPTX_RENDER_WORKERSの値（未指定は既定値）")
+    parser.add_argument("--engines", default="pptx", help="計測するエンジン（pptx,streamのカンマ区切り）")
+    parser.add_argument("--output", help="結果のJSONを書き出すパス（未指定は標準出力）")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    with tempfile.TemporaryDirectory() as work_dir:
+        # サービスの読み込み前に出力先を一時ディレクトリへ切り替える
+        os.environ.setdefault("OPENAI_API_KEY", "benchmark-key")
+        os.environ["PPTX_CACHE_DIR"] = os.path.join(work_dir, "artifacts")
+        os.environ["PRESENTATION_STORE"] = "memory"
+        if args.render_workers:
+            os.environ["PPTX_RENDER_WORKERS"] = args.render_workers
+        results = asyncio.run(run_benchmark(args))
+
+    config = {key: value for key, value in vars(args).items() if key != "output"}
+    write_report(build_report("bench_render", results, config), args.output)
+
+
+if __name__ == "__main__":
+    main()
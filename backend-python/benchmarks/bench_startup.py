@@ -0,0 +1,105 @@
+"""起動時間のベンチマーク
+
+アプリケーションの読み込み時間（import main）と、プロセス起動から
+/api/healthが最初に200を返すまでの時間を計測する。
+
+使い方（backend-pythonディレクトリで実行）:
+    python -m benchmarks.bench_startup --repeat 5 --output startup.json
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import subprocess
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from benchmarks.common import build_report, percentile, write_report
+from benchmarks.fake_openai_server import _free_port
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_IMPORT_SCRIPT = "import time; start = time.perf_counter(); import main; print(time.perf_counter() - start)"
+
+
+def measure_import(env: Dict[str, str]) -> float:
+    """新しいプロセスでmainを読み込むまでの秒数"""
+    output = subprocess.run(
+        [sys.executable, "-c", _IMPORT_SCRIPT],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True,
+    ).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def measure_first_healthy(env: Dict[str, str], timeout: float = 60) -> float:
+    """uvicornの起動から/api/healthが200を返すまでの秒数"""
+    port = _free_port()
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+        env=env,
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            if process.poll() is not None:
+                raise RuntimeError("アプリケーションの起動に失敗しました")
+            try:
+                if httpx.get(f"http://127.0.0.1:{port}/api/health", timeout=1).status_code == 200:
+                    return time.perf_counter() - start
+            except httpx.TransportError:
+                time.sleep(0.005)
+        raise RuntimeError("アプリケーションの起動がタイムアウトしました")
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+def run_benchmark(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    with tempfile.TemporaryDirectory() as work_dir:
+        env = dict(
+            os.environ,
+            OPENAI_API_KEY="benchmark-key",
+            PPTX_CACHE_DIR=os.path.join(work_dir, "artifacts"),
+            LLM_CACHE_DIR="",
+            LOG_LEVEL="WARNING",
+        )
+        if args.render_workers:
+            env["PPTX_RENDER_WORKERS"] = args.render_workers
+        imports = [measure_import(env) for _ in range(args.repeat)]
+        healthy = [measure_first_healthy(env) for _ in range(args.repeat)]
+
+    result = {
+        "benchmark": "startup",
+        "repeat": args.repeat,
+        "import_p50_ms": round(percentile(imports, 0.5) * 1000, 3),
+        "import_max_ms": round(max(imports) * 1000, 3),
+        "first_healthy_p50_ms": round(percentile(healthy, 0.5) * 1000, 3),
+        "first_healthy_max_ms": round(max(healthy) * 1000, 3),
+    }
+    print(
+        f"import={result['import_p50_ms']}ms first_healthy={result['first_healthy_p50_ms']}ms",
+        file=sys.stderr,
+    )
+    return [result]
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="起動時間のベンチマーク")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--render-workers", default="", help="PPTX_RENDER_WORKERSの値（未指定は既定値）")
+    parser.add_argument("--output", help="結果のJSONを書き出すパス（未指定は標準出力）")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    results = run_benchmark(args)
+    config = {key: value for key, value in vars(args).items() if key != "output"}
+    write_report(build_report("bench_startup", results, config), args.output)
+
+
+if __name__ == "__main__":
+    main()
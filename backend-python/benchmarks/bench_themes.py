@@ -0,0 +1,87 @@
+"""テーマテンプレートのマイクロベンチマーク
+
+レンダリングごとに既定テンプレートを読み込んでテーマを適用する方式（reload）と、
+起動時に作成した原型を複製する方式（clone）を比較する。テンプレートの準備のみの時間と、
+小さなプレゼンテーション全体のレンダリング時間の両方を記録する。
+
+使い方（backend-pythonディレクトリで実行）:
+    python -m benchmarks.bench_themes --repeat 200 --slides 10 --output themes.json
+"""
+import io
+import sys
+import time
+import argparse
+from typing import Any, Callable, Dict, List, Optional
+
+from benchmarks.common import build_report, percentile, write_report
+from benchmarks.bench_render import build_presentation
+
+
+def _measure(func: Callable[[], Any], repeat: int) -> List[float]:
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def run_benchmark(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    from app.services.pptx_renderer import _add_slide
+    from app.services.theme_templates import build_theme_template, new_themed_pptx, warm_theme_prototypes
+
+    warm_theme_prototypes()
+    presentation = build_presentation(args.slides, args.items_per_slide)
+
+    def render(factory: Callable[[str], Any]) -> None:
+        pptx = factory(presentation.theme)
+        for i, slide_data in enumerate(presentation.slides):
+            _add_slide(pptx, slide_data, is_title=(i == 0))
+        pptx.save(io.BytesIO())
+
+    results = []
+    for mode, factory in (("reload", build_theme_template), ("clone", new_themed_pptx)):
+        template = _measure(lambda: factory(presentation.theme), args.repeat)
+        full = _measure(lambda: render(factory), max(1, args.repeat // 10))
+        result = {
+            "benchmark": "theme_template",
+            "scenario": mode,
+            "slides": args.slides,
+            "repeat": args.repeat,
+            "template_p50_ms": round(percentile(template, 0.5) * 1000, 3),
+            "template_p95_ms": round(percentile(template, 0.95) * 1000, 3),
+            "render_p50_ms": round(percentile(full, 0.5) * 1000, 3),
+        }
+        results.append(result)
+        print(
+            f"{mode:<6} template={result['template_p50_ms']}ms render({args.slides}slides)={result['render_p50_ms']}ms",
+            file=sys.stderr,
+        )
+
+    reload_result, clone_result = results
+    print(
+        f"原型の複製による短縮: テンプレート {reload_result['template_p50_ms'] / clone_result['template_p50_ms']:.2f}倍, "
+        f"レンダリング全体 {reload_result['render_p50_ms'] / clone_result['render_p50_ms']:.2f}倍",
+        file=sys.stderr,
+    )
+    return results
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="テーマテンプレートのマイクロベンチマーク")
+    parser.add_argument("--slides", type=int, default=10, help="レンダリング全体を計測するスライド数")
+    parser.add_argument("--items-per-slide", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--output", help="結果のJSONを書き出すパス（未指定は標準出力）")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    results = run_benchmark(args)
+    config = {key: value for key, value in vars(args).items() if key != "output"}
+    write_report(build_report("bench_themes", results, config), args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""ベンチマーク共通の集計・出力処理"""
+import os
+import sys
+import json
+import time
+import platform
+import resource
+from typing import Any, Dict, List, Optional
+
+
+def percentile(values: List[float], q: float) -> float:
+    """線形補間でパーセンタイル値を求める"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize_latencies(latencies: List[float], elapsed: float, errors: int) -> Dict[str, float]:
+    """レイテンシ(秒)のリストからp50/p95/p99とスループットを計算する"""
+    return {
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 3) if elapsed > 0 else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "max_ms": round(max(latencies) * 1000, 3) if latencies else 0.0,
+    }
+
+
+def read_rss_bytes(pid: Optional[int] = None) -> int:
+    """プロセスの現在のRSSを返す（/procが無い環境では自プロセスの最大RSS）"""
+    path = f"/proc/{pid or os.getpid()}/status"
+    try:
+        with open(path) as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOSはバイト、Linuxはキロバイト単位
+    return usage if sys.platform == "darwin" else usage * 1024
+
+
+def build_report(benchmark: str, results: List[Dict[str, Any]], config: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "benchmark": benchmark,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "config": config,
+        "results": results,
+    }
+
+
+def write_report(report: Dict[str, Any], output: Optional[str]) -> None:
+    """結果をJSONで出力する（outputが未指定なら標準出力）"""
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        print(f"結果を書き出しました: {output}", file=sys.stderr)
+    else:
+        print(text)
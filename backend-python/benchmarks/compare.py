@@ -0,0 +1,102 @@
+"""ベンチマーク結果をベースラインと比較する
+
+CIで保存済みのベースラインと今回の結果を突き合わせ、
+許容範囲を超えて悪化した項目があれば終了コード1で終了する。
+
+使い方（backend-pythonディレクトリで実行）:
+    python -m benchmarks.compare baseline.json current.json --tolerance 0.2
+"""
+import sys
+import json
+import argparse
+from typing import Any, Dict, List, Optional, Tuple
+
+# 比較する指標と、値が小さいほど良いかどうか
+METRICS = {
+    "p50_ms": True,
+    "p95_ms": True,
+    "p99_ms": True,
+    "rps": False,
+    "errors": True,
+    "rss_bytes": True,
+    "cold_p50_ms": True,
+    "cached_p50_ms": True,
+    "file_bytes": True,
+    "import_p50_ms": True,
+    "first_healthy_p50_ms": True,
+    "template_p50_ms": True,
+    "render_p50_ms": True,
+    "first_chunk_p50_ms": True,
+    "peak_alloc_bytes": True,
+}
+# 結果を特定するためのキー
+IDENTITY_KEYS = ("benchmark", "scenario", "concurrency", "slides")
+
+
+def result_key(result: Dict[str, Any]) -> Tuple:
+    return tuple((key, result[key]) for key in IDENTITY_KEYS if key in result)
+
+
+def compare_reports(
+    baseline: Dict[str, Any],
+    current: Dict[str, Any],
+    tolerance: float,
+    metrics: Optional[List[str]] = None,
+) -> List[Dict[str, Any]]:
+    """ベースラインに対する悪化（tolerance超）を一覧で返す"""
+    baseline_results = {result_key(result): result for result in baseline.get("results", [])}
+    regressions = []
+    for result in current.get("results", []):
+        base = baseline_results.get(result_key(result))
+        if base is None:
+            continue
+        for metric, lower_is_better in METRICS.items():
+            if metrics and metric not in metrics:
+                continue
+            if metric not in result or metric not in base:
+                continue
+            before, after = float(base[metric]), float(result[metric])
+            if lower_is_better:
+                # エラー件数のように0が基準となる指標は増加そのものを悪化とみなす
+                regressed = after > before * (1 + tolerance) if before > 0 else after > 0
+            else:
+                regressed = after < before * (1 - tolerance)
+            if regressed:
+                regressions.append({
+                    "key": dict(result_key(result)),
+                    "metric": metric,
+                    "baseline": before,
+                    "current": after,
+                })
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="ベンチマーク結果をベースラインと比較する")
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="許容する悪化率（0.2は20%%）")
+    parser.add_argument("--metrics", default="", help="比較する指標（カンマ区切り、未指定は全て）")
+    args = parser.parse_args(argv)
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.current, encoding="utf-8") as f:
+        current = json.load(f)
+
+    metrics = [metric for metric in args.metrics.split(",") if metric]
+    regressions = compare_reports(baseline, current, args.tolerance, metrics or None)
+    for regression in regressions:
+        print(
+            f"悪化: {regression['key']} {regression['metric']}: "
+            f"{regression['baseline']} -> {regression['current']}",
+            file=sys.stderr,
+        )
+    if regressions:
+        return 1
+    print("ベースラインからの悪化はありません", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,232 @@
+"""オフラインでのテスト・ベンチマーク用のOpenAI互換スタブサーバー
+
+Chat Completions API（通常/ストリーミング）のみを実装し、
+応答遅延・スライド数・同時実行数の計測と、エラー・遅延などの障害の注入を設定できる。
+"""
+import json
+import time
+import uuid
+import random
+import socket
+import asyncio
+import threading
+from typing import Any, Dict, List, Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+class FakeOpenAIState:
+    """スタブサーバーの設定と計測値"""
+
+    def __init__(self):
+        self.latency_seconds = 0.0
+        # 0より大きい場合は出力トークン数に応じて応答を遅らせる（1トークン≒4文字として計算）
+        self.tokens_per_second = 0.0
+        self.slide_count = 3
+        self.items_per_slide = 2
+        self.item_chars = 0
+        # Trueの場合は応答ごとに内容を変える（生成物のキャッシュを効かせない計測用）
+        self.unique_content = False
+        self.chunk_size = 16
+        self.chunk_interval_seconds = 0.0
+        self.content: Optional[str] = None
+        # 次のリクエストから順に返す応答本文（空になった後はcontentまたは既定の内容を返す）
+        self.content_plan: List[str] = []
+        # 障害の注入: 次のリクエストから順に適用する（"500"・"429"等はそのステータスのエラー、
+        # "timeout"はstall_seconds秒応答しない、"slow"はslow_seconds秒遅らせる、"ok"は障害なし）
+        self.fault_plan: List[str] = []
+        # 確率的な障害の注入（負荷試験用）
+        self.error_rate = 0.0
+        self.error_status = 500
+        self.slow_rate = 0.0
+        self.slow_seconds = 0.0
+        self.stall_seconds = 30.0
+        self.faults_injected = 0
+        self.requests: List[Dict[str, Any]] = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def build_content(self) -> str:
+        if self.content_plan:
+            return self.content_plan.pop(0)
+        if self.content is not None:
+            return self.content
+        padding = "あ" * self.item_chars
+        suffix = f" ({uuid.uuid4().hex[:8]})" if self.unique_content else ""
+        return json.dumps({
+            "slides": [
+                {
+                    "title": f"スライド{i + 1}{suffix}",
+                    "content": [f"項目{i + 1}-{j + 1}{padding}" for j in range(self.items_per_slide)],
+                }
+                for i in range(self.slide_count)
+            ]
+        }, ensure_ascii=False)
+
+    def next_fault(self) -> Optional[str]:
+        if self.fault_plan:
+            fault = self.fault_plan.pop(0)
+        elif self.error_rate and random.random() < self.error_rate:
+            fault = str(self.error_status)
+        elif self.slow_rate and random.random() < self.slow_rate:
+            fault = "slow"
+        else:
+            return None
+        if fault != "ok":
+            self.faults_injected += 1
+        return fault
+
+    def generation_seconds(self, content: str) -> float:
+        if self.tokens_per_second <= 0:
+            return 0.0
+        return (len(content) / 4) / self.tokens_per_second
+
+
+def create_fake_openai_app(state: FakeOpenAIState) -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        state.requests.append(body)
+        state.in_flight += 1
+        state.max_in_flight = max(state.max_in_flight, state.in_flight)
+        fault = state.next_fault()
+        if fault is not None and fault.isdigit():
+            state.in_flight -= 1
+            return JSONResponse(
+                status_code=int(fault),
+                content={"error": {"message": f"injected fault ({fault})", "type": "server_error", "code": None}},
+            )
+        try:
+            if fault == "timeout":
+                await asyncio.sleep(state.stall_seconds)
+            elif fault == "slow":
+                await asyncio.sleep(state.slow_seconds)
+            if state.latency_seconds:
+                await asyncio.sleep(state.latency_seconds)
+            content = state.build_content()
+            if not body.get("stream") and state.tokens_per_second > 0:
+                await asyncio.sleep(state.generation_seconds(content))
+        finally:
+            if not body.get("stream"):
+                state.in_flight -= 1
+
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+        if not body.get("stream"):
+            return JSONResponse({
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": body.get("model", "gpt-4"),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop",
+                }],
+                "usage": {
+                    "prompt_tokens": len(json.dumps(body.get("messages", []))) // 4,
+                    "completion_tokens": len(content) // 4,
+                    "total_tokens": (len(json.dumps(body.get("messages", []))) + len(content)) // 4,
+                },
+            })
+
+        async def event_stream():
+            interval = state.chunk_interval_seconds
+            if state.tokens_per_second > 0:
+                interval = state.generation_seconds(content[:state.chunk_size])
+            try:
+                for i in range(0, len(content), state.chunk_size):
+                    chunk = {
+                        "id": completion_id,
+                        "object": "chat.completion.chunk",
+                        "created": created,
+                        "model": body.get("model", "gpt-4"),
+                        "choices": [{
+                            "index": 0,
+                            "delta": {"content": content[i:i + state.chunk_size]},
+                            "finish_reason": None,
+                        }],
+                    }
+                    yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+                    if interval:
+                        await asyncio.sleep(interval)
+                yield "data: [DONE]\n\n"
+            finally:
+                state.in_flight -= 1
+
+        return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+    return app
+
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class FakeOpenAIServer:
+    """スタブサーバーを別スレッドで起動・停止する"""
+
+    def __init__(self, port: Optional[int] = None):
+        self.state = FakeOpenAIState()
+        self.port = port or _free_port()
+        config = uvicorn.Config(
+            create_fake_openai_app(self.state),
+            host="127.0.0.1",
+            port=self.port,
+            log_level="warning",
+        )
+        self._server = uvicorn.Server(config)
+        self._thread = threading.Thread(target=self._server.run, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/v1"
+
+    def start(self) -> "FakeOpenAIServer":
+        self._thread.start()
+        deadline = time.time() + 10
+        while not self._server.started:
+            if time.time() > deadline:
+                raise RuntimeError("スタブOpenAIサーバーの起動がタイムアウトしました")
+            time.sleep(0.01)
+        return self
+
+    def stop(self) -> None:
+        self._server.should_exit = True
+        self._thread.join(timeout=10)
+
+
+if __name__ == "__main__":
+    # ベンチマーク等から単体で起動する場合
+    import argparse
+
+    parser = argparse.ArgumentParser(description="OpenAI互換スタブサーバー")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--tokens-per-second", type=float, default=0.0)
+    parser.add_argument("--slides", type=int, default=10)
+    parser.add_argument("--item-chars", type=int, default=0)
+    parser.add_argument("--unique-content", action="store_true")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=500)
+    parser.add_argument("--slow-rate", type=float, default=0.0)
+    parser.add_argument("--slow-seconds", type=float, default=0.0)
+    args = parser.parse_args()
+
+    state = FakeOpenAIState()
+    state.latency_seconds = args.latency
+    state.tokens_per_second = args.tokens_per_second
+    state.slide_count = args.slides
+    state.item_chars = args.item_chars
+    state.unique_content = args.unique_content
+    state.error_rate = args.error_rate
+    state.error_status = args.error_status
+    state.slow_rate = args.slow_rate
+    state.slow_seconds = args.slow_seconds
+    uvicorn.run(create_fake_openai_app(state), host="127.0.0.1", port=args.port, log_level="warning")
@@ -0,0 +1,225 @@
+"""オフライン負荷テスト
+
+スタブOpenAIサーバーに対してアプリケーション（main:app）を別プロセスで起動し、
+生成・取得・ダウンロードのエンドポイントを同時実行数を段階的に上げながら計測する。
+
+使い方（backend-pythonディレクトリで実行）:
+    python -m benchmarks.load_test --concurrency 1,4,16 --requests 50 --output load.json
+"""
+import os
+import sys
+import time
+import uuid
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+from benchmarks.common import build_report, read_rss_bytes, summarize_latencies, write_report
+from benchmarks.fake_openai_server import FakeOpenAIServer, _free_port
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCENARIOS = ("generate", "get", "download", "download_cold")
+
+
+def start_app(port: int, env: Dict[str, str], timeout: float = 60) -> subprocess.Popen:
+    """uvicornでアプリケーションを起動し、ヘルスチェックが通るまで待つ"""
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+        env=env,
+    )
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("アプリケーションの起動に失敗しました")
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/api/health").status_code == 200:
+                return process
+        except httpx.TransportError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("アプリケーションの起動がタイムアウトしました")
+
+
+def generate_payload(slide_count: int, unique: bool = True) -> Dict[str, Any]:
+    # LLMキャッシュに当たらないよう、既定ではリクエストごとに入力を変える
+    suffix = uuid.uuid4().hex if unique else "fixed"
+    return {
+        "text": f"負荷テスト用の入力テキストです。{suffix}",
+        "options": {"slide_count": slide_count, "include_images": False},
+    }
+
+
+async def create_presentations(client: httpx.AsyncClient, count: int, slide_count: int) -> List[str]:
+    """取得・ダウンロードの計測に使うプレゼンテーションを事前に作成する"""
+    ids = []
+    for _ in range(count):
+        response = await client.post("/api/presentations/generate", json=generate_payload(slide_count))
+        response.raise_for_status()
+        ids.append(response.json()["id"])
+    return ids
+
+
+async def run_level(
+    client: httpx.AsyncClient,
+    scenario: str,
+    concurrency: int,
+    total: int,
+    slide_count: int,
+    presentation_ids: List[str],
+    deadline: float = 0.0,
+) -> Tuple[List[float], int, int, float]:
+    """指定の同時実行数でtotal件のリクエストを送り、レイテンシ・エラー数・受付を拒否された件数を収集する
+
+    deadlineを指定した場合、生成リクエストは締め切りをX-Request-Timeoutで伝え、締め切りを過ぎたら待つのをやめる。
+    """
+    latencies: List[float] = []
+    errors = 0
+    rejected = 0
+    next_index = 0
+
+    async def send(index: int) -> httpx.Response:
+        if scenario == "generate":
+            if deadline > 0:
+                return await client.post(
+                    "/api/presentations/generate",
+                    json=generate_payload(slide_count),
+                    headers={"X-Request-Timeout": str(deadline)},
+                    timeout=deadline,
+                )
+            return await client.post("/api/presentations/generate", json=generate_payload(slide_count))
+        if scenario == "get":
+            return await client.get(f"/api/presentations/{presentation_ids[0]}")
+        if scenario == "download":
+            return await client.get(f"/api/presentations/{presentation_ids[0]}/download")
+        # download_cold: 毎回別のプレゼンテーションを取得し、レンダリングを発生させる
+        return await client.get(f"/api/presentations/{presentation_ids[index]}/download")
+
+    async def worker():
+        nonlocal next_index, errors, rejected
+        while next_index < total:
+            index = next_index
+            next_index += 1
+            start = time.perf_counter()
+            try:
+                response = await send(index)
+                status = response.status_code
+            except httpx.HTTPError:
+                status = None
+            if status == 200:
+                latencies.append(time.perf_counter() - start)
+            elif status == 503:
+                # 混雑による早期の拒否（クライアントは待たずに済む）
+                rejected += 1
+            else:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, errors, rejected, time.perf_counter() - start
+
+
+async def run_benchmark(args: argparse.Namespace, base_url: str, app_pid: int) -> List[Dict[str, Any]]:
+    levels = [int(value) for value in args.concurrency.split(",")]
+    scenarios = args.scenarios.split(",")
+    limits = httpx.Limits(max_connections=max(levels) * 2, max_keepalive_connections=max(levels) * 2)
+    results = []
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+        presentation_ids = await create_presentations(client, 1, args.slides)
+        for scenario in scenarios:
+            if scenario not in SCENARIOS:
+                raise SystemExit(f"不明なシナリオです: {scenario}")
+            for concurrency in levels:
+                ids = presentation_ids
+                if scenario == "download_cold":
+                    ids = await create_presentations(client, args.requests, args.slides)
+                latencies, errors, rejected, elapsed = await run_level(
+                    client, scenario, concurrency, args.requests, args.slides, ids, args.deadline
+                )
+                result = {
+                    "scenario": scenario,
+                    "concurrency": concurrency,
+                    **summarize_latencies(latencies, elapsed, errors),
+                    "requests": len(latencies) + errors + rejected,
+                    "rejected": rejected,
+                    "rss_bytes": read_rss_bytes(app_pid),
+                }
+                results.append(result)
+                print(
+                    f"{scenario:>14} c={concurrency:<4} rps={result['rps']:<9} "
+                    f"p50={result['p50_ms']}ms p95={result['p95_ms']}ms p99={result['p99_ms']}ms "
+                    f"errors={errors} rejected={rejected} rss={result['rss_bytes'] // (1024 * 1024)}MiB",
+                    file=sys.stderr,
+                )
+    return results
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="オフライン負荷テスト")
+    parser.add_argument("--concurrency", default="1,4,16,64", help="同時実行数（カンマ区切り）")
+    parser.add_argument("--requests", type=int, default=50, help="同時実行数ごとのリクエスト数")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="計測するシナリオ（カンマ区切り）")
+    parser.add_argument("--latency", type=float, default=0.2, help="スタブOpenAIの応答遅延（秒）")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0, help="スタブOpenAIの出力速度（0は無制限）")
+    parser.add_argument("--slides", type=int, default=10, help="生成するスライド数")
+    parser.add_argument("--item-chars", type=int, default=0, help="箇条書き1項目あたりの追加文字数")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="スタブOpenAIがエラーを返す割合")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="スタブOpenAIの応答が遅れる割合")
+    parser.add_argument("--slow-seconds", type=float, default=0.0, help="遅れる応答の追加遅延（秒）")
+    parser.add_argument("--deadline", type=float, default=0.0, help="生成リクエストの締め切り（秒。0は指定なし）")
+    parser.add_argument("--admission", choices=("on", "off"), default="on", help="生成の受付制御の有効/無効")
+    parser.add_argument("--generation-concurrency", default="", help="GENERATION_MAX_CONCURRENCYの値（未指定は既定値）")
+    parser.add_argument("--render-workers", default="", help="PPTX_RENDER_WORKERSの値（未指定は既定値）")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--output", help="結果のJSONを書き出すパス（未指定は標準出力）")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    fake = FakeOpenAIServer()
+    fake.state.latency_seconds = args.latency
+    fake.state.tokens_per_second = args.tokens_per_second
+    fake.state.slide_count = args.slides
+    fake.state.item_chars = args.item_chars
+    fake.state.error_rate = args.error_rate
+    fake.state.slow_rate = args.slow_rate
+    fake.state.slow_seconds = args.slow_seconds
+    # download_coldでレンダリング結果のキャッシュに当たらないよう、応答内容を毎回変える
+    fake.state.unique_content = True
+    fake.start()
+
+    port = _free_port()
+    with tempfile.TemporaryDirectory() as work_dir:
+        env = dict(
+            os.environ,
+            OPENAI_API_KEY="benchmark-key",
+            OPENAI_BASE_URL=fake.base_url,
+            PRESENTATION_STORE="memory",
+            PPTX_CACHE_DIR=os.path.join(work_dir, "artifacts"),
+            LLM_CACHE_DIR="",
+            LOG_LEVEL="WARNING",
+        )
+        env["GENERATION_ADMISSION_ENABLED"] = "true" if args.admission == "on" else "false"
+        if args.generation_concurrency:
+            env["GENERATION_MAX_CONCURRENCY"] = args.generation_concurrency
+        if args.render_workers:
+            env["PPTX_RENDER_WORKERS"] = args.render_workers
+        app = start_app(port, env)
+        try:
+            results = asyncio.run(run_benchmark(args, f"http://127.0.0.1:{port}", app.pid))
+        finally:
+            app.terminate()
+            app.wait(timeout=30)
+            fake.stop()
+
+    config = {key: value for key, value in vars(args).items() if key != "output"}
+    write_report(build_report("load_test", results, config), args.output)
+
+
+if __name__ == "__main__":
+    main()
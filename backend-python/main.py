@@ -2,20 +2,34 @@ import uvicorn
 import logging
 import sys
 import os
+import json
+import asyncio
+import functools
 from fastapi import FastAPI, HTTPException, Depends, Request
+from starlette.background import BackgroundTask
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse, Response, PlainTextResponse
 from typing import Optional
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 import time
 
-# サービスとスキーマのインポート
-from app.services.presentation_service import generate_presentation_from_text, get_presentation_by_id, generate_powerpoint_file
-from app.schemas.presentation import PresentationRequest, Presentation
-
-# 環境変数の読み込み
+# 環境変数の読み込み（サービスのモジュール定数が参照するため先に読み込む）
 load_dotenv()
 
+# サービスとスキーマのインポート
+from app.services.presentation_service import generate_presentation_from_text, stream_presentation_from_text, get_presentation_by_id, fetch_presentation_by_id, generate_powerpoint_file, update_slide, regenerate_slide, get_image_path, render_presentation_preview, presentation_json_body, check_upstream_available, admit_generation, upstream_health, near_duplicate_report, warm_up, artifact_cache, render_pool, choose_download_engine, stream_artifact_key, stream_powerpoint_file
+from app.services.pptx_renderer import RenderPoolSaturated, RenderPoolUnavailable
+from app.services.resilience import CircuitOpenError
+from app.services.admission import AdmissionRejected, ClientDisconnected, cancel_on_disconnect, parse_deadline, DEADLINE_HEADER
+from app.services.artifact_cache import presentation_content_hash, etag_matches
+from app.services.response_cache import CachedBody, choose_encoding
+from app.services.metrics import REGISTRY, HTTP_LATENCY
+from app.services.job_queue import create_job_queue_from_env, JobQueueFull
+from app.services.profiler import create_request_profiler_from_env, PROFILE_FORMATS
+from app.services.batch_service import generate_presentations_batch, build_presentations_archive, BATCH_MAX_ITEMS
+from app.schemas.presentation import PresentationRequest, Presentation, BatchPresentationRequest, BatchArchiveRequest, JobStatus, SlideUpdate, SlideRegenerateRequest
+
 # ロギング設定
 log_level = os.getenv("LOG_LEVEL", "INFO").upper()
 logging.basicConfig(
@@ -25,10 +39,33 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# 生成ジョブのキュー（mode=jobの生成リクエストをバックグラウンドで処理）
+job_queue = create_job_queue_from_env()
+
+# 指定されたリクエストのみを計測するサンプリングプロファイラー（X-Profileヘッダーまたはサンプリング率で指定）
+request_profiler = create_request_profiler_from_env()
+
+# 起動後にバックグラウンドでOpenAIクライアントの作成などを済ませておくかどうか
+STARTUP_WARM_UP = os.getenv("STARTUP_WARM_UP", "true").lower() in ("1", "true", "yes")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # レンダリング用ワーカーを起動時に温めておく（プロセスの起動は待たない）
+    render_pool.start()
+    job_queue.start()
+    # 重い依存関係の読み込みは起動を待たせないようバックグラウンドで行う
+    warm_up_task = asyncio.create_task(warm_up()) if STARTUP_WARM_UP else None
+    yield
+    if warm_up_task is not None and not warm_up_task.done():
+        warm_up_task.cancel()
+    await job_queue.stop()
+    render_pool.shutdown()
+
 app = FastAPI(
     title="テキストからプレゼンテーション自動生成API",
     description="テキストからプレゼンテーション資料を自動生成するAPI",
-    version="0.1.0"
+    version="0.1.0",
+    lifespan=lifespan
 )
 
 # CORS設定を完全に許可
@@ -47,21 +84,36 @@ async def log_requests(request: Request, call_next):
     request_id = f"{time.time()}-{id(request)}"
     logger.info(f"Request [{request_id}] - {request.method} {request.url.path}")
     
-    # リクエストボディのログ
-    try:
-        body = await request.body()
-        if body:
-            body_str = body.decode("utf-8")
-            logger.debug(f"Request body [{request_id}]: {body_str[:1000]}{'...' if len(body_str) > 1000 else ''}")
-            # ボディを再設定（FastAPIの制限により必要）
-            request._body = body
-    except Exception as e:
-        logger.warning(f"Failed to log request body [{request_id}]: {str(e)}")
+    # リクエストボディのログ（DEBUG有効時のみ読み込む）
+    if logger.isEnabledFor(logging.DEBUG):
+        try:
+            body = await request.body()
+            if body:
+                body_str = body.decode("utf-8")
+                logger.debug(f"Request body [{request_id}]: {body_str[:1000]}{'...' if len(body_str) > 1000 else ''}")
+                # ボディを再設定（FastAPIの制限により必要）
+                request._body = body
+        except Exception as e:
+            logger.warning(f"Failed to log request body [{request_id}]: {str(e)}")
     
-    start_time = time.time()
+    start_time = time.perf_counter()
     response = await call_next(request)
-    process_time = time.time() - start_time
+    process_time = time.perf_counter() - start_time
+
+    # パスパラメータでラベルが増えないようルートのテンプレートで集計
+    route = request.scope.get("route")
+    HTTP_LATENCY.observe(
+        process_time,
+        method=request.method,
+        route=getattr(route, "path", "unmatched"),
+        status=str(response.status_code)
+    )
     
+    # プロファイルを取ったリクエストは、管理用APIで取得するためのIDを返す
+    profile_id = getattr(request.state, "profile_id", None)
+    if profile_id is not None:
+        response.headers["X-Profile-Id"] = profile_id
+
     logger.info(f"Response [{request_id}] - Status: {response.status_code} - Time: {process_time:.4f}s")
     return response
 
@@ -78,61 +130,387 @@ async def global_exception_handler(request: Request, exc: Exception):
 @app.get("/api/health")
 def health_check():
     logger.info("ヘルスチェックAPI呼び出し")
-    return {"status": "OK", "message": "Server is running"}
+    # 上流APIの障害時もサーバー自体は稼働しているため200を返し、状態のみDEGRADEDとする
+    upstream = upstream_health()
+    status = "DEGRADED" if upstream["circuit_state"] == "open" else "OK"
+    return {"status": status, "message": "Server is running", "upstream": upstream}
+
+def upstream_unavailable(e: CircuitOpenError) -> HTTPException:
+    """サーキットブレーカーが開いている場合の503応答"""
+    logger.warning(f"上流APIの障害のためリクエストを拒否しました: {str(e)}")
+    return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(max(1, int(e.retry_after + 0.5)))})
+
+def overloaded(e: AdmissionRejected) -> HTTPException:
+    """締め切りまでに生成を終えられない見込みの場合の503応答"""
+    return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(max(1, int(e.retry_after + 0.5)))})
+
+# メトリクス（Prometheusテキスト形式）
+@app.get("/api/metrics")
+def metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+# 類似入力インデックスの判定結果（類似度・再利用/パッチ/ミス）の確認API
+@app.get("/api/near-duplicates/report")
+def get_near_duplicate_report():
+    return near_duplicate_report()
+
+def profiled(name: str):
+    """エンドポイントをプロファイリングの対象にする（対象に選ばれなかったリクエストはそのまま呼び出す）"""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            request = next((value for value in kwargs.values() if isinstance(value, Request)), None)
+            if request is None or not request_profiler.should_profile(request.headers):
+                return await func(*args, **kwargs)
+            with request_profiler.profile(name, request.url.path) as session:
+                request.state.profile_id = session.id
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def require_admin(request: Request) -> None:
+    """管理用APIの認証（トークン未設定の場合は管理用API自体を無効にする）"""
+    if not request_profiler.admin_token:
+        raise HTTPException(status_code=404, detail="管理用APIは無効です（ADMIN_TOKENを設定してください）")
+    if not request_profiler.is_admin(request.headers):
+        raise HTTPException(status_code=403, detail="管理用トークンが正しくありません")
+
+# 記録済みプロファイルの一覧（新しい順）
+@app.get("/api/admin/profiles")
+def list_profiles(request: Request):
+    require_admin(request)
+    return {"profiles": request_profiler.profiles(), "stats": request_profiler.stats()}
+
+# 記録済みプロファイルの取得（format=speedscope または collapsed）
+@app.get("/api/admin/profiles/{profile_id}")
+def get_profile(profile_id: str, request: Request, format: str = "speedscope"):
+    require_admin(request)
+    if format not in PROFILE_FORMATS:
+        raise HTTPException(status_code=400, detail=f"不明な形式です: {format}（{', '.join(PROFILE_FORMATS)}のいずれかを指定してください）")
+    profile = request_profiler.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="プロファイルが見つかりません")
+    if format == "collapsed":
+        return PlainTextResponse(profile.to_collapsed())
+    return JSONResponse(
+        profile.to_speedscope(),
+        headers={"Content-Disposition": f'attachment; filename="profile-{profile_id}.speedscope.json"'}
+    )
 
 # プレゼンテーション生成API
+# mode=job または Prefer: respond-async の場合はジョブとして受け付けて202を返す
 @app.post("/api/presentations/generate", response_model=Presentation)
-async def create_presentation(request: PresentationRequest):
+@profiled("generate")
+async def create_presentation(request: PresentationRequest, http_request: Request, mode: str = "sync"):
     logger.info(f"プレゼンテーション生成APIが呼び出されました。テキスト長: {len(request.text)}")
     logger.debug(f"生成オプション: {request.options}")
+
+    if mode == "job" or "respond-async" in http_request.headers.get("prefer", ""):
+        try:
+            job = await job_queue.submit(request)
+        except JobQueueFull as e:
+            logger.warning(f"ジョブの受付を拒否しました: {str(e)}")
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "10"})
+        status_url = f"/api/jobs/{job.id}"
+        return JSONResponse(
+            status_code=202,
+            content={**job.model_dump(), "status_url": status_url},
+            headers={"Location": status_url}
+        )
     
+    # クライアントの締め切り（X-Request-Timeout: 秒数）までに終えられない生成は、上流APIを呼び出す前に拒否する
+    try:
+        deadline = parse_deadline(http_request.headers.get(DEADLINE_HEADER))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    async def generate() -> Presentation:
+        async with admit_generation(deadline):
+            return await generate_presentation_from_text(request.text, request.options)
+
     try:
-        presentation = await generate_presentation_from_text(request.text, request.options)
+        # 結果を受け取るクライアントが切断した場合は、待機や上流APIの呼び出しを打ち切る
+        presentation = await cancel_on_disconnect(generate(), http_request.is_disconnected)
         logger.info(f"プレゼンテーション生成成功: ID={presentation.id}, スライド数={len(presentation.slides)}")
         return presentation
+    except AdmissionRejected as e:
+        raise overloaded(e)
+    except ClientDisconnected as e:
+        logger.info(f"プレゼンテーション生成を中断しました: {str(e)}")
+        # 応答を読む相手はいないが、ログとメトリクスのためにクライアント切断として記録する
+        return Response(status_code=499)
+    except CircuitOpenError as e:
+        raise upstream_unavailable(e)
     except Exception as e:
         logger.error(f"プレゼンテーション生成エラー: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
-# プレゼンテーションの詳細取得API
+def format_sse(event: str, data: dict) -> str:
+    """Server-Sent Events形式のメッセージを作成する"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+# プレゼンテーションのストリーミング生成API（スライドが完成するたびにSSEで送信）
+@app.post("/api/presentations/generate/stream")
+async def create_presentation_stream(request: PresentationRequest):
+    logger.info(f"プレゼンテーションストリーミング生成APIが呼び出されました。テキスト長: {len(request.text)}")
+    # ストリームを開始してからではステータスコードを返せないため、開始前に判定する
+    try:
+        check_upstream_available()
+    except CircuitOpenError as e:
+        raise upstream_unavailable(e)
+
+    async def event_stream():
+        try:
+            async for event, data in stream_presentation_from_text(request.text, request.options):
+                yield format_sse(event, data)
+        except Exception as e:
+            logger.error(f"プレゼンテーションストリーミング生成エラー: {str(e)}", exc_info=True)
+            yield format_sse("error", {"detail": str(e)})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+ZIP_MEDIA_TYPE = "application/zip"
+
+def archive_response(archive_path: str, headers: Optional[dict] = None) -> FileResponse:
+    """zipファイルを送信し、送信後に削除するレスポンスを作成する"""
+    return FileResponse(
+        path=archive_path,
+        filename="presentations.zip",
+        media_type=ZIP_MEDIA_TYPE,
+        headers=headers,
+        background=BackgroundTask(os.remove, archive_path)
+    )
+
+# 複数テキストからの一括生成API（完了した順にNDJSONで返す。archive=trueでzipを返す）
+@app.post("/api/presentations/batch")
+async def create_presentations_batch(request: BatchPresentationRequest, archive: bool = False):
+    logger.info(f"バッチ生成APIが呼び出されました。件数: {len(request.requests)}, archive={archive}")
+    if not request.requests:
+        raise HTTPException(status_code=400, detail="リクエストが空です")
+    if len(request.requests) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"一度に生成できるのは{BATCH_MAX_ITEMS}件までです")
+
+    results = generate_presentations_batch(request.requests, request.concurrency)
+
+    if archive:
+        presentations = []
+        failed = 0
+        async for result in results:
+            if result.get("status") == "ok":
+                presentations.append(Presentation(**result["presentation"]))
+            elif result.get("status") == "error":
+                failed += 1
+        if not presentations:
+            raise HTTPException(status_code=500, detail="すべての生成に失敗しました")
+        try:
+            archive_path = await build_presentations_archive(presentations, request.concurrency)
+        except (RenderPoolSaturated, RenderPoolUnavailable) as e:
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+        return archive_response(archive_path, headers={"X-Batch-Failed": str(failed)})
+
+    async def result_stream():
+        async for result in results:
+            yield json.dumps(result, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(result_stream(), media_type="application/x-ndjson")
+
+# 生成済みプレゼンテーションをzipでまとめてダウンロードするAPI
+@app.post("/api/presentations/batch/archive")
+async def download_presentations_archive(request: BatchArchiveRequest):
+    logger.info(f"一括ダウンロードAPIが呼び出されました。件数: {len(request.presentation_ids)}")
+    if not request.presentation_ids or len(request.presentation_ids) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"IDは1件以上{BATCH_MAX_ITEMS}件以下で指定してください")
+
+    presentations = []
+    missing = []
+    for presentation_id in request.presentation_ids:
+        presentation = await fetch_presentation_by_id(presentation_id)
+        if presentation:
+            presentations.append(presentation)
+        else:
+            missing.append(presentation_id)
+    if missing:
+        raise HTTPException(status_code=404, detail=f"プレゼンテーションが見つかりません: {', '.join(missing)}")
+
+    try:
+        archive_path = await build_presentations_archive(presentations)
+    except (RenderPoolSaturated, RenderPoolUnavailable) as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    return archive_response(archive_path)
+
+# 生成ジョブの状態取得API
+@app.get("/api/jobs/{job_id}", response_model=JobStatus)
+def get_job(job_id: str):
+    job = job_queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="ジョブが見つかりません")
+    return job
+
+def cached_body_response(request: Request, cached: CachedBody) -> Response:
+    """シリアライズ済みの本文をETagでの再検証とAccept-Encodingに応じた圧縮付きで返す"""
+    headers = {"ETag": cached.etag, "Cache-Control": "private, no-cache", "Vary": "Accept-Encoding"}
+    if etag_matches(request.headers.get("if-none-match"), cached.etag):
+        return Response(status_code=304, headers=headers)
+    encoding = choose_encoding(request.headers.get("accept-encoding"))
+    content_encoding = cached.content_encoding(encoding)
+    if content_encoding:
+        headers["Content-Encoding"] = content_encoding
+    return Response(content=cached.encoded(encoding), media_type=cached.media_type, headers=headers)
+
+# プレゼンテーションの詳細取得API（繰り返しの取得に備え、シリアライズ済みの本文をETag・圧縮付きで返す）
 @app.get("/api/presentations/{presentation_id}", response_model=Presentation)
-def get_presentation(presentation_id: str):
+def get_presentation(presentation_id: str, request: Request):
     logger.info(f"プレゼンテーション詳細取得API呼び出し: ID={presentation_id}")
+    cached = presentation_json_body(presentation_id)
+    if cached is None:
+        raise HTTPException(status_code=404, detail="プレゼンテーションが見つかりません")
+    return cached_body_response(request, cached)
+
+# プレゼンテーションのプレビューAPI（テーマを反映したHTML/SVG。python-pptxは使わない）
+@app.get("/api/presentations/{presentation_id}/preview")
+def get_presentation_preview(presentation_id: str, request: Request, slide: Optional[int] = None):
     presentation = get_presentation_by_id(presentation_id)
     if not presentation:
         logger.warning(f"プレゼンテーションが見つかりません: ID={presentation_id}")
         raise HTTPException(status_code=404, detail="プレゼンテーションが見つかりません")
-    logger.debug(f"プレゼンテーション詳細: {presentation}")
+    try:
+        cached = render_presentation_preview(presentation, slide)
+    except IndexError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return cached_body_response(request, cached)
+
+# スライド画像の配信API（ファイル名は内容のハッシュ値のため、内容が変わることはない）
+@app.get("/api/images/{name}")
+def get_image(name: str):
+    image_path = get_image_path(name)
+    if not image_path:
+        raise HTTPException(status_code=404, detail="画像が見つかりません")
+    media_type = "image/png" if name.endswith(".png") else "image/jpeg"
+    return FileResponse(
+        path=image_path,
+        media_type=media_type,
+        headers={"Cache-Control": "public, max-age=31536000, immutable"},
+    )
+
+# スライド1枚の編集API（indexは0始まり）
+@app.patch("/api/presentations/{presentation_id}/slides/{index}", response_model=Presentation)
+def patch_slide(presentation_id: str, index: int, update: SlideUpdate):
+    logger.info(f"スライド編集API呼び出し: ID={presentation_id}, index={index}")
+    try:
+        presentation = update_slide(presentation_id, index, update)
+    except IndexError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    if not presentation:
+        raise HTTPException(status_code=404, detail="プレゼンテーションが見つかりません")
     return presentation
 
+# スライド1枚の再生成API（前後のスライドと全体の構成のみをモデルに渡す）
+@app.post("/api/presentations/{presentation_id}/slides/{index}/regenerate", response_model=Presentation)
+async def regenerate_presentation_slide(presentation_id: str, index: int, request: Optional[SlideRegenerateRequest] = None):
+    logger.info(f"スライド再生成API呼び出し: ID={presentation_id}, index={index}")
+    request = request or SlideRegenerateRequest()
+    try:
+        presentation = await regenerate_slide(presentation_id, index, request.instruction, request.source_text)
+    except IndexError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except CircuitOpenError as e:
+        raise upstream_unavailable(e)
+    except Exception as e:
+        logger.error(f"スライド再生成エラー: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+    if not presentation:
+        raise HTTPException(status_code=404, detail="プレゼンテーションが見つかりません")
+    return presentation
+
+PPTX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.presentationml.presentation"
+
+
+class CachedFileResponse(FileResponse):
+    """pinした生成物キャッシュのファイルを送信し、送信後（途中で切断された場合も）にpinを解除する"""
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            artifact_cache.release(self.path)
+
+
+def stream_download_response(presentation: Presentation, etag: str) -> Response:
+    """ストリーミングエンジンでのダウンロード応答（生成済みならファイル、未生成なら組み立てながら送信）"""
+    filename = f"presentation-{presentation.id}.pptx"
+    headers = {
+        "Access-Control-Allow-Origin": "*",
+        "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
+        "Access-Control-Allow-Headers": "*",
+    }
+    cached_path = artifact_cache.get(stream_artifact_key(presentation), pin=True)
+    if cached_path:
+        logger.info(f"生成済みのPowerPointファイルを再利用: {cached_path}")
+        headers.update({"ETag": etag, "Cache-Control": "private, no-cache"})
+        return CachedFileResponse(path=cached_path, filename=filename, media_type=PPTX_MEDIA_TYPE, headers=headers)
+
+    # サイズが事前に分からないためチャンク転送で送る（同期ジェネレーターはスレッドプールで実行される）
+    headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return StreamingResponse(stream_powerpoint_file(presentation), media_type=PPTX_MEDIA_TYPE, headers=headers)
+
+
 # プレゼンテーションのダウンロードAPI
 @app.get("/api/presentations/{presentation_id}/download")
-async def download_presentation(presentation_id: str):
+@profiled("download")
+async def download_presentation(presentation_id: str, request: Request, engine: Optional[str] = None):
     logger.info(f"プレゼンテーションダウンロードAPI呼び出し: ID={presentation_id}")
-    presentation = get_presentation_by_id(presentation_id)
+    presentation = await fetch_presentation_by_id(presentation_id)
     if not presentation:
         logger.warning(f"プレゼンテーションが見つかりません: ID={presentation_id}")
         raise HTTPException(status_code=404, detail="プレゼンテーションが見つかりません")
+
+    # レンダリングエンジン（auto/stream/pptx）の決定
+    try:
+        engine = choose_download_engine(presentation, engine)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # 内容が変わっていなければ304を返す（エンジンごとに出力が異なるためETagも分ける）
+    content_hash = presentation_content_hash(presentation)
+    etag = f'"{content_hash}"' if engine == "pptx" else f'"{content_hash}-stream"'
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        logger.info(f"プレゼンテーションは更新されていません: ID={presentation_id}")
+        return Response(status_code=304, headers={"ETag": etag})
+
+    if engine == "stream":
+        return stream_download_response(presentation, etag)
     
     try:
         # PowerPointファイルの生成
         logger.info(f"PowerPointファイル生成開始: ID={presentation_id}")
-        file_path = await generate_powerpoint_file(presentation)
+        file_path = await generate_powerpoint_file(presentation, pin=True)
         logger.info(f"PowerPointファイル生成完了: {file_path}")
         
-        # ファイルの送信
-        response = FileResponse(
+        # ファイルの送信（送信が終わるまでキャッシュから削除されないようpinしている）
+        response = CachedFileResponse(
             path=file_path,
             filename=f"presentation-{presentation_id}.pptx",
-            media_type="application/vnd.openxmlformats-officedocument.presentationml.presentation"
+            media_type=PPTX_MEDIA_TYPE
         )
         
+        # 生成済みキャッシュのファイルのみETagで再検証可能にする
+        if file_path == artifact_cache.path_for(content_hash):
+            response.headers["ETag"] = etag
+            response.headers["Cache-Control"] = "private, no-cache"
+
         # CORSヘッダーを追加
         response.headers["Access-Control-Allow-Origin"] = "*"
         response.headers["Access-Control-Allow-Methods"] = "GET, POST, OPTIONS"
         response.headers["Access-Control-Allow-Headers"] = "*"
         
         return response
+    except (RenderPoolSaturated, RenderPoolUnavailable) as e:
+        logger.warning(f"PowerPointファイル生成の受付を拒否しました: {str(e)}")
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
     except Exception as e:
         logger.error(f"PowerPointファイル生成エラー: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"ファイル生成エラー: {str(e)}")
@@ -142,14 +520,49 @@ async def download_presentation(presentation_id: str):
 async def options_generate():
     return {}
 
+@app.options("/api/presentations/generate/stream")
+async def options_generate_stream():
+    return {}
+
+@app.options("/api/presentations/batch")
+async def options_batch():
+    return {}
+
+@app.options("/api/presentations/batch/archive")
+async def options_batch_archive():
+    return {}
+
 @app.options("/api/presentations/{presentation_id}")
 async def options_get_presentation(presentation_id: str):
     return {}
 
+@app.options("/api/presentations/{presentation_id}/preview")
+async def options_preview_presentation(presentation_id: str):
+    return {}
+
 @app.options("/api/presentations/{presentation_id}/download")
 async def options_download_presentation(presentation_id: str):
     return {}
 
+@app.options("/api/presentations/{presentation_id}/slides/{index}")
+async def options_slide(presentation_id: str, index: int):
+    return {}
+
+@app.options("/api/presentations/{presentation_id}/slides/{index}/regenerate")
+async def options_regenerate_slide(presentation_id: str, index: int):
+    return {}
+
 if __name__ == "__main__":
-    logger.info("アプリケーション起動")
-    uvicorn.run("main:app", host="0.0.0.0", port=3001, reload=True)
+    # 本番用の起動（リローダーなし、WEB_CONCURRENCYでワーカープロセス数を指定）
+    # 開発時はAPP_RELOAD=trueでコード変更時に自動で再起動する
+    reload = os.getenv("APP_RELOAD", "false").lower() in ("1", "true", "yes")
+    workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+    logger.info(f"アプリケーション起動: ワーカー数={1 if reload else workers}, リロード={reload}")
+    uvicorn.run(
+        "main:app",
+        host=os.getenv("HOST", "0.0.0.0"),
+        port=int(os.getenv("PORT", "3001")),
+        reload=reload,
+        workers=None if reload else workers,
+        log_level=log_level.lower(),
+    )
@@ -0,0 +1,45 @@
+import pytest
+
+from benchmarks.fake_openai_server import FakeOpenAIServer, FakeOpenAIState
+
+
+@pytest.fixture(scope="session")
+def _fake_openai_server_session():
+    server = FakeOpenAIServer().start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def fake_openai_server(_fake_openai_server_session, monkeypatch):
+    """OpenAI互換スタブサーバーに接続するようサービスを差し替える"""
+    from app.services import presentation_service
+    from app.services.llm_cache import LLMResponseCache
+    from app.services.llm_client import create_async_client, UpstreamLimiter
+    from app.services.resilience import ResilientCaller
+
+    server = _fake_openai_server_session
+    server.state.__dict__.update(FakeOpenAIState().__dict__)
+
+    monkeypatch.setattr(presentation_service, "client", create_async_client("test-key", base_url=server.base_url))
+    monkeypatch.setattr(presentation_service, "upstream_limiter", UpstreamLimiter(16))
+    monkeypatch.setattr(presentation_service, "llm_cache", LLMResponseCache(max_entries=100))
+    # 再試行の待ち時間なし・ブレーカーの状態をテストごとに初期化する
+    monkeypatch.setattr(presentation_service, "upstream_resilience", ResilientCaller(backoff=lambda attempt: 0))
+    return server
+
+
+@pytest.fixture(scope="session")
+def redis_url():
+    """Redisプロトコルを話すfakeredisのTCPサーバーを起動する"""
+    fakeredis = pytest.importorskip("fakeredis")
+    import threading
+    from benchmarks.fake_openai_server import _free_port
+
+    port = _free_port()
+    server = fakeredis.TcpFakeServer(("127.0.0.1", port), server_type="redis")
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"redis://127.0.0.1:{port}/0"
+    server.shutdown()
+    server.server_close()
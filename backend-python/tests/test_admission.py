@@ -0,0 +1,82 @@
+import time
+import asyncio
+
+import pytest
+
+from app.services.admission import AdmissionController, AdmissionRejected, ClientDisconnected, cancel_on_disconnect, parse_deadline
+
+
+async def test_rejects_when_estimated_wait_exceeds_deadline():
+    admission = AdmissionController(max_concurrency=1, latency_estimate=lambda: 1.0)
+    release = asyncio.Event()
+
+    async def hold():
+        async with admission.admit(deadline=10):
+            await release.wait()
+
+    holder = asyncio.create_task(hold())
+    await asyncio.sleep(0)
+    assert admission.estimate_wait() == pytest.approx(1.0)
+
+    # 待ち時間（1秒）と生成の所要時間（1秒）が締め切りを超える場合はすぐに拒否する
+    with pytest.raises(AdmissionRejected) as rejected:
+        async with admission.admit(deadline=1.5):
+            pass
+    assert rejected.value.retry_after >= 1
+
+    # 間に合う見込みがあれば枠が空くまで待って実行する
+    async def queued():
+        async with admission.admit(deadline=5) as waited:
+            return waited
+
+    waiter = asyncio.create_task(queued())
+    await asyncio.sleep(0.05)
+    assert admission.queued == 1
+    release.set()
+    assert await waiter >= 0.05
+    await holder
+    assert admission.stats()["admitted"] == 2 and admission.stats()["rejected"] == 1
+
+
+async def test_queued_generation_expires_before_deadline():
+    admission = AdmissionController(max_concurrency=1, latency_estimate=lambda: 0.1)
+
+    async def hold():
+        async with admission.admit(deadline=10):
+            await asyncio.sleep(1)
+
+    holder = asyncio.create_task(hold())
+    await asyncio.sleep(0)
+    start = time.perf_counter()
+    with pytest.raises(AdmissionRejected):
+        async with admission.admit(deadline=0.3):
+            pass
+    # 残りの時間で生成を終えられなくなった時点（締め切り - 所要時間）で待機をやめる
+    assert time.perf_counter() - start < 0.5
+    assert admission.stats()["expired"] == 1 and admission.queued == 0
+    holder.cancel()
+
+
+async def test_disconnect_cancels_upstream_call(fake_openai_server):
+    from app.services import presentation_service
+
+    fake_openai_server.state.latency_seconds = 1
+    started = time.perf_counter()
+
+    async def is_disconnected():
+        return time.perf_counter() - started > 0.1
+
+    with pytest.raises(ClientDisconnected):
+        await cancel_on_disconnect(
+            presentation_service.generate_presentation_from_text("切断されるリクエスト"), is_disconnected, poll_interval=0.05
+        )
+    assert time.perf_counter() - started < 0.6
+    assert presentation_service.upstream_resilience.stats()["failures"] == 0
+
+
+def test_parse_deadline():
+    assert parse_deadline(None, default=30) == 30
+    assert parse_deadline("2.5") == 2.5
+    for value in ("abc", "0", "-1", "inf"):
+        with pytest.raises(ValueError):
+            parse_deadline(value)
@@ -72,3 +72,322 @@ def test_generate_presentation_missing_text():
     )
     
     assert response.status_code == 400
+
+
+
+def test_generate_presentation_stream(fake_openai_server):
+    from app.services import presentation_service
+
+    fake_openai_server.state.slide_count = 2
+    fake_openai_server.state.chunk_size = 7
+
+    response = client.post(
+        "/api/presentations/generate/stream",
+        json={"text": "ストリーミングテスト", "options": {"theme": "modern", "slide_count": 2}}
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert fake_openai_server.state.requests[0]["stream"] is True
+    events = [
+        (block.split("\n")[0][len("event: "):], json.loads(block.split("\n")[1][len("data: "):]))
+        for block in response.text.strip().split("\n\n")
+    ]
+    assert [name for name, _ in events] == ["slide", "slide", "presentation"]
+    assert events[1][1]["slide"]["title"] == "スライド2"
+
+    # 完成したプレゼンテーションは通常のストアに保存される
+    presentation_id = events[-1][1]["id"]
+    assert presentation_id in presentation_service.presentation_store
+
+
+def test_download_presentation_is_cached_with_etag():
+    from app.services import presentation_service
+    from app.schemas.presentation import Presentation, Slide
+
+    presentation = Presentation(
+        id="download-cache-test",
+        slides=[Slide(title="表紙", content=["副題"]), Slide(title="本文", content=["項目1", "項目2"])],
+        theme="modern",
+        created_at="2024-01-01T00:00:00",
+        download_url="/api/presentations/download-cache-test/download"
+    )
+    presentation_service.presentation_store.put(presentation)
+
+    first = client.get(f"/api/presentations/{presentation.id}/download")
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+    hits_before = presentation_service.artifact_cache.stats()["hits"]
+
+    second = client.get(f"/api/presentations/{presentation.id}/download")
+    assert second.status_code == 200
+    assert second.headers["etag"] == etag
+    assert second.content == first.content
+    assert presentation_service.artifact_cache.stats()["hits"] == hits_before + 1
+
+    not_modified = client.get(f"/api/presentations/{presentation.id}/download", headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304
+    assert not_modified.headers["etag"] == etag
+
+
+def test_download_with_streaming_engine():
+    import io
+    import uuid
+    from pptx import Presentation as PPTXPresentation
+    from app.services import presentation_service
+    from app.schemas.presentation import Presentation, Slide
+
+    marker = uuid.uuid4().hex
+    presentation = Presentation(
+        id="download-stream-test",
+        slides=[Slide(title=f"スライド{i}", content=[f"項目{i} {marker}"]) for i in range(30)],
+        theme="business",
+        created_at="2024-01-01T00:00:00",
+        download_url="/api/presentations/download-stream-test/download"
+    )
+    presentation_service.presentation_store.put(presentation)
+    url = f"/api/presentations/{presentation.id}/download"
+
+    # 未生成の場合はチャンク転送で送信し、書き出したファイルを生成物キャッシュに保存する
+    streamed = client.get(url, params={"engine": "stream"})
+    assert streamed.status_code == 200
+    assert "content-length" not in streamed.headers
+    assert [slide.shapes.title.text for slide in PPTXPresentation(io.BytesIO(streamed.content)).slides][-1] == "スライド29"
+
+    cached = client.get(url, params={"engine": "stream"})
+    assert cached.content == streamed.content
+    assert cached.headers["etag"].endswith('-stream"')
+    assert cached.headers["etag"] != client.get(url, params={"engine": "pptx"}).headers["etag"]
+
+    assert client.get(url, params={"engine": "unknown"}).status_code == 400
+
+
+def test_get_unknown_presentation_returns_404():
+    from app.services import presentation_service
+
+    size_before = len(presentation_service.presentation_store)
+    response = client.get("/api/presentations/does-not-exist")
+    assert response.status_code == 404
+    assert len(presentation_service.presentation_store) == size_before
+
+
+def test_batch_generation_streams_results(fake_openai_server, monkeypatch):
+    from app.services import presentation_service
+
+    original = presentation_service.generate_presentation_from_text
+
+    async def flaky_generate(text, options=None):
+        if text == "失敗":
+            raise ValueError("生成エラー")
+        return await original(text, options)
+
+    monkeypatch.setattr(presentation_service, "generate_presentation_from_text", flaky_generate)
+
+    response = client.post(
+        "/api/presentations/batch",
+        json={"requests": [{"text": "文書A"}, {"text": "失敗"}, {"text": "文書B"}], "concurrency": 2}
+    )
+
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in response.text.strip().split("\n")]
+    results = {line["index"]: line for line in lines if "index" in line}
+    assert results[0]["status"] == "ok"
+    assert results[1] == {"index": 1, "status": "error", "detail": "生成エラー"}
+    assert results[2]["presentation"]["slides"][0]["title"] == "スライド1"
+    assert lines[-1] == {"status": "done", "succeeded": 2, "failed": 1}
+
+
+def test_batch_generation_archive(fake_openai_server):
+    import io
+    import zipfile
+
+    response = client.post(
+        "/api/presentations/batch?archive=true",
+        json={"requests": [{"text": "文書A"}, {"text": "文書B"}]}
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/zip"
+    with zipfile.ZipFile(io.BytesIO(response.content)) as archive:
+        names = archive.namelist()
+    assert len(names) == 2
+    assert all(name.endswith(".pptx") for name in names)
+
+
+def test_batch_generation_archive_returns_503_when_render_pool_is_busy(fake_openai_server, monkeypatch):
+    import main
+    from app.services.pptx_renderer import RenderPoolSaturated
+
+    async def saturated(*args, **kwargs):
+        raise RenderPoolSaturated("レンダリングの待ちが上限に達しました")
+
+    monkeypatch.setattr(main, "build_presentations_archive", saturated)
+    response = client.post(
+        "/api/presentations/batch?archive=true",
+        json={"requests": [{"text": "文書A"}]}
+    )
+
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "5"
+
+
+def _store_presentation(presentation_id, slide_count=4):
+    from app.services import presentation_service
+    from app.schemas.presentation import Presentation, Slide
+
+    presentation = Presentation(
+        id=presentation_id,
+        slides=[Slide(title=f"スライド{i}", content=[f"項目{i}"]) for i in range(slide_count)],
+        theme="modern",
+        created_at="2024-01-01T00:00:00",
+        download_url=f"/api/presentations/{presentation_id}/download"
+    )
+    presentation_service.presentation_store.put(presentation)
+    return presentation
+
+
+def test_patch_slide_updates_only_given_fields():
+    _store_presentation("patch-slide-test")
+
+    response = client.patch("/api/presentations/patch-slide-test/slides/2", json={"title": "変更後"})
+    assert response.status_code == 200
+    slides = response.json()["slides"]
+    assert slides[2] == {"title": "変更後", "content": ["項目2"], "image_url": None}
+    assert client.get("/api/presentations/patch-slide-test").json()["slides"][2]["title"] == "変更後"
+
+    assert client.patch("/api/presentations/patch-slide-test/slides/9", json={"title": "x"}).status_code == 404
+    assert client.patch("/api/presentations/does-not-exist/slides/0", json={"title": "x"}).status_code == 404
+
+
+def test_regenerate_slide_sends_only_neighbouring_context(fake_openai_server):
+    _store_presentation("regenerate-slide-test", slide_count=6)
+    fake_openai_server.state.content = json.dumps({"title": "作り直したスライド", "content": ["新しい項目"]}, ensure_ascii=False)
+
+    response = client.post(
+        "/api/presentations/regenerate-slide-test/slides/3/regenerate",
+        json={"instruction": "具体例を増やす"},
+    )
+    assert response.status_code == 200
+    slides = response.json()["slides"]
+    assert slides[3]["title"] == "作り直したスライド"
+    assert slides[2]["title"] == "スライド2"
+
+    user_message = fake_openai_server.state.requests[0]["messages"][-1]["content"]
+    assert "具体例を増やす" in user_message
+    # 前後以外のスライドは内容を送らず、全体の構成（タイトル）のみ送る
+    assert "項目2" in user_message and "項目4" in user_message
+    assert "項目0" not in user_message and "項目5" not in user_message
+
+
+def test_download_after_edit_rerenders_only_changed_slide(monkeypatch, tmp_path):
+    from app.services import presentation_service
+    from app.services.artifact_cache import ArtifactCache
+    from app.services.pptx_renderer import RenderPool
+    from app.services.metrics import SLIDE_RENDER_EVENTS
+
+    # 以前の実行で生成したファイルを再利用しないよう、キャッシュを一時ディレクトリに切り替える
+    monkeypatch.setattr(presentation_service, "artifact_cache", ArtifactCache(str(tmp_path / "artifacts"), 10 ** 9))
+    monkeypatch.setattr(presentation_service, "render_pool", RenderPool(workers=0, slide_cache_dir=str(tmp_path / "slides")))
+
+    _store_presentation("partial-render-test", slide_count=8)
+    assert client.get("/api/presentations/partial-render-test/download").status_code == 200
+
+    client.patch("/api/presentations/partial-render-test/slides/5", json={"content": ["編集済み"]})
+    rendered_before = SLIDE_RENDER_EVENTS.value(result="rendered")
+    reused_before = SLIDE_RENDER_EVENTS.value(result="reused")
+
+    response = client.get("/api/presentations/partial-render-test/download")
+    assert response.status_code == 200
+    assert SLIDE_RENDER_EVENTS.value(result="rendered") == rendered_before + 1
+    assert SLIDE_RENDER_EVENTS.value(result="reused") == reused_before + 7
+
+
+def test_get_presentation_serves_cached_compressed_json():
+    from app.services import presentation_service
+
+    presentation = _store_presentation("json-cache-test", slide_count=30)
+    response = client.get("/api/presentations/json-cache-test", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.json() == presentation.model_dump()
+    etag = response.headers["etag"]
+
+    # 同じ版は再シリアライズせず、If-None-Matchが一致すれば本文を返さない
+    hits_before = presentation_service.presentation_json_cache.stats()["hits"]
+    not_modified = client.get("/api/presentations/json-cache-test", headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304
+    assert presentation_service.presentation_json_cache.stats()["hits"] == hits_before + 1
+
+    client.patch("/api/presentations/json-cache-test/slides/0", json={"title": "変更後"})
+    changed = client.get("/api/presentations/json-cache-test", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+    assert changed.json()["slides"][0]["title"] == "変更後"
+
+
+def test_get_presentation_skips_deserialization_for_unchanged_sqlite_entry(monkeypatch, tmp_path):
+    from app.services import presentation_service
+    from app.services.presentation_store import SQLitePresentationStore
+    from app.services.response_cache import BodyCache
+
+    store = SQLitePresentationStore(str(tmp_path / "store.sqlite3"))
+    monkeypatch.setattr(presentation_service, "presentation_store", store)
+    monkeypatch.setattr(presentation_service, "presentation_json_cache", BodyCache())
+    presentation = _store_presentation("sqlite-json-cache-test")
+    assert client.get("/api/presentations/sqlite-json-cache-test").json() == presentation.model_dump()
+
+    # 版が変わらない間はストアから本文を読み込まない
+    def fail_get_versioned(presentation_id):
+        raise AssertionError("本文を読み込みました")
+
+    monkeypatch.setattr(store, "get_versioned", fail_get_versioned)
+    assert client.get("/api/presentations/sqlite-json-cache-test").json() == presentation.model_dump()
+    store.close()
+
+
+def test_generate_with_profile_header_is_retrievable(fake_openai_server, monkeypatch):
+    import main
+    from app.services.profiler import RequestProfiler
+
+    monkeypatch.setattr(main, "request_profiler", RequestProfiler(admin_token="secret", interval_ms=1, max_profiles=2))
+    fake_openai_server.state.latency_seconds = 0.05
+    body = {"text": "プロファイル対象のテキスト", "options": {"theme": "modern", "slide_count": 3, "include_images": False}}
+
+    # ヘッダーのない（またはトークンが誤っている）リクエストはプロファイルを取らない
+    plain = client.post("/api/presentations/generate", json=body)
+    assert plain.status_code == 200 and "x-profile-id" not in plain.headers
+    assert client.post("/api/presentations/generate", json=body, headers={"X-Profile": "1", "X-Admin-Token": "x"}).headers.get("x-profile-id") is None
+
+    body["text"] = "上流APIを呼び出すテキスト"
+    profiled = client.post("/api/presentations/generate", json=body, headers={"X-Profile": "1", "X-Admin-Token": "secret"})
+    assert profiled.status_code == 200
+    profile_id = profiled.headers["x-profile-id"]
+
+    admin = {"X-Admin-Token": "secret"}
+    assert client.get("/api/admin/profiles").status_code == 403
+    listing = client.get("/api/admin/profiles", headers=admin).json()
+    assert [item["id"] for item in listing["profiles"]] == [profile_id]
+
+    speedscope = client.get(f"/api/admin/profiles/{profile_id}", headers=admin).json()
+    frames = [frame["name"] for frame in speedscope["shared"]["frames"]]
+    assert "generate_presentation_from_text" in frames
+    assert speedscope["profiles"][0]["type"] == "sampled"
+    collapsed = client.get(f"/api/admin/profiles/{profile_id}?format=collapsed", headers=admin).text
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in collapsed.splitlines())
+    assert client.get(f"/api/admin/profiles/{profile_id}?format=svg", headers=admin).status_code == 400
+
+
+def test_generate_is_shed_when_deadline_cannot_be_met(monkeypatch):
+    from app.services import presentation_service
+    from app.services.admission import AdmissionController
+
+    admission = AdmissionController(max_concurrency=1, latency_estimate=lambda: 30.0)
+    # 実行中の生成が1件ある状態（待ち時間の見積もり30秒）
+    admission.in_flight = 1
+    monkeypatch.setattr(presentation_service, "generation_admission", admission)
+    body = {"text": "混雑時のリクエスト", "options": {"slide_count": 3, "include_images": False}}
+
+    response = client.post("/api/presentations/generate", json=body, headers={"X-Request-Timeout": "10"})
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "30"
+    assert client.post("/api/presentations/generate", json=body, headers={"X-Request-Timeout": "abc"}).status_code == 400
@@ -0,0 +1,86 @@
+import os
+import time
+from app.services.artifact_cache import ArtifactCache, etag_matches
+
+
+def _put(cache, key, size):
+    temp_path = cache.new_temp_path()
+    with open(temp_path, "wb") as f:
+        f.write(b"x" * size)
+    return cache.put(key, temp_path)
+
+
+def test_get_returns_cached_path(tmp_path):
+    cache = ArtifactCache(str(tmp_path), max_bytes=1000)
+    assert cache.get("a") is None
+    path = _put(cache, "a", 10)
+    assert cache.get("a") == path
+    assert cache.stats() == {"hits": 1, "misses": 1, "evictions": 0}
+
+
+def test_garbage_collection_evicts_least_recently_used(tmp_path):
+    cache = ArtifactCache(str(tmp_path), max_bytes=250)
+    _put(cache, "a", 100)
+    _put(cache, "b", 100)
+    old = time.time() - 100
+    os.utime(cache.path_for("a"), (old, old))
+    os.utime(cache.path_for("b"), (old + 1, old + 1))
+    cache.get("a")  # aを最近使用済みにする
+
+    _put(cache, "c", 100)
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_pinned_file_is_not_evicted_until_released(tmp_path):
+    cache = ArtifactCache(str(tmp_path), max_bytes=150)
+    _put(cache, "a", 100)
+    path = cache.get("a", pin=True)
+
+    _put(cache, "b", 100)
+    assert os.path.exists(path)
+
+    cache.release(path)
+    _put(cache, "c", 100)
+    assert not os.path.exists(path)
+    assert cache.get("c") is not None
+
+
+def test_put_uses_index_without_rescanning_directory(tmp_path, monkeypatch):
+    cache = ArtifactCache(str(tmp_path), max_bytes=250)
+    _put(cache, "a", 100)
+    _put(cache, "b", 100)
+
+    def fail_scandir(path):
+        raise AssertionError("ディレクトリを走査しました")
+
+    monkeypatch.setattr(os, "scandir", fail_scandir)
+    _put(cache, "c", 100)
+
+    assert cache.get("a") is None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_index_is_rebuilt_from_existing_files(tmp_path):
+    cache = ArtifactCache(str(tmp_path), max_bytes=250)
+    _put(cache, "a", 100)
+    _put(cache, "b", 100)
+    old = time.time() - 100
+    os.utime(cache.path_for("b"), (old, old))
+
+    reopened = ArtifactCache(str(tmp_path), max_bytes=250)
+    _put(reopened, "c", 100)
+
+    assert reopened.get("b") is None
+    assert reopened.get("a") is not None
+
+
+def test_etag_matches():
+    assert etag_matches('"abc"', '"abc"')
+    assert etag_matches('"x", W/"abc"', '"abc"')
+    assert etag_matches("*", '"abc"')
+    assert not etag_matches('"x"', '"abc"')
+    assert not etag_matches(None, '"abc"')
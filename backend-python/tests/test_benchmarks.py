@@ -0,0 +1,38 @@
+from benchmarks.common import percentile, summarize_latencies
+from benchmarks.compare import compare_reports
+
+
+def test_percentile_interpolates():
+    values = [0.1, 0.2, 0.3, 0.4, 0.5]
+    assert percentile(values, 0.5) == 0.3
+    assert abs(percentile(values, 0.95) - 0.48) < 1e-9
+    assert percentile([], 0.99) == 0.0
+
+
+def test_summarize_latencies():
+    summary = summarize_latencies([0.01, 0.02, 0.03, 0.04], elapsed=2.0, errors=1)
+    assert summary["requests"] == 5
+    assert summary["errors"] == 1
+    assert summary["rps"] == 2.0
+    assert summary["max_ms"] == 40.0
+
+
+def test_compare_reports_detects_regressions():
+    baseline = {"results": [
+        {"scenario": "get", "concurrency": 4, "p95_ms": 10.0, "rps": 100.0, "errors": 0},
+        {"benchmark": "generate_powerpoint_file", "slides": 100, "cold_p50_ms": 50.0},
+    ]}
+    current = {"results": [
+        {"scenario": "get", "concurrency": 4, "p95_ms": 11.0, "rps": 70.0, "errors": 2},
+        {"benchmark": "generate_powerpoint_file", "slides": 100, "cold_p50_ms": 80.0},
+        # ベースラインに無い項目は比較しない
+        {"scenario": "get", "concurrency": 64, "p95_ms": 999.0},
+    ]}
+
+    regressions = compare_reports(baseline, current, tolerance=0.2)
+    assert {(r["key"].get("scenario") or r["key"]["benchmark"], r["metric"]) for r in regressions} == {
+        ("get", "rps"),
+        ("get", "errors"),
+        ("generate_powerpoint_file", "cold_p50_ms"),
+    }
+    assert compare_reports(baseline, current, tolerance=0.2, metrics=["p95_ms"]) == []
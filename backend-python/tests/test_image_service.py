@@ -0,0 +1,105 @@
+import io
+import asyncio
+import pytest
+from PIL import Image
+from pptx import Presentation as PPTXPresentation
+
+from app.schemas.presentation import Presentation, Slide
+from app.services.image_service import (
+    ImagePipeline,
+    ImageProvider,
+    LocalDirectoryImageProvider,
+    process_image,
+)
+from app.services.pptx_renderer import render_pptx_file
+
+
+def _write_image(path, size=(3000, 2000), color=(200, 30, 30)):
+    Image.new("RGB", size, color).save(path, format="PNG")
+
+
+class CountingProvider(ImageProvider):
+    name = "counting"
+
+    def __init__(self, data):
+        self.data = data
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def fetch(self, prompt):
+        self.calls += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.02)
+        self.in_flight -= 1
+        return self.data
+
+
+def _png_bytes(size=(400, 300)):
+    output = io.BytesIO()
+    Image.new("RGB", size, (10, 120, 200)).save(output, format="PNG")
+    return output.getvalue()
+
+
+def test_process_image_downscales_and_recompresses():
+    data = _png_bytes((4000, 3000))
+    processed, ext = process_image(data, 1280, 720, 80)
+    assert ext == "jpg"
+    assert Image.open(io.BytesIO(processed)).size == (960, 720)
+    assert len(processed) < len(data)
+
+
+def test_local_provider_matches_keywords_in_file_name(tmp_path):
+    _write_image(tmp_path / "sales-graph.png")
+    _write_image(tmp_path / "team_会議.png")
+    provider = LocalDirectoryImageProvider(str(tmp_path))
+
+    assert provider.find("四半期の会議の進め方").endswith("team_会議.png")
+    assert provider.find("Sales results").endswith("sales-graph.png")
+    assert provider.find("関係のない話題") is None
+
+
+async def test_pipeline_deduplicates_prompts_and_bounds_parallelism(tmp_path):
+    provider = CountingProvider(_png_bytes())
+    pipeline = ImagePipeline(provider, cache_dir=str(tmp_path), max_parallel=2)
+    slides = [Slide(title=f"スライド{i % 3}", content=["項目"]) for i in range(9)]
+
+    attached = await pipeline.attach_images(slides)
+
+    # 同じプロンプトは1回だけ取得する
+    assert provider.calls == 3
+    assert provider.max_in_flight <= 2
+    assert all(slide.image_url and slide.image_url.startswith("/api/images/") for slide in attached)
+    # 内容が同じ画像は同じファイルを共有する
+    assert len({slide.image_url for slide in attached}) == 1
+    assert pipeline.path_for_url(attached[0].image_url) is not None
+
+
+async def test_pipeline_limits_total_image_bytes_per_deck(tmp_path):
+    provider = CountingProvider(_png_bytes())
+    pipeline = ImagePipeline(provider, cache_dir=str(tmp_path), max_deck_bytes=1)
+    attached = await pipeline.attach_images([Slide(title="表紙", content=[])])
+    assert attached[0].image_url is None
+    assert pipeline.stats()["skipped_for_size"] == 1
+
+
+async def test_images_are_embedded_in_pptx(tmp_path):
+    pipeline = ImagePipeline(CountingProvider(_png_bytes()), cache_dir=str(tmp_path / "images"))
+    slides = await pipeline.attach_images([
+        Slide(title="表紙", content=["副題"]),
+        Slide(title="本文", content=["項目1", "項目2"]),
+    ])
+    presentation = Presentation(
+        id="image-test", slides=slides, theme="modern",
+        created_at="2024-01-01T00:00:00", download_url="/api/presentations/image-test/download",
+    )
+    image_paths = {slide.image_url: pipeline.path_for_url(slide.image_url) for slide in slides}
+
+    file_path = str(tmp_path / "out.pptx")
+    render_pptx_file(presentation, file_path, str(tmp_path / "slide_cache"), image_paths)
+
+    pptx = PPTXPresentation(file_path)
+    pictures = [shape for shape in pptx.slides[1].shapes if shape.shape_type == 13]
+    assert len(pictures) == 1
+    assert pictures[0].left + pictures[0].width <= pptx.slide_width
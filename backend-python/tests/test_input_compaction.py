@@ -0,0 +1,73 @@
+from app.services import input_compaction
+from app.services.input_compaction import compact_input, deduplicate, normalize_whitespace, select_sentences
+from app.services.tokenizer import count_tokens
+
+
+def test_normalize_whitespace():
+    text = "﻿本日の  会議について　報告します。 \r\n\r\n\r\n\r\n> > 引用された\t本文\n"
+    assert normalize_whitespace(text) == "本日の 会議について 報告します。\n\n引用された 本文"
+
+
+def test_normalize_whitespace_keeps_indentation():
+    text = "手順\n  1. 準備\n\t  - 材料を\u3000そろえる\n    def main():\n        return  0\n"
+    assert normalize_whitespace(text) == "手順\n  1. 準備\n      - 材料を そろえる\n    def main():\n        return 0"
+
+
+def test_deduplicate_removes_adjacent_and_long_repeated_content():
+    quoted = "先日お送りした資料について、第3四半期の売上見込みを修正しましたのでご確認をお願いいたします。"
+    text = f"社外秘\n売上は増加しました。\n売上は増加しました。\n\n社外秘\n利益も増加しました。\n\n{quoted}\n\n返信です。\n\n{quoted}"
+    # 連続する重複行と、離れた位置で繰り返される長い段落のみを削除する
+    assert deduplicate(text) == f"社外秘\n売上は増加しました。\n\n社外秘\n利益も増加しました。\n\n{quoted}\n\n返信です。"
+
+    # 短い段落やインデントの異なる行は、繰り返されていても内容の一部として残す
+    text = "売上は増加しました。\n\nはい\n\n売上は増加しました。\n\n- 項目\n  - 項目"
+    assert deduplicate(text) == text
+
+
+def test_deduplicate_removes_running_headers_and_footers():
+    pages = [
+        "株式会社サンプル 社外秘\n第1章 概要\n  - 背景\n  - 目的\n1 / 3",
+        "株式会社サンプル 社外秘\n第2章 売上\n売上は増加しました。\n2 / 3",
+        "株式会社サンプル 社外秘\n第3章 まとめ\n  - 今後の予定\n機密情報のため取扱注意",
+    ]
+    text = "\n\n".join(page + "\n\n機密情報のため取扱注意" for page in pages)
+    # 離れた位置で繰り返されるヘッダー・フッターは最初の1回のみ残し、インデントは保つ
+    assert deduplicate(text) == (
+        "株式会社サンプル 社外秘\n第1章 概要\n  - 背景\n  - 目的\n1 / 3\n\n機密情報のため取扱注意\n\n"
+        "第2章 売上\n売上は増加しました。\n2 / 3\n\n"
+        "第3章 まとめ\n  - 今後の予定"
+    )
+
+
+def test_select_sentences_fits_budget_and_keeps_order():
+    text = "\n\n".join(
+        f"第{i}章 売上の分析\n売上は前年から増加しました。詳細は別紙{i}を参照してください。天気は晴れでした。"
+        for i in range(1, 21)
+    )
+    selected = select_sentences(text, 200)
+    assert count_tokens(selected) <= 200
+    # 元の順序を保ったまま、見出しを優先して残す
+    assert selected.startswith("第1章 売上の分析")
+    positions = [selected.find(f"第{i}章") for i in range(1, 21) if f"第{i}章" in selected]
+    assert positions == sorted(positions)
+
+
+def test_compact_input_reports_saved_tokens(monkeypatch):
+    text = ("お知らせ\n本文です。\n\n" * 50).strip()
+    result = compact_input(text, slide_count=3)
+    assert result.text == "お知らせ\n本文です。"
+    assert result.original_tokens == count_tokens(text)
+    assert result.saved_tokens == result.original_tokens - result.compacted_tokens > 0
+
+    monkeypatch.setattr(input_compaction, "INPUT_COMPACTION_ENABLED", False)
+    assert compact_input(text).text == text
+
+
+def test_compact_input_applies_token_budget(monkeypatch):
+    monkeypatch.setattr(input_compaction, "INPUT_TOKEN_BUDGET_PER_SLIDE", 20)
+    monkeypatch.setattr(input_compaction, "INPUT_TOKEN_BUDGET_MIN", 50)
+    text = "。".join(f"これは{i}番目の文です" for i in range(200)) + "。"
+
+    result = compact_input(text, slide_count=3)
+    assert result.budget == 60
+    assert result.compacted_tokens <= 60
@@ -0,0 +1,105 @@
+import time
+import asyncio
+import pytest
+from fastapi.testclient import TestClient
+from app.services.single_flight import SingleFlight
+from main import app
+
+
+async def test_single_flight_coalesces_concurrent_calls():
+    flights = SingleFlight()
+    calls = 0
+
+    async def work():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return "result"
+
+    results = await asyncio.gather(*[flights.do("key", work) for _ in range(5)])
+
+    assert results == ["result"] * 5
+    assert calls == 1
+    assert flights.coalesced == 4
+    assert len(flights) == 0
+
+
+async def test_single_flight_cancels_only_when_all_waiters_cancel():
+    flights = SingleFlight()
+    started = asyncio.Event()
+    cancelled = asyncio.Event()
+
+    async def work():
+        started.set()
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    first = asyncio.create_task(flights.do("key", work))
+    second = asyncio.create_task(flights.do("key", work))
+    await started.wait()
+
+    first.cancel()
+    await asyncio.sleep(0.01)
+    assert not cancelled.is_set()
+
+    second.cancel()
+    await asyncio.sleep(0.01)
+    assert cancelled.is_set()
+
+
+def test_generate_job_mode_returns_202_and_completes(fake_openai_server):
+    fake_openai_server.state.latency_seconds = 0.2
+
+    with TestClient(app) as client:
+        body = {"text": "ジョブモードのテスト", "options": {"slide_count": 3}}
+        responses = [client.post("/api/presentations/generate?mode=job", json=body) for _ in range(3)]
+        assert all(response.status_code == 202 for response in responses)
+        job_ids = [response.json()["id"] for response in responses]
+        assert responses[0].headers["location"] == f"/api/jobs/{job_ids[0]}"
+
+        deadline = time.time() + 10
+        while time.time() < deadline:
+            statuses = [client.get(f"/api/jobs/{job_id}").json() for job_id in job_ids]
+            if all(status["status"] == "completed" for status in statuses):
+                break
+            time.sleep(0.05)
+
+        assert all(status["status"] == "completed" for status in statuses)
+        assert all(status["progress"] == 1.0 for status in statuses)
+        presentation = client.get(f"/api/presentations/{statuses[0]['presentation_id']}")
+        assert presentation.status_code == 200
+
+    # 同時に投入された同一リクエストは1回の上流呼び出しにまとめられる
+    assert len(fake_openai_server.state.requests) == 1
+
+
+def test_get_unknown_job_returns_404():
+    with TestClient(app) as client:
+        assert client.get("/api/jobs/unknown").status_code == 404
+
+
+@pytest.mark.parametrize("backend", ["sqlite", "redis"])
+async def test_job_status_is_visible_from_other_workers(backend, fake_openai_server, tmp_path, request):
+    from app.schemas.presentation import PresentationOptions, PresentationRequest
+    from app.services.job_queue import JobQueue, RedisJobStatusStore, SQLiteJobStatusStore
+
+    def make_store():
+        if backend == "redis":
+            return RedisJobStatusStore(request.getfixturevalue("redis_url"), key_prefix="job-test:")
+        return SQLiteJobStatusStore(str(tmp_path / "jobs.sqlite3"))
+
+    # 同じ共有ストアを使う2つのワーカープロセスを模擬する
+    accepting, other = JobQueue(workers=1, shared=make_store()), JobQueue(workers=1, shared=make_store())
+    job = await accepting.submit(PresentationRequest(
+        text=f"共有ストアのジョブ状態({backend})", options=PresentationOptions(slide_count=3, include_images=False)
+    ))
+    await accepting._queue.join()
+    await accepting.stop()
+
+    status = await asyncio.to_thread(other.get, job.id)
+    assert status is not None and status.status == "completed"
+    assert status.presentation_id == accepting.get(job.id).presentation_id
+    assert await asyncio.to_thread(other.get, "unknown") is None
@@ -0,0 +1,66 @@
+import json
+
+import pytest
+
+from app.services.json_repair import OutlineParseError, parse_outline, repair_json
+
+
+def test_valid_outline_is_parsed_without_repairs():
+    outline = parse_outline(json.dumps({"slides": [{"title": "A", "content": ["1", "2"]}]}))
+    assert outline.status == "ok"
+    assert [slide.title for slide in outline.slides] == ["A"]
+
+
+def test_repairs_common_formatting_errors():
+    text = """以下が結果です。
+```json
+{'slides': [
+  {'title': 'はじめに', 'content': ['It\\'s fine', '項目2',],},
+  {title: "本題" "content": "- 項目1\\n- 項目2"},
+]}
+```"""
+    outline = parse_outline(text)
+    assert outline.status == "repaired"
+    assert [slide.title for slide in outline.slides] == ["はじめに", "本題"]
+    assert outline.slides[0].content == ["It's fine", "項目2"]
+    # 文字列で返された本文は箇条書きの記号を除いて行ごとのリストにする
+    assert outline.slides[1].content == ["項目1", "項目2"]
+    assert {"code_fence", "single_quote", "trailing_comma", "unquoted_key", "missing_comma", "content_string"} <= set(outline.repairs)
+
+
+def test_truncated_outline_drops_incomplete_slide():
+    full = json.dumps({"slides": [
+        {"title": "A", "content": ["1"]},
+        {"title": "B", "content": ["2"]},
+        {"title": "C", "content": ["長い項目"]},
+    ]}, ensure_ascii=False)
+    outline = parse_outline(full[:full.index("長い") + 1])
+    assert outline.status == "truncated"
+    assert [slide.title for slide in outline.slides] == ["A", "B"]
+    assert outline.dropped == 1
+
+    # スライドの区切りで途切れた場合は全スライドが揃っている
+    assert [slide.title for slide in parse_outline(full[:full.index(', {"title": "C"')]).slides] == ["A", "B"]
+
+
+def test_missing_closing_brace_is_repaired_not_truncated():
+    full = json.dumps({"slides": [{"title": "A", "content": ["1"]}, {"title": "B", "content": ["2"]}]})
+    # 最後の閉じ括弧だけが欠けている場合はスライドが揃っているため、続きを生成させない
+    outline = parse_outline(full[:-1])
+    assert outline.status == "repaired" and not outline.truncated
+    assert [slide.title for slide in outline.slides] == ["A", "B"]
+    assert "unclosed_bracket" in outline.repairs and outline.dropped == 0
+
+    # スライドの一覧が閉じていない場合は続きがある可能性がある
+    assert parse_outline(full[:-2]).status == "truncated"
+
+
+def test_missing_content_and_title():
+    outline = parse_outline('{"slides": [{"title": "A"}, {"content": ["タイトルなし"]}, {"title": 2, "content": null}]}')
+    assert [(slide.title, slide.content) for slide in outline.slides] == [("A", []), ("2", [])]
+    assert outline.dropped == 1
+
+
+def test_unrecoverable_input_raises():
+    with pytest.raises(OutlineParseError):
+        repair_json("申し訳ありませんが、作成できません。")
@@ -0,0 +1,73 @@
+import time
+import pytest
+from app.services.llm_cache import LLMResponseCache, make_cache_key, normalize_text
+
+
+def test_make_cache_key_normalizes_text():
+    key1 = make_cache_key("タイトル  本文\n\n\n\n次の段落 ", "modern", 10, "gpt-4", "prompt")
+    key2 = make_cache_key("タイトル 本文\n\n次の段落", "modern", 10, "gpt-4", "prompt")
+    assert key1 == key2
+
+    # オプションが異なれば別のキー
+    assert key1 != make_cache_key("タイトル 本文\n\n次の段落", "business", 10, "gpt-4", "prompt")
+    assert key1 != make_cache_key("タイトル 本文\n\n次の段落", "modern", 5, "gpt-4", "prompt")
+    assert normalize_text("  a\t b  ") == "a b"
+
+
+def test_memory_tier_lru_eviction():
+    cache = LLMResponseCache(max_entries=2, ttl_seconds=0)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    assert cache.get("a") == "1"  # aを最近使用済みにする
+    cache.set("c", "3")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "1"
+    assert cache.get("c") == "3"
+
+    stats = cache.stats()
+    assert stats["evictions"] == 1
+    assert stats["hits"] == 3
+    assert stats["misses"] == 1
+
+
+def test_memory_tier_ttl_expiration(monkeypatch):
+    cache = LLMResponseCache(max_entries=10, ttl_seconds=60)
+    cache.set("a", "1")
+
+    now = time.time()
+    monkeypatch.setattr("app.services.llm_cache.time.time", lambda: now + 120)
+    assert cache.get("a") is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_disk_tier_survives_restart(tmp_path):
+    cache = LLMResponseCache(max_entries=10, ttl_seconds=3600, disk_dir=str(tmp_path))
+    cache.set("key", '{"slides": []}')
+
+    # 新しいインスタンス（再起動相当）からも読み出せる
+    restarted = LLMResponseCache(max_entries=10, ttl_seconds=3600, disk_dir=str(tmp_path))
+    assert restarted.get("key") == '{"slides": []}'
+    assert restarted.stats()["disk_hits"] == 1
+
+    # 2回目はメモリ層からヒット
+    assert restarted.get("key") == '{"slides": []}'
+    assert restarted.stats()["memory_hits"] == 1
+
+
+async def test_disk_tier_is_bounded_by_bytes(tmp_path):
+    cache = LLMResponseCache(max_entries=10, ttl_seconds=3600, disk_dir=str(tmp_path), disk_max_bytes=2500)
+    for key in ["a", "b", "c"]:
+        await cache.aset(key, "x" * 1000)
+    assert await cache.aget("a") == "x" * 1000  # メモリ層からはまだ読める
+
+    # 容量を超えた分は最終アクセスが古いものからディスクから削除する
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["b.json", "c.json"]
+    assert cache.stats()["disk_evictions"] == 1
+    assert cache.stats()["disk_bytes"] <= 2500
+
+    # 再起動後もディスク上のファイルから索引を作り直す
+    restarted = LLMResponseCache(max_entries=10, ttl_seconds=3600, disk_dir=str(tmp_path), disk_max_bytes=2500)
+    assert restarted.stats()["disk_size"] == 2
+    assert await restarted.aget("a") is None
+    assert await restarted.aget("c") == "x" * 1000
@@ -0,0 +1,92 @@
+import json
+import asyncio
+from app.schemas.presentation import PresentationOptions
+from app.services import long_document
+from app.services.long_document import chunk_text, split_into_sections, generate_outline_map_reduce
+from app.services.tokenizer import count_tokens, estimate_tokens
+
+
+def _make_document(sections=6, paragraphs=4):
+    parts = []
+    for i in range(sections):
+        parts.append(f"# 第{i + 1}節 セクション見出し")
+        for j in range(paragraphs):
+            parts.append(f"セクション{i + 1}の段落{j + 1}です。" * 20)
+    return "\n\n".join(parts)
+
+
+def test_estimate_tokens_counts_wide_characters():
+    assert estimate_tokens("あいう") == 3
+    assert estimate_tokens("abcdefgh") == 2
+
+
+def test_split_into_sections_breaks_at_headings():
+    sections = split_into_sections("前書き\n# 見出し1\n本文1\n\n本文2\n## 見出し2\n本文3")
+    assert sections == ["前書き", "# 見出し1\n本文1", "本文2", "## 見出し2\n本文3"]
+
+
+def test_chunk_text_respects_token_budget():
+    text = _make_document()
+    chunks = chunk_text(text, max_tokens=800)
+
+    assert len(chunks) > 1
+    assert all(count_tokens(chunk) <= 800 for chunk in chunks)
+    # 内容が失われていない
+    assert "".join(chunks).count("段落") == text.count("段落")
+
+
+def test_chunk_text_splits_oversized_paragraph():
+    text = "とても長い文です。" * 500
+    chunks = chunk_text(text, max_tokens=300)
+    assert len(chunks) > 1
+    assert all(count_tokens(chunk) <= 300 for chunk in chunks)
+
+
+async def test_map_reduce_outlines_chunks_in_parallel(monkeypatch):
+    monkeypatch.setattr(long_document, "LONG_DOCUMENT_CHUNK_TOKENS", 800)
+    monkeypatch.setattr(long_document, "LONG_DOCUMENT_MAX_PARALLEL", 3)
+
+    calls = {"map": 0, "reduce": 0, "in_flight": 0, "max_in_flight": 0}
+
+    async def fake_complete(system_prompt, user_content):
+        calls["in_flight"] += 1
+        calls["max_in_flight"] = max(calls["max_in_flight"], calls["in_flight"])
+        await asyncio.sleep(0.01)
+        calls["in_flight"] -= 1
+        if "スライド案（JSON）" in system_prompt:
+            calls["reduce"] += 1
+            slides = json.loads(user_content)["slides"][:5]
+        else:
+            calls["map"] += 1
+            slides = [{"title": "部分", "content": [user_content[:10]]}]
+        return json.dumps({"slides": slides}, ensure_ascii=False)
+
+    options = PresentationOptions(slide_count=5)
+    result = await generate_outline_map_reduce(_make_document(), options, "system", fake_complete)
+
+    assert calls["map"] > 1
+    assert calls["reduce"] == 1
+    assert calls["max_in_flight"] == 3
+    assert len(json.loads(result)["slides"]) == 5
+
+
+async def test_reduce_terminates_when_merged_outline_exceeds_chunk_limit(monkeypatch):
+    monkeypatch.setattr(long_document, "LONG_DOCUMENT_CHUNK_TOKENS", 800)
+    calls = {"reduce": 0}
+    long_item = "統合後も長い内容の項目です。" * 10
+
+    async def fake_complete(system_prompt, user_content):
+        if "スライド案（JSON）" in system_prompt:
+            calls["reduce"] += 1
+            assert calls["reduce"] < 50
+            # 統合の結果が常にチャンクの上限を超える大きさになる
+            slides = [{"title": f"統合{i}", "content": [long_item] * 3} for i in range(5)]
+        else:
+            slides = [{"title": "部分", "content": [long_item] * 3} for _ in range(3)]
+        return json.dumps({"slides": slides}, ensure_ascii=False)
+
+    options = PresentationOptions(slide_count=5)
+    result = await generate_outline_map_reduce(_make_document(), options, "system", fake_complete)
+
+    assert len(json.loads(result)["slides"]) == 5
+    assert calls["reduce"] < 50
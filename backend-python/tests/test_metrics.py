@@ -0,0 +1,41 @@
+from fastapi.testclient import TestClient
+from app.services.metrics import MetricsRegistry
+from main import app
+
+
+def test_histogram_and_counter_render_prometheus_text():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("stage_seconds", "段階ごとの時間", ["stage"], buckets=(0.1, 1.0))
+    counter = registry.counter("errors_total", "エラー数", ["stage"])
+    registry.callback("queue_size", "キュー長", lambda: 3)
+
+    histogram.observe(0.05, stage="llm")
+    histogram.observe(0.5, stage="llm")
+    histogram.observe(5, stage="llm")
+    counter.inc(stage='a"b')
+
+    text = registry.render()
+    assert '# TYPE stage_seconds histogram' in text
+    assert 'stage_seconds_bucket{stage="llm",le="0.1"} 1' in text
+    assert 'stage_seconds_bucket{stage="llm",le="1.0"} 2' in text
+    assert 'stage_seconds_bucket{stage="llm",le="+Inf"} 3' in text
+    assert 'stage_seconds_count{stage="llm"} 3' in text
+    assert 'errors_total{stage="a\\"b"} 1' in text
+    assert "queue_size 3" in text
+
+
+def test_metrics_endpoint_reports_stage_latency(fake_openai_server):
+    client = TestClient(app)
+    generated = client.post("/api/presentations/generate", json={"text": "メトリクスのテスト"})
+    assert generated.status_code == 200
+    client.get(f"/api/presentations/{generated.json()['id']}")
+
+    response = client.get("/api/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    text = response.text
+    assert 'presentation_stage_duration_seconds_count{stage="llm_request"}' in text
+    assert 'presentation_stage_duration_seconds_count{stage="store_get"}' in text
+    assert 'llm_tokens_total{type="prompt"}' in text
+    assert 'llm_cache_events_total{result="misses"}' in text
+    assert 'http_request_duration_seconds_count{method="POST",route="/api/presentations/generate",status="200"}' in text
@@ -0,0 +1,73 @@
+import os
+import sys
+import time
+import subprocess
+import pytest
+import httpx
+
+from benchmarks.fake_openai_server import _free_port
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _start_worker(port, env):
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+        env=env,
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/api/health").status_code == 200:
+                return process
+        except httpx.TransportError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("ワーカーの起動がタイムアウトしました")
+
+
+def test_generate_and_download_on_different_workers(redis_url, fake_openai_server, tmp_path):
+    workers = []
+    ports = [_free_port(), _free_port()]
+    try:
+        for i, port in enumerate(ports):
+            env = dict(
+                os.environ,
+                OPENAI_API_KEY="test-key",
+                OPENAI_BASE_URL=fake_openai_server.base_url,
+                PRESENTATION_STORE="redis",
+                REDIS_URL=redis_url,
+                REDIS_KEY_PREFIX="multi-worker-test:",
+                PPTX_RENDER_WORKERS="0",
+                # ノードごとに別のディスクを持つ構成を模擬する
+                PPTX_CACHE_DIR=str(tmp_path / f"artifacts-{i}"),
+                LLM_CACHE_DIR="",
+            )
+            workers.append(_start_worker(port, env))
+
+        worker_a, worker_b = (f"http://127.0.0.1:{port}" for port in ports)
+        generated = httpx.post(
+            f"{worker_a}/api/presentations/generate",
+            json={"text": "複数ワーカーのテスト", "options": {"slide_count": 3, "include_images": False}},
+            timeout=30,
+        )
+        assert generated.status_code == 200
+        presentation_id = generated.json()["id"]
+
+        fetched = httpx.get(f"{worker_b}/api/presentations/{presentation_id}")
+        assert fetched.status_code == 200
+        assert fetched.json()["slides"] == generated.json()["slides"]
+
+        downloaded_b = httpx.get(f"{worker_b}/api/presentations/{presentation_id}/download", timeout=30)
+        assert downloaded_b.status_code == 200
+
+        # ワーカーBのレンダリング結果は共有インデックス経由でワーカーAにも届く
+        downloaded_a = httpx.get(f"{worker_a}/api/presentations/{presentation_id}/download", timeout=30)
+        assert downloaded_a.status_code == 200
+        assert downloaded_a.content == downloaded_b.content
+        assert downloaded_a.headers["etag"] == downloaded_b.headers["etag"]
+    finally:
+        for process in workers:
+            process.terminate()
+            process.wait(timeout=10)
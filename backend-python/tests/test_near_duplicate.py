@@ -0,0 +1,92 @@
+import json
+from app.services.near_duplicate import NearDuplicateIndex, patch_outline
+
+BASE_TEXT = "\n".join(
+    ["第3回プロダクト会議 2024年4月1日"]
+    + [f"議題{i}: 新機能{i}の開発状況と今後の予定について担当者から報告がありました。" for i in range(30)]
+)
+EDITED_TEXT = BASE_TEXT.replace("2024年4月1日", "2024年4月8日")
+OUTLINE = json.dumps({
+    "slides": [
+        {"title": "第3回プロダクト会議", "content": ["開催日: 2024年4月1日"]},
+        {"title": "開発状況", "content": ["新機能0の開発状況"]},
+    ]
+}, ensure_ascii=False)
+
+
+def test_patch_outline_applies_input_diff():
+    outline, applied, unpatched = patch_outline(OUTLINE, BASE_TEXT, EDITED_TEXT)
+    assert json.loads(outline)["slides"][0]["content"] == ["開催日: 2024年4月8日"]
+    assert applied == 1 and unpatched == 0
+
+
+def test_lookup_reuses_similar_input_within_scope():
+    index = NearDuplicateIndex(threshold=0.8)
+    index.add(BASE_TEXT, "modern", OUTLINE)
+
+    match = index.lookup(EDITED_TEXT, "modern")
+    assert match is not None and match.decision == "patched"
+    assert "2024年4月8日" in match.outline
+
+    # テーマ等の設定が異なる場合や、内容が異なる入力は再利用しない
+    assert index.lookup(EDITED_TEXT, "business") is None
+    assert index.lookup("まったく別の内容の文書です。" * 20, "modern") is None
+
+    decisions = [item["decision"] for item in index.report()["decisions"]]
+    assert decisions == ["patched", "miss", "miss"]
+    assert index.report()["decisions"][0]["similarity"] >= 0.8
+
+
+def test_lookup_does_not_reuse_outline_when_lines_are_added():
+    index = NearDuplicateIndex(threshold=0.8)
+    index.add(BASE_TEXT, "modern", OUTLINE)
+
+    # 行の追加はアウトラインに反映できないため、再利用せずに生成させる
+    added = BASE_TEXT + "\n議題30: 来期の採用計画について人事部から説明がありました。"
+    assert index.lookup(added, "modern") is None
+    assert index.report()["decisions"][-1]["decision"] == "miss"
+    assert index.report()["decisions"][-1]["changes_unpatched"] == 1
+
+    # 許容件数を指定した場合は再利用する
+    lenient = NearDuplicateIndex(threshold=0.8, max_unpatched=1)
+    lenient.add(BASE_TEXT, "modern", OUTLINE)
+    assert lenient.lookup(added, "modern").decision == "reused"
+
+
+def test_lookup_reuses_outline_when_edit_is_not_in_outline():
+    index = NearDuplicateIndex(threshold=0.8)
+    index.add(BASE_TEXT, "modern", OUTLINE)
+
+    # アウトラインに現れない語の誤字修正は、そのままアウトラインを再利用する
+    edited = BASE_TEXT.replace("議題7: 新機能7の開発状況", "議題7: 新機能7の開発情況")
+    match = index.lookup(edited, "modern")
+    assert match is not None and match.decision == "reused"
+    assert match.outline == json.dumps(json.loads(OUTLINE), ensure_ascii=False)
+    assert match.changes_unpatched == 0
+
+
+def test_index_is_bounded_and_persisted(tmp_path):
+    path = str(tmp_path / "near_duplicates.db")
+    index = NearDuplicateIndex(max_entries=3, path=path)
+    for i in range(5):
+        index.add(f"文書{i}: " + BASE_TEXT, "modern", OUTLINE)
+    assert len(index) == 3
+    index.close()
+
+    reloaded = NearDuplicateIndex(max_entries=3, path=path)
+    assert len(reloaded) == 3
+    assert reloaded.lookup("文書4: " + BASE_TEXT, "modern").decision == "exact"
+    assert reloaded.lookup("文書0: " + BASE_TEXT, "modern").decision != "exact"
+
+
+async def test_generation_reuses_outline_for_lightly_edited_input(fake_openai_server, monkeypatch):
+    from app.services import presentation_service
+
+    monkeypatch.setattr(presentation_service, "near_duplicate_index", NearDuplicateIndex(threshold=0.8))
+    fake_openai_server.state.content = OUTLINE
+
+    await presentation_service.generate_presentation_from_text(BASE_TEXT)
+    presentation = await presentation_service.generate_presentation_from_text(EDITED_TEXT)
+
+    assert len(fake_openai_server.state.requests) == 1
+    assert presentation.slides[0].content == ["開催日: 2024年4月8日"]
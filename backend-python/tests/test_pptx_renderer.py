@@ -0,0 +1,146 @@
+import os
+import signal
+import asyncio
+import pytest
+from pptx import Presentation as PPTXPresentation
+from app.schemas.presentation import Presentation, Slide
+from app.services.pptx_renderer import RenderPool, RenderPoolSaturated, RenderPoolUnavailable
+
+
+def _presentation(slide_count=3):
+    return Presentation(
+        id="renderer-test",
+        slides=[Slide(title=f"スライド{i}", content=[f"項目{i}"]) for i in range(slide_count)],
+        theme="business",
+        created_at="2024-01-01T00:00:00",
+        download_url="/api/presentations/renderer-test/download"
+    )
+
+
+async def test_render_pool_renders_in_worker_process(tmp_path):
+    pool = RenderPool(workers=1, max_pending=4)
+    try:
+        file_path = str(tmp_path / "out.pptx")
+        await pool.render(_presentation(), file_path)
+        assert len(PPTXPresentation(file_path).slides) == 3
+        assert pool.stats()["completed"] == 1
+    finally:
+        pool.shutdown()
+
+
+async def test_render_pool_recovers_from_killed_worker(tmp_path):
+    pool = RenderPool(workers=1, max_pending=4)
+    try:
+        await pool.render(_presentation(), str(tmp_path / "before.pptx"))
+        # メモリ不足などでワーカーが強制終了された状態を再現する
+        for process in list(pool._executor._processes.values()):
+            os.kill(process.pid, signal.SIGKILL)
+            process.join()
+
+        file_path = str(tmp_path / "after.pptx")
+        await pool.render(_presentation(), file_path)
+        assert len(PPTXPresentation(file_path).slides) == 3
+        assert pool.stats()["restarts"] == 1
+    finally:
+        pool.shutdown()
+
+
+def _crash_worker(*args):
+    os._exit(1)
+
+
+async def test_render_pool_gives_up_when_worker_keeps_crashing(tmp_path, monkeypatch):
+    from app.services import pptx_renderer
+
+    monkeypatch.setattr(pptx_renderer, "render_pptx_file", _crash_worker)
+    pool = RenderPool(workers=1, max_pending=4)
+    try:
+        # 作り直したプールでも失敗する場合は、壊れたファイルを返さずに呼び出し元へ伝える
+        with pytest.raises(RenderPoolUnavailable):
+            await pool.render(_presentation(), str(tmp_path / "out.pptx"))
+        assert pool.stats()["restarts"] == 2
+    finally:
+        pool.shutdown()
+
+
+async def test_render_pool_rejects_when_saturated(tmp_path):
+    pool = RenderPool(workers=0, max_pending=1)
+    first = asyncio.create_task(pool.render(_presentation(200), str(tmp_path / "a.pptx")))
+    await asyncio.sleep(0)
+
+    with pytest.raises(RenderPoolSaturated):
+        await pool.render(_presentation(), str(tmp_path / "b.pptx"))
+
+    await first
+    assert pool.stats()["rejected"] == 1
+
+
+def test_slide_cache_rerenders_only_changed_slides(tmp_path):
+    from app.services.pptx_renderer import render_pptx_file
+
+    cache_dir = str(tmp_path / "slide_cache")
+    presentation = _presentation(5)
+    first = render_pptx_file(presentation, str(tmp_path / "first.pptx"), cache_dir)
+    assert first["slides_rendered"] == 5
+
+    slides = list(presentation.slides)
+    slides[3] = Slide(title="編集後", content=["新しい項目"])
+    edited = presentation.model_copy(update={"slides": slides})
+    second = render_pptx_file(edited, str(tmp_path / "second.pptx"), cache_dir)
+    assert second["slides_rendered"] == 1
+    assert second["slides_reused"] == 4
+
+    pptx = PPTXPresentation(str(tmp_path / "second.pptx"))
+    assert [slide.shapes.title.text for slide in pptx.slides] == ["スライド0", "スライド1", "スライド2", "編集後", "スライド4"]
+    assert pptx.slides[3].placeholders[1].text_frame.text == "新しい項目"
+
+
+def test_render_applies_theme_from_prototype(tmp_path):
+    import zipfile
+    from app.services.pptx_renderer import render_pptx_file
+    from app.services.theme_templates import new_themed_pptx, _prototype
+
+    file_path = str(tmp_path / "themed.pptx")
+    render_pptx_file(_presentation(), file_path)
+
+    with zipfile.ZipFile(file_path) as archive:
+        theme_xml = archive.read("ppt/theme/theme1.xml").decode("utf-8")
+        master_xml = archive.read("ppt/slideMasters/slideMaster1.xml").decode("utf-8")
+    # businessテーマの主色・文字色・フォントがテーマパーツに反映される
+    assert '<a:accent1><a:srgbClr val="1E40AF"/></a:accent1>' in theme_xml
+    assert '<a:dk1><a:srgbClr val="1F2937"/></a:dk1>' in theme_xml
+    assert '<a:latin typeface="Calibri"/>' in theme_xml
+    assert "Accent Bar" in master_xml
+
+    # 複製したプレゼンテーションへの変更は原型に影響しない
+    clone = new_themed_pptx("business")
+    clone.slides.add_slide(clone.slide_layouts[1])
+    assert len(_prototype("business").slides) == 0
+    assert len(new_themed_pptx("business").slides) == 0
+
+
+def test_stream_writer_matches_python_pptx_output(tmp_path):
+    import io
+    import zipfile
+    from app.services.pptx_renderer import render_pptx_file
+    from app.services.pptx_stream_writer import iter_pptx_stream, choose_render_engine
+
+    presentation = _presentation(3)
+    presentation.slides[0].title = "表紙 <&>\n副題"
+    presentation.slides[1].content = ["改行\nあり\v", "", "制御文字\x07", "\"引用\""]
+    presentation.slides[2].content = []
+    file_path = str(tmp_path / "reference.pptx")
+    render_pptx_file(presentation, file_path)
+
+    chunks = list(iter_pptx_stream(presentation, chunk_size=1024))
+    assert len(chunks) > 1
+    with zipfile.ZipFile(io.BytesIO(b"".join(chunks))) as streamed, zipfile.ZipFile(file_path) as reference:
+        assert sorted(streamed.namelist()) == sorted(reference.namelist())
+        # スライド一覧の順序だけが異なる[Content_Types].xml以外は同じ内容になる
+        for name in reference.namelist():
+            if name != "[Content_Types].xml":
+                assert streamed.read(name) == reference.read(name), name
+
+    assert choose_render_engine("auto", 1000) == "stream"
+    assert choose_render_engine("auto", 10) == "pptx"
+    assert choose_render_engine("stream", 1000, has_images=True) == "pptx"
@@ -0,0 +1,175 @@
+import time
+import asyncio
+import pytest
+from app.schemas.presentation import Presentation, Slide
+from app.services.presentation_store import InMemoryPresentationStore, SQLitePresentationStore
+
+
+def _presentation(presentation_id, text="内容"):
+    return Presentation(
+        id=presentation_id,
+        slides=[Slide(title="タイトル", content=[text])],
+        theme="modern",
+        created_at="2024-01-01T00:00:00",
+        download_url=f"/api/presentations/{presentation_id}/download"
+    )
+
+
+def test_memory_store_evicts_least_recently_used():
+    store = InMemoryPresentationStore(max_entries=2)
+    store.put(_presentation("a"))
+    store.put(_presentation("b"))
+    assert store.get("a") is not None
+    store.put(_presentation("c"))
+
+    assert store.get("b") is None
+    assert store.get("a") is not None
+    assert len(store) == 2
+
+
+def test_memory_store_enforces_byte_budget():
+    size = len(_presentation("a", "x" * 1000).model_dump_json())
+    store = InMemoryPresentationStore(max_entries=100, max_bytes=size * 2 + 10)
+    for presentation_id in ["a", "b", "c"]:
+        store.put(_presentation(presentation_id, "x" * 1000))
+
+    assert len(store) == 2
+    assert store.stats()["bytes"] <= size * 2 + 10
+
+
+def test_memory_store_unknown_id_does_not_allocate():
+    store = InMemoryPresentationStore()
+    assert store.get("unknown") is None
+    assert len(store) == 0
+
+
+def test_memory_store_ttl(monkeypatch):
+    store = InMemoryPresentationStore(ttl_seconds=10)
+    store.put(_presentation("a"))
+    now = time.time()
+    monkeypatch.setattr("app.services.presentation_store.time.time", lambda: now + 60)
+    assert store.get("a") is None
+
+
+def test_sqlite_store_persists_across_instances(tmp_path):
+    path = str(tmp_path / "store.sqlite3")
+    store = SQLitePresentationStore(path)
+    store.put(_presentation("a"))
+    store.close()
+
+    reopened = SQLitePresentationStore(path)
+    assert reopened.get("a") == _presentation("a")
+    assert reopened.get("unknown") is None
+    assert len(reopened) == 1
+
+
+def test_sqlite_store_limits_entries(tmp_path):
+    store = SQLitePresentationStore(str(tmp_path / "store.sqlite3"), max_entries=2)
+    for presentation_id in ["a", "b", "c"]:
+        store.put(_presentation(presentation_id))
+        time.sleep(0.01)
+    assert len(store) == 2
+    assert store.get("a") is None
+
+
+def test_sqlite_store_tracks_count_and_throttles_access_updates(tmp_path):
+    store = SQLitePresentationStore(str(tmp_path / "store.sqlite3"), max_entries=3, touch_interval=60)
+    for presentation_id in ["a", "b", "a"]:
+        store.put(_presentation(presentation_id))
+    store.delete("b")
+    store.delete("unknown")
+    assert len(store) == 1
+
+    # 直前に保存・参照した場合は最終アクセス日時を書き換えない
+    def accessed_at():
+        return store._conn.execute("SELECT accessed_at FROM presentations WHERE id = 'a'").fetchone()[0]
+
+    before = accessed_at()
+    assert store.get("a") is not None
+    assert accessed_at() == before
+
+    store.touch_interval = 0
+    assert store.get("a") is not None
+    assert accessed_at() > before
+
+
+def test_sqlite_store_version_changes_on_put(tmp_path):
+    store = SQLitePresentationStore(str(tmp_path / "store.sqlite3"))
+    assert store.version("a") is None
+    store.put(_presentation("a"))
+    version = store.version("a")
+    assert store.get_versioned("a") == (_presentation("a"), version)
+
+    store.put(_presentation("a", "変更後"))
+    assert store.version("a") not in (None, version)
+
+
+def test_sqlite_store_adds_version_column_to_existing_database(tmp_path):
+    import sqlite3
+
+    path = str(tmp_path / "store.sqlite3")
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE presentations (id TEXT PRIMARY KEY, data TEXT NOT NULL, expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+    )
+    conn.execute(
+        "INSERT INTO presentations VALUES (?, ?, ?, ?)",
+        ("a", _presentation("a").model_dump_json(), time.time() + 60, time.time()),
+    )
+    conn.commit()
+    conn.close()
+
+    store = SQLitePresentationStore(path)
+    assert store.get_versioned("a") == (_presentation("a"), "")
+
+
+def test_redis_store_version_is_shared_between_processes(redis_url):
+    from app.services.presentation_store import RedisPresentationStore
+
+    writer = RedisPresentationStore(redis_url, key_prefix="test-version:", local_cache=InMemoryPresentationStore())
+    reader = RedisPresentationStore(redis_url, key_prefix="test-version:")
+    writer.put(_presentation("a"))
+
+    version = writer.version("a")
+    assert reader.version("a") == version
+    assert reader.get_versioned("a") == (_presentation("a"), version)
+    writer.delete("a")
+    assert reader.version("a") is None
+    writer.close()
+    reader.close()
+
+
+def test_redis_store_read_through_local_cache(redis_url):
+    from app.services.presentation_store import RedisPresentationStore
+
+    writer = RedisPresentationStore(redis_url, key_prefix="test-store:", local_cache=InMemoryPresentationStore())
+    reader = RedisPresentationStore(redis_url, key_prefix="test-store:", local_cache=InMemoryPresentationStore())
+    writer.put(_presentation("shared"))
+
+    # 別プロセス相当のストアからも参照でき、2回目はローカルキャッシュから返る
+    assert reader.get("shared") == _presentation("shared")
+    assert reader.get("shared") == _presentation("shared")
+    stats = reader.stats()
+    assert (stats["local_hits"], stats["remote_hits"], stats["misses"]) == (1, 1, 0)
+    assert reader.get("unknown") is None
+    writer.close()
+    reader.close()
+
+
+async def test_redis_store_invalidates_local_caches_on_write(redis_url):
+    from app.services.presentation_store import RedisPresentationStore
+
+    writer = RedisPresentationStore(redis_url, key_prefix="test-invalidate:", local_cache=InMemoryPresentationStore())
+    reader = RedisPresentationStore(redis_url, key_prefix="test-invalidate:", local_cache=InMemoryPresentationStore())
+    await writer.aput(_presentation("edited"))
+    assert (await reader.aget("edited")).slides == _presentation("edited").slides
+
+    # 他のワーカーでの更新は、ローカルキャッシュの有効期限を待たずに反映される
+    updated = _presentation("edited").model_copy(update={"theme": "business"})
+    await writer.aput(updated)
+    deadline = time.time() + 5
+    while reader.local_cache.get("edited") is not None and time.time() < deadline:
+        await asyncio.sleep(0.01)
+    assert (await reader.aget("edited")).theme == "business"
+    writer.close()
+    reader.close()
@@ -0,0 +1,126 @@
+import os
+import sys
+import subprocess
+from fastapi.testclient import TestClient
+from main import app
+from app.schemas.presentation import Presentation, Slide
+from app.services.preview_renderer import PreviewRenderer, wrap_text
+from app.services.response_cache import choose_encoding
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+client = TestClient(app)
+
+
+def _presentation(presentation_id="preview-test", theme="business", slide_count=4):
+    return Presentation(
+        id=presentation_id,
+        slides=[Slide(title=f"スライド{i}", content=[f"項目{i}", "<script>alert(1)</script>"]) for i in range(slide_count)],
+        theme=theme,
+        created_at="2024-01-01T00:00:00",
+        download_url=f"/api/presentations/{presentation_id}/download"
+    )
+
+
+def test_preview_uses_theme_and_escapes_text():
+    html = PreviewRenderer().render(_presentation())
+
+    assert html.count('<section class="slide"') == 4
+    # businessテーマの配色・フォント
+    assert 'fill="#1E40AF"' in html and 'font-family="Calibri"' in html
+    assert "<script>" not in html and "&lt;script&gt;" in html
+
+
+def test_preview_reuses_unchanged_slides():
+    renderer = PreviewRenderer()
+    presentation = _presentation()
+    renderer.render(presentation)
+
+    slides = list(presentation.slides)
+    slides[2] = slides[2].model_copy(update={"title": "変更後"})
+    html = renderer.render(presentation.model_copy(update={"slides": slides}))
+    assert "変更後" in html
+    assert renderer.stats()["misses"] == 5
+    assert renderer.stats()["hits"] == 3
+
+
+def test_wrap_text_fits_width():
+    # 全角文字は1文字1em（480px / 24px = 20文字）、半角の単語は途中で折り返さない
+    lines = wrap_text("あ" * 30 + " lorem ipsum dolor sit amet consectetur", 480, 24)
+    assert lines[0] == "あ" * 20
+    words = " ".join(lines[1:]).split()
+    assert "あ" * 10 in words[0] and words[1:] == ["lorem", "ipsum", "dolor", "sit", "amet", "consectetur"]
+
+
+def test_choose_encoding_respects_quality():
+    assert choose_encoding("gzip, deflate") == "gzip"
+    assert choose_encoding("gzip;q=0") == "identity"
+    assert choose_encoding(None) == "identity"
+
+
+def test_preview_endpoint_supports_etag_and_gzip():
+    from app.services import presentation_service
+
+    presentation_service.presentation_store.put(_presentation("preview-api-test", slide_count=12))
+
+    response = client.get("/api/presentations/preview-api-test/preview", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/html")
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.text.count('<section class="slide"') == 12
+    etag = response.headers["etag"]
+
+    not_modified = client.get("/api/presentations/preview-api-test/preview", headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304
+
+    single = client.get("/api/presentations/preview-api-test/preview?slide=3", headers={"Accept-Encoding": "identity"})
+    assert single.status_code == 200
+    assert single.text.startswith('<section class="slide" data-index="3">')
+    assert single.headers["etag"] != etag
+    assert client.get("/api/presentations/preview-api-test/preview?slide=12").status_code == 404
+
+    # 編集するとETagが変わる
+    client.patch("/api/presentations/preview-api-test/slides/1", json={"title": "編集済み"})
+    edited = client.get("/api/presentations/preview-api-test/preview", headers={"If-None-Match": etag})
+    assert edited.status_code == 200
+    assert "編集済み" in edited.text
+
+
+def test_preview_does_not_load_python_pptx():
+    script = (
+        "import sys; from fastapi.testclient import TestClient; import main; "
+        "from app.services import presentation_service; "
+        "from tests.test_preview_renderer import _presentation; "
+        "presentation_service.presentation_store.put(_presentation('no-pptx')); "
+        "assert TestClient(main.app).get('/api/presentations/no-pptx/preview').status_code == 200; "
+        "print('pptx_loaded=' + str('pptx' in sys.modules))"
+    )
+    env = dict(os.environ, OPENAI_API_KEY="test-key", LOG_LEVEL="WARNING", PRESENTATION_STORE="memory")
+    output = subprocess.run(
+        [sys.executable, "-c", script], cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    assert "pptx_loaded=False" in output
+
+
+def test_brotli_is_preferred_when_available():
+    import pytest
+
+    brotli = pytest.importorskip("brotli")
+    from app.services.response_cache import CachedBody
+
+    assert choose_encoding("gzip, br") == "br"
+    body = CachedBody(b'{"slides": []}' * 100, '"x"', "application/json")
+    assert brotli.decompress(body.encoded("br")) == body.body
+
+
+def test_body_cache_is_bounded_by_bytes():
+    from app.services.response_cache import BodyCache, CachedBody
+
+    cache = BodyCache(max_entries=10, max_bytes=2500)
+    for key in ["a", "b", "a", "c"]:
+        cache.set(key, CachedBody(b"x" * 1000, f'"{key}"', "application/json"))
+
+    # 同じキーの上書きは容量に二重に数えず、超えた分は最終使用が古いものから破棄する
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache.stats()["bytes"] == 2000 and cache.stats()["evictions"] == 1
@@ -0,0 +1,54 @@
+import time
+import asyncio
+
+from app.services.profiler import RequestProfiler
+
+
+def _busy(seconds: float) -> None:
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        pass
+
+
+async def _profiled_work():
+    _busy(0.05)
+    await asyncio.sleep(0.05)
+
+
+async def _other_request():
+    for _ in range(10):
+        _busy(0.005)
+        await asyncio.sleep(0)
+
+
+async def test_profile_records_only_the_profiled_request():
+    profiler = RequestProfiler(admin_token="secret", interval_ms=1, max_profiles=2)
+
+    async def handler():
+        with profiler.profile("test", "/work") as session:
+            await _profiled_work()
+        return session.id
+
+    profile_id, _ = await asyncio.gather(handler(), _other_request())
+    profile = profiler.get(profile_id)
+
+    names = {profile.frames[i][0] for stack in profile.samples for i in stack}
+    assert {"test_profile_records_only_the_profiled_request.<locals>.handler", "_profiled_work", "_busy", "[await]"} <= names
+    # 同じイベントループで並行して動く他のリクエストの処理は含めない
+    assert "_other_request" not in names
+    assert sum(profile.weights) <= profile.duration_seconds + 0.01
+
+    for _ in range(2):
+        with profiler.profile("test", "/work"):
+            pass
+    assert profiler.get(profile_id) is None
+    assert len(profiler.profiles()) == 2
+
+
+def test_should_profile_requires_admin_token_or_sampling():
+    assert not RequestProfiler(admin_token="").should_profile({"x-profile": "1", "x-admin-token": ""})
+    profiler = RequestProfiler(admin_token="secret", sample_rate=0)
+    assert profiler.should_profile({"x-profile": "1", "x-admin-token": "secret"})
+    assert not profiler.should_profile({"x-profile": "1", "x-admin-token": "wrong"})
+    assert not profiler.should_profile({})
+    assert RequestProfiler(sample_rate=1.0).should_profile({})
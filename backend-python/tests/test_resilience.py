@@ -0,0 +1,133 @@
+import time
+import pytest
+from fastapi.testclient import TestClient
+from main import app
+from app.services.resilience import ResilientCaller, CircuitBreaker, CircuitOpenError, RetryBudget
+
+client = TestClient(app)
+
+
+def _use_caller(monkeypatch, **kwargs):
+    from app.services import presentation_service
+
+    caller = ResilientCaller(backoff=lambda attempt: 0, **kwargs)
+    monkeypatch.setattr(presentation_service, "upstream_resilience", caller)
+    return caller
+
+
+async def test_retries_server_errors_until_success(fake_openai_server):
+    from app.services import presentation_service
+
+    fake_openai_server.state.fault_plan = ["500", "429"]
+    content = await presentation_service.request_completion("system", "本文")
+
+    assert "スライド1" in content
+    assert len(fake_openai_server.state.requests) == 3
+    assert presentation_service.upstream_resilience.stats()["retries"] == 2
+
+
+async def test_does_not_retry_client_errors(fake_openai_server):
+    from app.services import presentation_service
+
+    fake_openai_server.state.fault_plan = ["400"]
+    with pytest.raises(ValueError):
+        await presentation_service.request_completion("system", "本文")
+    assert len(fake_openai_server.state.requests) == 1
+
+
+async def test_attempt_timeout_retries_stalled_request(fake_openai_server, monkeypatch):
+    from app.services import presentation_service
+
+    caller = _use_caller(monkeypatch, attempt_timeout=0.3)
+    fake_openai_server.state.fault_plan = ["timeout"]
+    fake_openai_server.state.stall_seconds = 1.5
+
+    start = time.perf_counter()
+    await presentation_service.request_completion("system", "本文")
+    assert time.perf_counter() - start < 1
+    assert caller.stats()["timeouts"] == 1
+
+
+async def test_hedged_request_wins_over_slow_attempt(fake_openai_server, monkeypatch):
+    from app.services import presentation_service
+
+    caller = _use_caller(monkeypatch, hedge_enabled=True, hedge_min_samples=1, hedge_min_delay=0.1)
+    caller.latencies.observe(0.05)
+    fake_openai_server.state.fault_plan = ["slow", "ok"]
+    fake_openai_server.state.slow_seconds = 1.5
+
+    start = time.perf_counter()
+    await presentation_service.request_completion("system", "本文")
+    assert time.perf_counter() - start < 1
+    assert caller.stats()["hedges"] == 1
+    assert caller.stats()["hedge_wins"] == 1
+
+
+async def test_hedge_is_skipped_when_limiter_has_no_free_slot(fake_openai_server, monkeypatch):
+    from app.services import presentation_service
+    from app.services.llm_client import UpstreamLimiter
+
+    caller = _use_caller(monkeypatch, hedge_enabled=True, hedge_min_samples=1, hedge_min_delay=0.1)
+    caller.latencies.observe(0.05)
+    limiter = UpstreamLimiter(1)
+    monkeypatch.setattr(presentation_service, "upstream_limiter", limiter)
+    fake_openai_server.state.fault_plan = ["slow", "ok"]
+    fake_openai_server.state.slow_seconds = 0.3
+
+    # 呼び出し元が唯一の枠を使っているため、ヘッジを送ると上限を超えてしまう
+    await presentation_service.request_completion("system", "本文")
+    assert len(fake_openai_server.state.requests) == 1
+    assert caller.stats()["hedges"] == 0 and caller.stats()["hedges_skipped"] == 1
+    assert limiter.in_flight == 0
+
+
+def test_open_circuit_fails_fast_and_is_reported_in_health(fake_openai_server, monkeypatch):
+    _use_caller(monkeypatch, max_attempts=1, breaker=CircuitBreaker(failure_threshold=2, reset_seconds=60))
+    fake_openai_server.state.error_rate = 1.0
+
+    for i in range(2):
+        response = client.post("/api/presentations/generate", json={"text": f"障害テスト{i}"})
+        assert response.status_code == 500
+    assert len(fake_openai_server.state.requests) == 2
+
+    response = client.post("/api/presentations/generate", json={"text": "障害テスト2"})
+    assert response.status_code == 503
+    assert int(response.headers["retry-after"]) > 0
+    assert len(fake_openai_server.state.requests) == 2
+    assert client.post("/api/presentations/generate/stream", json={"text": "障害テスト3"}).status_code == 503
+
+    health = client.get("/api/health").json()
+    assert health["status"] == "DEGRADED"
+    assert health["upstream"]["circuit_state"] == "open"
+
+
+def test_circuit_breaker_half_open_probe():
+    now = [0.0]
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=10, clock=lambda: now[0])
+    breaker.record_failure()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    now[0] = 11
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    breaker.before_call()
+    # 試行中は他の呼び出しを通さない
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+async def test_retry_budget_limits_retries():
+    calls = []
+
+    async def failing():
+        calls.append(1)
+        raise TimeoutError("stalled")
+
+    caller = ResilientCaller(max_attempts=5, budget=RetryBudget(ratio=0, minimum=1), backoff=lambda attempt: 0)
+    with pytest.raises(TimeoutError):
+        await caller.call(failing)
+    # 予算の1回分だけ再試行する
+    assert len(calls) == 2
+    assert caller.budget.exhausted == 1
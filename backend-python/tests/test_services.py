@@ -19,3 +19,183 @@ def test_get_theme_settings():
     business_theme = get_theme_settings("business")
     assert business_theme["primary_color"] == "1E40AF"
     assert business_theme["title_font"] == "Calibri"
+
+
+
+async def test_generate_presentation_uses_llm_cache(fake_openai_server):
+    from app.services import presentation_service
+
+    options = PresentationOptions(theme="modern", slide_count=3, include_images=False)
+    first = await presentation_service.generate_presentation_from_text("同じテキスト", options)
+    second = await presentation_service.generate_presentation_from_text("同じテキスト", options)
+
+    assert len(fake_openai_server.state.requests) == 1
+    assert first.id != second.id
+    assert second.slides == first.slides
+    assert presentation_service.llm_cache.stats()["hits"] == 1
+
+
+async def test_upstream_concurrency_is_bounded(fake_openai_server, monkeypatch):
+    import asyncio
+    from app.services import presentation_service
+    from app.services.llm_client import UpstreamLimiter
+
+    limiter = UpstreamLimiter(2)
+    monkeypatch.setattr(presentation_service, "upstream_limiter", limiter)
+    fake_openai_server.state.latency_seconds = 0.1
+
+    options = PresentationOptions(slide_count=3, include_images=False)
+    presentations = await asyncio.gather(*[
+        presentation_service.generate_presentation_from_text(f"テキスト{i}", options)
+        for i in range(6)
+    ])
+
+    assert len(presentations) == 6
+    assert fake_openai_server.state.max_in_flight == 2
+    stats = limiter.stats()
+    assert stats["acquired"] == 6
+    assert stats["queue_wait_seconds_max"] > 0.05
+
+
+async def test_long_document_uses_map_reduce(fake_openai_server, monkeypatch):
+    from app.services import presentation_service, long_document
+
+    monkeypatch.setattr(long_document, "LONG_DOCUMENT_THRESHOLD_TOKENS", 500)
+    monkeypatch.setattr(long_document, "LONG_DOCUMENT_CHUNK_TOKENS", 400)
+    fake_openai_server.state.slide_count = 2
+
+    text = "\n\n".join(f"# 見出し{i}\n" + "".join(f"本文{i}-{j}です。" for j in range(60)) for i in range(5))
+    options = PresentationOptions(slide_count=4, include_images=False)
+    presentation = await presentation_service.generate_presentation_from_text(text, options)
+
+    # チャンクごとのmap呼び出しと統合のreduce呼び出し
+    assert len(fake_openai_server.state.requests) > 2
+    assert all(
+        long_document.count_tokens(request["messages"][1]["content"]) <= 400
+        for request in fake_openai_server.state.requests[:-1]
+    )
+    assert len(presentation.slides) == 2
+
+
+async def test_input_is_compacted_before_llm_call(fake_openai_server):
+    from app.services import presentation_service
+
+    options = PresentationOptions(slide_count=3, include_images=False)
+    text = "ヘッダー行です\n本文の内容です。\n\n\n\nヘッダー行です\n本文の   内容です。"
+    await presentation_service.generate_presentation_from_text(text, options)
+
+    user_message = fake_openai_server.state.requests[0]["messages"][-1]["content"]
+    assert user_message.count("ヘッダー行です") == 1
+    assert "   " not in user_message
+
+
+async def test_generate_attaches_images_and_embeds_them(fake_openai_server, monkeypatch, tmp_path):
+    from PIL import Image
+    from pptx import Presentation as PPTXPresentation
+    from app.services import presentation_service
+    from app.services.image_service import ImagePipeline, LocalDirectoryImageProvider
+
+    image_dir = tmp_path / "library"
+    image_dir.mkdir()
+    Image.new("RGB", (1600, 1200), (0, 128, 0)).save(image_dir / "スライド2.png")
+    pipeline = ImagePipeline(LocalDirectoryImageProvider(str(image_dir)), cache_dir=str(tmp_path / "cache"))
+    monkeypatch.setattr(presentation_service, "image_pipeline", pipeline)
+
+    options = PresentationOptions(slide_count=3, include_images=True)
+    presentation = await presentation_service.generate_presentation_from_text("画像付きの生成", options)
+    assert [slide.image_url is not None for slide in presentation.slides] == [False, True, False]
+
+    file_path = await presentation_service.generate_powerpoint_file(presentation)
+    pptx = PPTXPresentation(file_path)
+    assert any(shape.shape_type == 13 for shape in pptx.slides[1].shapes)
+
+
+async def test_images_are_fetched_while_outline_is_cached(fake_openai_server, monkeypatch, tmp_path):
+    import asyncio
+    from app.services import presentation_service
+    from app.services.image_service import ImagePipeline, ImageProvider
+
+    fetch_started = asyncio.Event()
+
+    class RecordingProvider(ImageProvider):
+        name = "recording"
+
+        async def fetch(self, prompt):
+            fetch_started.set()
+            return None
+
+    monkeypatch.setattr(
+        presentation_service, "image_pipeline", ImagePipeline(RecordingProvider(), cache_dir=str(tmp_path))
+    )
+    original_aset = presentation_service.llm_cache.aset
+
+    # 画像の取得がキャッシュへの保存の完了を待たずに始まっていなければタイムアウトする
+    async def aset_after_fetch_started(key, value):
+        await asyncio.wait_for(fetch_started.wait(), 1)
+        await original_aset(key, value)
+
+    monkeypatch.setattr(presentation_service.llm_cache, "aset", aset_after_fetch_started)
+    options = PresentationOptions(slide_count=3, include_images=True)
+    presentation = await presentation_service.generate_presentation_from_text("画像と並行して保存", options)
+    assert len(presentation.slides) == 3
+
+
+async def test_stream_sends_repaired_slide_once_and_keeps_outline_order(fake_openai_server):
+    from app.services import presentation_service
+
+    # 2枚目は末尾のカンマで逐次パースに失敗し、全体の修復でのみ取り出せる
+    fake_openai_server.state.content = (
+        '{"slides": [{"title": "A", "content": ["a"]}, {"title": "B", "content": ["b",]}, '
+        '{"title": "C", "content": ["c"]}]}'
+    )
+    options = PresentationOptions(slide_count=3, include_images=False)
+    events = [event async for event in presentation_service.stream_presentation_from_text("修復が必要な出力", options)]
+
+    sent = [data["slide"]["title"] for name, data in events if name == "slide"]
+    assert sorted(sent) == ["A", "B", "C"]
+    assert [slide["title"] for slide in events[-1][1]["slides"]] == ["A", "B", "C"]
+
+
+async def test_truncated_outline_is_completed_with_continuation(fake_openai_server):
+    import json
+    from app.services import presentation_service
+    from app.services.metrics import OUTLINE_PARSE_EVENTS
+
+    head = json.dumps({"slides": [
+        {"title": "導入", "content": ["背景"]},
+        {"title": "課題", "content": "- 処理が遅い\n- 出力が崩れる"},
+        {"title": "書きかけ", "content": ["途中"]},
+    ]}, ensure_ascii=False)
+    tail = json.dumps({"slides": [{"title": "まとめ", "content": ["今後の予定"]}]}, ensure_ascii=False)
+    fake_openai_server.state.content_plan = [head[:head.index("途中")], tail]
+    continued = OUTLINE_PARSE_EVENTS.value(result="continued")
+
+    options = PresentationOptions(slide_count=3, include_images=False)
+    presentation = await presentation_service.generate_presentation_from_text("途切れるテキスト", options)
+
+    assert [slide.title for slide in presentation.slides] == ["導入", "課題", "まとめ"]
+    assert presentation.slides[1].content == ["処理が遅い", "出力が崩れる"]
+    assert OUTLINE_PARSE_EVENTS.value(result="continued") == continued + 1
+    # 続きの生成には作成済みのスライドのタイトルのみを渡す
+    requests = fake_openai_server.state.requests
+    assert len(requests) == 2
+    assert "1. 導入\n2. 課題" in requests[1]["messages"][1]["content"]
+
+    # 復元したアウトラインは正規化してキャッシュされ、再生成時は上流を呼ばない
+    cached = await presentation_service.generate_presentation_from_text("途切れるテキスト", options)
+    assert cached.slides == presentation.slides
+    assert len(fake_openai_server.state.requests) == 2
+
+
+async def test_missing_closing_brace_does_not_request_continuation(fake_openai_server):
+    import json
+    from app.services import presentation_service
+
+    outline = json.dumps({"slides": [{"title": "導入", "content": ["背景"]}, {"title": "まとめ", "content": ["予定"]}]})
+    fake_openai_server.state.content = outline[:-1]
+
+    options = PresentationOptions(slide_count=2, include_images=False)
+    presentation = await presentation_service.generate_presentation_from_text("閉じ括弧が欠けるテキスト", options)
+
+    assert [slide.title for slide in presentation.slides] == ["導入", "まとめ"]
+    assert len(fake_openai_server.state.requests) == 1
@@ -0,0 +1,37 @@
+import json
+from app.services.slide_stream_parser import SlideStreamParser
+
+
+SAMPLE = json.dumps({
+    "slides": [
+        {"title": "はじめに", "content": ["括弧 { } [ ] を含む文字列", "エスケープ \" 付き"]},
+        {"title": "本題", "content": ["項目1", "項目2"]},
+    ]
+}, ensure_ascii=False)
+
+
+def test_emits_each_slide_when_object_closes():
+    parser = SlideStreamParser()
+    emitted = []
+    positions = []
+    for i, ch in enumerate(SAMPLE):
+        for slide in parser.feed(ch):
+            emitted.append(slide)
+            positions.append(i)
+
+    assert [s["title"] for s in emitted] == ["はじめに", "本題"]
+    assert emitted[0]["content"][0] == "括弧 { } [ ] を含む文字列"
+    # 1枚目は全体の受信完了より前に取り出せる
+    assert positions[0] < len(SAMPLE) - 10
+
+
+def test_ignores_objects_outside_slides_array():
+    parser = SlideStreamParser()
+    text = '{"meta": {"title": "x"}, "slides": [{"title": "A", "content": []}], "extra": [{"title": "B"}]}'
+    assert [s["title"] for s in parser.feed(text)] == ["A"]
+
+
+def test_string_value_matching_array_key_is_not_treated_as_key():
+    parser = SlideStreamParser()
+    text = '{"note": "slides", "data": [{"title": "X", "content": []}], "slides": [{"title": "A", "content": []}]}'
+    assert [s["title"] for s in parser.feed(text)] == ["A"]
@@ -0,0 +1,29 @@
+import os
+import sys
+import subprocess
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_import_does_not_load_heavy_dependencies():
+    script = (
+        "import sys, main; "
+        "print('loaded=' + ','.join(name for name in ('openai', 'pptx', 'tiktoken') if name in sys.modules))"
+    )
+    env = dict(os.environ, OPENAI_API_KEY="test-key", LOG_LEVEL="WARNING")
+    output = subprocess.run(
+        [sys.executable, "-c", script], cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    assert "loaded=\n" in output
+
+
+async def test_warm_up_creates_client(monkeypatch):
+    from app.services import presentation_service
+
+    monkeypatch.setattr(presentation_service, "api_key", "test-key")
+    monkeypatch.setattr(presentation_service, "client", None)
+    monkeypatch.setattr(presentation_service, "_client_initialized", False)
+
+    await presentation_service.warm_up()
+    assert presentation_service.client is not None
+    assert presentation_service.get_client() is presentation_service.client